@@ -0,0 +1,225 @@
+from __future__ import annotations
+
+"""Escritura diferida de AuditEvent.
+
+El middleware ya no hace un INSERT (una transacción de escritura en SQLite) por cada request:
+deja el evento en una cola en memoria y un hilo de fondo los graba con `bulk_create` cuando
+junta `AUDITORIA_BUFFER_LOTE` o pasan `AUDITORIA_BUFFER_SEGUNDOS`.
+
+- Si la DB está ocupada (o la cola llena) el lote va a un archivo JSONL en
+  `AUDITORIA_SPOOL_DIR`; el hilo lo reimporta en la próxima escritura que funcione.
+- Al cerrar el proceso (atexit) se graba lo pendiente.
+- Cada AUDITORIA_ROLLUP_SEGUNDOS el mismo hilo pone al día los resúmenes horarios (auditoria.rollup).
+- Con `AUDITORIA_BUFFER = False` (tests) se graba en el momento, en el hilo del request.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import threading
+import time
+import uuid
+from datetime import datetime
+from pathlib import Path
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, OperationalError, close_old_connections, connections
+
+from . import rollup
+from .models import AuditEvent
+
+logger = logging.getLogger(__name__)
+
+_FIN = object()
+
+
+def _a_json(datos: dict) -> str:
+    d = dict(datos)
+    d["created_at"] = d["created_at"].isoformat()
+    return json.dumps(d, ensure_ascii=False)
+
+
+def _de_json(linea: str) -> dict:
+    d = json.loads(linea)
+    d["created_at"] = datetime.fromisoformat(d["created_at"])
+    return d
+
+
+def _grabar(lote: list[dict]) -> None:
+    # Un usuario borrado entre el request y la escritura no tira el lote: queda su username
+    ids = {d["user_id"] for d in lote if d.get("user_id")}
+    if ids:
+        vigentes = set(get_user_model().objects.filter(pk__in=ids).values_list("pk", flat=True))
+        if vigentes != ids:
+            lote = [d if d.get("user_id") in vigentes or not d.get("user_id") else {**d, "user_id": None} for d in lote]
+    AuditEvent.objects.bulk_create([AuditEvent(**d) for d in lote], batch_size=500)
+
+
+class BufferAuditoria:
+    """Cola de eventos (dicts con los campos de AuditEvent, `user_id` en lugar de `user`)."""
+
+    def __init__(self, lote: int, segundos: float, maximo: int, spool_dir: Path, rollup_segundos: float = 0):
+        self.lote = max(1, lote)
+        self.segundos = max(0.05, segundos)
+        self.spool_dir = Path(spool_dir)
+        self.rollup_segundos = rollup_segundos
+        self._proximo_rollup = 0.0
+        self._cola: queue.Queue = queue.Queue(maxsize=max(1, maximo))
+        self._hilo: threading.Thread | None = None
+        self._lock = threading.Lock()
+        self._escritura = threading.Lock()
+
+    # ------------------------------------------------------------------
+    # Productor (hilos de request)
+    # ------------------------------------------------------------------
+    def agregar(self, datos: dict) -> None:
+        self._iniciar()
+        try:
+            self._cola.put_nowait(datos)
+        except queue.Full:
+            # El hilo no da abasto (DB bloqueada un buen rato): a disco, no se pierde
+            self._a_spool([datos])
+
+    def _iniciar(self) -> None:
+        if self._hilo is not None and self._hilo.is_alive():
+            return
+        with self._lock:
+            if self._hilo is None or not self._hilo.is_alive():
+                self._hilo = threading.Thread(target=self._loop, name="auditoria-buffer", daemon=True)
+                self._hilo.start()
+
+    # ------------------------------------------------------------------
+    # Consumidor (hilo de fondo)
+    # ------------------------------------------------------------------
+    def _loop(self) -> None:
+        pendientes: list[dict] = []
+        limite = time.monotonic() + self.segundos
+        try:
+            while True:
+                try:
+                    item = self._cola.get(timeout=max(0.0, limite - time.monotonic()))
+                except queue.Empty:
+                    item = None
+                if item is _FIN:
+                    break
+                if item is not None:
+                    pendientes.append(item)
+                if len(pendientes) >= self.lote or time.monotonic() >= limite:
+                    self.escribir(pendientes)
+                    pendientes = []
+                    limite = time.monotonic() + self.segundos
+        finally:
+            self.escribir(pendientes)
+            connections.close_all()
+
+    def escribir(self, lote: list[dict]) -> int:
+        """Graba un lote (y lo que haya en el spool). Si la DB no responde, el lote va al spool."""
+
+        with self._escritura:
+            close_old_connections()
+            if lote:
+                try:
+                    _grabar(lote)
+                except OperationalError as e:
+                    # "database is locked" / "busy": reintenta desde el spool
+                    logger.warning("Auditoría: DB ocupada, %s eventos al spool (%s)", len(lote), e)
+                    self._a_spool(lote)
+                    return 0
+                except DatabaseError:
+                    logger.exception("Auditoría: se descartan %s eventos", len(lote))
+                    return 0
+            self._reimportar_spool()
+            self._rollup_si_toca()
+            return len(lote)
+
+    def _rollup_si_toca(self) -> None:
+        if not self.rollup_segundos or time.monotonic() < self._proximo_rollup:
+            return
+        self._proximo_rollup = time.monotonic() + self.rollup_segundos
+        try:
+            rollup.actualizar()
+        except DatabaseError:
+            # Ocupada: queda para la próxima (el checkpoint no avanzó)
+            logger.warning("Auditoría: no se pudo actualizar el resumen horario", exc_info=True)
+
+    def vaciar(self) -> int:
+        """Graba ya todo lo que está en la cola (sin esperar al hilo)."""
+
+        lote = []
+        while True:
+            try:
+                item = self._cola.get_nowait()
+            except queue.Empty:
+                break
+            if item is not _FIN:
+                lote.append(item)
+        return self.escribir(lote)
+
+    def detener(self, timeout: float = 10) -> None:
+        hilo = self._hilo
+        if hilo is not None and hilo.is_alive():
+            self._cola.put(_FIN)
+            hilo.join(timeout)
+        self.vaciar()
+
+    # ------------------------------------------------------------------
+    # Spool en disco
+    # ------------------------------------------------------------------
+    def _a_spool(self, lote: list[dict]) -> None:
+        try:
+            self.spool_dir.mkdir(parents=True, exist_ok=True)
+            nombre = f"spool-{time.time_ns()}-{os.getpid()}-{uuid.uuid4().hex[:6]}.jsonl"
+            tmp = self.spool_dir / f"{nombre}.tmp"
+            tmp.write_text("".join(_a_json(d) + "\n" for d in lote), encoding="utf-8")
+            tmp.replace(self.spool_dir / nombre)
+        except OSError:
+            logger.exception("Auditoría: no se pudo escribir el spool (%s eventos perdidos)", len(lote))
+
+    def archivos_spool(self) -> list[Path]:
+        if not self.spool_dir.is_dir():
+            return []
+        return sorted(self.spool_dir.glob("spool-*.jsonl"))
+
+    def _reimportar_spool(self) -> None:
+        for path in self.archivos_spool():
+            try:
+                _grabar([_de_json(l) for l in path.read_text(encoding="utf-8").splitlines() if l.strip()])
+            except OperationalError:
+                return  # Sigue ocupada: la próxima vez
+            except (ValueError, TypeError, DatabaseError):
+                logger.exception("Auditoría: spool ilegible %s", path.name)
+                path.rename(path.with_suffix(".error"))
+                continue
+            path.unlink(missing_ok=True)
+
+
+_buffer: BufferAuditoria | None = None
+_buffer_lock = threading.Lock()
+
+
+def get_buffer() -> BufferAuditoria:
+    global _buffer
+    if _buffer is None:
+        with _buffer_lock:
+            if _buffer is None:
+                _buffer = BufferAuditoria(
+                    lote=getattr(settings, "AUDITORIA_BUFFER_LOTE", 200),
+                    segundos=getattr(settings, "AUDITORIA_BUFFER_SEGUNDOS", 2.0),
+                    maximo=getattr(settings, "AUDITORIA_BUFFER_MAX", 10000),
+                    spool_dir=getattr(settings, "AUDITORIA_SPOOL_DIR", Path(settings.BASE_DIR) / "var" / "auditoria_spool"),
+                    rollup_segundos=getattr(settings, "AUDITORIA_ROLLUP_SEGUNDOS", 300),
+                )
+                atexit.register(_buffer.detener)
+    return _buffer
+
+
+def registrar(datos: dict) -> None:
+    """Encola un evento (o lo graba ya si AUDITORIA_BUFFER está apagado)."""
+
+    if getattr(settings, "AUDITORIA_BUFFER", True):
+        get_buffer().agregar(datos)
+    else:
+        AuditEvent.objects.create(**datos)
@@ -0,0 +1,122 @@
+from __future__ import annotations
+
+"""Percentiles de duración (p50/p95/p99) por vista, área o usuario, y comparación entre períodos.
+
+Sale de los histogramas de AuditRollupHora (cubetas fijas en escala logarítmica, ver
+models.LIMITES_MS): sumar histogramas de distintas horas es sumar columna a columna, así que el
+merge lo hace la DB en un solo GROUP BY (`SUM(h00) ... SUM(h20)`) sin importar si la ventana es de
+un día o de 90. En Python sólo queda recorrer 21 cubetas por grupo.
+
+- `latencias(dimension, desde, hasta)` -> {clave: Latencia}
+- `comparar(dimension, dias)` -> los últimos `dias` contra los `dias` anteriores, ordenado por
+  variación del p95; `regresion` marca las que empeoraron más de REGRESION_PCT.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+
+from django.db.models import Max
+from django.utils import timezone
+
+from . import rollup
+from .models import AuditRollupHora
+
+# Dimensión (parámetro `por` de la pantalla) -> columna del resumen
+DIMENSIONES = {
+    "vista": "view_name",
+    "area": "app_area",
+    "usuario": "username",
+}
+
+# Variación del p95 (%) a partir de la cual se marca una regresión. Las cubetas miden ~1.5x de
+# ancho: por debajo de esto la diferencia puede ser sólo la interpolación.
+REGRESION_PCT = 25
+MIN_REQUESTS = 20
+
+
+@dataclass(frozen=True)
+class Latencia:
+    n: int
+    p50: int | None
+    p95: int | None
+    p99: int | None
+    max: int | None
+
+    @classmethod
+    def de_histograma(cls, cubetas: list[int], maximo: int | None) -> "Latencia":
+        return cls(
+            n=sum(cubetas),
+            p50=rollup.percentil_histograma(cubetas, 50, maximo),
+            p95=rollup.percentil_histograma(cubetas, 95, maximo),
+            p99=rollup.percentil_histograma(cubetas, 99, maximo),
+            max=maximo,
+        )
+
+
+def latencias(dimension: str | None, desde: datetime, hasta: datetime | None = None) -> dict[str, Latencia]:
+    """Percentiles por valor de `dimension` (clave de DIMENSIONES) en las horas [desde, hasta).
+
+    Con `dimension=None` devuelve el total bajo la clave "".
+    """
+
+    qs = AuditRollupHora.objects.filter(hora__gte=rollup.hora_de(desde))
+    if hasta is not None:
+        qs = qs.filter(hora__lt=hasta)
+
+    if dimension is None:
+        f = qs.aggregate(maximo=Max("max_ms"), **rollup.sumas_cubetas())
+        lat = Latencia.de_histograma(rollup.histograma(f), f["maximo"])
+        return {"": lat} if lat.n else {}
+
+    campo = DIMENSIONES[dimension]
+    filas = qs.values(campo).annotate(maximo=Max("max_ms"), **rollup.sumas_cubetas()).order_by()
+    res = {}
+    for f in filas:
+        lat = Latencia.de_histograma(rollup.histograma(f), f["maximo"])
+        if lat.n:
+            res[f[campo]] = lat
+    return res
+
+
+def _variacion(actual: int | None, anterior: int | None) -> float | None:
+    if actual is None or not anterior:
+        return None
+    return 100 * (actual - anterior) / anterior
+
+
+def comparar(
+    dimension: str,
+    dias: int = 7,
+    min_requests: int = MIN_REQUESTS,
+    ahora: datetime | None = None,
+) -> list[dict]:
+    """Últimos `dias` contra los `dias` anteriores (ventanas de horas completas).
+
+    Filas: clave, actual (Latencia), anterior (Latencia o None), variacion_p95 (%), regresion.
+    Sólo entran las claves con al menos `min_requests` en el período actual; primero las que
+    más empeoraron.
+    """
+
+    fin = rollup.hora_de(ahora or timezone.now()) + rollup.UNA_HORA
+    medio = fin - timedelta(days=dias)
+    inicio = medio - timedelta(days=dias)
+    actuales = latencias(dimension, medio, fin)
+    anteriores = latencias(dimension, inicio, medio)
+
+    filas = []
+    for clave, act in actuales.items():
+        if act.n < min_requests:
+            continue
+        ant = anteriores.get(clave)
+        if ant is not None and ant.n < min_requests:
+            ant = None
+        variacion = _variacion(act.p95, ant.p95 if ant else None)
+        filas.append({
+            "clave": clave,
+            "actual": act,
+            "anterior": ant,
+            "variacion_p95": variacion,
+            "regresion": variacion is not None and variacion >= REGRESION_PCT,
+        })
+    filas.sort(key=lambda f: (f["variacion_p95"] is None, -(f["variacion_p95"] or 0), -(f["actual"].p95 or 0), f["clave"]))
+    return filas
@@ -0,0 +1,49 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import connection
+from django.template import engines
+
+from auditoria import perf
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide el costo de AUDITORIA_PERF en este equipo: la misma consulta y el mismo render "
+        "con y sin medición. Informa el agregado por consulta / por render."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--n", type=int, default=5000, help="Repeticiones (default: 5000).")
+
+    def _consultas(self, n: int) -> float:
+        inicio = time.perf_counter()
+        with connection.cursor() as cur:
+            for _ in range(n):
+                cur.execute("SELECT 1")
+                cur.fetchone()
+        return time.perf_counter() - inicio
+
+    def _renders(self, n: int) -> float:
+        tpl = engines["django"].from_string("{% for i in items %}{{ i }}{% endfor %}")
+        ctx = {"items": range(20)}
+        inicio = time.perf_counter()
+        for _ in range(n):
+            tpl.render(ctx)
+        return time.perf_counter() - inicio
+
+    def handle(self, *args, **opts):
+        n = max(100, int(opts["n"]))
+        self._consultas(100)  # calentar conexión
+
+        for nombre, fn in (("consulta", self._consultas), ("render", self._renders)):
+            sin = fn(n)
+            with perf.medir():
+                con = fn(n)
+            extra_us = (con - sin) / n * 1e6
+            self.stdout.write(
+                f"{nombre}: {sin / n * 1e6:.1f} µs sin medir · {con / n * 1e6:.1f} µs midiendo · "
+                f"costo {extra_us:+.1f} µs por {nombre}"
+            )
@@ -1,23 +1,247 @@
-from datetime import timedelta
+from __future__ import annotations
 
+import csv
+import gzip
+import json
+import time
+from datetime import datetime, timedelta
+from pathlib import Path
+
+from django.conf import settings
 from django.core.management.base import BaseCommand
+from django.db import connection, transaction
+from django.db.models import Max, Min
 from django.utils import timezone
 
+from auditoria import rollup
 from auditoria.models import AuditEvent
 
+CAMPOS = [f.attname for f in AuditEvent._meta.concrete_fields]
+CHECKPOINT = "purga_checkpoint.json"
+# Páginas que libera cada PRAGMA incremental_vacuum (4 KB c/u: ~8 MB por paso)
+PAGINAS_VACUUM = 2000
+
+
+def _fila_json(fila: dict) -> str:
+    return json.dumps({**fila, "created_at": fila["created_at"].isoformat()}, ensure_ascii=False, default=str)
+
+
+def _fila_csv(fila: dict) -> list:
+    return [
+        fila[c].isoformat() if c == "created_at" else json.dumps(fila[c], ensure_ascii=False) if c == "extra" else fila[c]
+        for c in CAMPOS
+    ]
+
+
+def archivar(filas: list[dict], directorio: Path, formato: str) -> dict[str, int]:
+    """Agrega las filas a `auditoria-AAAA-MM.<formato>.gz` según el mes (hora local) de cada evento.
+
+    gzip en modo "a" suma un miembro nuevo al archivo: se lee de corrido con gzip.open / zcat.
+    """
+
+    por_mes: dict[str, list[dict]] = {}
+    for f in filas:
+        por_mes.setdefault(timezone.localtime(f["created_at"]).strftime("%Y-%m"), []).append(f)
+
+    directorio.mkdir(parents=True, exist_ok=True)
+    for mes, grupo in por_mes.items():
+        path = directorio / f"auditoria-{mes}.{formato}.gz"
+        nuevo = not path.exists()
+        with gzip.open(path, "at", encoding="utf-8", newline="") as fh:
+            if formato == "csv":
+                w = csv.writer(fh)
+                if nuevo:
+                    w.writerow(CAMPOS)
+                w.writerows(_fila_csv(f) for f in grupo)
+            else:
+                fh.writelines(_fila_json(f) + "\n" for f in grupo)
+    return {mes: len(grupo) for mes, grupo in por_mes.items()}
+
 
 class Command(BaseCommand):
-    help = "Borra eventos de auditoría antiguos (por defecto > 180 días)."
+    help = (
+        "Borra eventos de auditoría antiguos (por defecto > 180 días) por rangos de id, con pausas "
+        "entre lotes para no bloquear SQLite. Opcional: archivarlos antes en JSONL/CSV comprimido "
+        "por mes. Si se corta, se vuelve a correr y sigue donde quedó."
+    )
 
     def add_arguments(self, parser):
         parser.add_argument("--days", type=int, default=180, help="Conservar últimos N días")
+        parser.add_argument("--chunk", type=int, default=5000, help="Eventos por lote / transacción (default: 5000).")
+        parser.add_argument("--pausa", type=float, default=0.5, help="Segundos entre lotes (default: 0.5).")
+        parser.add_argument("--dry-run", action="store_true", help="Sólo cuenta lo que borraría.")
+        parser.add_argument("--archivar", action="store_true", help="Guarda los eventos antes de borrarlos.")
+        parser.add_argument("--formato", choices=["jsonl", "csv"], default="jsonl", help="Formato del archivo (default: jsonl).")
+        parser.add_argument(
+            "--archivo-dir",
+            default="",
+            help="Carpeta del archivo (default: AUDITORIA_ARCHIVO_DIR).",
+        )
+        parser.add_argument(
+            "--vacuum-min",
+            type=int,
+            default=50000,
+            help="Con al menos N eventos borrados libera espacio (incremental_vacuum). 0 = nunca.",
+        )
+        parser.add_argument(
+            "--activar-vacuum-incremental",
+            action="store_true",
+            help="Pasa la base a auto_vacuum=INCREMENTAL (hace un VACUUM completo: fuera de horario) y sale.",
+        )
 
     def handle(self, *args, **options):
+        if options["activar_vacuum_incremental"]:
+            self._activar_vacuum_incremental()
+            return
+
         days = int(options.get("days") or 180)
         if days < 7:
             days = 7
-        cutoff = timezone.now() - timedelta(days=days)
-        qs = AuditEvent.objects.filter(created_at__lt=cutoff)
-        n = qs.count()
-        qs.delete()
-        self.stdout.write(self.style.SUCCESS(f"OK: eliminados {n} eventos anteriores a {cutoff:%Y-%m-%d}."))
+        # Corte en hora completa: cada hora del resumen horario queda entera o intacta
+        cutoff = rollup.hora_de(timezone.now() - timedelta(days=days))
+        chunk = max(1, int(options["chunk"]))
+        pausa = max(0.0, float(options["pausa"]))
+
+        if options["dry_run"]:
+            n = AuditEvent.objects.filter(created_at__lt=cutoff).count()
+            self.stdout.write(f"DRY-RUN: se borrarían {n} eventos anteriores a {cutoff:%Y-%m-%d}.")
+            return
+
+        directorio = None
+        checkpoint = None
+        if options["archivar"]:
+            directorio = Path(
+                options["archivo_dir"]
+                or getattr(settings, "AUDITORIA_ARCHIVO_DIR", Path(settings.BASE_DIR) / "var" / "auditoria_archivo")
+            )
+            checkpoint = self._leer_checkpoint(directorio)
+
+        # Lo que se borra tiene que estar en el resumen horario (el informe gerencial lee de ahí)
+        rollup.actualizar()
+
+        borrados = 0
+        archivado_hasta = 0
+        if checkpoint is not None:
+            corte_previo, archivado_hasta = checkpoint
+            if corte_previo != cutoff:
+                # El checkpoint vale para su corte: se termina esa purga antes de empezar la nueva
+                self.stdout.write(f"Terminando la purga interrumpida (anteriores a {corte_previo:%Y-%m-%d %H:%M} UTC)")
+                borrados += self._purgar(corte_previo, chunk, pausa, directorio, options["formato"], archivado_hasta)
+                archivado_hasta = 0
+        borrados += self._purgar(cutoff, chunk, pausa, directorio, options["formato"], archivado_hasta)
+
+        vacuum_min = int(options["vacuum_min"])
+        if vacuum_min and borrados >= vacuum_min:
+            self._vacuum(pausa)
+        self.stdout.write(self.style.SUCCESS(f"OK: eliminados {borrados} eventos anteriores a {cutoff:%Y-%m-%d}."))
+
+    def _purgar(
+        self, cutoff: datetime, chunk: int, pausa: float, directorio: Path | None, formato: str, archivado_hasta: int
+    ) -> int:
+        """Borra (y archiva) los eventos anteriores a `cutoff`. Devuelve los borrados.
+
+        `archivado_hasta`: ids ya archivados por una corrida cortada con el mismo corte.
+        """
+
+        viejos = AuditEvent.objects.filter(created_at__lt=cutoff)
+        rango = viejos.aggregate(desde=Min("id"), hasta=Max("id"))
+        if rango["hasta"] is None:
+            self.stdout.write(f"No hay eventos anteriores a {cutoff:%Y-%m-%d %H:%M} UTC.")
+            self._borrar_checkpoint(directorio)
+            return 0
+
+        desde, tope = rango["desde"], rango["hasta"]
+        self.stdout.write(f"Purgando eventos anteriores a {cutoff:%Y-%m-%d %H:%M} UTC (ids {desde}..{tope})")
+        ultimo = desde - 1
+        borrados = 0
+        archivados = 0
+        inicio = time.monotonic()
+        while ultimo < tope:
+            hasta = (
+                viejos.filter(id__gt=ultimo, id__lte=tope).order_by("id").values_list("id", flat=True)[chunk - 1 : chunk].first()
+                or tope
+            )
+            lote = viejos.filter(id__gt=ultimo, id__lte=hasta)
+
+            # Si un corte dejó el lote archivado pero sin borrar, no se archiva dos veces
+            if directorio is not None and hasta > archivado_hasta:
+                filas = list(lote.filter(id__gt=archivado_hasta).order_by("id").values(*CAMPOS))
+                archivados += sum(archivar(filas, directorio, formato).values())
+                archivado_hasta = hasta
+                (directorio / CHECKPOINT).write_text(
+                    json.dumps({"cutoff": cutoff.isoformat(), "archivado_hasta": hasta}), encoding="utf-8"
+                )
+
+            with transaction.atomic():
+                n = lote.delete()[1].get(AuditEvent._meta.label, 0)
+            borrados += n
+            ultimo = hasta
+
+            pct = 100 * (hasta - desde + 1) / (tope - desde + 1)
+            self.stdout.write(f"  {borrados} borrados (hasta id {hasta}, {pct:.0f}%, {time.monotonic() - inicio:.0f}s)")
+            if ultimo < tope and pausa:
+                time.sleep(pausa)
+
+        if directorio is not None:
+            self.stdout.write(f"Archivados: {archivados} en {directorio}")
+        # Terminada: la próxima purga (otro corte) archiva desde cero
+        self._borrar_checkpoint(directorio)
+        return borrados
+
+    def _leer_checkpoint(self, directorio: Path) -> tuple[datetime, int] | None:
+        """(corte, archivado_hasta) de una purga con --archivar que se cortó; None si no hay."""
+
+        path = directorio / CHECKPOINT
+        if not path.exists():
+            return None
+        try:
+            datos = json.loads(path.read_text(encoding="utf-8"))
+            return datetime.fromisoformat(datos["cutoff"]), int(datos.get("archivado_hasta") or 0)
+        except (KeyError, TypeError, ValueError, OSError):
+            return None
+
+    def _borrar_checkpoint(self, directorio: Path | None) -> None:
+        if directorio is not None:
+            (directorio / CHECKPOINT).unlink(missing_ok=True)
+
+    def _vacuum(self, pausa: float) -> None:
+        """Devuelve al disco las páginas libres de a poco y recorta el WAL (sólo SQLite)."""
+
+        if connection.vendor != "sqlite":
+            return
+        with connection.cursor() as cur:
+            cur.execute("PRAGMA auto_vacuum")
+            incremental = cur.fetchone()[0] == 2
+            if not incremental:
+                self.stdout.write(
+                    "El espacio liberado queda para reusar dentro de la base. Para devolverlo al disco en "
+                    "próximas purgas: purge_auditoria --activar-vacuum-incremental (una vez, fuera de horario)."
+                )
+            if connection.in_atomic_block:
+                # executescript hace COMMIT: no dentro de una transacción ajena
+                return
+            if incremental:
+                cur.execute("PRAGMA freelist_count")
+                libres = cur.fetchone()[0]
+                while libres:
+                    # executescript: el pragma libera una página por paso y execute() da uno solo
+                    cur.cursor.executescript(f"PRAGMA incremental_vacuum({PAGINAS_VACUUM})")
+                    cur.execute("PRAGMA freelist_count")
+                    quedan = cur.fetchone()[0]
+                    self.stdout.write(f"  vacuum: {quedan} páginas libres")
+                    if quedan >= libres:
+                        break
+                    libres = quedan
+                    if pausa:
+                        time.sleep(pausa)
+            cur.execute("PRAGMA wal_checkpoint(TRUNCATE)")
+            cur.fetchall()
+
+    def _activar_vacuum_incremental(self) -> None:
+        if connection.vendor != "sqlite":
+            self.stdout.write("Sólo aplica a SQLite.")
+            return
+        with connection.cursor() as cur:
+            cur.execute("PRAGMA auto_vacuum = INCREMENTAL")
+            cur.execute("VACUUM")
+        self.stdout.write(self.style.SUCCESS("OK: auto_vacuum=INCREMENTAL."))
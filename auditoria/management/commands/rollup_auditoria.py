@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from auditoria import rollup
+from auditoria.models import AuditRollupEstado
+
+
+class Command(BaseCommand):
+    help = (
+        "Pone al día los resúmenes horarios de auditoría (AuditRollupHora / AuditDispositivoHora) "
+        "con los eventos nuevos desde el último checkpoint.\n"
+        "Con --reconstruir recalcula todas las horas que todavía tienen eventos crudos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reconstruir", action="store_true", help="Recalcula desde el primer evento.")
+        parser.add_argument(
+            "--chunk",
+            type=int,
+            default=rollup.CHUNK_EVENTOS,
+            help=f"Eventos por vuelta; el checkpoint avanza tras cada una (default: {rollup.CHUNK_EVENTOS}).",
+        )
+
+    def handle(self, *args, **opts):
+        chunk = max(1, int(opts["chunk"]))
+
+        def progreso(ultimo_id: int, horas: int) -> None:
+            self.stdout.write(f"  hasta id {ultimo_id}: {horas} horas recalculadas")
+
+        if opts["reconstruir"]:
+            horas = rollup.reconstruir(chunk=chunk, progreso=progreso)
+        else:
+            horas = rollup.actualizar(chunk=chunk, progreso=progreso)
+        estado = AuditRollupEstado.objects.get(pk=1)
+        self.stdout.write(self.style.SUCCESS(f"OK: {horas} horas recalculadas (último evento: {estado.ultimo_id})."))
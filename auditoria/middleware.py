@@ -1,39 +1,62 @@
 from __future__ import annotations
 
+import itertools
 import time
 from typing import Callable
 
-from django.urls import Resolver404, resolve
+from django.conf import settings
+from django.utils import timezone
 
-from .models import AuditEvent
+from . import buffer, perf
 
 
 class AuditMiddleware:
-    """Guarda un AuditEvent por request finalizado.
+    """Registra un AuditEvent por request finalizado (grabado en lote, ver auditoria.buffer).
 
     Reglas:
     - Solo usuarios autenticados.
     - Ignora estáticos/media.
-    - Ignora endpoints de polling/partials si se quiere (se deja configurable por prefix).
+    - Endpoints ruidosos (polling de TV): se guarda 1 de cada N según AUDITORIA_MUESTREO;
+      el evento lleva muestreo = N (los resúmenes lo cuentan N veces).
+    - Con AUDITORIA_PERF: consultas, ms en SQL y en templates (auditoria.perf).
     """
 
     def __init__(self, get_response: Callable):
         self.get_response = get_response
+        self.perf = bool(getattr(settings, "AUDITORIA_PERF", False))
+        # (view_name, parámetros GET que deben coincidir, N) -> contador propio por regla
+        self.muestreo = [
+            (view_name, dict(params), max(1, int(n)), itertools.count())
+            for view_name, params, n in getattr(settings, "AUDITORIA_MUESTREO", ())
+        ]
+
+    def _uno_cada(self, request, view_name: str) -> int | None:
+        """None: no se guarda. 1: se guarda siempre. N: se guardó este (1 de cada N)."""
+
+        for nombre, params, n, contador in self.muestreo:
+            if nombre == view_name and all(request.GET.get(k) == v for k, v in params.items()):
+                return n if next(contador) % n == 0 else None
+        return 1
 
     def __call__(self, request):
         started = time.monotonic()
-        response = self.get_response(request)
+        if self.perf:
+            with perf.medir() as medicion:
+                response = self.get_response(request)
+        else:
+            medicion = None
+            response = self.get_response(request)
         duration_ms = int((time.monotonic() - started) * 1000)
 
         try:
-            self._log(request, response, duration_ms)
+            self._log(request, response, duration_ms, medicion)
         except Exception:
             # Auditoría nunca puede romper operación.
             return response
 
         return response
 
-    def _log(self, request, response, duration_ms: int):
+    def _log(self, request, response, duration_ms: int, medicion: perf.Medicion | None = None):
         path = getattr(request, "path", "") or ""
 
         # Ignorar static/media/favicon
@@ -46,14 +69,13 @@ class AuditMiddleware:
         if not getattr(user, "is_authenticated", False):
             return
 
-        # Opcional: ignorar polling TV parcial u otros endpoints ruidosos
-        # (Se deja solo para staff si fuera necesario en el futuro.)
+        # Ya resuelto por el handler (None si la URL no existe)
+        match = getattr(request, "resolver_match", None)
+        view_name = (match.view_name if match else "") or ""
 
-        try:
-            match = resolve(path)
-            view_name = match.view_name or ""
-        except Resolver404:
-            view_name = ""
+        uno_cada = self._uno_cada(request, view_name)
+        if uno_cada is None:
+            return
 
         method = (getattr(request, "method", "") or "").upper()
         status_code = getattr(response, "status_code", None)
@@ -83,17 +105,18 @@ class AuditMiddleware:
         elif method == "DELETE":
             action = "delete"
 
-        # Minimizar ruido: no guardar cada refresh de TV si se decide.
-        # Por ahora se guarda, porque gerencia quiere trazabilidad.
-
         extra = {}
         # Guardar querystring acotado (sin tokens)
         if request.GET:
             # Convertir QueryDict -> dict simple (primer valor)
             extra["query"] = {k: request.GET.get(k) for k in request.GET.keys()}
+        if medicion is not None:
+            extra.update(medicion.extra())
 
-        AuditEvent.objects.create(
-            user=user,
+        buffer.registrar(dict(
+            **(medicion.campos() if medicion is not None else {}),
+            created_at=timezone.now(),
+            user_id=user.pk,
             username=getattr(user, "username", "") or "",
             method=method[:10],
             path=path[:255],
@@ -104,5 +127,6 @@ class AuditMiddleware:
             user_agent=ua,
             app_area=app_area,
             action=action,
+            muestreo=uno_cada,
             extra=extra,
-        )
+        ))
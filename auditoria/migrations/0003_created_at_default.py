@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:07
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0002_rename_auditoria_a_created__2f8a7a_idx_auditoria_a_created_99daf2_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='auditevent',
+            name='created_at',
+            field=models.DateTimeField(db_index=True, default=django.utils.timezone.now),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:11
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0003_created_at_default'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditevent',
+            name='sql_count',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditevent',
+            name='sql_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='auditevent',
+            name='template_ms',
+            field=models.PositiveIntegerField(blank=True, null=True),
+        ),
+    ]
@@ -0,0 +1,92 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:16
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0004_medicion_request'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='AuditDispositivoHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(db_index=True)),
+                ('ip', models.GenericIPAddressField(blank=True, null=True)),
+                ('user_agent', models.CharField(blank=True, max_length=255)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('errores', models.PositiveIntegerField(default=0)),
+                ('primero', models.DateTimeField(blank=True, null=True)),
+                ('ultimo', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Dispositivo por hora',
+                'verbose_name_plural': 'Dispositivos por hora',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditRollupEstado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('ultimo_id', models.BigIntegerField(default=0)),
+                ('actualizado', models.DateTimeField(blank=True, null=True)),
+            ],
+            options={
+                'verbose_name': 'Estado del resumen de auditoría',
+                'verbose_name_plural': 'Estado del resumen de auditoría',
+            },
+        ),
+        migrations.CreateModel(
+            name='AuditRollupHora',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('hora', models.DateTimeField(db_index=True)),
+                ('username', models.CharField(blank=True, max_length=150)),
+                ('app_area', models.CharField(blank=True, max_length=50)),
+                ('action', models.CharField(blank=True, max_length=50)),
+                ('view_name', models.CharField(blank=True, max_length=255)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('errores', models.PositiveIntegerField(default=0)),
+                ('lentos', models.PositiveIntegerField(default=0)),
+                ('duracion_ms', models.PositiveBigIntegerField(default=0)),
+                ('max_ms', models.PositiveIntegerField(blank=True, null=True)),
+                ('primero', models.DateTimeField(blank=True, null=True)),
+                ('ultimo', models.DateTimeField(blank=True, null=True)),
+                ('medidos', models.PositiveIntegerField(default=0)),
+                ('sql_count', models.PositiveBigIntegerField(default=0)),
+                ('sql_ms', models.PositiveBigIntegerField(default=0)),
+                ('template_ms', models.PositiveBigIntegerField(default=0)),
+                ('h00', models.PositiveIntegerField(default=0)),
+                ('h01', models.PositiveIntegerField(default=0)),
+                ('h02', models.PositiveIntegerField(default=0)),
+                ('h03', models.PositiveIntegerField(default=0)),
+                ('h04', models.PositiveIntegerField(default=0)),
+                ('h05', models.PositiveIntegerField(default=0)),
+                ('h06', models.PositiveIntegerField(default=0)),
+                ('h07', models.PositiveIntegerField(default=0)),
+                ('h08', models.PositiveIntegerField(default=0)),
+                ('h09', models.PositiveIntegerField(default=0)),
+                ('h10', models.PositiveIntegerField(default=0)),
+                ('h11', models.PositiveIntegerField(default=0)),
+                ('h12', models.PositiveIntegerField(default=0)),
+                ('h13', models.PositiveIntegerField(default=0)),
+                ('h14', models.PositiveIntegerField(default=0)),
+                ('h15', models.PositiveIntegerField(default=0)),
+                ('h16', models.PositiveIntegerField(default=0)),
+                ('h17', models.PositiveIntegerField(default=0)),
+                ('h18', models.PositiveIntegerField(default=0)),
+                ('h19', models.PositiveIntegerField(default=0)),
+                ('h20', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Resumen horario de auditoría',
+                'verbose_name_plural': 'Resúmenes horarios de auditoría',
+                'indexes': [models.Index(fields=['view_name', 'hora'], name='idx_rollup_vista_hora')],
+                'constraints': [models.UniqueConstraint(fields=('hora', 'username', 'app_area', 'action', 'view_name'), name='uniq_audit_rollup_hora')],
+            },
+        ),
+    ]
@@ -0,0 +1,35 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:38
+
+from django.db import migrations, models
+
+
+def copiar_muestreo(apps, schema_editor):
+    AuditEvent = apps.get_model("auditoria", "AuditEvent")
+    AuditRollupEstado = apps.get_model("auditoria", "AuditRollupEstado")
+    conmuestreo = AuditEvent.objects.filter(extra__has_key="muestreo")
+    # Pocos valores distintos (uno por regla de AUDITORIA_MUESTREO): un UPDATE por valor
+    for n in set(conmuestreo.values_list("extra__muestreo", flat=True)):
+        try:
+            n = int(n)
+        except (TypeError, ValueError):
+            continue
+        if n > 1:
+            conmuestreo.filter(extra__muestreo=n).update(muestreo=min(n, 32767))
+    # Los resúmenes horarios contaban 1 por evento muestreado: el próximo actualizar los rearma
+    AuditRollupEstado.objects.update(ultimo_id=0)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('auditoria', '0005_resumen_horario'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='auditevent',
+            name='muestreo',
+            field=models.PositiveSmallIntegerField(default=1),
+        ),
+        migrations.RunPython(copiar_muestreo, migrations.RunPython.noop),
+    ]
@@ -2,6 +2,7 @@ from __future__ import annotations
 
 from django.conf import settings
 from django.db import models
+from django.utils import timezone
 
 
 class AuditEvent(models.Model):
@@ -13,7 +14,8 @@ class AuditEvent(models.Model):
     - extra: datos opcionales (ej: querystring relevante)
     """
 
-    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+    # Hora del request (no de la escritura, que es diferida: auditoria.buffer)
+    created_at = models.DateTimeField(default=timezone.now, db_index=True)
 
     user = models.ForeignKey(
         settings.AUTH_USER_MODEL,
@@ -38,6 +40,13 @@ class AuditEvent(models.Model):
     app_area = models.CharField(max_length=50, blank=True, db_index=True)  # flota/inventario/usuarios/...
     action = models.CharField(max_length=50, blank=True, db_index=True)  # view/create/update/delete/login/logout
 
+    # Medición por request (AUDITORIA_PERF, ver auditoria.perf); vacías si está apagada
+    sql_count = models.PositiveIntegerField(null=True, blank=True)
+    sql_ms = models.PositiveIntegerField(null=True, blank=True)
+    template_ms = models.PositiveIntegerField(null=True, blank=True)
+    # Endpoints muestreados (AUDITORIA_MUESTREO): este evento representa a N requests
+    muestreo = models.PositiveSmallIntegerField(default=1)
+
     extra = models.JSONField(default=dict, blank=True)
 
     class Meta:
@@ -51,3 +60,108 @@ class AuditEvent(models.Model):
     def __str__(self) -> str:
         u = self.username or (self.user.username if self.user_id else "(sin usuario)")
         return f"[{self.created_at:%Y-%m-%d %H:%M:%S}] {u} {self.method} {self.path}"
+
+
+# Límites superiores (ms, excluyentes) de las cubetas del histograma de duración: escala
+# logarítmica 1 - 1.5 - 2.5 - 4 - 6 por década. h00 = [0, 10), h01 = [10, 15), ... h20 = 60000+.
+# Fijos: los histogramas de distintas horas se suman cubeta a cubeta (auditoria.rollup).
+LIMITES_MS = (10, 15, 25, 40, 60, 100, 150, 250, 400, 600, 1000, 1500, 2500, 4000, 6000, 10000, 15000, 25000, 40000, 60000)
+CUBETAS = tuple(f"h{i:02d}" for i in range(len(LIMITES_MS) + 1))
+
+
+class AuditRollupHora(models.Model):
+    """Resumen de AuditEvent por hora (UTC) y (usuario, área, acción, vista).
+
+    Lo mantiene auditoria.rollup (hilo del buffer / `rollup_auditoria`); los informes, los filtros
+    del listado y los percentiles leen de acá en lugar de recorrer los eventos crudos.
+    """
+
+    hora = models.DateTimeField(db_index=True)
+    username = models.CharField(max_length=150, blank=True)
+    app_area = models.CharField(max_length=50, blank=True)
+    action = models.CharField(max_length=50, blank=True)
+    view_name = models.CharField(max_length=255, blank=True)
+
+    total = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)  # status >= 400
+    lentos = models.PositiveIntegerField(default=0)  # duración >= AUDITORIA_LENTO_MS
+    duracion_ms = models.PositiveBigIntegerField(default=0)  # suma
+    max_ms = models.PositiveIntegerField(null=True, blank=True)
+    primero = models.DateTimeField(null=True, blank=True)
+    ultimo = models.DateTimeField(null=True, blank=True)
+
+    # Sumas de la medición por request (AUDITORIA_PERF); `medidos` = eventos con medición
+    medidos = models.PositiveIntegerField(default=0)
+    sql_count = models.PositiveBigIntegerField(default=0)
+    sql_ms = models.PositiveBigIntegerField(default=0)
+    template_ms = models.PositiveBigIntegerField(default=0)
+
+    # Histograma de duración (ver LIMITES_MS)
+    h00 = models.PositiveIntegerField(default=0)
+    h01 = models.PositiveIntegerField(default=0)
+    h02 = models.PositiveIntegerField(default=0)
+    h03 = models.PositiveIntegerField(default=0)
+    h04 = models.PositiveIntegerField(default=0)
+    h05 = models.PositiveIntegerField(default=0)
+    h06 = models.PositiveIntegerField(default=0)
+    h07 = models.PositiveIntegerField(default=0)
+    h08 = models.PositiveIntegerField(default=0)
+    h09 = models.PositiveIntegerField(default=0)
+    h10 = models.PositiveIntegerField(default=0)
+    h11 = models.PositiveIntegerField(default=0)
+    h12 = models.PositiveIntegerField(default=0)
+    h13 = models.PositiveIntegerField(default=0)
+    h14 = models.PositiveIntegerField(default=0)
+    h15 = models.PositiveIntegerField(default=0)
+    h16 = models.PositiveIntegerField(default=0)
+    h17 = models.PositiveIntegerField(default=0)
+    h18 = models.PositiveIntegerField(default=0)
+    h19 = models.PositiveIntegerField(default=0)
+    h20 = models.PositiveIntegerField(default=0)
+
+    class Meta:
+        verbose_name = "Resumen horario de auditoría"
+        verbose_name_plural = "Resúmenes horarios de auditoría"
+        constraints = [
+            models.UniqueConstraint(
+                fields=["hora", "username", "app_area", "action", "view_name"], name="uniq_audit_rollup_hora"
+            ),
+        ]
+        indexes = [
+            models.Index(fields=["view_name", "hora"], name="idx_rollup_vista_hora"),
+        ]
+
+    def __str__(self) -> str:
+        return f"[{self.hora:%Y-%m-%d %H}h] {self.username or '(anon)'} {self.view_name or self.app_area} x{self.total}"
+
+
+class AuditDispositivoHora(models.Model):
+    """Resumen por hora de (IP, navegador, usuario): la hoja de dispositivos del informe gerencial."""
+
+    hora = models.DateTimeField(db_index=True)
+    ip = models.GenericIPAddressField(null=True, blank=True)
+    user_agent = models.CharField(max_length=255, blank=True)
+    username = models.CharField(max_length=150, blank=True)
+
+    total = models.PositiveIntegerField(default=0)
+    errores = models.PositiveIntegerField(default=0)
+    primero = models.DateTimeField(null=True, blank=True)
+    ultimo = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Dispositivo por hora"
+        verbose_name_plural = "Dispositivos por hora"
+
+    def __str__(self) -> str:
+        return f"[{self.hora:%Y-%m-%d %H}h] {self.ip or '-'} {self.username or '(anon)'} x{self.total}"
+
+
+class AuditRollupEstado(models.Model):
+    """Fila única: hasta qué AuditEvent.id están volcados los resúmenes horarios."""
+
+    ultimo_id = models.BigIntegerField(default=0)
+    actualizado = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        verbose_name = "Estado del resumen de auditoría"
+        verbose_name_plural = "Estado del resumen de auditoría"
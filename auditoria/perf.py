@@ -0,0 +1,116 @@
+from __future__ import annotations
+
+"""Medición por request: consultas SQL, tiempo en la DB y tiempo de render de templates.
+
+Opt-in con `AUDITORIA_PERF` (settings). El middleware abre `medir()` alrededor del request:
+
+- SQL: `connection.execute_wrapper` cuenta consultas, suma su tiempo y se queda con la más lenta
+  (su "huella": el SQL ya viene con placeholders; se colapsan listas IN y espacios).
+- Templates: el backend `TemplatesMedidos` (settings.TEMPLATES) suma el render de cada template
+  de primer nivel; los {% include %} quedan dentro de ese tiempo, no se cuentan dos veces.
+
+Costo: dos perf_counter por consulta y por render (`bench_perf_auditoria` lo mide en este equipo).
+"""
+
+import math
+import re
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass
+
+from django.db import connection
+from django.template.backends.django import DjangoTemplates, Template
+
+_RX_IN = re.compile(r"IN \((?:%s, )*%s\)")
+_RX_ESPACIOS = re.compile(r"\s+")
+
+MAX_HUELLA = 255
+
+
+def huella(sql: str) -> str:
+    """SQL normalizado para agrupar la misma consulta con distintos parámetros."""
+
+    sql = _RX_ESPACIOS.sub(" ", sql or "").strip()
+    return _RX_IN.sub("IN (...)", sql)[:MAX_HUELLA]
+
+
+@dataclass
+class Medicion:
+    consultas: int = 0
+    sql_s: float = 0.0
+    lenta_s: float = 0.0
+    lenta_sql: str = ""
+    templates_s: float = 0.0
+
+    # execute_wrapper(execute, sql, params, many, context)
+    def __call__(self, execute, sql, params, many, context):
+        inicio = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            dt = time.perf_counter() - inicio
+            self.consultas += 1
+            self.sql_s += dt
+            if dt > self.lenta_s:
+                self.lenta_s = dt
+                self.lenta_sql = sql
+
+    def campos(self) -> dict:
+        """Columnas de AuditEvent."""
+
+        return {
+            "sql_count": self.consultas,
+            "sql_ms": int(round(self.sql_s * 1000)),
+            "template_ms": int(round(self.templates_s * 1000)),
+        }
+
+    def extra(self) -> dict:
+        if not self.consultas:
+            return {}
+        return {"sql_lento": {"ms": round(self.lenta_s * 1000, 1), "sql": huella(self.lenta_sql)}}
+
+
+_actual: ContextVar[Medicion | None] = ContextVar("auditoria_perf", default=None)
+
+
+@contextmanager
+def medir():
+    m = Medicion()
+    token = _actual.set(m)
+    try:
+        with connection.execute_wrapper(m):
+            yield m
+    finally:
+        _actual.reset(token)
+
+
+class TemplateMedido(Template):
+    def render(self, context=None, request=None):
+        m = _actual.get()
+        if m is None:
+            return super().render(context, request)
+        inicio = time.perf_counter()
+        try:
+            return super().render(context, request)
+        finally:
+            m.templates_s += time.perf_counter() - inicio
+
+
+class TemplatesMedidos(DjangoTemplates):
+    """DjangoTemplates que suma el tiempo de render a la medición del request en curso."""
+
+    def from_string(self, template_code):
+        return TemplateMedido(self.engine.from_string(template_code), self)
+
+    def get_template(self, template_name):
+        return TemplateMedido(super().get_template(template_name).template, self)
+
+
+def percentil(ordenados: list, p: float):
+    """Percentil por rango más cercano sobre una lista ya ordenada (None si está vacía)."""
+
+    if not ordenados:
+        return None
+    k = min(len(ordenados), max(1, math.ceil(p / 100 * len(ordenados)))) - 1
+    return ordenados[k]
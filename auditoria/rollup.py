@@ -0,0 +1,233 @@
+from __future__ import annotations
+
+"""Resúmenes horarios de AuditEvent (AuditRollupHora, AuditDispositivoHora).
+
+El informe gerencial, los filtros de /auditoria/ y los percentiles de /auditoria/perf/ leen de
+estas tablas: unas pocas filas por hora en lugar de recorrer millones de eventos.
+
+Mantenimiento (`actualizar`):
+- `AuditRollupEstado.ultimo_id` marca hasta qué evento está volcado.
+- Los eventos nuevos (id > ultimo_id) dicen qué horas cambiaron; esas horas se recalculan
+  enteras desde los eventos crudos (DELETE + INSERT en una transacción). Es idempotente: un
+  evento que llega tarde (spool del buffer) o un recálculo repetido no duplican nada.
+- Lo corre el hilo del buffer cada AUDITORIA_ROLLUP_SEGUNDOS y `rollup_auditoria` (cron / a mano).
+
+Los conteos, histogramas y sumas pesan cada evento por `AuditEvent.muestreo`: un evento de un
+endpoint muestreado 1 de cada N cuenta como N requests.
+
+Las horas ya purgadas de AuditEvent no se tocan: el resumen sobrevive a la purga.
+"""
+
+import math
+from datetime import datetime, timedelta
+from datetime import timezone as dt_timezone
+from typing import Sequence
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import F, Max, Min, Q, Sum
+from django.db.models.functions import TruncHour
+from django.utils import timezone
+
+from .models import CUBETAS, LIMITES_MS, AuditDispositivoHora, AuditEvent, AuditRollupEstado, AuditRollupHora
+
+UNA_HORA = timedelta(hours=1)
+# Horas por transacción al recalcular (acota el GROUP BY y el tiempo con la DB tomada)
+VENTANA_HORAS = 24
+# Eventos nuevos por vuelta de `actualizar` (el checkpoint avanza tras cada una)
+CHUNK_EVENTOS = 50000
+
+
+def hora_de(dt: datetime) -> datetime:
+    """Inicio de la hora (UTC) de `dt`: la clave `hora` de los resúmenes."""
+
+    return dt.astimezone(dt_timezone.utc).replace(minute=0, second=0, microsecond=0)
+
+
+def _trunc_hora():
+    return TruncHour("created_at", tzinfo=dt_timezone.utc)
+
+
+def _peso(filtro: Q | None = None) -> Sum:
+    """Requests representados: cada evento vale `muestreo` (1 salvo endpoints muestreados)."""
+
+    return Sum("muestreo", filter=filtro, default=0)
+
+
+def _suma(campo: str) -> Sum:
+    return Sum(F(campo) * F("muestreo"), default=0)
+
+
+def _agregados_rollup() -> dict:
+    lento = getattr(settings, "AUDITORIA_LENTO_MS", 1500)
+    aggs = {
+        "total": _peso(),
+        "errores": _peso(Q(status_code__gte=400)),
+        "lentos": _peso(Q(duration_ms__gte=lento)),
+        "duracion_ms": _suma("duration_ms"),
+        "max_ms": Max("duration_ms"),
+        "primero": Min("created_at"),
+        "ultimo": Max("created_at"),
+        "medidos": _peso(Q(sql_ms__isnull=False)),
+        "sql_count": _suma("sql_count"),
+        "sql_ms": _suma("sql_ms"),
+        "template_ms": _suma("template_ms"),
+    }
+    desde = 0
+    for nombre, hasta in zip(CUBETAS, (*LIMITES_MS, None)):
+        rango = Q(duration_ms__gte=desde) if hasta is None else Q(duration_ms__gte=desde, duration_ms__lt=hasta)
+        aggs[nombre] = _peso(rango)
+        desde = hasta
+    return aggs
+
+
+def _agregados_dispositivo() -> dict:
+    return {
+        "total": _peso(),
+        "errores": _peso(Q(status_code__gte=400)),
+        "primero": Min("created_at"),
+        "ultimo": Max("created_at"),
+    }
+
+
+def _filas(qs, dimensiones: Sequence[str], aggs: dict) -> list[dict]:
+    # Prefijo: varios agregados se llaman igual que columnas de AuditEvent (sql_ms, ...)
+    filas = qs.values("_hora", *dimensiones).annotate(**{f"_{k}": v for k, v in aggs.items()})
+    return [
+        {"hora": f["_hora"], **{d: f[d] for d in dimensiones}, **{k: f[f"_{k}"] for k in aggs}}
+        for f in filas
+    ]
+
+
+def recalcular(desde: datetime, hasta: datetime) -> int:
+    """Rearma los resúmenes de las horas en [desde, hasta) desde AuditEvent. Devuelve filas creadas."""
+
+    eventos = AuditEvent.objects.filter(created_at__gte=desde, created_at__lt=hasta).annotate(_hora=_trunc_hora()).order_by()
+    # Leer y reemplazar en la misma transacción (BEGIN IMMEDIATE en SQLite): dos recálculos
+    # simultáneos (hilo del buffer y comando) no pueden pisarse con agregados viejos
+    with transaction.atomic():
+        rollup = [
+            AuditRollupHora(**f)
+            for f in _filas(eventos, ("username", "app_area", "action", "view_name"), _agregados_rollup())
+        ]
+        dispositivos = [
+            AuditDispositivoHora(**f) for f in _filas(eventos, ("ip", "user_agent", "username"), _agregados_dispositivo())
+        ]
+        AuditRollupHora.objects.filter(hora__gte=desde, hora__lt=hasta).delete()
+        AuditDispositivoHora.objects.filter(hora__gte=desde, hora__lt=hasta).delete()
+        AuditRollupHora.objects.bulk_create(rollup, batch_size=500)
+        AuditDispositivoHora.objects.bulk_create(dispositivos, batch_size=500)
+    return len(rollup)
+
+
+def _ventanas(horas: Sequence[datetime]) -> list[tuple[datetime, datetime]]:
+    """Agrupa horas sueltas en rangos contiguos de hasta VENTANA_HORAS."""
+
+    ventanas: list[tuple[datetime, datetime]] = []
+    for h in sorted(set(horas)):
+        if ventanas:
+            desde, hasta = ventanas[-1]
+            if h == hasta and hasta - desde < VENTANA_HORAS * UNA_HORA:
+                ventanas[-1] = (desde, h + UNA_HORA)
+                continue
+        ventanas.append((h, h + UNA_HORA))
+    return ventanas
+
+
+def actualizar(chunk: int = CHUNK_EVENTOS, progreso=None) -> int:
+    """Vuelca los eventos nuevos desde el último checkpoint. Devuelve la cantidad de horas recalculadas.
+
+    `progreso(ultimo_id, horas)` se llama tras cada vuelta (lo usa el comando).
+    """
+
+    estado, _ = AuditRollupEstado.objects.get_or_create(pk=1)
+    ultimo_id = estado.ultimo_id
+    recalculadas = 0
+    while True:
+        nuevos = AuditEvent.objects.filter(id__gt=ultimo_id).order_by("id")
+        tope = nuevos.values_list("id", flat=True)[chunk - 1 : chunk].first()
+        if tope is None:
+            tope = nuevos.aggregate(m=Max("id"))["m"]
+            if tope is None:
+                break
+        horas = list(
+            nuevos.filter(id__lte=tope).annotate(_hora=_trunc_hora()).order_by().values_list("_hora", flat=True).distinct()
+        )
+        for desde, hasta in _ventanas(horas):
+            recalcular(desde, hasta)
+        recalculadas += len(horas)
+        ultimo_id = tope
+        AuditRollupEstado.objects.filter(pk=1, ultimo_id__lt=tope).update(ultimo_id=tope, actualizado=timezone.now())
+        if progreso:
+            progreso(ultimo_id, recalculadas)
+    return recalculadas
+
+
+def reconstruir(chunk: int = CHUNK_EVENTOS, progreso=None) -> int:
+    """Recalcula todas las horas que todavía tienen eventos crudos (las purgadas quedan como están)."""
+
+    AuditRollupEstado.objects.update_or_create(pk=1, defaults={"ultimo_id": 0})
+    return actualizar(chunk=chunk, progreso=progreso)
+
+
+# ----------------------------------------------------------------------
+# Lectura
+# ----------------------------------------------------------------------
+def sumas_cubetas() -> dict:
+    """Agregados para sumar histogramas en SQL (`n_h00`, `n_h01`, ...): `.annotate(**sumas_cubetas())`."""
+
+    return {f"n_{c}": Sum(c, default=0) for c in CUBETAS}
+
+
+def histograma(fila) -> list[int]:
+    """Cubetas de una fila de resumen, o de un dict con las sumas de `sumas_cubetas()`."""
+
+    if isinstance(fila, dict):
+        return [int(fila.get(f"n_{c}") or 0) for c in CUBETAS]
+    return [int(getattr(fila, c) or 0) for c in CUBETAS]
+
+
+def limite_cubeta(ms: int) -> int:
+    """Primer límite de cubeta >= `ms` (el umbral más cercano que el histograma puede contar exacto)."""
+
+    for limite in (0, *LIMITES_MS):
+        if limite >= ms:
+            return limite
+    return LIMITES_MS[-1]
+
+
+def contar_desde(cubetas: Sequence[int], ms: int) -> int:
+    """Eventos con duración >= limite_cubeta(ms)."""
+
+    return sum(cubetas[(0, *LIMITES_MS).index(limite_cubeta(ms)) :])
+
+
+def percentil_histograma(cubetas: Sequence[int], p: float, maximo: int | None = None) -> int | None:
+    """Percentil `p` estimado desde un histograma (interpolación lineal dentro de la cubeta).
+
+    Mismo criterio de rango que perf.percentil; `maximo` (si se conoce) acota el resultado y
+    cierra la última cubeta, que no tiene límite superior.
+    """
+
+    n = sum(cubetas)
+    if not n:
+        return None
+    k = min(n, max(1, math.ceil(p / 100 * n)))
+    acumulado = 0
+    for i, c in enumerate(cubetas):
+        if c and acumulado + c >= k:
+            desde = LIMITES_MS[i - 1] if i else 0
+            hasta = LIMITES_MS[i] if i < len(LIMITES_MS) else max(maximo or 0, desde)
+            valor = desde + (hasta - desde) * (k - acumulado) / c
+            if maximo is not None:
+                valor = min(valor, maximo)
+            return int(round(valor))
+        acumulado += c
+    return None
+
+
+def opciones_filtro(campo: str, limite: int | None = None) -> list[str]:
+    """Valores distintos de `campo` (app_area / action / username) para los filtros del listado."""
+
+    qs = AuditRollupHora.objects.values_list(campo, flat=True).distinct().order_by(campo)
+    return list(qs[:limite] if limite else qs)
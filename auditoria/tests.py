@@ -0,0 +1,364 @@
+from __future__ import annotations
+
+import gzip
+import json
+import tempfile
+from io import StringIO
+from pathlib import Path
+from unittest import mock
+
+from django.contrib.auth.models import User
+from django.core.management import call_command
+from django.db import OperationalError
+from django.db.models import Sum
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from auditoria import latencias, perf, rollup
+from auditoria.buffer import BufferAuditoria
+from auditoria.models import AuditDispositivoHora, AuditEvent, AuditRollupEstado, AuditRollupHora
+
+
+def _evento(path: str = "/x/", **kw) -> dict:
+    return {"created_at": timezone.now(), "method": "GET", "path": path, "username": "u", **kw}
+
+
+class BufferAuditoriaTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        self.buffer = BufferAuditoria(lote=100, segundos=60, maximo=3, spool_dir=Path(self.tmp.name))
+        # Sin hilo: los tests vacían a mano
+        self.buffer._iniciar = lambda: None
+
+    def test_graba_en_un_solo_insert_con_la_hora_del_request(self):
+        antes = timezone.now() - timezone.timedelta(minutes=5)
+        for i in range(3):
+            self.buffer.agregar(_evento(f"/p/{i}/", created_at=antes))
+        with self.assertNumQueries(1):
+            self.assertEqual(self.buffer.vaciar(), 3)
+        self.assertEqual(AuditEvent.objects.filter(created_at=antes).count(), 3)
+
+    def test_db_ocupada_va_al_spool_y_se_reimporta(self):
+        self.buffer.agregar(_evento("/a/"))
+        with mock.patch.object(AuditEvent.objects, "bulk_create", side_effect=OperationalError("database is locked")):
+            with self.assertLogs("auditoria.buffer", "WARNING"):
+                self.assertEqual(self.buffer.vaciar(), 0)
+        self.assertEqual(len(self.buffer.archivos_spool()), 1)
+        self.assertFalse(AuditEvent.objects.exists())
+
+        # Cola llena: el excedente también va a disco
+        for i in range(4):
+            self.buffer.agregar(_evento(f"/b/{i}/"))
+        self.assertEqual(len(self.buffer.archivos_spool()), 2)
+
+        self.buffer.vaciar()
+        self.assertEqual(self.buffer.archivos_spool(), [])
+        self.assertEqual(
+            sorted(AuditEvent.objects.values_list("path", flat=True)),
+            ["/a/", "/b/0/", "/b/1/", "/b/2/", "/b/3/"],
+        )
+
+    def test_usuario_borrado_no_descarta_el_lote(self):
+        user = User.objects.create_user(username="efimero", password="x")
+        self.buffer.agregar(_evento("/u/", user_id=user.pk + 1000, username="efimero"))
+        self.buffer.agregar(_evento("/ok/", user_id=user.pk))
+        self.buffer.vaciar()
+        self.assertEqual(dict(AuditEvent.objects.values_list("path", "user_id")), {"/u/": None, "/ok/": user.pk})
+
+
+class BufferHiloTests(TransactionTestCase):
+    def test_hilo_graba_por_tamano_y_al_detener(self):
+        with tempfile.TemporaryDirectory() as tmp:
+            buffer = BufferAuditoria(lote=2, segundos=60, maximo=100, spool_dir=Path(tmp))
+            for i in range(3):
+                buffer.agregar(_evento(f"/h/{i}/"))
+            buffer.detener()
+        self.assertEqual(AuditEvent.objects.count(), 3)
+        self.assertFalse(buffer._hilo.is_alive())
+
+
+class AuditMiddlewareTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(self.user)
+
+    def test_registra_vista_resuelta(self):
+        self.client.get(reverse("auditoria:audit_list"), {"app": "flota"})
+        ev = AuditEvent.objects.get()
+        self.assertEqual(ev.view_name, "auditoria:audit_list")
+        self.assertEqual(ev.user_id, self.user.pk)
+        self.assertEqual(ev.extra["query"], {"app": "flota"})
+
+    @override_settings(AUDITORIA_MUESTREO=[("auditoria:audit_list", {"app": "ruido"}, 3)])
+    def test_muestreo_de_endpoints_ruidosos(self):
+        url = reverse("auditoria:audit_list")
+        for _ in range(7):
+            self.client.get(url, {"app": "ruido"})
+        self.client.get(url, {"app": "flota"})
+
+        ruido = AuditEvent.objects.filter(extra__query__app="ruido")
+        self.assertEqual(ruido.count(), 3)
+        self.assertEqual(set(ruido.values_list("muestreo", flat=True)), {3})
+        self.assertEqual(AuditEvent.objects.get(extra__query__app="flota").muestreo, 1)
+
+
+class MedicionRequestTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(self.user)
+
+    def test_huella_y_percentil(self):
+        self.assertEqual(
+            perf.huella('SELECT  "a"\n FROM "t" WHERE "id" IN (%s, %s, %s) AND "x" = %s'),
+            'SELECT "a" FROM "t" WHERE "id" IN (...) AND "x" = %s',
+        )
+        valores = list(range(1, 101))
+        self.assertEqual([perf.percentil(valores, p) for p in (50, 95, 99)], [50, 95, 99])
+        self.assertEqual(perf.percentil([7], 95), 7)
+        self.assertIsNone(perf.percentil([], 95))
+
+    @override_settings(AUDITORIA_PERF=True)
+    def test_registra_sql_y_templates(self):
+        self.client.get(reverse("auditoria:audit_list"))
+        ev = AuditEvent.objects.get(view_name="auditoria:audit_list")
+        self.assertGreater(ev.sql_count, 0)
+        self.assertIsNotNone(ev.sql_ms)
+        self.assertIsNotNone(ev.template_ms)
+        self.assertIn("SELECT", ev.extra["sql_lento"]["sql"])
+
+    def test_apagada_no_mide(self):
+        self.client.get(reverse("auditoria:audit_list"))
+        ev = AuditEvent.objects.get(view_name="auditoria:audit_list")
+        self.assertIsNone(ev.sql_count)
+        self.assertNotIn("sql_lento", ev.extra)
+
+    def test_pagina_perf_ordena_por_p95(self):
+        def cargar(view_name, duraciones, **kw):
+            AuditEvent.objects.bulk_create(
+                [AuditEvent(method="GET", path="/", view_name=view_name, duration_ms=d, **kw) for d in duraciones]
+            )
+
+        cargar("rapida", [10] * 20, sql_ms=5, sql_count=3)
+        # Mediana baja pero cola larga: gana por p95
+        cargar("cola_larga", [5] * 18 + [900, 1000], sql_ms=1, sql_count=2)
+        cargar("pocas", [5000, 5000])
+        AuditEvent.objects.filter(view_name="cola_larga", duration_ms=1000).update(
+            extra={"sql_lento": {"ms": 800.0, "sql": "SELECT ..."}}
+        )
+
+        # La pantalla no actualiza el resumen: lo hace el hilo del buffer / rollup_auditoria
+        resp = self.client.get(reverse("auditoria:audit_perf"), {"days": 7, "min": 5})
+        self.assertEqual(resp.context["vistas"], [])
+        self.assertIsNone(resp.context["rollup_actualizado"])
+
+        rollup.actualizar()
+        resp = self.client.get(reverse("auditoria:audit_perf"), {"days": 7, "min": 5})
+        self.assertIsNotNone(resp.context["rollup_actualizado"])
+        vistas = resp.context["vistas"]
+        self.assertEqual([v["view_name"] for v in vistas], ["cola_larga", "rapida"])
+        # Estimados desde el histograma: p50 dentro de [0, 10), p95 en la cubeta [600, 1000) acotada por el máximo
+        self.assertEqual((vistas[0]["p50"], vistas[0]["p95"], vistas[0]["max"]), (6, 1000, 1000))
+        self.assertEqual(vistas[0]["sql_lento"]["ms"], 800.0)
+        self.assertEqual(vistas[1]["sql_pct"], 50)
+
+
+class RollupHoraTests(TestCase):
+    def setUp(self):
+        self.hora = rollup.hora_de(timezone.now()) - timezone.timedelta(hours=3)
+
+    def _cargar(self, minutos: int, **kw) -> AuditEvent:
+        datos = {"method": "GET", "path": "/", "username": "ana", "app_area": "flota", "action": "view",
+                 "view_name": "flota:list", "status_code": 200, "duration_ms": 100, "ip": "10.0.0.1", **kw}
+        return AuditEvent.objects.create(created_at=self.hora + timezone.timedelta(minutes=minutos), **datos)
+
+    def test_resume_por_hora_y_recalcula_lo_que_llega_tarde(self):
+        self._cargar(5, duration_ms=8)
+        self._cargar(10, status_code=500, duration_ms=2000)
+        self._cargar(65, username="beto")
+        self.assertEqual(rollup.actualizar(), 2)
+
+        fila = AuditRollupHora.objects.get(hora=self.hora, username="ana")
+        self.assertEqual((fila.total, fila.errores, fila.lentos, fila.max_ms), (2, 1, 1, 2000))
+        self.assertEqual((fila.h00, fila.h12), (1, 1))
+        self.assertEqual(AuditDispositivoHora.objects.get(hora=self.hora).total, 2)
+
+        # Sin eventos nuevos no recalcula nada; uno tardío rearma sólo su hora
+        self.assertEqual(rollup.actualizar(), 0)
+        self._cargar(30)
+        self.assertEqual(rollup.actualizar(), 1)
+        self.assertEqual(AuditRollupHora.objects.get(hora=self.hora, username="ana").total, 3)
+        self.assertEqual(AuditRollupHora.objects.filter(hora=self.hora + rollup.UNA_HORA).count(), 1)
+        self.assertEqual(AuditRollupEstado.objects.get().ultimo_id, AuditEvent.objects.latest("id").id)
+
+    def test_evento_muestreado_pesa_n_requests(self):
+        self._cargar(5, duration_ms=8, sql_ms=4, sql_count=2)
+        # Polling muestreado 1 de cada 20: un evento representa 20 requests
+        self._cargar(10, duration_ms=50, sql_ms=10, sql_count=1, muestreo=20)
+        rollup.actualizar()
+
+        fila = AuditRollupHora.objects.get(hora=self.hora)
+        self.assertEqual((fila.total, fila.h00, fila.h04), (21, 1, 20))
+        self.assertEqual((fila.duracion_ms, fila.medidos, fila.sql_ms, fila.sql_count), (1008, 21, 204, 22))
+        self.assertEqual(AuditDispositivoHora.objects.get(hora=self.hora).total, 21)
+        # El percentil sale del histograma pesado: la mediana es la del endpoint muestreado
+        lat = latencias.latencias(None, self.hora)[""]
+        self.assertEqual(lat.n, 21)
+        self.assertGreaterEqual(lat.p50, 40)
+
+    def test_reconstruir_no_borra_horas_purgadas(self):
+        viejo = self._cargar(0)
+        self._cargar(120)
+        rollup.actualizar()
+        viejo.delete()
+
+        rollup.reconstruir(chunk=1)
+        self.assertEqual(
+            sorted(AuditRollupHora.objects.values_list("hora", "total")),
+            [(self.hora, 1), (self.hora + 2 * rollup.UNA_HORA, 1)],
+        )
+
+    def test_percentil_y_umbral_desde_histograma(self):
+        cubetas = [0] * len(rollup.histograma(AuditRollupHora()))
+        self.assertIsNone(rollup.percentil_histograma(cubetas, 50))
+        cubetas[5] = 10  # [60, 100)
+        self.assertEqual(rollup.percentil_histograma(cubetas, 50), 80)
+        self.assertEqual(rollup.percentil_histograma(cubetas, 50, maximo=70), 70)
+        self.assertEqual(rollup.limite_cubeta(1200), 1500)
+        self.assertEqual(rollup.contar_desde(cubetas, 60), 10)
+        self.assertEqual(rollup.contar_desde(cubetas, 61), 0)
+
+    def test_filtros_del_listado_salen_del_resumen(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        self._cargar(0, app_area="inventario", action="create")
+        rollup.actualizar()
+
+        # sesión, usuario, página, 3 filtros sobre el resumen y el INSERT del propio evento
+        with self.assertNumQueries(7):
+            resp = self.client.get(reverse("auditoria:audit_list"))
+        self.assertEqual(resp.context["apps"], ["inventario"])
+        self.assertEqual(resp.context["actions"], ["create"])
+        self.assertEqual(resp.context["usernames"], ["ana"])
+
+
+class LatenciasTests(TestCase):
+    def _cargar(self, dias_atras: int, view_name: str, duraciones: list[int], **kw) -> None:
+        cuando = timezone.now() - timezone.timedelta(days=dias_atras)
+        AuditEvent.objects.bulk_create([
+            AuditEvent(created_at=cuando, method="GET", path="/", view_name=view_name, duration_ms=d, **kw)
+            for d in duraciones
+        ])
+
+    def setUp(self):
+        self._cargar(8, "lenta", [100] * 20, app_area="flota", username="ana")
+        self._cargar(1, "lenta", [100] * 10 + [400] * 10, app_area="flota", username="ana")
+        self._cargar(8, "estable", [50] * 20, app_area="inventario", username="beto")
+        self._cargar(1, "estable", [50] * 20, app_area="inventario", username="beto")
+        rollup.actualizar()
+
+    def test_percentiles_por_dimension_suman_horas(self):
+        desde = timezone.now() - timezone.timedelta(days=10)
+        por_area = latencias.latencias("area", desde)
+        self.assertEqual(set(por_area), {"flota", "inventario"})
+        self.assertEqual(por_area["flota"].n, 40)
+        self.assertEqual(por_area["flota"].max, 400)
+        self.assertEqual(latencias.latencias(None, desde)[""].n, 80)
+
+    def test_compara_con_el_periodo_anterior(self):
+        filas = latencias.comparar("vista", dias=7, min_requests=5)
+        self.assertEqual([f["clave"] for f in filas], ["lenta", "estable"])
+        lenta, estable = filas
+        self.assertTrue(lenta["regresion"])
+        self.assertEqual(lenta["anterior"].p95, 100)
+        self.assertEqual(lenta["actual"].p95, 400)
+        self.assertFalse(estable["regresion"])
+        self.assertEqual(estable["variacion_p95"], 0)
+
+    def test_pantalla_perf_compara_por_usuario(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("auditoria:audit_perf"), {"days": 7, "por": "usuario", "min": 5})
+        self.assertEqual([c["clave"] for c in resp.context["comparacion"]], ["ana", "beto"])
+        self.assertEqual(resp.context["regresiones"], 1)
+        self.assertContains(resp, "p95 anterior")
+
+
+class PurgaAuditoriaTests(TestCase):
+    def setUp(self):
+        self.tmp = tempfile.TemporaryDirectory()
+        self.addCleanup(self.tmp.cleanup)
+        ahora = timezone.now()
+        AuditEvent.objects.bulk_create(
+            [AuditEvent(created_at=ahora - timezone.timedelta(days=d), method="GET", path=f"/{d}/", username="ana") for d in (400, 399, 200, 1)]
+        )
+
+    def _purgar(self, *args) -> str:
+        out = StringIO()
+        call_command("purge_auditoria", "--days=180", "--chunk=1", "--pausa=0", *args, stdout=out)
+        return out.getvalue()
+
+    def _archivados(self, patron: str) -> list[str]:
+        lineas = []
+        for path in sorted(Path(self.tmp.name).glob(patron)):
+            with gzip.open(path, "rt", encoding="utf-8") as fh:
+                lineas += fh.read().splitlines()
+        return lineas
+
+    def test_borra_por_lotes_archiva_por_mes_y_conserva_el_resumen(self):
+        salida = self._purgar("--archivar", f"--archivo-dir={self.tmp.name}", "--vacuum-min=1")
+        self.assertIn("3 borrados", salida)
+        self.assertIn("--activar-vacuum-incremental", salida)
+        self.assertEqual(list(AuditEvent.objects.values_list("path", flat=True)), ["/1/"])
+
+        archivados = [json.loads(l) for l in self._archivados("auditoria-*.jsonl.gz")]
+        self.assertEqual(sorted(a["path"] for a in archivados), ["/200/", "/399/", "/400/"])
+        self.assertGreaterEqual(len(list(Path(self.tmp.name).glob("*.jsonl.gz"))), 2)
+        # El resumen horario se actualizó antes de borrar y sobrevive a la purga
+        self.assertEqual(AuditRollupHora.objects.aggregate(n=Sum("total"))["n"], 4)
+
+    def test_retoma_sin_archivar_dos_veces(self):
+        viejo = AuditEvent.objects.get(path="/400/")
+        # Corte anterior con el mismo corte: ese lote llegó a archivarse pero no a borrarse
+        cutoff = rollup.hora_de(timezone.now() - timezone.timedelta(days=180))
+        checkpoint = Path(self.tmp.name) / "purga_checkpoint.json"
+        checkpoint.write_text(json.dumps({"cutoff": cutoff.isoformat(), "archivado_hasta": viejo.id}))
+        self._purgar("--archivar", "--formato=csv", f"--archivo-dir={self.tmp.name}")
+
+        filas = self._archivados("auditoria-*.csv.gz")
+        self.assertFalse(any("/400/" in f for f in filas))
+        self.assertEqual(sum(1 for f in filas if f.startswith("id,")), len(list(Path(self.tmp.name).glob("*.csv.gz"))))
+        self.assertFalse(AuditEvent.objects.filter(path="/400/").exists())
+        self.assertFalse(checkpoint.exists())
+
+    def test_dos_purgas_seguidas_archivan_todo(self):
+        AuditEvent.objects.all().delete()
+        ahora = timezone.now()
+        # El de 100 días tiene un id menor que el que borra la primera purga
+        AuditEvent.objects.bulk_create(
+            [AuditEvent(created_at=ahora - timezone.timedelta(days=d), method="GET", path=f"/{d}/", username="ana") for d in (100, 400)]
+        )
+        self._purgar("--archivar", f"--archivo-dir={self.tmp.name}")
+        self.assertEqual([json.loads(l)["path"] for l in self._archivados("*.jsonl.gz")], ["/400/"])
+
+        self._purgar("--days=90", "--archivar", f"--archivo-dir={self.tmp.name}")
+        self.assertEqual(sorted(json.loads(l)["path"] for l in self._archivados("*.jsonl.gz")), ["/100/", "/400/"])
+        self.assertFalse(AuditEvent.objects.exists())
+
+    def test_termina_la_purga_cortada_antes_de_otro_corte(self):
+        viejo = AuditEvent.objects.get(path="/400/")
+        # Cortada con --days=365: /400/ archivado sin borrar, /399/ sin archivar
+        corte_previo = rollup.hora_de(timezone.now() - timezone.timedelta(days=365))
+        (Path(self.tmp.name) / "purga_checkpoint.json").write_text(
+            json.dumps({"cutoff": corte_previo.isoformat(), "archivado_hasta": viejo.id})
+        )
+        salida = self._purgar("--archivar", f"--archivo-dir={self.tmp.name}")
+
+        self.assertIn("Terminando la purga interrumpida", salida)
+        self.assertEqual(sorted(json.loads(l)["path"] for l in self._archivados("*.jsonl.gz")), ["/200/", "/399/"])
+        self.assertEqual(list(AuditEvent.objects.values_list("path", flat=True)), ["/1/"])
+
+    def test_dry_run_no_borra(self):
+        self.assertIn("se borrarían 3", self._purgar("--dry-run"))
+        self.assertEqual(AuditEvent.objects.count(), 4)
@@ -6,4 +6,5 @@ app_name = "auditoria"
 urlpatterns = [
     path("", views.audit_list, name="audit_list"),
     path("export.csv", views.audit_export_csv, name="audit_export_csv"),
+    path("perf/", views.audit_perf, name="audit_perf"),
 ]
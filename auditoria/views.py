@@ -4,14 +4,17 @@ import csv
 from datetime import timedelta
 from typing import Any, Dict, Optional
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required, permission_required
-from django.core.paginator import Paginator
-from django.db.models import Q
+from django.db.models import Max, Q, Sum
 from django.http import HttpRequest, HttpResponse
 from django.shortcuts import render
 from django.utils import timezone
 
-from .models import AuditEvent
+from core.paginacion import paginar
+
+from . import latencias, rollup
+from .models import AuditEvent, AuditRollupEstado, AuditRollupHora
 
 
 def _parse_date(s: str) -> Optional[timezone.datetime]:
@@ -93,9 +96,8 @@ def _qs_filtered(request: HttpRequest):
 def audit_list(request: HttpRequest) -> HttpResponse:
     qs = _qs_filtered(request)
 
-    paginator = Paginator(qs, 50)
-    page_number = request.GET.get("page") or 1
-    page_obj = paginator.get_page(page_number)
+    # Cursor sobre (created_at, id): sin OFFSET ni COUNT(*) de toda la tabla
+    page_obj = paginar(qs, ("-created_at", "-id"), request.GET, 50)
 
     ctx: Dict[str, Any] = {
         "page_obj": page_obj,
@@ -107,9 +109,10 @@ def audit_list(request: HttpRequest) -> HttpResponse:
         "from": request.GET.get("from", ""),
         "to": request.GET.get("to", ""),
         "days": request.GET.get("days", "7") or "7",
-        "apps": list(AuditEvent.objects.values_list("app_area", flat=True).distinct().order_by("app_area")),
-        "actions": list(AuditEvent.objects.values_list("action", flat=True).distinct().order_by("action")),
-        "usernames": list(AuditEvent.objects.values_list("username", flat=True).distinct().order_by("username")[:200]),
+        # Desde el resumen horario: no hace DISTINCT sobre todos los eventos en cada carga
+        "apps": rollup.opciones_filtro("app_area"),
+        "actions": rollup.opciones_filtro("action"),
+        "usernames": rollup.opciones_filtro("username", 200),
     }
     return render(request, "auditoria/audit_list.html", ctx)
 
@@ -155,3 +158,94 @@ def audit_export_csv(request: HttpRequest) -> HttpResponse:
             ]
         )
     return resp
+
+
+@login_required
+@permission_required("auditoria.view_auditevent", raise_exception=True)
+def audit_perf(request: HttpRequest) -> HttpResponse:
+    """Vistas más lentas por p95 de duración, con el reparto SQL / templates (AUDITORIA_PERF),
+    y la comparación de percentiles contra el período anterior."""
+
+    try:
+        days = max(1, min(90, int(request.GET.get("days") or 7)))
+    except ValueError:
+        days = 7
+    try:
+        min_req = max(1, int(request.GET.get("min") or 5))
+    except ValueError:
+        min_req = 5
+    since = rollup.hora_de(timezone.now() - timedelta(days=days))
+
+    # Histogramas por hora sumados en SQL (auditoria.rollup): no recorre los eventos crudos.
+    # Los pone al día el hilo del buffer / rollup_auditoria, no esta pantalla.
+    filas = (
+        AuditRollupHora.objects.filter(hora__gte=since)
+        .exclude(view_name="")
+        .values("view_name")
+        .annotate(
+            maximo=Max("max_ms"),
+            n_duracion=Sum("duracion_ms"),
+            n_medidos=Sum("medidos"),
+            n_sql_ms=Sum("sql_ms"),
+            n_sql_count=Sum("sql_count"),
+            n_template_ms=Sum("template_ms"),
+            **rollup.sumas_cubetas(),
+        )
+    )
+
+    vistas = []
+    for f in filas:
+        cubetas = rollup.histograma(f)
+        n = sum(cubetas)
+        if n < min_req:
+            continue
+        medidos = f["n_medidos"]
+        sql_ms = f["n_sql_ms"] / medidos if medidos else None
+        dur_prom = f["n_duracion"] / n
+        lat = latencias.Latencia.de_histograma(cubetas, f["maximo"])
+        vistas.append({
+            "view_name": f["view_name"],
+            "n": n,
+            "p50": lat.p50,
+            "p95": lat.p95,
+            "p99": lat.p99,
+            "max": lat.max,
+            "sql_ms": sql_ms,
+            "sql_count": f["n_sql_count"] / medidos if medidos else None,
+            "template_ms": f["n_template_ms"] / medidos if medidos else None,
+            "sql_pct": (100 * sql_ms / dur_prom) if sql_ms is not None and dur_prom else None,
+        })
+    vistas.sort(key=lambda v: (-v["p95"], v["view_name"]))
+    vistas = vistas[:30]
+
+    # Consulta más lenta del peor request de cada vista (una lectura)
+    peores: Dict[str, AuditEvent] = {}
+    if vistas:
+        cond = Q()
+        for v in vistas:
+            cond |= Q(view_name=v["view_name"], duration_ms=v["max"])
+        for ev in AuditEvent.objects.filter(cond, created_at__gte=since).only("view_name", "extra").order_by("-id"):
+            peores.setdefault(ev.view_name, ev)
+    for v in vistas:
+        ev = peores.get(v["view_name"])
+        v["sql_lento"] = (ev.extra or {}).get("sql_lento") if ev else None
+
+    # Mismo largo de período, inmediatamente antes: regresiones de p95 por vista / área / usuario
+    por = request.GET.get("por") or "vista"
+    if por not in latencias.DIMENSIONES:
+        por = "vista"
+    comparacion = latencias.comparar(por, dias=days, min_requests=min_req)
+
+    ctx: Dict[str, Any] = {
+        "vistas": vistas,
+        "comparacion": comparacion[:50],
+        "por": por,
+        "dimensiones": list(latencias.DIMENSIONES),
+        "regresiones": sum(1 for c in comparacion if c["regresion"]),
+        "regresion_pct": latencias.REGRESION_PCT,
+        "days": days,
+        "min_req": min_req,
+        "perf_activo": bool(getattr(settings, "AUDITORIA_PERF", False)),
+        "rollup_actualizado": AuditRollupEstado.objects.filter(pk=1).values_list("actualizado", flat=True).first(),
+    }
+    return render(request, "auditoria/audit_perf.html", ctx)
@@ -61,7 +61,9 @@ ROOT_URLCONF = "config.urls"
 
 TEMPLATES = [
     {
-        "BACKEND": "django.template.backends.django.DjangoTemplates",
+        # DjangoTemplates + tiempo de render para la medición por request (auditoria.perf)
+        "BACKEND": "auditoria.perf.TemplatesMedidos",
+        "NAME": "django",
         "DIRS": [BASE_DIR / "templates"],
         "APP_DIRS": True,
         "OPTIONS": {
@@ -84,9 +86,56 @@ DATABASES = {
     "default": {
         "ENGINE": "django.db.backends.sqlite3",
         "NAME": BASE_DIR / "db.sqlite3",
+        "OPTIONS": {
+            # Varios hilos de waitress escriben a la vez: esperar el lock en lugar de fallar
+            "timeout": int(os.getenv("SQLITE_TIMEOUT", "20")),
+            # BEGIN IMMEDIATE: toma el lock de escritura al abrir el atomic (evita deadlocks de upgrade)
+            "transaction_mode": "IMMEDIATE",
+        },
     }
 }
 
+# Servicio de stock (inventario.services.stock): reintentos ante DB ocupada / conflicto de versión
+INVENTARIO_STOCK_REINTENTOS = int(os.getenv("INVENTARIO_STOCK_REINTENTOS", "5"))
+INVENTARIO_STOCK_REINTENTO_ESPERA = float(os.getenv("INVENTARIO_STOCK_REINTENTO_ESPERA", "0.05"))
+
+# Dashboard: TTL del contexto cacheado (se invalida antes por generación, ver core.generaciones)
+DASHBOARD_CACHE_SEGUNDOS = int(os.getenv("DASHBOARD_CACHE_SEGUNDOS", "300"))
+
+# Pantallas TV (flota.tv_views): cuánto espera cada conexión un cambio antes de cerrarse,
+# cada cuánto mira las generaciones y en cuánto reconecta el navegador
+TV_STREAM_ESPERA = float(os.getenv("TV_STREAM_ESPERA", "15"))
+TV_STREAM_INTERVALO = float(os.getenv("TV_STREAM_INTERVALO", "1"))
+TV_STREAM_RETRY = float(os.getenv("TV_STREAM_RETRY", "1"))
+
+# Conflictos de diagrama (flota.conflictos): duración asumida de una salida sin llegada programada
+SALIDAS_DURACION_SUPUESTA_MIN = int(os.getenv("SALIDAS_DURACION_SUPUESTA_MIN", "60"))
+
+# Auditoría (auditoria.buffer): el middleware encola y un hilo graba en lote cada N eventos / T segundos.
+# En tests se graba en el momento: lo apaga el runner (core.test_runner).
+AUDITORIA_BUFFER = os.getenv("AUDITORIA_BUFFER", "1") == "1"
+TEST_RUNNER = "core.test_runner.TestRunner"
+AUDITORIA_BUFFER_LOTE = int(os.getenv("AUDITORIA_BUFFER_LOTE", "200"))
+AUDITORIA_BUFFER_SEGUNDOS = float(os.getenv("AUDITORIA_BUFFER_SEGUNDOS", "2"))
+AUDITORIA_BUFFER_MAX = int(os.getenv("AUDITORIA_BUFFER_MAX", "10000"))
+# Si la DB está ocupada los eventos esperan acá (JSONL) y se reimportan solos
+AUDITORIA_SPOOL_DIR = Path(os.getenv("AUDITORIA_SPOOL_DIR", str(BASE_DIR / "var" / "auditoria_spool")))
+# Endpoints ruidosos: (view_name, parámetros GET que deben coincidir, se guarda 1 de cada N)
+AUDITORIA_MUESTREO = [
+    ("flota:tv_taller", {"partial": "1"}, 20),
+    ("flota:tv_stream", {}, 20),
+]
+
+# Medición por request (auditoria.perf): consultas, ms en SQL y en templates. Ver /auditoria/perf/
+AUDITORIA_PERF = os.getenv("AUDITORIA_PERF", "0") == "1"
+
+# Resúmenes horarios (auditoria.rollup): el hilo del buffer los pone al día cada N segundos (0 = sólo
+# con `rollup_auditoria`). "Lento" es el mismo umbral del informe gerencial.
+AUDITORIA_ROLLUP_SEGUNDOS = float(os.getenv("AUDITORIA_ROLLUP_SEGUNDOS", "300"))
+AUDITORIA_LENTO_MS = int(os.getenv("ERP_SLOW_MS", "1500"))
+# Archivo de eventos purgados (`purge_auditoria --archivar`): un .jsonl.gz / .csv.gz por mes
+AUDITORIA_ARCHIVO_DIR = Path(os.getenv("AUDITORIA_ARCHIVO_DIR", str(BASE_DIR / "var" / "auditoria_archivo")))
+
 AUTH_PASSWORD_VALIDATORS = [
     {"NAME": "django.contrib.auth.password_validation.UserAttributeSimilarityValidator"},
     {"NAME": "django.contrib.auth.password_validation.MinimumLengthValidator"},
@@ -4,3 +4,26 @@ from django.apps import AppConfig
 class CoreConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'core'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from core import generaciones
+        from flota.models import Colectivo
+        from flota.odometro_models import OdometroLectura
+        from inventario.models import MovimientoStock, Producto, StockActual, Ubicacion
+        from inventario.signals import stock_cambiado
+
+        # Los handlers se guardan en la instancia: connect() usa weakrefs por defecto
+        self._bump_flota = generaciones.receptor(generaciones.FLOTA)
+        self._bump_inventario = generaciones.receptor(generaciones.INVENTARIO)
+
+        for model in (Colectivo, OdometroLectura):
+            post_save.connect(self._bump_flota, sender=model, dispatch_uid=f"gen_flota_save_{model.__name__}")
+            post_delete.connect(self._bump_flota, sender=model, dispatch_uid=f"gen_flota_delete_{model.__name__}")
+
+        for model in (Producto, StockActual, MovimientoStock, Ubicacion):
+            post_save.connect(self._bump_inventario, sender=model, dispatch_uid=f"gen_inv_save_{model.__name__}")
+            post_delete.connect(self._bump_inventario, sender=model, dispatch_uid=f"gen_inv_delete_{model.__name__}")
+
+        stock_cambiado.connect(self._bump_inventario, dispatch_uid="gen_inv_stock_cambiado")
@@ -0,0 +1,62 @@
+"""Contadores de "generación" por área para invalidar caches sin borrar claves.
+
+Cada cambio relevante (post_save/post_delete o el servicio de stock) incrementa el
+contador del área. Las vistas cacheadas arman la clave con los contadores vigentes:
+si algo cambió, la clave es otra y el valor viejo simplemente expira.
+"""
+
+from __future__ import annotations
+
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+
+FLOTA = "flota"
+INVENTARIO = "inventario"
+SALIDAS = "salidas"
+PARTES = "partes"
+VOCABULARIO = "vocabulario"
+
+
+def _key(area: str) -> str:
+    return f"gen:{area}"
+
+
+def _incr(area: str) -> None:
+    try:
+        cache.incr(_key(area))
+    except ValueError:
+        # La clave expiró / fue desalojada: arrancar desde un valor que no repita uno viejo
+        cache.set(_key(area), time.time_ns(), timeout=None)
+
+
+def generacion(area: str) -> int:
+    v = cache.get(_key(area))
+    if v is None:
+        cache.add(_key(area), time.time_ns(), timeout=None)
+        v = cache.get(_key(area))
+    return v
+
+
+def bump(area: str) -> None:
+    """Incrementa ya (misma request) y de nuevo al confirmar la transacción.
+
+    El segundo incremento evita que una lectura concurrente cachee datos previos al commit.
+    """
+
+    _incr(area)
+    transaction.on_commit(lambda: _incr(area))
+
+
+def receptor(area: str):
+    """Handler de señal que incrementa `area`. Conectarlo con una referencia fuerte (weak=False o guardarlo)."""
+
+    def handler(sender, **kwargs):
+        bump(area)
+
+    return handler
+
+
+def clave(prefijo: str, *areas: str) -> str:
+    return ":".join([prefijo, *(f"{a}{generacion(a)}" for a in areas)])
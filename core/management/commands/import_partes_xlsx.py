@@ -11,7 +11,7 @@ from django.contrib.auth import get_user_model
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from flota.models import Colectivo, ParteDiario
+from flota.models import Colectivo, OdometroLectura, ParteDiario
 
 
 User = get_user_model()
@@ -158,7 +158,7 @@ class Command(BaseCommand):
                     continue
 
                 if not dry:
-                    ParteDiario.objects.create(
+                    parte = ParteDiario(
                         colectivo=colectivo,
                         fecha_evento=dt_local,
                         reportado_por=reporter,
@@ -174,6 +174,9 @@ class Command(BaseCommand):
                         trabajos_carroceria_varios=car,
                         combustible_ruta_detalle=comb,
                     )
+                    # La lectura de odómetro queda marcada como importada (flota.odometro)
+                    parte._origen_odometro = OdometroLectura.Origen.IMPORTACION
+                    parte.save()
                 created += 1
 
             except Exception:
@@ -9,7 +9,7 @@ import openpyxl
 from django.core.management.base import BaseCommand, CommandError
 from django.utils import timezone
 
-from flota.models import Colectivo, ParteDiario
+from flota.models import Colectivo, OdometroLectura, ParteDiario
 
 
 def _parse_interno(value: str) -> Optional[int]:
@@ -138,7 +138,7 @@ class Command(BaseCommand):
                     observaciones += "\n" + "\n".join(obs_parts)
 
                 if not dry:
-                    ParteDiario.objects.create(
+                    parte = ParteDiario(
                         colectivo=colectivo,
                         fecha_evento=dt_local,
                         reportado_por=None,
@@ -150,6 +150,9 @@ class Command(BaseCommand):
                         observaciones=observaciones,
                         chofer_label=chofer,
                     )
+                    # La lectura de odómetro queda marcada como importada (flota.odometro)
+                    parte._origen_odometro = OdometroLectura.Origen.IMPORTACION
+                    parte.save()
                 created += 1
 
             except Exception:
@@ -9,11 +9,14 @@ from email.message import EmailMessage
 from pathlib import Path
 from typing import Iterable
 
+from django.conf import settings
 from django.core.management.base import BaseCommand, CommandError
-from django.db.models import Count, Max, Min, Q
+from django.db.models import Count, Max, Min, Sum
 from django.utils import timezone
 
-from auditoria.models import AuditEvent
+from auditoria import latencias, rollup
+from auditoria.models import AuditDispositivoHora, AuditRollupHora
+from flota import vencimientos
 
 
 @dataclass(frozen=True)
@@ -163,53 +166,95 @@ class Command(BaseCommand):
             default=_env_int("ERP_SLOW_MS", 1500),
             help="Umbral de request lento (ms). Default 1500 o ERP_SLOW_MS.",
         )
+        parser.add_argument(
+            "--vencimientos-dias",
+            type=int,
+            default=7,
+            help="Incluye los vencimientos de flota de los próximos N días (default 7).",
+        )
 
     def handle(self, *args, **opts):
         period: str = opts["period"]
         outdir = _safe_outdir(opts["outdir"])
         slow_ms: int = int(opts["slow_ms"])
+        vto_dias: int = int(opts["vencimientos_dias"])
 
         start, end = _period_range(period)
 
-        qs = AuditEvent.objects.filter(created_at__gte=start, created_at__lte=end)
-
-        total = qs.count()
-        err = qs.filter(status_code__gte=400).count()
-        slow = qs.filter(duration_ms__gte=slow_ms).count()
+        # Desde los resúmenes horarios (auditoria.rollup): granularidad de hora completa
+        rollup.actualizar()
+        filas = AuditRollupHora.objects.filter(hora__gte=rollup.hora_de(start), hora__lte=end)
+
+        # "lentos" viene precalculado con AUDITORIA_LENTO_MS; otro umbral sale del histograma
+        # (redondeado al límite de cubeta siguiente)
+        exacto = slow_ms == getattr(settings, "AUDITORIA_LENTO_MS", 1500)
+        if not exacto:
+            slow_ms = rollup.limite_cubeta(slow_ms)
+        cubetas = {} if exacto else rollup.sumas_cubetas()
+
+        def lentos(r: dict) -> int:
+            return r["n_lentos"] if exacto else rollup.contar_desde(rollup.histograma(r), slow_ms)
+
+        tot = filas.aggregate(
+            eventos=Sum("total", default=0),
+            n_errores=Sum("errores", default=0),
+            n_lentos=Sum("lentos", default=0),
+            **cubetas,
+        )
+        total = tot["eventos"]
+        err = tot["n_errores"]
+        slow = lentos(tot)
 
         # resumen por empleado (username)
-        by_user = (
-            qs.values("username")
+        by_user = list(
+            filas.values("username")
             .annotate(
-                total=Count("id"),
-                errores=Count("id", filter=Q(status_code__gte=400)),
-                lentos=Count("id", filter=Q(duration_ms__gte=slow_ms)),
-                primero=Min("created_at"),
-                ultimo=Max("created_at"),
+                eventos=Sum("total"),
+                n_errores=Sum("errores"),
+                n_lentos=Sum("lentos"),
+                primera=Min("primero"),
+                ultima=Max("ultimo"),
+                **cubetas,
             )
-            .order_by("-total", "username")
+            .order_by("-eventos", "username")
         )
 
         # top áreas
-        by_area = (
-            qs.values("app_area")
-            .annotate(total=Count("id"))
-            .order_by("-total", "app_area")
+        by_area = list(
+            filas.values("app_area")
+            .annotate(eventos=Sum("total"))
+            .order_by("-eventos", "app_area")
         )
 
         # dispositivos (ip + user_agent)
         by_device = (
-            qs.values("ip", "user_agent")
+            AuditDispositivoHora.objects.filter(hora__gte=rollup.hora_de(start), hora__lte=end)
+            .values("ip", "user_agent")
             .annotate(
-                total=Count("id"),
-                primero=Min("created_at"),
-                ultimo=Max("created_at"),
+                eventos=Sum("total"),
+                primera=Min("primero"),
+                ultima=Max("ultimo"),
                 usuarios=Count("username", distinct=True),
-                errores=Count("id", filter=Q(status_code__gte=400)),
+                n_errores=Sum("errores"),
             )
-            .order_by("-total")
+            .order_by("-eventos")
         )
 
+        # Tiempos de respuesta: percentiles desde los histogramas del resumen, contra el período anterior
+        dias = {"daily": 1, "weekly": 7, "monthly": 30}[period]
+        lat_total = latencias.latencias(None, start).get("")
+        comparaciones = {dim: latencias.comparar(dim, dias=dias, min_requests=1) for dim in latencias.DIMENSIONES}
+
+        def comparable(c: dict) -> bool:
+            minimo = latencias.MIN_REQUESTS
+            return c["actual"].n >= minimo and c["anterior"] is not None and c["anterior"].n >= minimo
+
+        regresiones = [c for c in comparaciones["vista"] if c["regresion"] and comparable(c)]
+        vistas_lentas = sorted(
+            (c for c in comparaciones["vista"] if c["actual"].n >= latencias.MIN_REQUESTS),
+            key=lambda c: -(c["actual"].p95 or 0),
+        )[:3]
+
         # Archivos
         now_local = timezone.localtime(timezone.now())
         stamp = now_local.strftime("%Y%m%d_%H%M")
@@ -219,13 +264,19 @@ class Command(BaseCommand):
         usuarios_csv = outdir / f"{base}_empleados.csv"
         device_csv = outdir / f"{base}_dispositivos.csv"
         area_csv = outdir / f"{base}_areas.csv"
+        vto_csv = outdir / f"{base}_vencimientos.csv"
+        lat_csv = outdir / f"{base}_latencias.csv"
+
+        # Vencimientos de flota (índice flota.Vencimiento)
+        vtos = [vencimientos.describir(v) for v in vencimientos.proximos(dias=vto_dias)]
+        vto_vencidos = sum(1 for v in vtos if v["badge"] == "critical")
 
         # Texto simple para gerente (sin tecnicismos)
         start_str = timezone.localtime(start).strftime("%d/%m/%Y %H:%M")
         end_str = timezone.localtime(end).strftime("%d/%m/%Y %H:%M")
 
-        top_areas_txt = ", ".join([f"{r['app_area'] or '—'} ({r['total']})" for r in list(by_area)[:5]]) or "—"
-        top_users_txt = ", ".join([f"{(r['username'] or 'anon')} ({r['total']})" for r in list(by_user)[:5]]) or "—"
+        top_areas_txt = ", ".join([f"{r['app_area'] or '—'} ({r['eventos']})" for r in by_area[:5]]) or "—"
+        top_users_txt = ", ".join([f"{(r['username'] or 'anon')} ({r['eventos']})" for r in by_user[:5]]) or "—"
 
         lines = [
             "LA TERMAL ERP — INFORME GERENCIAL (AUDITORÍA)",
@@ -238,10 +289,27 @@ class Command(BaseCommand):
             f"Top módulos usados: {top_areas_txt}",
             f"Top usuarios con actividad: {top_users_txt}",
             "",
+            "Tiempo de respuesta (p50 / p95 / p99): "
+            + (f"{lat_total.p50} / {lat_total.p95} / {lat_total.p99} ms" if lat_total else "—"),
+            "Pantallas más lentas (p95): "
+            + (", ".join(f"{c['clave']} ({c['actual'].p95} ms)" for c in vistas_lentas) or "—"),
+            f"Pantallas más lentas que el período anterior (p95 +{latencias.REGRESION_PCT}% o más): {len(regresiones)}"
+            + (
+                " — " + ", ".join(
+                    f"{c['clave']} ({c['anterior'].p95} -> {c['actual'].p95} ms)" for c in regresiones[:5]
+                )
+                if regresiones
+                else ""
+            ),
+            "",
+            f"Vencimientos de flota (próximos {vto_dias} días): {len(vtos)} (vencidos u hoy: {vto_vencidos})",
+            "",
             "Archivos adjuntos:",
             f"- {usuarios_csv.name} (resumen por empleado)",
             f"- {device_csv.name} (dispositivos conectados: IP + navegador)",
             f"- {area_csv.name} (uso por módulo/área)",
+            f"- {vto_csv.name} (vencimientos de flota: VTV, matafuegos, aceite y filtros)",
+            f"- {lat_csv.name} (tiempos de respuesta p50/p95/p99 por pantalla, módulo y usuario)",
             "",
             "Nota:",
             "Si hay errores repetidos (status 500/403/404) conviene revisarlos con el administrador.",
@@ -253,11 +321,11 @@ class Command(BaseCommand):
         for r in by_user:
             emp_rows.append([
                 (r["username"] or "anon"),
-                str(r["total"]),
-                str(r["errores"]),
-                str(r["lentos"]),
-                timezone.localtime(r["primero"]).strftime("%d/%m/%Y %H:%M") if r["primero"] else "",
-                timezone.localtime(r["ultimo"]).strftime("%d/%m/%Y %H:%M") if r["ultimo"] else "",
+                str(r["eventos"]),
+                str(r["n_errores"]),
+                str(lentos(r)),
+                timezone.localtime(r["primera"]).strftime("%d/%m/%Y %H:%M") if r["primera"] else "",
+                timezone.localtime(r["ultima"]).strftime("%d/%m/%Y %H:%M") if r["ultima"] else "",
             ])
         _utf8sig_write_csv(
             usuarios_csv,
@@ -271,11 +339,11 @@ class Command(BaseCommand):
             dev_rows.append([
                 (r["ip"] or ""),
                 (r["user_agent"] or ""),
-                str(r["total"]),
+                str(r["eventos"]),
                 str(r["usuarios"]),
-                str(r["errores"]),
-                timezone.localtime(r["primero"]).strftime("%d/%m/%Y %H:%M") if r["primero"] else "",
-                timezone.localtime(r["ultimo"]).strftime("%d/%m/%Y %H:%M") if r["ultimo"] else "",
+                str(r["n_errores"]),
+                timezone.localtime(r["primera"]).strftime("%d/%m/%Y %H:%M") if r["primera"] else "",
+                timezone.localtime(r["ultima"]).strftime("%d/%m/%Y %H:%M") if r["ultima"] else "",
             ])
         _utf8sig_write_csv(
             device_csv,
@@ -288,7 +356,7 @@ class Command(BaseCommand):
         for r in by_area:
             area_rows.append([
                 (r["app_area"] or "—"),
-                str(r["total"]),
+                str(r["eventos"]),
             ])
         _utf8sig_write_csv(
             area_csv,
@@ -296,11 +364,53 @@ class Command(BaseCommand):
             area_rows,
         )
 
+        # CSV vencimientos
+        _utf8sig_write_csv(
+            vto_csv,
+            ["interno", "dominio", "tipo", "vence", "dias", "km", "km_restantes", "estado"],
+            [
+                [
+                    str(v["interno"]),
+                    v["dominio"],
+                    v["tipo"],
+                    v["fecha"].strftime("%d/%m/%Y") if v["fecha"] else "",
+                    "" if v["dias"] is None else str(v["dias"]),
+                    "" if v["km"] is None else str(v["km"]),
+                    "" if v["km_restantes"] is None else str(v["km_restantes"]),
+                    v["estado"],
+                ]
+                for v in vtos
+            ],
+        )
+
+        # CSV latencias
+        _utf8sig_write_csv(
+            lat_csv,
+            ["por", "clave", "requests", "p50_ms", "p95_ms", "p99_ms", "max_ms", "p95_anterior_ms", "variacion_p95_pct"],
+            [
+                [
+                    dim,
+                    c["clave"] or "—",
+                    str(c["actual"].n),
+                    str(c["actual"].p50),
+                    str(c["actual"].p95),
+                    str(c["actual"].p99),
+                    "" if c["actual"].max is None else str(c["actual"].max),
+                    str(c["anterior"].p95) if c["anterior"] else "",
+                    "" if c["variacion_p95"] is None else f"{c['variacion_p95']:.0f}",
+                ]
+                for dim, filas_dim in comparaciones.items()
+                for c in filas_dim
+            ],
+        )
+
         self.stdout.write(self.style.SUCCESS(f"OK: informe generado en {outdir}"))
         self.stdout.write(f"- {txt_path.name}")
         self.stdout.write(f"- {usuarios_csv.name}")
         self.stdout.write(f"- {device_csv.name}")
         self.stdout.write(f"- {area_csv.name}")
+        self.stdout.write(f"- {vto_csv.name}")
+        self.stdout.write(f"- {lat_csv.name}")
 
         if opts["send"]:
             cfg = _smtp_from_env()
@@ -309,7 +419,7 @@ class Command(BaseCommand):
             body = txt_path.read_text(encoding="utf-8")
 
             try:
-                _send_email(cfg, subject, body, [txt_path, usuarios_csv, device_csv, area_csv])
+                _send_email(cfg, subject, body, [txt_path, usuarios_csv, device_csv, area_csv, vto_csv, lat_csv])
             except Exception as e:
                 # No fallar la ejecución: el informe local ya fue generado.
                 err_path = outdir / f"{base}_envio_error.txt"
@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+"""Paginación por cursor (keyset) para listados grandes.
+
+En lugar de OFFSET + COUNT(*) (más lento cuanto más profunda la página y cuanto más crece la
+tabla), cada página se busca "a partir de" la clave de la última fila vista:
+`WHERE (fecha, id) < (:f, :i) ORDER BY fecha DESC, id DESC LIMIT n+1`. El costo es el mismo en
+la página 1 que en la 1000, siempre que haya índice sobre las columnas del orden.
+
+- `paginar(qs, orden, get, por_pagina)` devuelve una `PaginaCursor` (iterable, como page_obj)
+  con los querystrings de anterior/siguiente, que conservan los filtros vigentes.
+- `KeysetPaginationMixin` lo enchufa en un ListView (reemplaza paginate_queryset).
+- El total sólo se cuenta si se pide (`?total=1`); el partial `partials/paginacion_cursor.html`
+  ofrece el enlace.
+
+Las columnas del orden no pueden ser NULL y la última debe ser única (normalmente "id").
+"""
+
+import base64
+import json
+from dataclasses import dataclass
+from typing import Sequence
+
+from django.db.models import Q, QuerySet
+from django.http import QueryDict
+
+PARAM_CURSOR = "cursor"
+PARAM_TOTAL = "total"
+
+
+class CursorInvalido(ValueError):
+    pass
+
+
+def _codificar(direccion: str, valores: list) -> str:
+    raw = json.dumps([direccion, valores], separators=(",", ":"), default=str)
+    return base64.urlsafe_b64encode(raw.encode("utf-8")).decode("ascii").rstrip("=")
+
+
+def _decodificar(token: str, model, campos: Sequence[str]) -> tuple[str, list]:
+    try:
+        raw = base64.urlsafe_b64decode(token + "=" * (-len(token) % 4))
+        direccion, valores = json.loads(raw)
+        if direccion not in ("sig", "ant") or len(valores) != len(campos):
+            raise CursorInvalido(token)
+        return direccion, [model._meta.get_field(c).to_python(v) for c, v in zip(campos, valores)]
+    except CursorInvalido:
+        raise
+    except Exception as e:
+        raise CursorInvalido(token) from e
+
+
+def _seek(campos: Sequence[str], desc: Sequence[bool], valores: list, hacia_adelante: bool) -> Q:
+    """Condición "viene después de `valores`" en el orden dado (o antes, si no hacia_adelante)."""
+
+    cond = Q()
+    for i, campo in enumerate(campos):
+        menor = desc[i] == hacia_adelante
+        paso = Q(**{f"{campo}__{'lt' if menor else 'gt'}": valores[i]})
+        for j in range(i):
+            paso &= Q(**{campos[j]: valores[j]})
+        cond |= paso
+    return cond
+
+
+@dataclass
+class PaginaCursor:
+    object_list: list
+    has_next: bool
+    has_previous: bool
+    anterior_qs: str = ""
+    siguiente_qs: str = ""
+    primera_qs: str = ""
+    contar_qs: str = ""
+    total: int | None = None
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self) -> int:
+        return len(self.object_list)
+
+    def has_other_pages(self) -> bool:
+        return self.has_next or self.has_previous
+
+
+def _querystring(get: QueryDict, **cambios) -> str:
+    qd = get.copy()
+    # Links viejos con ?page=N: el cursor manda
+    qd.pop("page", None)
+    for k, v in cambios.items():
+        if v is None:
+            qd.pop(k, None)
+        else:
+            qd[k] = v
+    return qd.urlencode()
+
+
+def paginar(
+    qs: QuerySet,
+    orden: Sequence[str],
+    get: QueryDict | None = None,
+    por_pagina: int = 25,
+    contar: bool | None = None,
+) -> PaginaCursor:
+    """Una página de `qs` ordenado por `orden` (ej: ("-fecha", "-id")) según el cursor de `get`.
+
+    `contar`: None = según `?total=1`. Un cursor inválido o vencido vuelve a la primera página.
+    """
+
+    get = get if get is not None else QueryDict()
+    campos = [c.lstrip("-") for c in orden]
+    desc = [c.startswith("-") for c in orden]
+
+    direccion, valores = None, None
+    token = get.get(PARAM_CURSOR) or ""
+    if token:
+        try:
+            direccion, valores = _decodificar(token, qs.model, campos)
+        except CursorInvalido:
+            direccion, valores = None, None
+
+    if direccion == "ant":
+        # Hacia atrás: orden invertido y después se da vuelta la página
+        invertido = [c[1:] if c.startswith("-") else f"-{c}" for c in orden]
+        filas = list(qs.filter(_seek(campos, desc, valores, False)).order_by(*invertido)[: por_pagina + 1])
+        has_previous = len(filas) > por_pagina
+        filas = filas[:por_pagina][::-1]
+        has_next = True
+    else:
+        base = qs.filter(_seek(campos, desc, valores, True)) if direccion == "sig" else qs
+        filas = list(base.order_by(*orden)[: por_pagina + 1])
+        has_next = len(filas) > por_pagina
+        filas = filas[:por_pagina]
+        has_previous = direccion == "sig"
+
+    if contar is None:
+        contar = get.get(PARAM_TOTAL) == "1"
+
+    def clave(obj) -> list:
+        return [getattr(obj, c) for c in campos]
+
+    pagina = PaginaCursor(object_list=filas, has_next=has_next and bool(filas), has_previous=has_previous and bool(filas))
+    if pagina.has_next:
+        pagina.siguiente_qs = _querystring(get, **{PARAM_CURSOR: _codificar("sig", clave(filas[-1]))})
+    if pagina.has_previous:
+        pagina.anterior_qs = _querystring(get, **{PARAM_CURSOR: _codificar("ant", clave(filas[0]))})
+    if direccion:
+        pagina.primera_qs = _querystring(get, **{PARAM_CURSOR: None})
+    if contar:
+        pagina.total = qs.order_by().count()
+    else:
+        pagina.contar_qs = _querystring(get, **{PARAM_TOTAL: "1"})
+    return pagina
+
+
+class KeysetPaginationMixin:
+    """Para ListView: pagina por cursor sobre `keyset_orden` en lugar de Paginator (OFFSET + COUNT)."""
+
+    keyset_orden: Sequence[str] = ("-id",)
+
+    def paginate_queryset(self, queryset, page_size):
+        pagina = paginar(queryset, self.keyset_orden, self.request.GET, page_size)
+        return (None, pagina, pagina.object_list, pagina.has_other_pages())
@@ -0,0 +1,21 @@
+from __future__ import annotations
+
+from django.conf import settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    """Runner de `manage.py test` (settings.TEST_RUNNER).
+
+    Apaga el buffer de auditoría: el hilo grabaría fuera de la transacción de cada test, así que
+    los eventos se graban en el momento, en el hilo del request.
+    """
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        self._buffer_auditoria = settings.AUDITORIA_BUFFER
+        settings.AUDITORIA_BUFFER = False
+
+    def teardown_test_environment(self, **kwargs):
+        settings.AUDITORIA_BUFFER = self._buffer_auditoria
+        super().teardown_test_environment(**kwargs)
@@ -1,15 +1,30 @@
 from datetime import timedelta
 
 from django.contrib.auth.models import Permission, User
+from django.core.cache import cache
+from django.db import connection
+from django.http import QueryDict
 from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
+from auditoria.models import AuditEvent
+from core import generaciones
+from core.paginacion import paginar
+from core.views import _dashboard_ctx
+from flota import odometro, vencimientos
 from flota.models import Colectivo
+from flota.odometro_models import OdometroLectura
+from inventario.models import MovimientoStock, Producto, Ubicacion
+from inventario.services.stock import aplicar_movimiento_creado, aplicar_movimientos_lote
 
 
 class DashboardTests(TestCase):
     def setUp(self):
+        # Las generaciones viven en cache y sobreviven al rollback de cada test
+        cache.clear()
+
         # Usuario base para pruebas
         self.user = User.objects.create_user(username="user_a", password="pass12345")
 
@@ -84,3 +99,181 @@ class DashboardTests(TestCase):
         self.assertContains(resp, "100")
         self.assertContains(resp, "101")
         self.assertContains(resp, "102")
+
+
+    def _colectivo(self, interno, vto):
+        return Colectivo.objects.create(
+            interno=interno,
+            dominio=f"DOM{interno}",
+            anio_modelo=2010,
+            marca="X",
+            modelo="Y",
+            numero_chasis=f"CHASIS{interno}",
+            revision_tecnica_vto=vto,
+            is_active=True,
+        )
+
+    def test_dashboard_vencimientos_ordenados(self):
+        today = timezone.localdate()
+        self._colectivo(200, None)
+        self._colectivo(201, today + timedelta(days=40))
+        self._colectivo(202, today + timedelta(days=2))
+        self._colectivo(203, today)
+        self._colectivo(204, today - timedelta(days=5))
+
+        self.client.login(username="user_a", password="pass12345")
+        resp = self.client.get(reverse("core:dashboard"))
+
+        filas = resp.context["vencimientos_vtv"]
+        self.assertEqual([r["interno"] for r in filas], [204, 203, 202, 201, 200])
+        self.assertEqual([r["estado"] for r in filas], ["Vencido", "Hoy", "Por vencer", "OK", "Pendiente"])
+        self.assertEqual(resp.context["kpi_vtv_vencidos"], 1)
+        self.assertEqual(resp.context["kpi_vtv_hoy"], 1)
+        self.assertEqual(resp.context["kpi_vtv_por_vencer_7"], 1)
+        self.assertEqual(resp.context["kpi_vtv_por_vencer"], 2)
+        self.assertEqual(resp.context["kpi_vtv_sin_fecha"], 1)
+
+    def test_dashboard_query_budget(self):
+        today = timezone.localdate()
+        for i in range(10):
+            self._colectivo(300 + i, today + timedelta(days=i - 3))
+        prod = Producto.objects.create(codigo="P-001", nombre="Producto X", stock_minimo=5)
+        ubic = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        aplicar_movimiento_creado(
+            MovimientoStock.objects.create(
+                tipo=MovimientoStock.Tipo.INGRESO, producto=prod, ubicacion=ubic, cantidad=2
+            )
+        )
+
+        # Frío: una query por agregado/listado, no crece con la cantidad de unidades
+        with self.assertNumQueries(11):
+            ctx = _dashboard_ctx(today)
+        self.assertEqual(ctx["kpi_total_unidades"], 10)
+        self.assertEqual(ctx["inv_productos_bajo_min"], 1)
+        self.assertEqual(ctx["criticos_inventario"][0]["ubicaciones"], "U-01 (2.000)")
+
+        self.client.login(username="user_a", password="pass12345")
+        url = reverse("core:dashboard")
+        cargas = []
+        for _ in range(3):
+            with CaptureQueriesContext(connection) as q:
+                self.client.get(url)
+            cargas.append(len(q))
+
+        # Caliente: el contexto sale del cache, sólo queda el costo fijo del request
+        self.assertEqual(cargas[0] - cargas[1], 11)
+        self.assertEqual(cargas[1], cargas[2])
+
+    def test_dashboard_cache_se_invalida_por_generacion(self):
+        self.client.login(username="user_a", password="pass12345")
+        url = reverse("core:dashboard")
+
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["kpi_total_unidades"], 0)
+
+        # post_save de Colectivo incrementa la generación de flota
+        gen = generaciones.generacion(generaciones.FLOTA)
+        self._colectivo(400, None)
+        self.assertGreater(generaciones.generacion(generaciones.FLOTA), gen)
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["kpi_total_unidades"], 1)
+
+        # El servicio de stock escribe con update(): avisa por la señal stock_cambiado
+        prod = Producto.objects.create(codigo="P-001", nombre="Producto X")
+        ubic = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["inv_productos_sin_stock"], 1)
+
+        gen = generaciones.generacion(generaciones.INVENTARIO)
+        movs = MovimientoStock.objects.bulk_create(
+            [MovimientoStock(tipo=MovimientoStock.Tipo.INGRESO, producto=prod, ubicacion=ubic, cantidad=3)]
+        )
+        aplicar_movimientos_lote(movs)
+        self.assertGreater(generaciones.generacion(generaciones.INVENTARIO), gen)
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["inv_productos_sin_stock"], 0)
+        self.assertEqual(resp.context["inv_productos_con_stock"], 1)
+
+
+    def test_dashboard_muestra_proyecciones_nuevas(self):
+        self.client.login(username="user_a", password="pass12345")
+        url = reverse("core:dashboard")
+        c = self._colectivo(300, None)
+        Colectivo.objects.filter(pk=c.pk).update(aceite_ultimo_cambio_km=100_000, aceite_intervalo_km=10_000)
+        # Lecturas cargadas en bloque (import): ~200 km/día, hoy ~111.000 km
+        ahora = timezone.now()
+        OdometroLectura.objects.bulk_create(
+            [OdometroLectura(colectivo=c, fecha=ahora - timedelta(days=30 - 5 * i), km=105_000 + 1_000 * i) for i in range(6)]
+        )
+        resp = self.client.get(url)
+        self.assertEqual(resp.context["mantenimiento_proyectado"], [])
+
+        # La tarea nocturna reescribe las proyecciones con bulk_create (sin señales)
+        odometro.estimar()
+        vencimientos.reconstruir()
+        resp = self.client.get(url)
+        self.assertEqual([m["interno"] for m in resp.context["mantenimiento_proyectado"]], [300])
+
+class PaginacionCursorTests(TestCase):
+    def setUp(self):
+        ahora = timezone.now()
+        for i in range(9):
+            ev = AuditEvent.objects.create(method="GET", path=f"/x/{i}", app_area="flota" if i < 7 else "inventario")
+            # Varios con el mismo instante: el desempate es el id
+            AuditEvent.objects.filter(pk=ev.pk).update(created_at=ahora - timedelta(minutes=i // 3))
+        self.qs = AuditEvent.objects.filter(app_area="flota")
+        self.esperado = list(self.qs.order_by("-created_at", "-id").values_list("id", flat=True))
+
+    def _ids(self, pagina):
+        return [e.id for e in pagina]
+
+    def test_recorre_adelante_y_atras(self):
+        paginas = [paginar(self.qs, ("-created_at", "-id"), QueryDict(), 3)]
+        while paginas[-1].has_next:
+            paginas.append(paginar(self.qs, ("-created_at", "-id"), QueryDict(paginas[-1].siguiente_qs), 3))
+        self.assertEqual([i for p in paginas for i in self._ids(p)], self.esperado)
+        self.assertEqual([len(p) for p in paginas], [3, 3, 1])
+        self.assertFalse(paginas[0].has_previous)
+
+        atras = paginar(self.qs, ("-created_at", "-id"), QueryDict(paginas[-1].anterior_qs), 3)
+        self.assertEqual(self._ids(atras), self._ids(paginas[1]))
+        self.assertTrue(atras.has_previous and atras.has_next)
+        primera = paginar(self.qs, ("-created_at", "-id"), QueryDict(atras.anterior_qs), 3)
+        self.assertEqual(self._ids(primera), self._ids(paginas[0]))
+        self.assertFalse(primera.has_previous)
+
+    def test_conserva_filtros_y_cuenta_a_pedido(self):
+        get = QueryDict("app=flota&page=4")
+        pagina = paginar(self.qs, ("-created_at", "-id"), get, 3)
+        siguiente = QueryDict(pagina.siguiente_qs)
+        self.assertEqual(siguiente["app"], "flota")
+        self.assertNotIn("page", siguiente)
+        self.assertIsNone(pagina.total)
+
+        with self.assertNumQueries(2):
+            contada = paginar(self.qs, ("-created_at", "-id"), QueryDict(pagina.contar_qs), 3)
+        self.assertEqual(contada.total, 7)
+
+        # Cursor roto: primera página
+        rota = paginar(self.qs, ("-created_at", "-id"), QueryDict("cursor=xx"), 3)
+        self.assertEqual(self._ids(rota), self.esperado[:3])
+
+    def test_listado_de_movimientos_por_cursor(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        prod = Producto.objects.create(codigo="P-1", nombre="P")
+        ubic = Ubicacion.objects.create(codigo="U-1", nombre="U")
+        aplicar_movimientos_lote(
+            MovimientoStock.objects.bulk_create(
+                [MovimientoStock(producto=prod, ubicacion=ubic, tipo=MovimientoStock.Tipo.INGRESO, cantidad=1) for _ in range(30)]
+            )
+        )
+        url = reverse("inventario:movimiento_list")
+        resp = self.client.get(url)
+        pagina = resp.context["page_obj"]
+        self.assertEqual(len(pagina), 25)
+        self.assertTrue(pagina.has_next)
+
+        resp = self.client.get(f"{url}?{pagina.siguiente_qs}")
+        self.assertEqual(len(resp.context["movimientos"]), 5)
+        self.assertContains(resp, "Anterior")
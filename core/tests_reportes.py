@@ -31,3 +31,12 @@ class ReporteGerenciaCommandTests(TestCase):
             self.assertTrue(empleados, "No se generó empleados.csv")
             self.assertTrue(dispositivos, "No se generó dispositivos.csv")
             self.assertTrue(areas, "No se generó areas.csv")
+
+            # Sale de los resúmenes horarios (auditoria.rollup)
+            filas = empleados[0].read_text(encoding="utf-8-sig").splitlines()
+            self.assertEqual(filas[1].split(",")[:4], ["user_a", "2", "0", "0"])
+
+            latencias = list(outdir.glob("informe_daily_*_latencias.csv"))
+            self.assertTrue(latencias, "No se generó latencias.csv")
+            self.assertIn("usuario,user_a,2,", latencias[0].read_text(encoding="utf-8-sig"))
+            self.assertIn("Tiempo de respuesta (p50 / p95 / p99)", files[0].read_text(encoding="utf-8"))
@@ -1,26 +1,25 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 import logging
 
+from django.conf import settings
 from django.contrib.auth.decorators import login_required
-from django.db.models import Sum, F, Value, Q, DecimalField
-from django.db.models.functions import Coalesce
+from django.core.cache import cache
+from django.db.models import Case, Count, F, FilteredRelation, IntegerField, Q, Value, When
 from django.http import HttpResponseForbidden
 from django.shortcuts import redirect, render
 from django.utils import timezone
 from django.views.decorators.csrf import requires_csrf_token
 
-from flota.models import Colectivo
+from core import generaciones
+from flota import vencimientos
+from flota.models import Colectivo, Vencimiento
 from inventario.models import Producto, StockActual, MovimientoStock, Ubicacion
 
 
 _csrf_logger = logging.getLogger("django.security.csrf")
 
-# Tipo Decimal consistente con tu inventario (12,3)
-QTY_FIELD = DecimalField(max_digits=12, decimal_places=3)
-ZERO_QTY = Value(0, output_field=QTY_FIELD)
-
 
 
 @login_required
@@ -52,9 +51,13 @@ def home_redirect(request):
     return redirect("core:dashboard")
 
 
-@login_required
-def dashboard_view(request):
-    today = timezone.localdate()
+def _inicio_dia(d):
+    return timezone.make_aware(datetime.combine(d, time.min))
+
+
+def _dashboard_ctx(today):
+    """Arma el contexto del dashboard con agregados condicionales (una query por tabla)."""
+
     limit_30 = today + timedelta(days=30)
     limit_7 = today + timedelta(days=7)
     desde_7 = today - timedelta(days=6)
@@ -62,51 +65,47 @@ def dashboard_view(request):
     # =====================
     # FLOTA (real)
     # =====================
-    total_unidades = Colectivo.objects.filter(is_active=True).count()
-    activos = Colectivo.objects.filter(is_active=True, estado=Colectivo.Estado.ACTIVO).count()
-    en_taller = Colectivo.objects.filter(is_active=True, estado=Colectivo.Estado.TALLER).count()
-    bajas = Colectivo.objects.filter(is_active=True, estado=Colectivo.Estado.BAJA).count()
+    col_qs = Colectivo.objects.filter(is_active=True)
+    # VTV desde el índice Vencimiento (flota.vencimientos); sin fila = sin fecha
+    vtv_qs = col_qs.annotate(
+        vtv=FilteredRelation("vencimientos", condition=Q(vencimientos__tipo=Vencimiento.Tipo.VTV))
+    )
+    vto = "vtv__fecha"
+    flota = vtv_qs.aggregate(
+        total=Count("id"),
+        activos=Count("id", filter=Q(estado=Colectivo.Estado.ACTIVO)),
+        taller=Count("id", filter=Q(estado=Colectivo.Estado.TALLER)),
+        bajas=Count("id", filter=Q(estado=Colectivo.Estado.BAJA)),
+        vtv_vencidos=Count("id", filter=Q(**{f"{vto}__lt": today})),
+        vtv_hoy=Count("id", filter=Q(**{vto: today})),
+        vtv_7=Count("id", filter=Q(**{f"{vto}__gt": today, f"{vto}__lte": limit_7})),
+        vtv_30=Count("id", filter=Q(**{f"{vto}__gte": today, f"{vto}__lte": limit_30})),
+        vtv_sin_fecha=Count("id", filter=Q(**{f"{vto}__isnull": True})),
+    )
+    total_unidades = flota["total"]
+    activos = flota["activos"]
+    bajas = flota["bajas"]
     flota_operativo_pct = round((activos / total_unidades) * 100) if total_unidades else 0
 
-    vtv_vencidos_qs = Colectivo.objects.filter(
-        is_active=True,
-        revision_tecnica_vto__isnull=False,
-        revision_tecnica_vto__lt=today,
-    ).order_by("revision_tecnica_vto", "interno")
-
-    vtv_hoy_qs = Colectivo.objects.filter(
-        is_active=True,
-        revision_tecnica_vto__isnull=False,
-        revision_tecnica_vto=today,
-    ).order_by("interno")
-
-    vtv_por_vencer_7_qs = Colectivo.objects.filter(
-        is_active=True,
-        revision_tecnica_vto__isnull=False,
-        revision_tecnica_vto__gt=today,
-        revision_tecnica_vto__lte=limit_7,
-    ).order_by("revision_tecnica_vto", "interno")
-
-    vtv_por_vencer_30_qs = Colectivo.objects.filter(
-        is_active=True,
-        revision_tecnica_vto__isnull=False,
-        revision_tecnica_vto__gte=today,
-        revision_tecnica_vto__lte=limit_30,
-    ).order_by("revision_tecnica_vto", "interno")
-
-    vtv_sin_fecha_qs = Colectivo.objects.filter(
-        is_active=True,
-        revision_tecnica_vto__isnull=True,
-    ).order_by("interno")
-
+    # Prioridad: vencido/hoy (0), 1..7 días (1), resto (3), sin fecha (4); el orden lo resuelve la DB
+    prioridad = Case(
+        When(**{f"{vto}__isnull": True}, then=Value(4)),
+        When(**{f"{vto}__lte": today}, then=Value(0)),
+        When(**{f"{vto}__lte": limit_7}, then=Value(1)),
+        default=Value(3),
+        output_field=IntegerField(),
+    )
     vencimientos_vtv = []
-    for c in Colectivo.objects.filter(is_active=True).only("interno", "dominio", "revision_tecnica_vto").order_by("interno"):
-        vto = c.revision_tecnica_vto
-        if not vto:
+    for interno, dominio, fecha in (
+        vtv_qs.annotate(prio=prioridad)
+        .order_by("prio", vto, "interno")
+        .values_list("interno", "dominio", vto)[:80]
+    ):
+        if not fecha:
             vencimientos_vtv.append({
                 "tipo": "VTV",
-                "interno": c.interno,
-                "dominio": c.dominio,
+                "interno": interno,
+                "dominio": dominio,
                 "fecha": None,
                 "dias": None,
                 "estado": "Pendiente",
@@ -114,88 +113,88 @@ def dashboard_view(request):
             })
             continue
 
-        dias = (vto - today).days
-        if dias < 0:
-            estado = "Vencido"
-            badge = "critical"
-        elif dias == 0:
-            estado = "Hoy"
-            badge = "critical"
-        elif 1 <= dias <= 7:
-            estado = "Por vencer"
-            badge = "high"
-        else:
-            estado = "OK"
-            badge = "ok"
+        dias = (fecha - today).days
+        badge, estado = vencimientos.estado_dias(dias)
 
         vencimientos_vtv.append({
             "tipo": "VTV",
-            "interno": c.interno,
-            "dominio": c.dominio,
-            "fecha": vto,
+            "interno": interno,
+            "dominio": dominio,
+            "fecha": fecha,
             "dias": dias,
             "estado": estado,
             "badge": badge,
         })
 
-    def _sort_key(row):
-        prio = {"critical": 0, "high": 1, "ok": 3, "muted": 4}.get(row.get("badge"), 9)
-        dias = row.get("dias")
-        dias_sort = dias if dias is not None else 10**9
-        return (prio, dias_sort)
-
-    vencimientos_vtv.sort(key=_sort_key)
+    # Aceite / filtros: vencidos por km o con fecha proyectada en 30 días (flota.odometro)
+    mantenimiento_proyectado = [
+        vencimientos.describir(v, today)
+        for v in vencimientos.proximos(
+            dias=30, hoy=today, tipos=[Vencimiento.Tipo.ACEITE, Vencimiento.Tipo.FILTROS]
+        )[:8]
+    ]
 
     # =====================
     # INVENTARIO (real) - FIX DECIMAL
     # =====================
     inv_total_ubicaciones = Ubicacion.objects.filter(is_active=True).count()
-    inv_total_stock_rows = StockActual.objects.count()
 
-    # ✅ Sum(Decimal) + Coalesce con ZERO_QTY (Decimal) => sin FieldError
-    prod_qs = Producto.objects.filter(is_active=True).annotate(
-        stock_total=Coalesce(Sum("stocks__cantidad"), ZERO_QTY, output_field=QTY_FIELD)
+    stock_agg = StockActual.objects.aggregate(
+        filas=Count("id"),
+        bajas=Count("id", filter=Q(cantidad__lt=F("producto__stock_minimo"))),
     )
 
-    inv_total_productos = prod_qs.count()
-    inv_productos_con_stock = prod_qs.filter(stock_total__gt=0).count()
-    inv_productos_sin_stock = prod_qs.filter(stock_total__lte=0).count()
-    inv_productos_bajo_min = prod_qs.filter(stock_minimo__gt=0, stock_total__lt=F("stock_minimo")).count()
+    # stock_total / bajo_minimo desnormalizados en Producto (los mantiene el servicio de stock)
+    prod_qs = Producto.objects.filter(is_active=True)
+    prod_agg = prod_qs.aggregate(
+        total=Count("id"),
+        con_stock=Count("id", filter=Q(stock_total__gt=0)),
+        sin_stock=Count("id", filter=Q(stock_total__lte=0)),
+        bajo_min=Count("id", filter=Q(bajo_minimo=True)),
+    )
+    inv_total_productos = prod_agg["total"]
+    inv_productos_con_stock = prod_agg["con_stock"]
     inv_disponibilidad_pct = round((inv_productos_con_stock / inv_total_productos) * 100) if inv_total_productos else 0
 
-    inv_stock_rows_low = StockActual.objects.filter(cantidad__lt=F("producto__stock_minimo")).count()
-
-    inv_mov_hoy = MovimientoStock.objects.filter(fecha__date=today).count()
-    inv_mov_7 = MovimientoStock.objects.filter(fecha__date__gte=desde_7, fecha__date__lte=today).count()
-
-    inv_mov_hoy_ing = MovimientoStock.objects.filter(fecha__date=today, tipo=MovimientoStock.Tipo.INGRESO).count()
-    inv_mov_hoy_egr = MovimientoStock.objects.filter(fecha__date=today, tipo=MovimientoStock.Tipo.EGRESO).count()
-    inv_mov_hoy_ajs = MovimientoStock.objects.filter(fecha__date=today, tipo=MovimientoStock.Tipo.AJUSTE).count()
-    inv_mov_hoy_trf = MovimientoStock.objects.filter(fecha__date=today, tipo=MovimientoStock.Tipo.TRANSFERENCIA).count()
+    # Rango de datetimes (no fecha__date): usa los índices por fecha en lugar de castear cada fila
+    T = MovimientoStock.Tipo
+    hoy = Q(fecha__gte=_inicio_dia(today))
+    mov = MovimientoStock.objects.filter(
+        fecha__gte=_inicio_dia(desde_7),
+        fecha__lt=_inicio_dia(today + timedelta(days=1)),
+    ).aggregate(
+        hoy=Count("id", filter=hoy),
+        siete=Count("id"),
+        ing=Count("id", filter=hoy & Q(tipo=T.INGRESO)),
+        egr=Count("id", filter=hoy & Q(tipo=T.EGRESO)),
+        ajs=Count("id", filter=hoy & Q(tipo=T.AJUSTE)),
+        trf=Count("id", filter=hoy & Q(tipo=T.TRANSFERENCIA)),
+    )
 
-    movimientos_recientes = (
+    movimientos_recientes = list(
         MovimientoStock.objects
         .select_related("producto", "ubicacion", "ubicacion_destino", "usuario")
         .order_by("-fecha", "-id")[:20]
     )
 
-    crit_qs = (
+    crit_qs = list(
         prod_qs.filter(
-            Q(stock_total__lte=0) | Q(stock_minimo__gt=0, stock_total__lt=F("stock_minimo"))
+            Q(stock_total__lte=0) | Q(bajo_minimo=True)
         )
-        .order_by("stock_total", "codigo")
-    )[:12]
+        .order_by("stock_total", "codigo")[:12]
+    )
 
     criticos_inventario = []
     crit_ids = [p.id for p in crit_qs]
     stocks_map = {}
-    for s in (
-        StockActual.objects
-        .filter(producto_id__in=crit_ids)
-        .select_related("ubicacion", "producto")
-        .order_by("producto_id", "-cantidad", "ubicacion__codigo")
-    ):
-        stocks_map.setdefault(s.producto_id, []).append(s)
+    if crit_ids:
+        for s in (
+            StockActual.objects
+            .filter(producto_id__in=crit_ids)
+            .select_related("ubicacion")
+            .order_by("producto_id", "-cantidad", "ubicacion__codigo")
+        ):
+            stocks_map.setdefault(s.producto_id, []).append(s)
 
     for p in crit_qs:
         st_list = stocks_map.get(p.id, [])
@@ -224,17 +223,16 @@ def dashboard_view(request):
             "badge": badge,
         })
 
-    alert_crit_vtv = vtv_vencidos_qs.count() + vtv_hoy_qs.count()
+    alert_crit_vtv = flota["vtv_vencidos"] + flota["vtv_hoy"]
     alert_crit_unidad = bajas
-    alert_crit_inv_sin_stock = inv_productos_sin_stock
+    alert_crit_inv_sin_stock = prod_agg["sin_stock"]
     alert_total_critico = alert_crit_vtv + alert_crit_unidad + alert_crit_inv_sin_stock
-    colectivos_quick = (
-    Colectivo.objects.filter(is_active=True)
-    .only("id", "interno", "dominio", "estado", "revision_tecnica_vto")
-    .order_by("interno")[:20]
-)
+    colectivos_quick = list(
+        col_qs.only("id", "interno", "dominio", "estado", "revision_tecnica_vto")
+        .order_by("interno")[:20]
+    )
 
-    ctx = {
+    return {
         "today": today,
         "limit_7": limit_7,
         "limit_30": limit_30,
@@ -243,33 +241,33 @@ def dashboard_view(request):
 
         "kpi_total_unidades": total_unidades,
         "kpi_activos": activos,
-        "kpi_taller": en_taller,
+        "kpi_taller": flota["taller"],
         "kpi_baja": bajas,
         "kpi_flota_operativo_pct": flota_operativo_pct,
 
-        "kpi_vtv_vencidos": vtv_vencidos_qs.count(),
-        "kpi_vtv_hoy": vtv_hoy_qs.count(),
-        "kpi_vtv_por_vencer_7": vtv_por_vencer_7_qs.count(),
-        "kpi_vtv_por_vencer": vtv_por_vencer_30_qs.count(),
-        "kpi_vtv_sin_fecha": vtv_sin_fecha_qs.count(),
-        "vencimientos_vtv": vencimientos_vtv[:80],
+        "kpi_vtv_vencidos": flota["vtv_vencidos"],
+        "kpi_vtv_hoy": flota["vtv_hoy"],
+        "kpi_vtv_por_vencer_7": flota["vtv_7"],
+        "kpi_vtv_por_vencer": flota["vtv_30"],
+        "kpi_vtv_sin_fecha": flota["vtv_sin_fecha"],
+        "vencimientos_vtv": vencimientos_vtv,
+        "mantenimiento_proyectado": mantenimiento_proyectado,
 
-        
         "inv_total_productos": inv_total_productos,
         "inv_productos_con_stock": inv_productos_con_stock,
-        "inv_productos_sin_stock": inv_productos_sin_stock,
-        "inv_productos_bajo_min": inv_productos_bajo_min,
+        "inv_productos_sin_stock": prod_agg["sin_stock"],
+        "inv_productos_bajo_min": prod_agg["bajo_min"],
         "inv_disponibilidad_pct": inv_disponibilidad_pct,
         "inv_total_ubicaciones": inv_total_ubicaciones,
-        "inv_total_stock_rows": inv_total_stock_rows,
-        "inv_stock_rows_low": inv_stock_rows_low,
+        "inv_total_stock_rows": stock_agg["filas"],
+        "inv_stock_rows_low": stock_agg["bajas"],
 
-        "inv_mov_hoy": inv_mov_hoy,
-        "inv_mov_7": inv_mov_7,
-        "inv_mov_hoy_ing": inv_mov_hoy_ing,
-        "inv_mov_hoy_egr": inv_mov_hoy_egr,
-        "inv_mov_hoy_ajs": inv_mov_hoy_ajs,
-        "inv_mov_hoy_trf": inv_mov_hoy_trf,
+        "inv_mov_hoy": mov["hoy"],
+        "inv_mov_7": mov["siete"],
+        "inv_mov_hoy_ing": mov["ing"],
+        "inv_mov_hoy_egr": mov["egr"],
+        "inv_mov_hoy_ajs": mov["ajs"],
+        "inv_mov_hoy_trf": mov["trf"],
 
         "movimientos_recientes": movimientos_recientes,
         "colectivos_quick": colectivos_quick,
@@ -280,6 +278,19 @@ def dashboard_view(request):
         "alert_crit_inv_sin_stock": alert_crit_inv_sin_stock,
     }
 
+
+@login_required
+def dashboard_view(request):
+    today = timezone.localdate()
+
+    # La clave cambia cuando cambia la fecha o cualquier generación (ver core.generaciones):
+    # no hace falta borrar nada, lo viejo expira solo.
+    key = generaciones.clave(f"dashboard:{today.isoformat()}", generaciones.FLOTA, generaciones.INVENTARIO)
+    ctx = cache.get(key)
+    if ctx is None:
+        ctx = _dashboard_ctx(today)
+        cache.set(key, ctx, getattr(settings, "DASHBOARD_CACHE_SEGUNDOS", 300))
+
     return render(request, "core/dashboard.html", ctx)
 
 
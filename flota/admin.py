@@ -3,7 +3,10 @@ from import_export.admin import ImportExportModelAdmin
 
 from .models import Colectivo, SalidaProgramada
 from .choferes_models import Chofer
+from .patrones_models import Feriado, PatronDiagrama, PatronDiagramaLinea
+from .odometro_models import OdometroLectura
 from .resources import ColectivoResource
+from .vencimientos_models import Vencimiento
 
 
 @admin.register(Colectivo)
@@ -28,3 +31,48 @@ class ChoferAdmin(admin.ModelAdmin):
     list_filter = ('is_active',)
     search_fields = ('apellido', 'nombre', 'legajo')
 
+
+class PatronDiagramaLineaInline(admin.TabularInline):
+    model = PatronDiagramaLinea
+    extra = 0
+    autocomplete_fields = ("colectivo",)
+    fields = ("hora", "llegada", "colectivo", "tipo", "seccion", "salida_label", "regreso", "chofer", "recorrido", "nota")
+
+
+@admin.register(PatronDiagrama)
+class PatronDiagramaAdmin(admin.ModelAdmin):
+    list_display = ("nombre", "tipo_dia", "vigente_desde", "vigente_hasta", "is_active")
+    list_filter = ("tipo_dia", "is_active")
+    search_fields = ("nombre",)
+    inlines = (PatronDiagramaLineaInline,)
+
+
+@admin.register(Feriado)
+class FeriadoAdmin(admin.ModelAdmin):
+    list_display = ("fecha", "descripcion")
+    ordering = ("-fecha",)
+
+
+@admin.register(Vencimiento)
+class VencimientoAdmin(admin.ModelAdmin):
+    # Derivado de Colectivo (flota.vencimientos): sólo lectura
+    list_display = ("colectivo", "tipo", "fecha", "km", "km_restantes", "campo")
+    list_filter = ("tipo",)
+    search_fields = ("colectivo__interno", "colectivo__dominio")
+    ordering = ("fecha", "km_restantes")
+
+    def has_add_permission(self, request):
+        return False
+
+    def has_change_permission(self, request, obj=None):
+        return False
+
+
+@admin.register(OdometroLectura)
+class OdometroLecturaAdmin(admin.ModelAdmin):
+    list_display = ("colectivo", "fecha", "km", "origen", "parte")
+    list_filter = ("origen",)
+    search_fields = ("colectivo__interno", "colectivo__dominio")
+    autocomplete_fields = ("colectivo",)
+    raw_id_fields = ("parte",)
+    ordering = ("-fecha",)
@@ -4,3 +4,44 @@ from django.apps import AppConfig
 class FlotaConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'flota'
+
+    def ready(self):
+        from django.db.models.signals import post_delete, post_save
+
+        from core import generaciones
+        from flota import estado_unidad, odometro, vencimientos, vocabulario
+        from flota.models import Colectivo, Feriado, ParteDiario, PatronDiagrama, PatronDiagramaLinea, SalidaProgramada
+
+        # Pantallas TV (flota.tv_views): sólo se rearman cuando cambia la generación
+        self._bump_salidas = generaciones.receptor(generaciones.SALIDAS)
+        self._bump_partes = generaciones.receptor(generaciones.PARTES)
+
+        for model, handler, area in (
+            (SalidaProgramada, self._bump_salidas, generaciones.SALIDAS),
+            (ParteDiario, self._bump_partes, generaciones.PARTES),
+        ):
+            post_save.connect(handler, sender=model, dispatch_uid=f"gen_{area}_save")
+            post_delete.connect(handler, sender=model, dispatch_uid=f"gen_{area}_delete")
+
+        # Los patrones arman salidas virtuales (flota.patrones): mismas pantallas que SALIDAS
+        for model in (PatronDiagrama, PatronDiagramaLinea, Feriado):
+            post_save.connect(self._bump_salidas, sender=model, dispatch_uid=f"gen_salidas_{model.__name__}_save")
+            post_delete.connect(self._bump_salidas, sender=model, dispatch_uid=f"gen_salidas_{model.__name__}_delete")
+
+        post_save.connect(vocabulario.salida_guardada, sender=SalidaProgramada, dispatch_uid="vocabulario_salida_save")
+
+        # Modelo de lectura por unidad (flota.estado_unidad)
+        for model, handler in (
+            (SalidaProgramada, estado_unidad.salida_cambiada),
+            (ParteDiario, estado_unidad.parte_cambiado),
+        ):
+            post_save.connect(handler, sender=model, dispatch_uid=f"estado_unidad_{model.__name__}_save")
+            post_delete.connect(handler, sender=model, dispatch_uid=f"estado_unidad_{model.__name__}_delete")
+        post_save.connect(estado_unidad.colectivo_guardado, sender=Colectivo, dispatch_uid="estado_unidad_Colectivo_save")
+
+        # Índice de vencimientos (flota.vencimientos): se deriva de los campos de Colectivo
+        post_save.connect(vencimientos.colectivo_guardado, sender=Colectivo, dispatch_uid="vencimientos_Colectivo_save")
+
+        # Serie de odómetro (flota.odometro): lecturas desde partes y carga manual
+        post_save.connect(odometro.parte_guardado, sender=ParteDiario, dispatch_uid="odometro_ParteDiario_save")
+        post_save.connect(odometro.colectivo_guardado, sender=Colectivo, dispatch_uid="odometro_Colectivo_save")
@@ -0,0 +1,134 @@
+from __future__ import annotations
+
+"""
+flota.condicional
+
+GET condicional (ETag / 304) para las pantallas que se consultan seguido:
+TV Taller (partial), TV Horarios, Salidas doble y Diagrama imprimible.
+
+El ETag sale de agregados baratos (cantidad + max(updated_at)) de las salidas del día que la
+vista va a mostrar (con ?fecha= o el que elige su heurística, ver `_salidas_para`) y,
+si la vista lo pide, de los partes abiertos. Si el navegador manda If-None-Match con el
+mismo valor, se responde 304 sin correr los querysets de la vista ni renderizar.
+"""
+
+import hashlib
+from datetime import timedelta
+from functools import wraps
+
+from django.db.models import Count, Max, Q
+from django.utils import timezone
+from django.utils.cache import patch_cache_control
+from django.views.decorators.http import condition
+
+from .models import Colectivo, Feriado, PatronDiagrama, SalidaProgramada
+from .partes_models import ParteDiario
+
+# Parámetros que no cambian el HTML (cache-busting del navegador / JS)
+_PARAMS_IGNORADOS = {"_"}
+
+
+def _firma(qs) -> str:
+    agg = qs.aggregate(n=Count("id"), m=Max("updated_at"))
+    m = agg["m"]
+    return f"{agg['n']}:{m.timestamp() if m else 0}"
+
+
+def _salidas_para(request, dias: int, con_patrones: bool):
+    """(día, salidas que puede mostrar la vista): `dias` días desde ?fecha= o desde el día que
+    elige la misma heurística de la vista (incluye ESPECIALES que cruzan el rango).
+
+    Si una alta cambia el día elegido, cambia el día y con él la firma.
+    """
+
+    # Import diferido: salidas_views importa este módulo
+    from .salidas_views import _day_bounds, _resolve_day_from_request
+
+    day, _explicit = _resolve_day_from_request(request, con_patrones=con_patrones)
+    start, _ = _day_bounds(day)
+    _, end = _day_bounds(day + timedelta(days=dias - 1))
+    return day, SalidaProgramada.objects.filter(
+        Q(salida_programada__gte=start, salida_programada__lt=end)
+        | Q(
+            tipo=SalidaProgramada.Tipo.ESPECIAL,
+            llegada_programada__isnull=False,
+            salida_programada__lt=end,
+            llegada_programada__gte=start,
+        )
+    )
+
+
+def _mensajes_pendientes(request) -> str:
+    # Un 304 no mostraría los mensajes de django.contrib.messages: que cambien el ETag
+    session = getattr(request, "session", None)
+    pendientes = session.get("_messages", "") if session is not None else ""
+    return f"{request.COOKIES.get('messages', '')}|{pendientes}"
+
+
+def etag_flota(
+    *,
+    dias: int = 1,
+    salidas_futuras: bool = False,
+    partes: bool = False,
+    patrones: bool = False,
+    por_minuto: bool = False,
+):
+    """Decorador ETag/304 para vistas de flota. Va debajo de login_required / permission_required.
+
+    - dias: cuántos días desde ?fecha= firma (salidas_dual = 2).
+    - salidas_futuras: firmar salidas desde ahora en adelante (TV Taller) en lugar del día.
+    - partes: incluir partes abiertos / en proceso.
+    - patrones: la vista suma salidas de patrones (flota.patrones): firmar patrones y feriados.
+    - por_minuto: la vista depende de la hora ("próxima salida"): el ETag cambia cada minuto.
+    """
+
+    def etag_func(request, *args, **kwargs) -> str:
+        now = timezone.localtime(timezone.now())
+        user = getattr(request, "user", None)
+        firma = []
+
+        if salidas_futuras:
+            salidas = SalidaProgramada.objects.filter(salida_programada__gte=now - timedelta(minutes=1))
+        else:
+            day, salidas = _salidas_para(request, dias, con_patrones=patrones)
+            firma.append(day.isoformat())
+        firma.append(_firma(salidas))
+        if partes:
+            firma.append(
+                _firma(ParteDiario.objects.filter(estado__in=[ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO]))
+            )
+        if patrones:
+            # Editar una línea toca PatronDiagrama.updated_at (ver PatronDiagramaLinea.save)
+            firma.append(_firma(PatronDiagrama.objects.all()))
+            firma.append(str(Feriado.objects.aggregate(n=Count("id"), m=Max("id"))))
+        # interno / dominio se muestran en todas estas pantallas
+        firma.append(_firma(Colectivo.objects.all()))
+
+        params = sorted((k, v) for k, v in request.GET.items() if k not in _PARAMS_IGNORADOS)
+        firma += [
+            request.path,
+            repr(params),
+            str(getattr(user, "pk", "")),
+            _mensajes_pendientes(request),
+            # La heurística de día por defecto cambia con la fecha y a las 18hs
+            now.date().isoformat(),
+            "noche" if now.hour >= 18 else "dia",
+        ]
+        if por_minuto:
+            firma.append(now.strftime("%H:%M"))
+
+        return hashlib.sha1("|".join(firma).encode("utf-8")).hexdigest()[:20]
+
+    def decorator(view):
+        conditional = condition(etag_func=etag_func)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            response = conditional(request, *args, **kwargs)
+            # Que el navegador revalide siempre (si no, puede usar la copia sin preguntar)
+            patch_cache_control(response, private=True, no_cache=True)
+            return response
+
+        return wrapper
+
+    return decorator
@@ -0,0 +1,136 @@
+from __future__ import annotations
+
+"""
+flota.conflictos
+
+Detecta unidades y choferes asignados a dos salidas que se superponen en el tiempo.
+
+- Cada salida es un intervalo [salida_programada, llegada_programada). Si no tiene llegada
+  (lo habitual en el diagrama diario) se asume SALIDAS_DURACION_SUPUESTA_MIN minutos.
+- Se agrupa por colectivo y por chofer normalizado (mayúsculas, sin tildes ni comas) y se
+  hace un barrido ordenado por inicio: O(n log n), sin comparar todos contra todos.
+- El barrido informa cada salida que arranca antes de que termine la que más se extiende
+  hasta ese momento: toda salida en conflicto aparece al menos una vez.
+- Las CANCELADAS no ocupan. `en_rango` suma las salidas virtuales de los patrones.
+"""
+
+import unicodedata
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+
+from . import patrones
+from .models import SalidaProgramada
+
+
+@dataclass(frozen=True)
+class Conflicto:
+    recurso: str  # "colectivo" | "chofer"
+    clave: str
+    a: SalidaProgramada
+    b: SalidaProgramada
+    desde: datetime
+    hasta: datetime
+
+    def as_dict(self) -> dict:
+        def salida(s):
+            return {
+                "id": s.pk,
+                "virtual": bool(getattr(s, "virtual", False)),
+                "patron_linea": s.patron_linea_id,
+                "interno": s.colectivo.interno,
+                "chofer": s.chofer,
+                "salida_programada": timezone.localtime(s.salida_programada).isoformat(),
+                "salida_label": s.salida_label,
+            }
+
+        return {
+            "recurso": self.recurso,
+            "clave": self.clave,
+            "desde": timezone.localtime(self.desde).isoformat(),
+            "hasta": timezone.localtime(self.hasta).isoformat(),
+            "a": salida(self.a),
+            "b": salida(self.b),
+        }
+
+
+def normalizar_chofer(nombre: str | None) -> str:
+    s = unicodedata.normalize("NFKD", nombre or "")
+    s = "".join(c for c in s if not unicodedata.combining(c))
+    return " ".join(s.upper().replace(",", " ").split())
+
+
+def duracion_supuesta() -> timedelta:
+    return timedelta(minutes=int(getattr(settings, "SALIDAS_DURACION_SUPUESTA_MIN", 60)))
+
+
+def _barrido(recurso: str, clave: str, intervalos: list) -> Iterable[Conflicto]:
+    intervalos.sort(key=lambda x: (x[0], x[1]))
+    activo = None
+    for ini, fin, s in intervalos:
+        if activo is not None and ini < activo[1]:
+            yield Conflicto(recurso, clave, activo[2], s, ini, min(fin, activo[1]))
+        if activo is None or fin > activo[1]:
+            activo = (ini, fin, s)
+
+
+def detectar(salidas: Iterable[SalidaProgramada], duracion: timedelta | None = None) -> list[Conflicto]:
+    """Conflictos de unidad y de chofer entre `salidas` (necesitan `colectivo` cargado)."""
+
+    duracion = duracion or duracion_supuesta()
+    por_colectivo: dict[int, list] = defaultdict(list)
+    por_chofer: dict[str, list] = defaultdict(list)
+    internos: dict[int, int] = {}
+
+    for s in salidas:
+        if s.estado == SalidaProgramada.Estado.CANCELADA:
+            continue
+        ini = s.salida_programada
+        fin = s.llegada_programada if s.llegada_programada and s.llegada_programada > ini else ini + duracion
+        por_colectivo[s.colectivo_id].append((ini, fin, s))
+        internos[s.colectivo_id] = s.colectivo.interno
+        chofer = normalizar_chofer(s.chofer)
+        if chofer:
+            por_chofer[chofer].append((ini, fin, s))
+
+    conflictos = []
+    for colectivo_id, intervalos in por_colectivo.items():
+        conflictos.extend(_barrido("colectivo", f"Interno {internos[colectivo_id]}", intervalos))
+    for chofer, intervalos in por_chofer.items():
+        conflictos.extend(_barrido("chofer", chofer, intervalos))
+    conflictos.sort(key=lambda c: (c.desde, c.recurso, c.clave))
+    return conflictos
+
+
+def en_rango(desde: date, hasta: date, duracion: timedelta | None = None) -> list[Conflicto]:
+    """Conflictos de los días [desde, hasta]: una query de salidas + las de patrones."""
+
+    start = timezone.make_aware(datetime.combine(desde, datetime.min.time()))
+    end = timezone.make_aware(datetime.combine(hasta + timedelta(days=1), datetime.min.time()))
+    concretas = list(
+        SalidaProgramada.objects.filter(
+            Q(salida_programada__gte=start, salida_programada__lt=end)
+            # Especiales que arrancaron antes y siguen en viaje
+            | Q(llegada_programada__isnull=False, llegada_programada__gt=start, salida_programada__lt=end)
+        )
+        .exclude(estado=SalidaProgramada.Estado.CANCELADA)
+        .select_related("colectivo")
+    )
+    por_dia = patrones.resolver(desde, hasta, concretas)
+    return detectar((s for salidas in por_dia.values() for s in salidas), duracion)
+
+
+def marcar(conflictos: Iterable[Conflicto]) -> None:
+    """Deja en cada salida involucrada `s.conflictos` = [descripción, ...] (para templates)."""
+
+    for c in conflictos:
+        for s, otra in ((c.b, c.a), (c.a, c.b)):
+            hora = timezone.localtime(otra.salida_programada).strftime("%d/%m %H:%M")
+            if not hasattr(s, "conflictos"):
+                s.conflictos = []
+            s.conflictos.append(f"{c.clave} también en la salida de las {hora}")
@@ -11,8 +11,9 @@ from django.shortcuts import redirect, render
 from django.urls import reverse
 from django.utils import timezone
 
-from .models import Colectivo, SalidaProgramada
-from .partes_models import ParteDiario
+from . import vocabulario
+from .forms import ColectivoCompartidoField, ColectivoCompartidoFormMixin, FormSetFilasCargadas, OpcionesColectivo
+from .models import Colectivo, EstadoUnidad, SalidaProgramada
 
 
 def _parse_day(s: str):
@@ -55,35 +56,27 @@ def _occupied_units_by_special(start, end):
 
 
 def _open_parte_by_colectivo(colectivo_ids):
-    open_partes = (
-        ParteDiario.objects.filter(
-            colectivo_id__in=colectivo_ids,
-            estado__in=[ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO],
+    """Último parte abierto / en proceso por unidad (desde EstadoUnidad)."""
+    return dict(
+        EstadoUnidad.objects.filter(colectivo_id__in=colectivo_ids, ultimo_parte__isnull=False).values_list(
+            "colectivo_id", "ultimo_parte_id"
         )
-        .order_by("-fecha_evento", "-id")
     )
-    mp = {}
-    for p in open_partes:
-        if p.colectivo_id not in mp:
-            mp[p.colectivo_id] = p.pk
-    return mp
 
 
-class _ColectivoField(forms.ModelChoiceField):
-    def __init__(self, *args, **kwargs):
-        self.occupied_map = kwargs.pop("occupied_map", {})
-        super().__init__(*args, **kwargs)
-
-    def label_from_instance(self, obj: Colectivo):
+def _etiqueta_colectivo(occupied_map):
+    def etiqueta(obj: Colectivo) -> str:
         base = f"Interno {obj.interno} - {obj.dominio}"
-        info = self.occupied_map.get(obj.pk)
+        info = occupied_map.get(obj.pk)
         if info and info.get("hasta"):
             hasta = timezone.localtime(info["hasta"]).strftime("%d/%m %H:%M")
             return f"{base} (OCUPADA: especial hasta {hasta})"
         return base
 
+    return etiqueta
+
 
-class SalidaReemplazoForm(forms.ModelForm):
+class SalidaReemplazoForm(ColectivoCompartidoFormMixin, forms.ModelForm):
     chofer = forms.CharField(required=False)
 
     class Meta:
@@ -92,14 +85,11 @@ class SalidaReemplazoForm(forms.ModelForm):
 
     def __init__(self, *args, **kwargs):
         occupied_map = kwargs.pop("occupied_map", {})
+        opciones_colectivo = kwargs.pop("opciones_colectivo", None) or OpcionesColectivo(_etiqueta_colectivo(occupied_map))
         super().__init__(*args, **kwargs)
 
-        # Colectivo con labels + bloqueo de ocupadas vía clean
-        self.fields["colectivo"] = _ColectivoField(
-            queryset=Colectivo.objects.all().order_by("interno"),
-            occupied_map=occupied_map,
-            empty_label=None,
-        )
+        # Colectivo con labels (opciones compartidas por el formset) + bloqueo de ocupadas vía clean
+        self.fields["colectivo"] = ColectivoCompartidoField(opciones_colectivo)
         self.fields["colectivo"].widget.attrs.update({"class": "ti-input"})
         self.fields["chofer"].widget.attrs.update({"class": "ti-input", "list": "dl_choferes", "placeholder": "Ej: APELLIDO, Nombre"})
 
@@ -141,12 +131,19 @@ def diagrama_reemplazos(request):
     FormSet = modelformset_factory(
         SalidaProgramada,
         form=SalidaReemplazoForm,
+        formset=FormSetFilasCargadas,
         extra=0,
         can_delete=False,
     )
 
+    # Una sola query / un solo HTML de opciones de unidad para todas las filas
+    form_kwargs = {
+        "occupied_map": occupied_map,
+        "opciones_colectivo": OpcionesColectivo(_etiqueta_colectivo(occupied_map)),
+    }
+
     if request.method == "POST":
-        formset = FormSet(request.POST, queryset=qs, form_kwargs={"occupied_map": occupied_map})
+        formset = FormSet(request.POST, queryset=qs, form_kwargs=form_kwargs)
         if formset.is_valid():
             with transaction.atomic():
                 formset.save()
@@ -154,7 +151,7 @@ def diagrama_reemplazos(request):
             return redirect(f"{reverse('flota:salida_diagrama_reemplazos')}?fecha={day.isoformat()}")
         messages.error(request, "No se pudo guardar. Revisá los campos marcados.")
     else:
-        formset = FormSet(queryset=qs, form_kwargs={"occupied_map": occupied_map})
+        formset = FormSet(queryset=qs, form_kwargs=form_kwargs)
 
     ctx = {
         "day": day,
@@ -162,11 +159,6 @@ def diagrama_reemplazos(request):
         "occupied_ids": sorted(list(occupied_map.keys())),
         "occupied_map": occupied_map,
         "hours": 12,
-        "datalist_choferes": list(
-            SalidaProgramada.objects.exclude(chofer="")
-            .values_list("chofer", flat=True)
-            .distinct()
-            .order_by("chofer")[:300]
-        ),
+        "datalist_choferes": vocabulario.datalists()["datalist_choferes"],
     }
     return render(request, "flota/diagrama_reemplazos.html", ctx)
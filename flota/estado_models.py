@@ -0,0 +1,69 @@
+from __future__ import annotations
+
+from django.db import models
+from django.utils import timezone
+
+
+class EstadoUnidad(models.Model):
+    """Modelo de lectura: una fila por colectivo con lo que repiten informe, TV Taller y diagrama.
+
+    Lo mantiene flota.estado_unidad (señales de SalidaProgramada, ParteDiario y Colectivo, más
+    los caminos bulk). `reconstruir_estado_unidad` lo rearma completo (tarea nocturna).
+
+    Se guardan fechas, no "días restantes": los días se calculan al leer.
+    """
+
+    colectivo = models.OneToOneField(
+        "flota.Colectivo",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="estado_unidad",
+    )
+
+    # Próxima salida no cancelada desde el último cálculo (se corre sola al pasar: ver vigentes())
+    proxima_salida = models.DateTimeField(null=True, blank=True)
+    proxima_seccion = models.CharField(max_length=80, blank=True, default="")
+    proxima_label = models.CharField(max_length=50, blank=True, default="")
+
+    partes_abiertos = models.PositiveIntegerField(default=0)
+    # 0 = sin partes, 1 = BAJA ... 4 = CRITICA
+    severidad_rank = models.PositiveSmallIntegerField(default=0)
+    ultimo_parte = models.ForeignKey(
+        "flota.ParteDiario",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="+",
+    )
+
+    vtv_vto = models.DateField(null=True, blank=True)
+    matafuego_vto = models.DateField(null=True, blank=True)
+
+    actualizado = models.DateTimeField(auto_now=True)
+
+    SEVERIDADES = {1: "BAJA", 2: "MEDIA", 3: "ALTA", 4: "CRITICA"}
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["proxima_salida"], name="idx_estado_unidad_prox"),
+            models.Index(fields=["partes_abiertos"], name="idx_estado_unidad_partes"),
+        ]
+
+    def __str__(self) -> str:
+        return f"Estado {self.colectivo_id}"
+
+    @property
+    def severidad_max(self) -> str:
+        return self.SEVERIDADES.get(self.severidad_rank, "")
+
+    @staticmethod
+    def _dias(d):
+        return (d - timezone.localdate()).days if d else None
+
+    @property
+    def vtv_dias(self):
+        return self._dias(self.vtv_vto)
+
+    @property
+    def matafuego_dias(self):
+        return self._dias(self.matafuego_vto)
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+"""
+flota.estado_unidad
+
+Mantiene EstadoUnidad (una fila por colectivo): próxima salida, partes abiertos (cantidad,
+severidad máxima, último) y vencimientos de VTV / matafuego.
+
+- `actualizar(ids)` recalcula esas unidades con una cantidad fija de queries (3 lecturas + un
+  upsert), sin importar cuántas sean. Lo llaman las señales y los caminos bulk.
+- La próxima salida envejece sola: `vigentes()` recalcula, antes de leer, sólo las unidades cuya
+  próxima salida ya pasó (una query si no hay ninguna).
+- `reconstruir()` rearma todo (comando `reconstruir_estado_unidad`, tarea nocturna).
+
+Sólo cuenta salidas concretas (no las virtuales de flota.patrones).
+"""
+
+from typing import Iterable
+
+from django.db.models import Case, Count, IntegerField, Max, OuterRef, Subquery, When
+from django.utils import timezone
+
+from .estado_models import EstadoUnidad
+from .models import Colectivo, SalidaProgramada
+from .partes_models import ParteDiario
+
+ESTADOS_ABIERTOS = (ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO)
+
+_RANK = Case(
+    *(When(severidad=sev, then=rank) for rank, sev in EstadoUnidad.SEVERIDADES.items()),
+    default=0,
+    output_field=IntegerField(),
+)
+
+_CAMPOS = [
+    "proxima_salida",
+    "proxima_seccion",
+    "proxima_label",
+    "partes_abiertos",
+    "severidad_rank",
+    "ultimo_parte",
+    "vtv_vto",
+    "matafuego_vto",
+    "actualizado",
+]
+
+
+def calcular(colectivo_ids: Iterable[int] | None = None, now=None) -> list[EstadoUnidad]:
+    """Filas EstadoUnidad (sin guardar) para esas unidades, o todas si `colectivo_ids` es None."""
+
+    now = now or timezone.now()
+    colectivos = Colectivo.objects.only(
+        "id", "revision_tecnica_vto", "matafuego_1_vto", "matafuego_2_vto", "matafuego_vto", "matafuego_vencimiento_2"
+    )
+    partes = ParteDiario.objects.filter(estado__in=ESTADOS_ABIERTOS)
+    if colectivo_ids is not None:
+        colectivo_ids = list(colectivo_ids)
+        colectivos = colectivos.filter(pk__in=colectivo_ids)
+        partes = partes.filter(colectivo_id__in=colectivo_ids)
+
+    proxima = (
+        SalidaProgramada.objects.filter(colectivo=OuterRef("pk"), salida_programada__gte=now)
+        .exclude(estado=SalidaProgramada.Estado.CANCELADA)
+        .order_by("salida_programada", "id")
+        .values("id")[:1]
+    )
+    ultimo = (
+        ParteDiario.objects.filter(colectivo=OuterRef("pk"), estado__in=ESTADOS_ABIERTOS)
+        .order_by("-fecha_evento", "-id")
+        .values("id")[:1]
+    )
+    colectivos = list(colectivos.annotate(proxima_id=Subquery(proxima), ultimo_parte_id=Subquery(ultimo)))
+
+    agregados = {
+        r["colectivo_id"]: r
+        for r in partes.values("colectivo_id").annotate(n=Count("id"), rank=Max(_RANK)).order_by()
+    }
+    salidas = {
+        r["id"]: r
+        for r in SalidaProgramada.objects.filter(pk__in=[c.proxima_id for c in colectivos if c.proxima_id]).values(
+            "id", "salida_programada", "seccion", "salida_label"
+        )
+    }
+
+    filas = []
+    for c in colectivos:
+        s = salidas.get(c.proxima_id) or {}
+        p = agregados.get(c.pk) or {}
+        filas.append(
+            EstadoUnidad(
+                colectivo_id=c.pk,
+                proxima_salida=s.get("salida_programada"),
+                proxima_seccion=(s.get("seccion") or "").strip()[:80],
+                proxima_label=(s.get("salida_label") or "").strip()[:50],
+                partes_abiertos=p.get("n") or 0,
+                severidad_rank=p.get("rank") or 0,
+                ultimo_parte_id=c.ultimo_parte_id,
+                vtv_vto=c.revision_tecnica_vto,
+                matafuego_vto=c.matafuego_proximo_vencimiento,
+            )
+        )
+    return filas
+
+
+def _guardar(filas: list[EstadoUnidad]) -> int:
+    if filas:
+        EstadoUnidad.objects.bulk_create(
+            filas, update_conflicts=True, unique_fields=["colectivo"], update_fields=_CAMPOS, batch_size=500
+        )
+    return len(filas)
+
+
+def actualizar(colectivo_ids: Iterable[int]) -> int:
+    ids = {i for i in colectivo_ids if i}
+    if not ids:
+        return 0
+    return _guardar(calcular(ids))
+
+
+def vigentes(now=None) -> int:
+    """Recalcula las unidades cuya próxima salida ya pasó. Llamar antes de leer EstadoUnidad."""
+
+    now = now or timezone.now()
+    vencidas = list(EstadoUnidad.objects.filter(proxima_salida__lt=now).values_list("colectivo_id", flat=True))
+    return _guardar(calcular(vencidas, now)) if vencidas else 0
+
+
+def reconstruir() -> int:
+    filas = calcular()
+    EstadoUnidad.objects.exclude(colectivo_id__in=[f.colectivo_id for f in filas]).delete()
+    return _guardar(filas)
+
+
+# ---------------------------------------------------------------------
+# Señales (conectadas en FlotaConfig.ready)
+# ---------------------------------------------------------------------
+def salida_cambiada(sender, instance: SalidaProgramada, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    # Si se cambió la unidad, también se recalcula la anterior
+    actualizar({instance.colectivo_id, getattr(instance, "_colectivo_id_inicial", None)})
+    instance._colectivo_id_inicial = instance.colectivo_id
+
+
+def parte_cambiado(sender, instance: ParteDiario, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    # Un parte abierto movido a otra unidad deja de contar en la anterior
+    actualizar({instance.colectivo_id, getattr(instance, "_colectivo_id_inicial", None)})
+    instance._colectivo_id_inicial = instance.colectivo_id
+
+
+def colectivo_guardado(sender, instance: Colectivo, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    actualizar([instance.pk])
@@ -0,0 +1,140 @@
+from __future__ import annotations
+
+"""
+flota.expansion
+
+Motor común para copiar diagramas entre días (día anterior, 15 días, quincena, plantilla).
+
+- Lee TODO el rango de origen en una query y agrupa por día local.
+- Corre las salidas al día destino conservando la hora local (seguro ante cambios de horario:
+  no suma 24h fijas).
+- Deduplica contra lo que ya existe en destino (colectivo + salida_programada) en una query.
+- Inserta con bulk_create en una sola transacción y devuelve un reporte.
+
+bulk_create no dispara post_save: acá se registra el vocabulario, se recalcula EstadoUnidad
+y se avisa a las TVs.
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from core import generaciones
+
+from . import estado_unidad, vocabulario
+from .models import SalidaProgramada
+
+# Campos que se copian tal cual (estado vuelve a PROGRAMADA, reales en blanco)
+CAMPOS_COPIA = ("colectivo_id", "tipo", "seccion", "salida_label", "regreso", "chofer", "recorrido", "nota")
+
+
+@dataclass(frozen=True)
+class Omitida:
+    origen_id: int
+    colectivo_id: int
+    salida_programada: datetime
+    motivo: str
+
+
+@dataclass
+class ReporteExpansion:
+    creadas: list[SalidaProgramada] = field(default_factory=list)
+    omitidas: list[Omitida] = field(default_factory=list)
+    # Días de origen pedidos que no tenían salidas
+    dias_sin_origen: list[date] = field(default_factory=list)
+    origenes: int = 0
+
+    @property
+    def total_creadas(self) -> int:
+        return len(self.creadas)
+
+
+def desplazar(dt: datetime | None, dias: int) -> datetime | None:
+    """Mismo horario local, `dias` días después (o antes)."""
+
+    if dt is None:
+        return None
+    local = timezone.localtime(dt)
+    return timezone.make_aware(local.replace(tzinfo=None) + timedelta(days=dias))
+
+
+def _inicio(day: date) -> datetime:
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def _rangos(dias: Iterable[date]) -> Q:
+    """Q con un rango [00:00, 00:00 del día siguiente) por tramo de días consecutivos."""
+
+    q = Q()
+    dias = sorted(set(dias))
+    i = 0
+    while i < len(dias):
+        j = i
+        while j + 1 < len(dias) and dias[j + 1] == dias[j] + timedelta(days=1):
+            j += 1
+        q |= Q(salida_programada__gte=_inicio(dias[i]), salida_programada__lt=_inicio(dias[j] + timedelta(days=1)))
+        i = j + 1
+    return q
+
+
+@transaction.atomic
+def expandir(pares: Iterable[tuple[date, date]]) -> ReporteExpansion:
+    """Copia las salidas de cada día origen a su día destino. `pares` = [(origen, destino), ...]."""
+
+    pares = list(pares)
+    reporte = ReporteExpansion()
+    if not pares:
+        return reporte
+
+    por_dia: dict[date, list[SalidaProgramada]] = defaultdict(list)
+    for s in (
+        SalidaProgramada.objects.filter(_rangos(o for o, _ in pares))
+        .only("id", "salida_programada", "llegada_programada", *CAMPOS_COPIA)
+        .order_by("salida_programada", "id")
+    ):
+        por_dia[timezone.localdate(s.salida_programada)].append(s)
+
+    existentes = set(
+        SalidaProgramada.objects.filter(_rangos(d for _, d in pares)).values_list("colectivo_id", "salida_programada")
+    )
+
+    vistos_origen: set[date] = set()
+    for origen, destino in pares:
+        salidas = por_dia.get(origen, [])
+        if not salidas:
+            if origen not in vistos_origen:
+                reporte.dias_sin_origen.append(origen)
+            vistos_origen.add(origen)
+            continue
+        vistos_origen.add(origen)
+
+        dias = (destino - origen).days
+        for s in salidas:
+            reporte.origenes += 1
+            nueva = desplazar(s.salida_programada, dias)
+            key = (s.colectivo_id, nueva)
+            if key in existentes:
+                reporte.omitidas.append(Omitida(s.pk, s.colectivo_id, nueva, "ya existe"))
+                continue
+            existentes.add(key)
+
+            obj = SalidaProgramada(
+                salida_programada=nueva,
+                llegada_programada=desplazar(s.llegada_programada, dias),
+                estado=SalidaProgramada.Estado.PROGRAMADA,
+            )
+            for campo in CAMPOS_COPIA:
+                setattr(obj, campo, getattr(s, campo))
+            reporte.creadas.append(obj)
+
+    if reporte.creadas:
+        SalidaProgramada.objects.bulk_create(reporte.creadas, batch_size=500)
+        vocabulario.registrar(p for obj in reporte.creadas for p in vocabulario.terminos_de(obj))
+        estado_unidad.actualizar({obj.colectivo_id for obj in reporte.creadas})
+        generaciones.bump(generaciones.SALIDAS)
+    return reporte
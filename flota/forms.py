@@ -1,10 +1,61 @@
 from __future__ import annotations
 
+from typing import Callable
+
 from django import forms
+from django.forms.utils import flatatt
+from django.utils.html import format_html
+from django.utils.safestring import mark_safe
 
 from .models import Colectivo, SalidaProgramada
 
 
+class OpcionesColectivo:
+    """Unidades para los <select> de un formset: una query y un HTML de <option> para todas las filas.
+
+    Con 80-120 salidas por día, armar un ModelChoiceField por fila cuesta una query y un render
+    completo del <select> por fila. Se arma una vez por request y se pasa por `form_kwargs`.
+    """
+
+    def __init__(self, etiqueta: Callable[[Colectivo], str] = str):
+        self.colectivos = {c.pk: c for c in Colectivo.objects.order_by("interno")}
+        self.choices = [(pk, etiqueta(c)) for pk, c in self.colectivos.items()]
+        self.html = "".join(format_html('<option value="{}">{}</option>', pk, label) for pk, label in self.choices)
+
+    def render(self, valor) -> str:
+        if valor in (None, ""):
+            return self.html
+        marca = f'<option value="{valor}">'
+        return self.html.replace(marca, f'<option value="{valor}" selected>', 1)
+
+
+class _SelectCompartido(forms.Select):
+    def __init__(self, opciones: OpcionesColectivo, attrs=None):
+        super().__init__(attrs)
+        self.opciones = opciones
+
+    def render(self, name, value, attrs=None, renderer=None):
+        attrs = self.build_attrs(self.attrs, attrs)
+        return mark_safe(format_html('<select name="{}"{}>', name, flatatt(attrs)) + self.opciones.render(value) + "</select>")
+
+
+class ColectivoCompartidoField(forms.ModelChoiceField):
+    """ModelChoiceField que valida y renderiza contra OpcionesColectivo (sin queries por fila)."""
+
+    def __init__(self, opciones: OpcionesColectivo, **kwargs):
+        kwargs.setdefault("empty_label", None)
+        super().__init__(queryset=Colectivo.objects.none(), widget=_SelectCompartido(opciones), **kwargs)
+        self.opciones = opciones
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            return self.opciones.colectivos[int(value)]
+        except (KeyError, TypeError, ValueError):
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+
+
 class ColectivoForm(forms.ModelForm):
     """
     Formulario de Colectivo (Unidad).
@@ -199,7 +250,51 @@ class SalidaProgramadaForm(forms.ModelForm):
                 w.attrs["class"] = (cls + " ti-input").strip()
 
 
-class SalidaProgramadaBulkForm(forms.ModelForm):
+class FormSetFilasCargadas(forms.BaseModelFormSet):
+    """ModelFormSet que resuelve el `id` oculto de cada fila contra el queryset ya cargado.
+
+    Por defecto cada fila valida su `id` con un queryset.get() propio: una query por fila al guardar.
+    """
+
+    def add_fields(self, form, index):
+        super().add_fields(form, index)
+        pk_name = self.model._meta.pk.name
+        original = form.fields.get(pk_name)
+        if isinstance(original, forms.ModelChoiceField):
+            form.fields[pk_name] = _FilaCargadaField(
+                self, original.queryset, initial=original.initial, required=False, widget=original.widget
+            )
+
+
+class _FilaCargadaField(forms.ModelChoiceField):
+    def __init__(self, formset: FormSetFilasCargadas, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.formset = formset
+
+    def to_python(self, value):
+        if value in self.empty_values:
+            return None
+        try:
+            obj = self.formset._existing_object(self.formset.model._meta.pk.to_python(value))
+        except forms.ValidationError:
+            obj = None
+        if obj is None:
+            raise forms.ValidationError(self.error_messages["invalid_choice"], code="invalid_choice")
+        return obj
+
+
+class ColectivoCompartidoFormMixin:
+    """Para ModelForms con ColectivoCompartidoField: la unidad ya se validó en memoria, así que
+    full_clean() no repite el exists() de la ForeignKey en cada fila."""
+
+    def _get_validation_exclusions(self):
+        exclude = super()._get_validation_exclusions()
+        if isinstance(self.fields.get("colectivo"), ColectivoCompartidoField):
+            exclude.add("colectivo")
+        return exclude
+
+
+class SalidaProgramadaBulkForm(ColectivoCompartidoFormMixin, forms.ModelForm):
     """Formulario compacto para editar el diagrama del dÃ­a en tabla (reemplazos rÃ¡pidos).
 
     En operaciÃ³n real, la mayorÃ­a de horarios/etiquetas/recorridos son fijos.
@@ -219,8 +314,12 @@ class SalidaProgramadaBulkForm(forms.ModelForm):
         ]
 
     def __init__(self, *args, **kwargs):
+        opciones_colectivo = kwargs.pop("opciones_colectivo", None)
         super().__init__(*args, **kwargs)
 
+        if opciones_colectivo is not None:
+            self.fields["colectivo"] = ColectivoCompartidoField(opciones_colectivo, label=self.fields["colectivo"].label)
+
         if "chofer" in self.fields:
             self.fields["chofer"].widget.attrs.setdefault("placeholder", "Nombre y apellido")
             self.fields["chofer"].widget.attrs.setdefault("list", "dl_choferes")
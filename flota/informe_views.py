@@ -9,7 +9,7 @@ Objetivo
 - Resumir en una sola pantalla el estado de las unidades:
   - Salidas próximas
   - Partes abiertos / en proceso (alertas)
-  - Vencimientos (VTV / matafuegos) para anticipar problemas
+  - Vencimientos (VTV / matafuegos / aceite / filtros) para anticipar problemas
   - Carga de choferes (conteo de salidas por chofer en el día)
 
 Notas
@@ -21,12 +21,11 @@ from collections import defaultdict
 from datetime import datetime, timedelta
 
 from django.contrib.auth.decorators import login_required
-from django.db.models import Count, Max, Q
 from django.shortcuts import render
 from django.utils import timezone
 
-from .models import Colectivo, SalidaProgramada
-from .partes_models import ParteDiario
+from . import estado_unidad, vencimientos
+from .models import EstadoUnidad, SalidaProgramada
 
 
 def _parse_day(value: str | None):
@@ -44,16 +43,6 @@ def _day_bounds(day):
     return start, end
 
 
-def _days_to(d):
-    if not d:
-        return None
-    today = timezone.localdate()
-    try:
-        return (d - today).days
-    except Exception:
-        return None
-
-
 @login_required
 def informe_flota(request):
     """
@@ -83,38 +72,14 @@ def informe_flota(request):
         .order_by("salida_programada", "colectivo__interno")
     )
 
-    # Partes abiertos/en proceso por unidad
-    partes_abiertos = (
-        ParteDiario.objects.filter(estado__in=[ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO])
-        .values("colectivo_id")
-        .annotate(
-            cant=Count("id"),
-            max_severidad=Max("severidad"),
-        )
-    )
-    partes_map = {p["colectivo_id"]: p for p in partes_abiertos}
-
-    # Próxima salida por unidad (en las próximas 48h, para contexto)
+    # Estado por unidad (próxima salida, partes, vencimientos): una query sobre EstadoUnidad
+    estado_unidad.vigentes()
     next48 = now + timedelta(hours=48)
-    prox_por_unidad = (
-        SalidaProgramada.objects.filter(salida_programada__gte=now, salida_programada__lte=next48)
-        .values("colectivo_id")
-        .annotate(next_dt=Max("salida_programada"))
-    )
-    # Nota: usamos Max en el queryset agregado; luego ajustamos con una búsqueda real por min.
-    # Para evitar dos queries por unidad, hacemos un segundo paso con un map por unidad:
-    prox_min_map = {}
-    qs = (
-        SalidaProgramada.objects.filter(salida_programada__gte=now, salida_programada__lte=next48)
-        .values("colectivo_id", "salida_programada")
-        .order_by("colectivo_id", "salida_programada")
+    estados = (
+        EstadoUnidad.objects.select_related("colectivo")
+        .filter(colectivo__is_active=True)
+        .order_by("colectivo__interno")
     )
-    for row in qs:
-        cid = row["colectivo_id"]
-        if cid not in prox_min_map:
-            prox_min_map[cid] = row["salida_programada"]
-
-    unidades = Colectivo.objects.filter(is_active=True).order_by("interno")
 
     # Carga por chofer (conteo simple)
     carga_chofer = defaultdict(int)
@@ -125,24 +90,30 @@ def informe_flota(request):
     carga_chofer_rows = [{"chofer": k, "salidas": v} for k, v in sorted(carga_chofer.items(), key=lambda x: (-x[1], x[0]))]
 
     rows = []
-    for u in unidades:
-        p = partes_map.get(u.id)
+    for e in estados:
         rows.append(
             {
-                "unidad": u,
-                "partes_cant": p["cant"] if p else 0,
-                "partes_sev": p["max_severidad"] if p else "",
-                "next_salida": prox_min_map.get(u.id),
-                "vtv_dias": _days_to(getattr(u, "revision_tecnica_vto", None)),
-                "matafuego_dias": _days_to(getattr(u, "matafuego_vto", None)),
+                "unidad": e.colectivo,
+                "partes_cant": e.partes_abiertos,
+                "partes_sev": e.severidad_max,
+                # Próxima salida en las próximas 48h (contexto)
+                "next_salida": e.proxima_salida if e.proxima_salida and e.proxima_salida <= next48 else None,
+                "vtv_dias": e.vtv_dias,
+                "matafuego_dias": e.matafuego_dias,
             }
         )
 
+    # Todo lo que vence pronto en la flota: rango sobre el índice Vencimiento
+    vencimientos_proximos = [vencimientos.describir(v) for v in vencimientos.proximos(dias=7)]
+
     ctx = {
         "fecha": day,
         "hours": horizon_hours,
         "salidas_proximas": salidas_proximas,
         "rows": rows,
         "carga_chofer": carga_chofer_rows,
+        "vencimientos_proximos": vencimientos_proximos,
+        "vencimientos_dias": 7,
+        "vencimientos_km": vencimientos.KM_POR_VENCER,
     }
     return render(request, "flota/informe_flota.html", ctx)
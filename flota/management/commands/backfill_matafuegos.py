@@ -2,7 +2,10 @@ from __future__ import annotations
 
 from django.core.management.base import BaseCommand
 from django.db import transaction
+from django.utils import timezone
 
+from core import generaciones
+from flota import estado_unidad, vencimientos
 from flota.models import Colectivo
 
 
@@ -57,13 +60,19 @@ class Command(BaseCommand):
             self.stdout.write(self.style.SUCCESS(f"DRY RUN: {changed} unidades serían actualizadas."))
             return
 
+        # bulk_update no dispara señales: lo que hacen los post_save de Colectivo va explícito
+        now = timezone.now()
+        for c in to_update:
+            c.updated_at = now
         with transaction.atomic():
-            for c in to_update:
-                c.save(update_fields=[
-                    "matafuego_1_vto",
-                    "matafuego_2_vto",
-                    "matafuego_vto",
-                    "matafuego_vencimiento_2",
-                ])
+            Colectivo.objects.bulk_update(
+                to_update,
+                ["matafuego_1_vto", "matafuego_2_vto", "matafuego_vto", "matafuego_vencimiento_2", "updated_at"],
+                batch_size=500,
+            )
+            vencimientos.sincronizar(to_update)
+            estado_unidad.actualizar([c.pk for c in to_update])
+            if to_update:
+                generaciones.bump(generaciones.FLOTA)
 
         self.stdout.write(self.style.SUCCESS(f"OK: {changed} unidades actualizadas."))
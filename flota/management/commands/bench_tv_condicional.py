@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+import time
+
+from django.contrib.auth import get_user_model
+from django.contrib.sessions.backends.base import SessionBase
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+
+
+class Command(BaseCommand):
+    help = (
+        "Mide cuánto ahorra el GET condicional (ETag/304) por ciclo de polling en las pantallas "
+        "de flota: bytes, CPU y queries de una respuesta completa vs. una 304."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--usuario", required=True, help="Usuario con permisos de flota (se usa su sesión simulada).")
+        parser.add_argument("--ciclos", type=int, default=20, help="Repeticiones por URL (default 20).")
+        parser.add_argument("--fecha", default="", help="YYYY-MM-DD opcional (se pasa como ?fecha=).")
+
+    def _get(self, user, url: str, etag: str | None):
+        headers = {"HTTP_IF_NONE_MATCH": etag} if etag else {}
+        request = RequestFactory().get(url, **headers)
+        request.user = user
+        request.session = SessionBase()
+        match = resolve(request.path)
+        response = match.func(request, *match.args, **match.kwargs)
+        if hasattr(response, "render"):
+            response = response.render()
+        return response
+
+    def _medir(self, user, url: str, etag: str | None, ciclos: int):
+        cpu = 0.0
+        queries = 0
+        size = 0
+        status = None
+        for _ in range(ciclos):
+            with CaptureQueriesContext(connection) as q:
+                t0 = time.process_time()
+                response = self._get(user, url, etag)
+                cpu += time.process_time() - t0
+            queries += len(q)
+            size = len(response.content)
+            status = response.status_code
+        return status, size, cpu / ciclos * 1000, queries / ciclos, response
+
+    def handle(self, *args, **opts):
+        User = get_user_model()
+        try:
+            user = User.objects.get(username=opts["usuario"])
+        except User.DoesNotExist:
+            raise CommandError(f"No existe el usuario {opts['usuario']!r}.")
+
+        ciclos = max(1, opts["ciclos"])
+        qs = f"?fecha={opts['fecha']}" if opts["fecha"] else ""
+        urls = [
+            reverse("flota:tv_taller") + "?partial=1" + (f"&fecha={opts['fecha']}" if opts["fecha"] else ""),
+            reverse("flota:tv_horarios") + qs,
+            reverse("flota:salida_dual") + qs,
+            reverse("flota:salida_diagrama_print") + qs,
+        ]
+
+        self.stdout.write(f"{'URL':<45} {'completa':>23} {'304':>23} {'ahorro':>17}")
+        for url in urls:
+            status, size, cpu, nq, response = self._medir(user, url, None, ciclos)
+            if status != 200:
+                self.stdout.write(self.style.WARNING(f"{url:<45} HTTP {status} (¿permisos?)"))
+                continue
+            etag = response.get("ETag")
+            if not etag:
+                self.stdout.write(self.style.WARNING(f"{url:<45} sin ETag"))
+                continue
+
+            status_c, size_c, cpu_c, nq_c, _ = self._medir(user, url, etag, ciclos)
+            if status_c != 304:
+                self.stdout.write(self.style.WARNING(f"{url:<45} el ETag cambió entre ciclos (HTTP {status_c})"))
+                continue
+
+            self.stdout.write(
+                f"{url:<45} "
+                f"{size:>7}B {cpu:>6.1f}ms {nq:>4.0f}q  "
+                f"{size_c:>7}B {cpu_c:>6.1f}ms {nq_c:>4.0f}q  "
+                f"{size - size_c:>7}B {cpu - cpu_c:>6.1f}ms"
+            )
+
+        self.stdout.write(self.style.SUCCESS(f"OK: promedio de {ciclos} ciclos por URL (CPU = process_time)."))
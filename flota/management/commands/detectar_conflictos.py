@@ -0,0 +1,54 @@
+from __future__ import annotations
+
+import json
+import time
+from datetime import date, timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from flota import conflictos
+
+
+class Command(BaseCommand):
+    help = (
+        "Lista unidades y choferes con salidas superpuestas en un rango (por defecto, el mes actual). "
+        "Incluye las salidas que arman los patrones. Sale con código 1 si encuentra conflictos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--desde", default="", help="YYYY-MM-DD (default: primer día del mes actual).")
+        parser.add_argument("--hasta", default="", help="YYYY-MM-DD inclusive (default: último día de ese mes).")
+        parser.add_argument("--duracion", type=int, default=None, help="Minutos asumidos si la salida no tiene llegada.")
+        parser.add_argument("--json", action="store_true", help="Salida en JSON.")
+
+    def handle(self, *args, **opts):
+        try:
+            desde = date.fromisoformat(opts["desde"]) if opts["desde"] else timezone.localdate().replace(day=1)
+            if opts["hasta"]:
+                hasta = date.fromisoformat(opts["hasta"])
+            else:
+                hasta = (desde.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
+        except ValueError as e:
+            raise CommandError(f"Fecha inválida: {e}")
+        if hasta < desde:
+            raise CommandError("--hasta es anterior a --desde.")
+
+        duracion = timedelta(minutes=opts["duracion"]) if opts["duracion"] else None
+        t0 = time.perf_counter()
+        encontrados = conflictos.en_rango(desde, hasta, duracion)
+        elapsed = time.perf_counter() - t0
+
+        if opts["json"]:
+            self.stdout.write(json.dumps([c.as_dict() for c in encontrados], ensure_ascii=False, indent=2))
+        else:
+            for c in encontrados:
+                a = timezone.localtime(c.a.salida_programada).strftime("%d/%m %H:%M")
+                b = timezone.localtime(c.b.salida_programada).strftime("%d/%m %H:%M")
+                self.stdout.write(f"{c.recurso:<9} {c.clave:<30} {a} ({c.a.pk or 'patrón'}) <-> {b} ({c.b.pk or 'patrón'})")
+
+        resumen = f"{len(encontrados)} conflictos entre {desde} y {hasta} ({elapsed * 1000:.0f} ms)."
+        if encontrados:
+            # Código de salida 1 para cron / CI (manage.py imprime el resumen en stderr)
+            raise CommandError(resumen, returncode=1)
+        self.stderr.write(self.style.SUCCESS(f"OK: {resumen}"))
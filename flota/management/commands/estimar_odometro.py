@@ -0,0 +1,31 @@
+from __future__ import annotations
+
+import time
+
+from django.core.management.base import BaseCommand
+
+from flota import odometro, vencimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Estima km/día por unidad con las lecturas de odómetro de la ventana (toda la flota en una pasada) "
+        "y rearma Vencimiento con las fechas proyectadas de aceite y filtros. Tarea nocturna."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--ventana",
+            type=int,
+            default=odometro.VENTANA_DIAS,
+            help=f"Días de lecturas a usar (default {odometro.VENTANA_DIAS}).",
+        )
+
+    def handle(self, *args, **opts):
+        t0 = time.perf_counter()
+        n = odometro.estimar(ventana_dias=opts["ventana"])
+        v = vencimientos.reconstruir()
+        elapsed = time.perf_counter() - t0
+        self.stdout.write(
+            self.style.SUCCESS(f"OK: {n} unidades estimadas, {v} vencimientos rearmados ({elapsed * 1000:.0f} ms).")
+        )
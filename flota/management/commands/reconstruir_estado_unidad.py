@@ -0,0 +1,17 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from flota import estado_unidad
+
+
+class Command(BaseCommand):
+    help = (
+        "Rearma EstadoUnidad (próxima salida, partes abiertos y vencimientos por unidad) desde cero. "
+        "Normalmente se mantiene solo con las señales; correr como tarea nocturna y tras cargas "
+        "masivas por SQL o comandos que borran salidas."
+    )
+
+    def handle(self, *args, **opts):
+        n = estado_unidad.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"OK: estado reconstruido ({n} unidades)."))
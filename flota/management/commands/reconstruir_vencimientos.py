@@ -0,0 +1,16 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from flota import vencimientos
+
+
+class Command(BaseCommand):
+    help = (
+        "Rearma el índice Vencimiento (VTV, matafuegos, aceite, filtros) desde los campos de Colectivo. "
+        "Normalmente se mantiene solo al guardar; correr tras cargas masivas por SQL."
+    )
+
+    def handle(self, *args, **opts):
+        n = vencimientos.reconstruir()
+        self.stdout.write(self.style.SUCCESS(f"OK: índice reconstruido ({n} vencimientos)."))
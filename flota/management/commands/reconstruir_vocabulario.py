@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from flota import vocabulario
+
+
+class Command(BaseCommand):
+    help = (
+        "Rearma el vocabulario de autocompletado (choferes, secciones, recorridos, etiquetas, regresos) "
+        "desde todas las salidas programadas. Normalmente se mantiene solo al guardar; usar tras "
+        "cargas masivas por SQL o si el ranking quedó raro."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk-size", type=int, default=5000, help="Filas por tanda al leer salidas (default 5000).")
+
+    def handle(self, *args, **opts):
+        n = vocabulario.reconstruir(chunk_size=max(100, opts["chunk_size"]))
+        self.stdout.write(self.style.SUCCESS(f"OK: vocabulario reconstruido ({n} términos)."))
@@ -0,0 +1,25 @@
+from django.db import migrations, models
+from django.db.models import F
+import django.utils.timezone
+
+
+def copiar_created_at(apps, schema_editor):
+    ParteDiario = apps.get_model("flota", "ParteDiario")
+    ParteDiario.objects.update(updated_at=F("created_at"))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0016_rename_flota_chofer_ap_nom_idx_flota_chofe_apellid_c748e7_idx_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='partediario',
+            name='updated_at',
+            field=models.DateTimeField(auto_now=True, default=django.utils.timezone.now),
+            preserve_default=False,
+        ),
+        migrations.RunPython(copiar_created_at, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,68 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:27
+
+from datetime import datetime, timezone
+
+from django.db import migrations, models
+
+CAMPOS = {
+    "chofer": "CHOFER",
+    "seccion": "SECCION",
+    "recorrido": "RECORRIDO",
+    "salida_label": "ETIQUETA",
+    "regreso": "REGRESO",
+}
+EPOCA = datetime(2024, 1, 1, tzinfo=timezone.utc)
+VIDA_MEDIA_SEG = 30 * 86400
+
+
+def backfill_vocabulario(apps, schema_editor):
+    # Misma cuenta que flota.vocabulario.reconstruir, con los modelos históricos
+    SalidaProgramada = apps.get_model("flota", "SalidaProgramada")
+    TerminoVocabulario = apps.get_model("flota", "TerminoVocabulario")
+
+    acumulado = {}
+    for created_at, *valores in SalidaProgramada.objects.values_list("created_at", *CAMPOS).iterator(chunk_size=5000):
+        w = 2.0 ** ((created_at - EPOCA).total_seconds() / VIDA_MEDIA_SEG)
+        for campo, valor in zip(CAMPOS, valores):
+            termino = (valor or "").strip()[:120]
+            if not termino:
+                continue
+            acc = acumulado.setdefault((CAMPOS[campo], termino), [0, created_at, 0.0])
+            acc[0] += 1
+            acc[1] = max(acc[1], created_at)
+            acc[2] += w
+
+    TerminoVocabulario.objects.bulk_create(
+        [
+            TerminoVocabulario(tipo=tipo, termino=termino, frecuencia=f, ultimo_uso=u, puntaje=p)
+            for (tipo, termino), (f, u, p) in acumulado.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0017_partediario_updated_at'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TerminoVocabulario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('CHOFER', 'Chofer'), ('SECCION', 'Sección'), ('RECORRIDO', 'Recorrido'), ('ETIQUETA', 'Etiqueta de salida'), ('REGRESO', 'Regreso')], max_length=10)),
+                ('termino', models.CharField(max_length=120)),
+                ('frecuencia', models.PositiveIntegerField(default=0)),
+                ('ultimo_uso', models.DateTimeField()),
+                ('puntaje', models.FloatField(default=0)),
+            ],
+            options={
+                'ordering': ['tipo', '-puntaje', 'termino'],
+                'indexes': [models.Index(fields=['tipo', '-puntaje'], name='idx_vocabulario_tipo_puntaje')],
+                'constraints': [models.UniqueConstraint(fields=('tipo', 'termino'), name='uq_vocabulario_tipo_termino')],
+            },
+        ),
+        migrations.RunPython(backfill_vocabulario, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,78 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:33
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0018_vocabulario'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Feriado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateField(unique=True, verbose_name='fecha')),
+                ('descripcion', models.CharField(blank=True, default='', max_length=120, verbose_name='descripción')),
+            ],
+            options={
+                'ordering': ['fecha'],
+            },
+        ),
+        migrations.AddField(
+            model_name='salidaprogramada',
+            name='patron_fecha',
+            field=models.DateField(blank=True, null=True, verbose_name='día del patrón'),
+        ),
+        migrations.CreateModel(
+            name='PatronDiagrama',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado el')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='actualizado el')),
+                ('nombre', models.CharField(max_length=80, verbose_name='nombre')),
+                ('tipo_dia', models.CharField(choices=[('NORMAL', 'Lunes a sábado'), ('DOMINGO', 'Domingo'), ('FERIADO', 'Feriado')], default='NORMAL', max_length=10, verbose_name='tipo de día')),
+                ('vigente_desde', models.DateField(verbose_name='vigente desde')),
+                ('vigente_hasta', models.DateField(blank=True, null=True, verbose_name='vigente hasta')),
+                ('is_active', models.BooleanField(default=True, verbose_name='activo')),
+            ],
+            options={
+                'ordering': ['tipo_dia', '-vigente_desde', 'id'],
+                'indexes': [models.Index(fields=['tipo_dia', 'vigente_desde'], name='idx_patron_tipo_desde')],
+            },
+        ),
+        migrations.CreateModel(
+            name='PatronDiagramaLinea',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado el')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='actualizado el')),
+                ('hora', models.TimeField(verbose_name='hora de salida')),
+                ('llegada', models.TimeField(blank=True, help_text='Si es menor que la hora de salida, se toma al día siguiente.', null=True, verbose_name='hora de llegada')),
+                ('tipo', models.CharField(choices=[('NORMAL', 'Normal'), ('ESPECIAL', 'Especial')], default='NORMAL', max_length=10)),
+                ('seccion', models.CharField(blank=True, default='', max_length=80, verbose_name='sección')),
+                ('salida_label', models.CharField(blank=True, default='', max_length=50, verbose_name='etiqueta de salida')),
+                ('regreso', models.CharField(blank=True, default='', max_length=40, verbose_name='regreso')),
+                ('chofer', models.CharField(blank=True, default='', max_length=80, verbose_name='chofer')),
+                ('recorrido', models.CharField(blank=True, default='', max_length=120, verbose_name='recorrido')),
+                ('nota', models.CharField(blank=True, default='', max_length=160, verbose_name='nota')),
+                ('colectivo', models.ForeignKey(on_delete=django.db.models.deletion.PROTECT, related_name='lineas_patron', to='flota.colectivo')),
+                ('patron', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lineas', to='flota.patrondiagrama')),
+            ],
+            options={
+                'ordering': ['patron', 'hora', 'id'],
+            },
+        ),
+        migrations.AddField(
+            model_name='salidaprogramada',
+            name='patron_linea',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='excepciones', to='flota.patrondiagramalinea'),
+        ),
+        migrations.AddIndex(
+            model_name='salidaprogramada',
+            index=models.Index(fields=['patron_fecha', 'patron_linea'], name='idx_salida_prog_patron'),
+        ),
+    ]
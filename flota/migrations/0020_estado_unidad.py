@@ -0,0 +1,72 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:43
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.utils import timezone
+
+SEVERIDADES = {"BAJA": 1, "MEDIA": 2, "ALTA": 3, "CRITICA": 4}
+
+
+def backfill_estado_unidad(apps, schema_editor):
+    # Misma cuenta que flota.estado_unidad.calcular, con los modelos históricos (flota chica: por unidad)
+    Colectivo = apps.get_model("flota", "Colectivo")
+    SalidaProgramada = apps.get_model("flota", "SalidaProgramada")
+    ParteDiario = apps.get_model("flota", "ParteDiario")
+    EstadoUnidad = apps.get_model("flota", "EstadoUnidad")
+
+    now = timezone.now()
+    filas = []
+    for c in Colectivo.objects.all():
+        s = (
+            SalidaProgramada.objects.filter(colectivo_id=c.pk, salida_programada__gte=now)
+            .exclude(estado="CANCELADA")
+            .order_by("salida_programada", "id")
+            .first()
+        )
+        partes = list(
+            ParteDiario.objects.filter(colectivo_id=c.pk, estado__in=["ABIERTO", "EN_PROCESO"]).order_by("-fecha_evento", "-id")
+        )
+        matafuegos = [d for d in (c.matafuego_1_vto or c.matafuego_vto, c.matafuego_2_vto or c.matafuego_vencimiento_2) if d]
+        filas.append(
+            EstadoUnidad(
+                colectivo_id=c.pk,
+                proxima_salida=s.salida_programada if s else None,
+                proxima_seccion=((s.seccion or "").strip()[:80]) if s else "",
+                proxima_label=((s.salida_label or "").strip()[:50]) if s else "",
+                partes_abiertos=len(partes),
+                severidad_rank=max((SEVERIDADES.get(p.severidad, 0) for p in partes), default=0),
+                ultimo_parte_id=partes[0].pk if partes else None,
+                vtv_vto=c.revision_tecnica_vto,
+                matafuego_vto=min(matafuegos) if matafuegos else None,
+            )
+        )
+    EstadoUnidad.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0019_patrones'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstadoUnidad',
+            fields=[
+                ('colectivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estado_unidad', serialize=False, to='flota.colectivo')),
+                ('proxima_salida', models.DateTimeField(blank=True, null=True)),
+                ('proxima_seccion', models.CharField(blank=True, default='', max_length=80)),
+                ('proxima_label', models.CharField(blank=True, default='', max_length=50)),
+                ('partes_abiertos', models.PositiveIntegerField(default=0)),
+                ('severidad_rank', models.PositiveSmallIntegerField(default=0)),
+                ('vtv_vto', models.DateField(blank=True, null=True)),
+                ('matafuego_vto', models.DateField(blank=True, null=True)),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('ultimo_parte', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='+', to='flota.partediario')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['proxima_salida'], name='idx_estado_unidad_prox'), models.Index(fields=['partes_abiertos'], name='idx_estado_unidad_partes')],
+            },
+        ),
+        migrations.RunPython(backfill_estado_unidad, migrations.RunPython.noop),
+    ]
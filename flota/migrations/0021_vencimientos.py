@@ -0,0 +1,67 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:48
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def backfill_vencimientos(apps, schema_editor):
+    # Misma derivación que flota.vencimientos.filas, con los modelos históricos
+    Colectivo = apps.get_model("flota", "Colectivo")
+    Vencimiento = apps.get_model("flota", "Vencimiento")
+
+    filas = []
+    for c in Colectivo.objects.all().iterator():
+        for tipo, campos in (
+            ("VTV", ("revision_tecnica_vto",)),
+            ("MATAFUEGO_1", ("matafuego_1_vto", "matafuego_vto")),
+            ("MATAFUEGO_2", ("matafuego_2_vto", "matafuego_vencimiento_2")),
+        ):
+            campo = next((f for f in campos if getattr(c, f)), None)
+            if campo:
+                filas.append(Vencimiento(colectivo_id=c.pk, tipo=tipo, fecha=getattr(c, campo), campo=campo))
+        for tipo, prefijo in (("ACEITE", "aceite"), ("FILTROS", "filtros")):
+            ultimo = getattr(c, f"{prefijo}_ultimo_cambio_km")
+            intervalo = getattr(c, f"{prefijo}_intervalo_km")
+            if ultimo and intervalo:
+                km = ultimo + intervalo
+                filas.append(
+                    Vencimiento(
+                        colectivo_id=c.pk,
+                        tipo=tipo,
+                        km=km,
+                        km_restantes=(km - c.odometro_km) if c.odometro_km else None,
+                        campo=f"{prefijo}_ultimo_cambio_km",
+                    )
+                )
+    Vencimiento.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0020_estado_unidad'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Vencimiento',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('tipo', models.CharField(choices=[('VTV', 'VTV'), ('MATAFUEGO_1', 'Matafuego 1'), ('MATAFUEGO_2', 'Matafuego 2'), ('ACEITE', 'Aceite'), ('FILTROS', 'Filtros')], max_length=12, verbose_name='tipo')),
+                ('fecha', models.DateField(blank=True, null=True, verbose_name='vence')),
+                ('km', models.PositiveIntegerField(blank=True, null=True, verbose_name='vence (km)')),
+                ('km_restantes', models.IntegerField(blank=True, null=True, verbose_name='km restantes')),
+                ('campo', models.CharField(max_length=40, verbose_name='campo origen')),
+                ('actualizado', models.DateTimeField(auto_now=True)),
+                ('colectivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='vencimientos', to='flota.colectivo')),
+            ],
+            options={
+                'verbose_name': 'vencimiento',
+                'verbose_name_plural': 'vencimientos',
+                'ordering': ['fecha', 'km_restantes'],
+                'indexes': [models.Index(fields=['fecha'], name='idx_vencimiento_fecha'), models.Index(fields=['tipo', 'fecha'], name='idx_vencimiento_tipo_fecha'), models.Index(fields=['km_restantes'], name='idx_vencimiento_km_rest')],
+                'constraints': [models.UniqueConstraint(fields=('colectivo', 'tipo'), name='uniq_vencimiento_colectivo_tipo')],
+            },
+        ),
+        migrations.RunPython(backfill_vencimientos, migrations.RunPython.noop),
+    ]
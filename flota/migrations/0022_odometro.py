@@ -0,0 +1,79 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:52
+
+from datetime import datetime, time
+
+import django.db.models.deletion
+import django.utils.timezone
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def backfill_lecturas(apps, schema_editor):
+    # La historia que ya estaba en los partes (odómetro o km de mantenimiento) y el odómetro cargado a mano
+    ParteDiario = apps.get_model("flota", "ParteDiario")
+    Colectivo = apps.get_model("flota", "Colectivo")
+    OdometroLectura = apps.get_model("flota", "OdometroLectura")
+
+    filas = []
+    vistos = set()
+    for p in ParteDiario.objects.exclude(odometro_km__isnull=True, km_mantenimiento__isnull=True).iterator():
+        km = p.odometro_km or p.km_mantenimiento
+        if not km:
+            continue
+        origen = "IMPORTACION" if (p.observaciones or "").startswith("IMPORT_XLSX") else "PARTE"
+        filas.append(OdometroLectura(colectivo_id=p.colectivo_id, fecha=p.fecha_evento, km=km, origen=origen, parte_id=p.pk))
+        vistos.add((p.colectivo_id, km))
+    for c in Colectivo.objects.filter(odometro_km__isnull=False).iterator():
+        if (c.pk, c.odometro_km) in vistos:
+            continue
+        if c.odometro_fecha:
+            fecha = timezone.make_aware(datetime.combine(c.odometro_fecha, time(12)))
+        else:
+            fecha = c.updated_at
+        filas.append(OdometroLectura(colectivo_id=c.pk, fecha=fecha, km=c.odometro_km, origen="MANUAL"))
+    OdometroLectura.objects.bulk_create(filas, batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0021_vencimientos'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='EstimacionOdometro',
+            fields=[
+                ('colectivo', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='estimacion_odometro', serialize=False, to='flota.colectivo')),
+                ('km_dia', models.FloatField(verbose_name='km por día')),
+                ('km_base', models.PositiveIntegerField(verbose_name='km estimado')),
+                ('fecha_base', models.DateField(verbose_name='fecha del cálculo')),
+                ('muestras', models.PositiveIntegerField(verbose_name='lecturas usadas')),
+                ('ultima_lectura', models.DateTimeField(verbose_name='última lectura')),
+                ('calculado', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'estimación de odómetro',
+                'verbose_name_plural': 'estimaciones de odómetro',
+            },
+        ),
+        migrations.CreateModel(
+            name='OdometroLectura',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('fecha', models.DateTimeField(default=django.utils.timezone.now, verbose_name='fecha')),
+                ('km', models.PositiveIntegerField(verbose_name='km')),
+                ('origen', models.CharField(choices=[('PARTE', 'Parte diario'), ('IMPORTACION', 'Importación'), ('MANUAL', 'Carga manual')], default='PARTE', max_length=12, verbose_name='origen')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('colectivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='lecturas_odometro', to='flota.colectivo')),
+                ('parte', models.OneToOneField(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, related_name='lectura_odometro', to='flota.partediario')),
+            ],
+            options={
+                'verbose_name': 'lectura de odómetro',
+                'verbose_name_plural': 'lecturas de odómetro',
+                'ordering': ['colectivo', '-fecha'],
+                'indexes': [models.Index(fields=['colectivo', 'fecha'], name='idx_odometro_colectivo_fecha'), models.Index(fields=['fecha'], name='idx_odometro_fecha')],
+            },
+        ),
+        migrations.RunPython(backfill_lecturas, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0022_odometro'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='partediario',
+            index=models.Index(fields=['fecha_evento', 'id'], name='idx_parte_fecha_id'),
+        ),
+    ]
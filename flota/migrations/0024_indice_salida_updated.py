@@ -0,0 +1,17 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0023_indices_cursor'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='salidaprogramada',
+            index=models.Index(fields=['salida_programada', 'updated_at'], name='idx_salida_prog_updated'),
+        ),
+    ]
@@ -318,18 +318,57 @@ class SalidaProgramada(TimeStampedModel):
     recorrido = models.CharField("recorrido", max_length=120, blank=True, default="")
     nota = models.CharField("nota", max_length=160, blank=True, default="")
 
+    # Excepción a un patrón (flota.patrones): reemplaza la salida virtual de esa línea ese día
+    patron_linea = models.ForeignKey(
+        "flota.PatronDiagramaLinea",
+        on_delete=models.SET_NULL,
+        null=True,
+        blank=True,
+        related_name="excepciones",
+    )
+    patron_fecha = models.DateField("día del patrón", null=True, blank=True)
+
+    # Campos de texto que alimentan el autocompletado (flota.vocabulario)
+    CAMPOS_VOCABULARIO = ("chofer", "seccion", "recorrido", "salida_label", "regreso")
+
     class Meta:
         ordering = ["salida_programada", "id"]
         indexes = [
             models.Index(fields=["salida_programada"], name="idx_salida_prog_fecha"),
+            # Firma del ETag (flota.condicional): count + max(updated_at) del día sin leer la tabla
+            models.Index(fields=["salida_programada", "updated_at"], name="idx_salida_prog_updated"),
             models.Index(fields=["seccion", "salida_programada"], name="idx_salida_prog_seccion"),
             models.Index(fields=["colectivo", "salida_programada"], name="idx_salida_prog_colectivo"),
+            models.Index(fields=["patron_fecha", "patron_linea"], name="idx_salida_prog_patron"),
         ]
 
     def __str__(self) -> str:
         return f"Salida {self.id} - {self.colectivo_id} - {self.salida_programada:%Y-%m-%d %H:%M}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        # Valores leídos: al guardar, el vocabulario sólo cuenta lo que cambió
+        obj._vocabulario_inicial = {f: obj.__dict__[f] for f in cls.CAMPOS_VOCABULARIO if f in obj.__dict__}
+        # Si cambia de unidad, flota.estado_unidad recalcula también la anterior
+        obj._colectivo_id_inicial = obj.__dict__.get("colectivo_id")
+        return obj
+
 
 
 from .choferes_models import Chofer  # noqa: F401
 
+
+from .vocabulario_models import TerminoVocabulario  # noqa: F401
+
+
+from .patrones_models import Feriado, PatronDiagrama, PatronDiagramaLinea  # noqa: F401
+
+
+from .estado_models import EstadoUnidad  # noqa: F401
+
+
+from .vencimientos_models import Vencimiento  # noqa: F401
+
+
+from .odometro_models import EstimacionOdometro, OdometroLectura  # noqa: F401
@@ -0,0 +1,154 @@
+from __future__ import annotations
+
+"""
+flota.odometro
+
+Serie de lecturas de odómetro (OdometroLectura) y estimación de km/día por unidad.
+
+- Las lecturas salen de los partes (odómetro, o km de mantenimiento si no hay), de los imports
+  XLSX (`_origen_odometro` en la instancia) y de la edición manual del odómetro del colectivo.
+- `estimar()` recalcula en una pasada toda la flota: una query para las lecturas de la ventana,
+  el cálculo en memoria y un upsert de EstimacionOdometro. Lo corre `estimar_odometro` (nocturno),
+  que después rearma Vencimiento para proyectar las fechas de aceite y filtros.
+
+Estimador: Theil-Sen (mediana de las pendientes entre todos los pares de lecturas separadas por
+al menos `MIN_DIAS_PAR`). Aguanta lecturas mal tipeadas o cargadas en otra unidad sin que una
+sola mueva el resultado, cosa que un promedio o el último tramo no hacen.
+"""
+
+from dataclasses import dataclass
+from datetime import datetime, time, timedelta
+from itertools import groupby
+from statistics import median
+
+from django.utils import timezone
+
+from core import generaciones
+
+from .models import Colectivo
+from .odometro_models import EstimacionOdometro, OdometroLectura
+from .partes_models import ParteDiario
+
+VENTANA_DIAS = 90
+MIN_LECTURAS = 3
+MIN_DIAS_PAR = 0.5
+# Más que esto no es un colectivo: pendiente descartada
+MAX_KM_DIA = 2000
+
+
+@dataclass(frozen=True)
+class Ajuste:
+    km_dia: float
+    km_base: int
+    muestras: int
+    ultima_lectura: datetime
+
+
+def ajustar(puntos: list[tuple[datetime, int]], base: datetime) -> Ajuste | None:
+    """Theil-Sen sobre (fecha, km) ordenados por fecha. None si no alcanza para estimar."""
+
+    if len(puntos) < MIN_LECTURAS:
+        return None
+    t0 = puntos[0][0]
+    xs = [(f - t0).total_seconds() / 86400 for f, _ in puntos]
+    ys = [km for _, km in puntos]
+
+    pendientes = []
+    for i in range(len(xs)):
+        for j in range(i + 1, len(xs)):
+            dx = xs[j] - xs[i]
+            if dx >= MIN_DIAS_PAR:
+                p = (ys[j] - ys[i]) / dx
+                if abs(p) <= MAX_KM_DIA:
+                    pendientes.append(p)
+    if not pendientes:
+        return None
+
+    km_dia = max(0.0, median(pendientes))
+    ordenada = median(y - km_dia * x for x, y in zip(xs, ys))
+    x_base = (base - t0).total_seconds() / 86400
+    return Ajuste(
+        km_dia=km_dia,
+        km_base=max(0, int(round(ordenada + km_dia * x_base))),
+        muestras=len(puntos),
+        ultima_lectura=puntos[-1][0],
+    )
+
+
+def estimar(ventana_dias: int = VENTANA_DIAS, hoy=None) -> int:
+    """Recalcula EstimacionOdometro de toda la flota en una pasada. Devuelve las unidades estimadas."""
+
+    hoy = hoy or timezone.localdate()
+    base = timezone.make_aware(datetime.combine(hoy, time.min))
+    desde = base - timedelta(days=ventana_dias)
+
+    lecturas = (
+        OdometroLectura.objects.filter(fecha__gte=desde, fecha__lt=base + timedelta(days=1))
+        .order_by("colectivo_id", "fecha", "id")
+        .values_list("colectivo_id", "fecha", "km")
+    )
+    filas = []
+    for colectivo_id, grupo in groupby(lecturas.iterator(chunk_size=2000), key=lambda r: r[0]):
+        ajuste = ajustar([(f, km) for _, f, km in grupo], base)
+        if ajuste:
+            filas.append(
+                EstimacionOdometro(
+                    colectivo_id=colectivo_id,
+                    km_dia=ajuste.km_dia,
+                    km_base=ajuste.km_base,
+                    fecha_base=hoy,
+                    muestras=ajuste.muestras,
+                    ultima_lectura=ajuste.ultima_lectura,
+                )
+            )
+
+    EstimacionOdometro.objects.exclude(colectivo_id__in=[e.colectivo_id for e in filas]).delete()
+    if filas:
+        EstimacionOdometro.objects.bulk_create(
+            filas,
+            update_conflicts=True,
+            unique_fields=["colectivo"],
+            update_fields=["km_dia", "km_base", "fecha_base", "muestras", "ultima_lectura", "calculado"],
+            batch_size=500,
+        )
+    # bulk_create / delete no disparan señales: el dashboard cachea por generación de flota
+    generaciones.bump(generaciones.FLOTA)
+    return len(filas)
+
+
+# ---------------------------------------------------------------------
+# Señales (conectadas en FlotaConfig.ready)
+# ---------------------------------------------------------------------
+def parte_guardado(sender, instance: ParteDiario, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    km = instance.odometro_km or instance.km_mantenimiento
+    if not km:
+        OdometroLectura.objects.filter(parte=instance).delete()
+        return
+    OdometroLectura.objects.update_or_create(
+        parte=instance,
+        defaults={"colectivo_id": instance.colectivo_id, "fecha": instance.fecha_evento, "km": km},
+        create_defaults={
+            "colectivo_id": instance.colectivo_id,
+            "fecha": instance.fecha_evento,
+            "km": km,
+            "origen": getattr(instance, "_origen_odometro", OdometroLectura.Origen.PARTE),
+        },
+    )
+
+
+def colectivo_guardado(sender, instance: Colectivo, raw: bool = False, **kwargs) -> None:
+    # Edición manual del odómetro: se registra si ese km todavía no está en la serie
+    if raw or not instance.odometro_km:
+        return
+    if OdometroLectura.objects.filter(colectivo=instance, km=instance.odometro_km).exists():
+        return
+    hoy = timezone.localdate()
+    if instance.odometro_fecha and instance.odometro_fecha != hoy:
+        fecha = timezone.make_aware(datetime.combine(instance.odometro_fecha, time(12)))
+    else:
+        fecha = timezone.now()
+    OdometroLectura.objects.create(
+        colectivo=instance, fecha=fecha, km=instance.odometro_km, origen=OdometroLectura.Origen.MANUAL
+    )
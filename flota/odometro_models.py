@@ -0,0 +1,79 @@
+from __future__ import annotations
+
+from datetime import timedelta
+import math
+
+from django.db import models
+from django.utils import timezone
+
+
+class OdometroLectura(models.Model):
+    """Serie de lecturas de odómetro por unidad (ver flota.odometro).
+
+    Se alimenta de los partes (odómetro o km de mantenimiento), de los imports XLSX y de la
+    edición manual del odómetro en el colectivo. Un parte aporta a lo sumo una lectura.
+    """
+
+    class Origen(models.TextChoices):
+        PARTE = "PARTE", "Parte diario"
+        IMPORTACION = "IMPORTACION", "Importación"
+        MANUAL = "MANUAL", "Carga manual"
+
+    colectivo = models.ForeignKey("flota.Colectivo", on_delete=models.CASCADE, related_name="lecturas_odometro")
+    fecha = models.DateTimeField("fecha", default=timezone.now)
+    km = models.PositiveIntegerField("km")
+    origen = models.CharField("origen", max_length=12, choices=Origen.choices, default=Origen.PARTE)
+    parte = models.OneToOneField(
+        "flota.ParteDiario",
+        on_delete=models.CASCADE,
+        null=True,
+        blank=True,
+        related_name="lectura_odometro",
+    )
+    created_at = models.DateTimeField(auto_now_add=True)
+
+    class Meta:
+        verbose_name = "lectura de odómetro"
+        verbose_name_plural = "lecturas de odómetro"
+        ordering = ["colectivo", "-fecha"]
+        indexes = [
+            models.Index(fields=["colectivo", "fecha"], name="idx_odometro_colectivo_fecha"),
+            models.Index(fields=["fecha"], name="idx_odometro_fecha"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.colectivo_id}: {self.km} km ({self.fecha:%d/%m/%Y})"
+
+
+class EstimacionOdometro(models.Model):
+    """Km/día estimado por unidad y km estimado a `fecha_base`. Lo recalcula `estimar_odometro` (nocturno)."""
+
+    colectivo = models.OneToOneField(
+        "flota.Colectivo",
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name="estimacion_odometro",
+    )
+    km_dia = models.FloatField("km por día")
+    km_base = models.PositiveIntegerField("km estimado")
+    fecha_base = models.DateField("fecha del cálculo")
+    muestras = models.PositiveIntegerField("lecturas usadas")
+    ultima_lectura = models.DateTimeField("última lectura")
+    calculado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "estimación de odómetro"
+        verbose_name_plural = "estimaciones de odómetro"
+
+    def __str__(self) -> str:
+        return f"{self.colectivo_id}: {self.km_dia:.0f} km/día"
+
+    def km_en(self, dia) -> int:
+        return int(round(self.km_base + self.km_dia * (dia - self.fecha_base).days))
+
+    def fecha_para(self, km: int):
+        """Día en que se llega a `km` al ritmo estimado (pasado si ya se superó); None si no avanza."""
+
+        if self.km_dia <= 0:
+            return None
+        return self.fecha_base + timedelta(days=math.ceil((km - self.km_base) / self.km_dia))
@@ -73,17 +73,28 @@ class ParteDiario(models.Model):
     combustible_ruta_detalle = models.TextField("combustible en ruta (detalle)", blank=True, default="")
 
     created_at = models.DateTimeField(auto_now_add=True)
+    # Para el ETag de las pantallas TV (flota.condicional)
+    updated_at = models.DateTimeField(auto_now=True)
 
     class Meta:
         ordering = ["-fecha_evento", "-id"]
         indexes = [
             models.Index(fields=["colectivo", "fecha_evento"], name="idx_parte_colectivo_fecha"),
             models.Index(fields=["tipo", "estado"], name="idx_parte_tipo_estado"),
+            # Listado paginado por cursor (core.paginacion)
+            models.Index(fields=["fecha_evento", "id"], name="idx_parte_fecha_id"),
         ]
 
     def __str__(self) -> str:
         return f"Parte {self.id} - {self.colectivo_id} - {self.tipo}"
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        obj = super().from_db(db, field_names, values)
+        # Si cambia de unidad, flota.estado_unidad recalcula también la anterior
+        obj._colectivo_id_inicial = obj.__dict__.get("colectivo_id")
+        return obj
+
     @property
     def resumen(self) -> str:
         txt = (self.descripcion or "").strip().replace("\n", " ")
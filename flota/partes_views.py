@@ -13,7 +13,11 @@ from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.generic import ListView, CreateView, DetailView
 
-from .models import ParteDiario, ParteDiarioAdjunto, Colectivo, SalidaProgramada
+from core.paginacion import KeysetPaginationMixin
+
+from . import estado_unidad
+from .condicional import etag_flota
+from .models import EstadoUnidad, ParteDiario, ParteDiarioAdjunto, Colectivo
 from .partes_forms import ParteDiarioForm, ParteDiarioAdjuntoForm, ParteDiarioChoferForm
 
 
@@ -25,11 +29,12 @@ def _clamp_days(raw: str) -> int:
     return max(1, min(365, n))
 
 
-class ParteDiarioListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class ParteDiarioListView(LoginRequiredMixin, PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     model = ParteDiario
     template_name = "flota/parte_list.html"
     context_object_name = "items"
     paginate_by = 25
+    keyset_orden = ("-fecha_evento", "-id")
     permission_required = "flota.view_partediario"
 
     def get_queryset(self):
@@ -221,10 +226,10 @@ def parte_adjunto_delete(request, pk: int, adj_id: int):
         adj.delete()
         messages.success(request, "Adjunto eliminado.")
     return redirect("flota:parte_detail", pk=parte.pk)
-@login_required
-@permission_required("flota.view_partediario", raise_exception=True)
-def tv_taller(request):
-    """Pantalla TV (Taller): partes abiertos/en proceso priorizados por próxima salida.
+
+
+def _tv_taller_context(request) -> dict:
+    """Contexto de la pantalla TV (Taller): partes abiertos/en proceso priorizados por próxima salida.
 
     Objetivo operativo:
     - El taller NO usa celulares.
@@ -258,28 +263,18 @@ def tv_taller(request):
     dt_to = now + timedelta(hours=hours)
 
     # --------- salidas próximas por colectivo (mapa) ----------
-    # Elegimos la salida programada más próxima por unidad dentro del rango.
-    salidas_qs = (
-        SalidaProgramada.objects.filter(
-            salida_programada__gte=now,
-            salida_programada__lte=dt_to,
-        )
-        .exclude(estado=SalidaProgramada.Estado.CANCELADA)
-        .select_related("colectivo")
-        .order_by("colectivo_id", "salida_programada")
-    )
-
+    # La salida programada más próxima por unidad sale de EstadoUnidad (una query indexada);
+    # vigentes() corre antes las unidades cuya próxima salida ya pasó.
+    estado_unidad.vigentes(now)
     next_salida = {}
     next_salida_label = {}
     next_salida_seccion = {}
 
-    for s in salidas_qs:
-        if s.colectivo_id in next_salida:
-            continue
-        next_salida[s.colectivo_id] = s.salida_programada
+    for e in EstadoUnidad.objects.filter(proxima_salida__gte=now, proxima_salida__lte=dt_to):
+        next_salida[e.colectivo_id] = e.proxima_salida
         # Para TV: preferimos label del diagrama. Si no hay, usamos hora simple.
-        next_salida_label[s.colectivo_id] = (s.salida_label or "").strip()
-        next_salida_seccion[s.colectivo_id] = (s.seccion or "").strip()
+        next_salida_label[e.colectivo_id] = e.proxima_label
+        next_salida_seccion[e.colectivo_id] = e.proxima_seccion
 
     # --------- partes abiertos/en proceso ----------
     abiertos = (
@@ -320,7 +315,7 @@ def tv_taller(request):
     # Limitamos para no saturar la pantalla.
     items = items[:limit]
 
-    context = {
+    return {
         "now": now,
         "hours": hours,
         "refresh_sec": refresh_sec,
@@ -328,11 +323,20 @@ def tv_taller(request):
         "items": items,
         "limit": limit,
     }
-    
+
+
+@login_required
+@permission_required("flota.view_partediario", raise_exception=True)
+@etag_flota(salidas_futuras=True, partes=True, por_minuto=True)
+def tv_taller(request):
+    """Pantalla TV (Taller). Ver `_tv_taller_context`; las filas se actualizan por `tv_stream`."""
+    context = _tv_taller_context(request)
+
     if request.GET.get("partial") == "1":
         return render(request, "flota/_tv_taller_rows.html", context)
     return render(request, "flota/tv_taller.html", context)
 
+
 from .salidas_views import _salidas_datalists
 
 @login_required
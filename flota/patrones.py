@@ -0,0 +1,164 @@
+from __future__ import annotations
+
+"""
+flota.patrones
+
+Diagramas por patrón (lunes a sábado / domingo / feriado) resueltos al leer.
+
+- Un PatronDiagrama con sus líneas describe un día tipo. No se guardan filas por día:
+  `resolver()` arma salidas "virtuales" (SalidaProgramada sin guardar, `virtual=True`)
+  para cada día del rango y las mezcla con las concretas.
+- Una SalidaProgramada con `patron_linea` + `patron_fecha` es una excepción: reemplaza a
+  la virtual de esa línea ese día (aunque se haya movido de hora o cancelado).
+- Una concreta sin patrón con la misma unidad y horario también tapa a la virtual
+  (días copiados a mano antes de existir el patrón).
+- El costo es fijo por rango: patrones + líneas, feriados y excepciones (3-4 queries),
+  sin importar cuántos días o líneas haya. Guardar 90 días cuesta sólo las excepciones.
+
+Limitación: los ESPECIALES virtuales aparecen sólo en su día de salida (no en los días
+que cruzan hasta la llegada, como sí hacen los concretos).
+"""
+
+from collections import defaultdict
+from datetime import date, datetime, timedelta
+from typing import Iterable
+
+from django.db import transaction
+from django.db.models import Prefetch, Q
+from django.utils import timezone
+
+from .models import Feriado, PatronDiagrama, PatronDiagramaLinea, SalidaProgramada
+
+CAMPOS_LINEA = ("colectivo_id", "tipo", "seccion", "salida_label", "regreso", "chofer", "recorrido", "nota")
+
+
+def _dias(desde: date, hasta: date) -> list[date]:
+    return [desde + timedelta(days=i) for i in range((hasta - desde).days + 1)]
+
+
+def tipo_dia(day: date, feriados: set[date]) -> str:
+    if day in feriados:
+        return PatronDiagrama.TipoDia.FERIADO
+    if day.weekday() == 6:
+        return PatronDiagrama.TipoDia.DOMINGO
+    return PatronDiagrama.TipoDia.NORMAL
+
+
+def patrones_vigentes(desde: date, hasta: date) -> list[PatronDiagrama]:
+    """Patrones activos que tocan el rango, con líneas y unidades (2 queries)."""
+
+    lineas = PatronDiagramaLinea.objects.select_related("colectivo").order_by("hora", "id")
+    return list(
+        PatronDiagrama.objects.filter(is_active=True, vigente_desde__lte=hasta)
+        .filter(Q(vigente_hasta__isnull=True) | Q(vigente_hasta__gte=desde))
+        .order_by("-vigente_desde", "-id")
+        .prefetch_related(Prefetch("lineas", queryset=lineas))
+    )
+
+
+def patron_del_dia(day: date, patrones: list[PatronDiagrama], feriados: set[date]) -> PatronDiagrama | None:
+    """El patrón vigente más reciente del tipo de día. Un feriado sin patrón propio usa el de domingo."""
+
+    tipo = tipo_dia(day, feriados)
+    tipos = [tipo, PatronDiagrama.TipoDia.DOMINGO] if tipo == PatronDiagrama.TipoDia.FERIADO else [tipo]
+    for t in tipos:
+        for p in patrones:
+            if p.tipo_dia == t and p.aplica(day):
+                return p
+    return None
+
+
+def _datetime(day: date, hora) -> datetime:
+    return timezone.make_aware(datetime.combine(day, hora))
+
+
+def virtual(linea: PatronDiagramaLinea, day: date) -> SalidaProgramada:
+    """SalidaProgramada sin guardar que representa la línea en ese día."""
+
+    llegada = None
+    if linea.llegada is not None:
+        llegada = _datetime(day + timedelta(days=1) if linea.llegada < linea.hora else day, linea.llegada)
+
+    s = SalidaProgramada(
+        salida_programada=_datetime(day, linea.hora),
+        llegada_programada=llegada,
+        estado=SalidaProgramada.Estado.PROGRAMADA,
+        patron_linea=linea,
+        patron_fecha=day,
+    )
+    for campo in CAMPOS_LINEA:
+        setattr(s, campo, getattr(linea, campo))
+    s.colectivo = linea.colectivo
+    s.virtual = True
+    return s
+
+
+def coincide(s: SalidaProgramada, q: str) -> bool:
+    """Mismo filtro de texto que los listados (unidad, dominio, chofer, sección, etiqueta, recorrido)."""
+
+    q = (q or "").strip().lower()
+    if not q:
+        return True
+    textos = (str(s.colectivo.interno), s.colectivo.dominio, s.chofer, s.recorrido, s.seccion, s.salida_label)
+    return any(q in (t or "").lower() for t in textos)
+
+
+def resolver(desde: date, hasta: date, concretas: Iterable[SalidaProgramada], q: str = "") -> dict[date, list]:
+    """Salidas por día local en [desde, hasta]: concretas (ya filtradas por `q`) + virtuales.
+
+    Cada lista queda ordenada por horario. Las concretas se agrupan por el día en que salen.
+    """
+
+    por_dia: dict[date, list] = defaultdict(list)
+    ocupadas = set()
+    for s in concretas:
+        por_dia[timezone.localdate(s.salida_programada)].append(s)
+        ocupadas.add((s.colectivo_id, s.salida_programada))
+
+    patrones = patrones_vigentes(desde, hasta)
+    if patrones:
+        feriados = set(Feriado.objects.filter(fecha__range=(desde, hasta)).values_list("fecha", flat=True))
+        # Excepciones por (línea, día), estén o no dentro del rango mostrado / del filtro
+        excepciones = set(
+            SalidaProgramada.objects.filter(patron_fecha__range=(desde, hasta), patron_linea__isnull=False).values_list(
+                "patron_linea_id", "patron_fecha"
+            )
+        )
+        for day in _dias(desde, hasta):
+            patron = patron_del_dia(day, patrones, feriados)
+            if patron is None:
+                continue
+            for linea in patron.lineas.all():
+                if (linea.pk, day) in excepciones:
+                    continue
+                s = virtual(linea, day)
+                if (s.colectivo_id, s.salida_programada) in ocupadas or not coincide(s, q):
+                    continue
+                por_dia[day].append(s)
+
+    for salidas in por_dia.values():
+        salidas.sort(key=lambda s: (s.salida_programada, s.pk is None, s.pk or 0))
+    return por_dia
+
+
+def hay_patron(day: date) -> bool:
+    patrones = patrones_vigentes(day, day)
+    if not patrones:
+        return False
+    feriados = set(Feriado.objects.filter(fecha=day).values_list("fecha", flat=True))
+    patron = patron_del_dia(day, patrones, feriados)
+    return bool(patron and patron.lineas.all())
+
+
+@transaction.atomic
+def materializar(linea: PatronDiagramaLinea, day: date) -> SalidaProgramada:
+    """Fila concreta (excepción) para editar la línea en ese día. Idempotente."""
+
+    existente = (
+        SalidaProgramada.objects.select_for_update().filter(patron_linea=linea, patron_fecha=day).order_by("id").first()
+    )
+    if existente is not None:
+        return existente
+    s = virtual(linea, day)
+    s.save()
+    return s
@@ -0,0 +1,93 @@
+from __future__ import annotations
+
+from django.db import models
+from django.utils import timezone
+
+from core.models import TimeStampedModel
+
+
+class Feriado(models.Model):
+    """Días que usan el diagrama de feriado (o el de domingo si no hay uno de feriado)."""
+
+    fecha = models.DateField("fecha", unique=True)
+    descripcion = models.CharField("descripción", max_length=120, blank=True, default="")
+
+    class Meta:
+        ordering = ["fecha"]
+
+    def __str__(self) -> str:
+        return f"{self.fecha:%d/%m/%Y} {self.descripcion}".strip()
+
+
+class PatronDiagrama(TimeStampedModel):
+    """Diagrama recurrente por tipo de día (lunes a sábado / domingo / feriado).
+
+    Las salidas del patrón NO se guardan por día: flota.patrones las arma al leer y las
+    mezcla con las SalidaProgramada concretas. Sólo se escribe una fila cuando alguien
+    edita una línea para un día puntual (excepción).
+    """
+
+    class TipoDia(models.TextChoices):
+        NORMAL = "NORMAL", "Lunes a sábado"
+        DOMINGO = "DOMINGO", "Domingo"
+        FERIADO = "FERIADO", "Feriado"
+
+    nombre = models.CharField("nombre", max_length=80)
+    tipo_dia = models.CharField("tipo de día", max_length=10, choices=TipoDia.choices, default=TipoDia.NORMAL)
+    vigente_desde = models.DateField("vigente desde")
+    vigente_hasta = models.DateField("vigente hasta", null=True, blank=True)
+    is_active = models.BooleanField("activo", default=True)
+
+    class Meta:
+        ordering = ["tipo_dia", "-vigente_desde", "id"]
+        indexes = [
+            models.Index(fields=["tipo_dia", "vigente_desde"], name="idx_patron_tipo_desde"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.nombre} ({self.get_tipo_dia_display()})"
+
+    def aplica(self, day) -> bool:
+        return self.vigente_desde <= day and (self.vigente_hasta is None or day <= self.vigente_hasta)
+
+
+class PatronDiagramaLinea(TimeStampedModel):
+    """Una salida del patrón: se repite todos los días donde el patrón aplica."""
+
+    patron = models.ForeignKey(PatronDiagrama, on_delete=models.CASCADE, related_name="lineas")
+    colectivo = models.ForeignKey("flota.Colectivo", on_delete=models.PROTECT, related_name="lineas_patron")
+
+    hora = models.TimeField("hora de salida")
+    llegada = models.TimeField(
+        "hora de llegada",
+        null=True,
+        blank=True,
+        help_text="Si es menor que la hora de salida, se toma al día siguiente.",
+    )
+
+    tipo = models.CharField(max_length=10, choices=[("NORMAL", "Normal"), ("ESPECIAL", "Especial")], default="NORMAL")
+    seccion = models.CharField("sección", max_length=80, blank=True, default="")
+    salida_label = models.CharField("etiqueta de salida", max_length=50, blank=True, default="")
+    regreso = models.CharField("regreso", max_length=40, blank=True, default="")
+    chofer = models.CharField("chofer", max_length=80, blank=True, default="")
+    recorrido = models.CharField("recorrido", max_length=120, blank=True, default="")
+    nota = models.CharField("nota", max_length=160, blank=True, default="")
+
+    class Meta:
+        ordering = ["patron", "hora", "id"]
+
+    def __str__(self) -> str:
+        return f"{self.patron.nombre} {self.hora:%H:%M} - {self.colectivo_id}"
+
+    def _tocar_patron(self) -> None:
+        # El ETag de las pantallas firma PatronDiagrama.updated_at: editar una línea lo mueve
+        PatronDiagrama.objects.filter(pk=self.patron_id).update(updated_at=timezone.now())
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        self._tocar_patron()
+
+    def delete(self, *args, **kwargs):
+        result = super().delete(*args, **kwargs)
+        self._tocar_patron()
+        return result
@@ -13,7 +13,8 @@ Objetivo operativo
 Notas de diseño (importante para mantenimiento)
 - No se usan dependencias externas (offline-first).
 - Se prioriza robustez y simplicidad sobre "features" complejas.
-- Si más adelante se implementa "Diagramas por patrón" (semanal), este módulo sirve como base.
+- Diagramas por patrón (lunes a sábado / domingo / feriado): ver flota.patrones. Plan 15 días y
+  TV Horarios suman las salidas del patrón sin guardarlas; sólo se escriben las excepciones.
 """
 
 from datetime import datetime, timedelta, time as dtime
@@ -24,7 +25,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.forms import modelformset_factory
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
-from django.db import models
+from django.db import models, transaction
 from django.http import JsonResponse, HttpResponseBadRequest
 from django.shortcuts import redirect, render
 from django.urls import reverse_lazy
@@ -32,8 +33,12 @@ from django.utils import timezone
 from django.views.decorators.http import require_GET, require_POST
 from django.views.generic import CreateView, DeleteView, ListView, UpdateView
 
-from .forms import SalidaProgramadaForm, SalidaProgramadaBulkForm
-from .models import Colectivo, SalidaProgramada
+from core import generaciones
+
+from . import conflictos, estado_unidad, expansion, patrones, vocabulario
+from .condicional import etag_flota
+from .forms import FormSetFilasCargadas, OpcionesColectivo, SalidaProgramadaForm, SalidaProgramadaBulkForm
+from .models import Colectivo, EstadoUnidad, PatronDiagramaLinea, SalidaProgramada
 from .partes_models import ParteDiario
 
 
@@ -99,7 +104,7 @@ def _latest_day_with_salidas() -> datetime.date | None:
         return None
 
 
-def _default_day_for_diagramador() -> datetime.date:
+def _default_day_for_diagramador(con_patrones: bool = False) -> datetime.date:
     """
     Heurística operativa robusta (evita pantallas vacías):
     - Preferido:
@@ -107,19 +112,22 @@ def _default_day_for_diagramador() -> datetime.date:
         - <18hs: hoy
     - Si el día preferido NO tiene salidas y el usuario NO eligió fecha:
         - cae al último día que tenga salidas (si existe).
+    - con_patrones: un día cubierto por un patrón (flota.patrones) no está vacío aunque no tenga filas.
+
+    También la usa el ETag (flota.condicional) para firmar sólo el día que la vista va a mostrar.
     """
     now = timezone.localtime(timezone.now())
     base = timezone.localdate()
     preferred = base + timedelta(days=1) if now.hour >= 18 else base
 
-    if _day_has_salidas(preferred):
+    if _day_has_salidas(preferred) or (con_patrones and patrones.hay_patron(preferred)):
         return preferred
 
     last = _latest_day_with_salidas()
     return last or preferred
 
 
-def _resolve_day_from_request(request) -> tuple[datetime.date, bool]:
+def _resolve_day_from_request(request, con_patrones: bool = False) -> tuple[datetime.date, bool]:
     """
     Devuelve (day, explicit):
     - explicit=True si el usuario eligió ?fecha=YYYY-MM-DD
@@ -129,7 +137,7 @@ def _resolve_day_from_request(request) -> tuple[datetime.date, bool]:
     if fecha:
         day = _parse_day(fecha)
         return day, True
-    return _default_day_for_diagramador(), False
+    return _default_day_for_diagramador(con_patrones), False
 
 
 def _resolve_day_for_views(request, preferred: datetime.date) -> datetime.date:
@@ -148,39 +156,10 @@ def _salidas_datalists():
     """
     Devuelve listas para autocompletar (datalist HTML) sin crear catálogos extra.
     Evita que el diagramador tenga que escribir siempre lo mismo.
+
+    Salen del vocabulario materializado (flota.vocabulario), ordenadas por uso reciente.
     """
-    return {
-        "datalist_choferes": list(
-            SalidaProgramada.objects.exclude(chofer="")
-            .values_list("chofer", flat=True)
-            .distinct()
-            .order_by("chofer")[:300]
-        ),
-        "datalist_secciones": list(
-            SalidaProgramada.objects.exclude(seccion="")
-            .values_list("seccion", flat=True)
-            .distinct()
-            .order_by("seccion")[:300]
-        ),
-        "datalist_recorridos": list(
-            SalidaProgramada.objects.exclude(recorrido="")
-            .values_list("recorrido", flat=True)
-            .distinct()
-            .order_by("recorrido")[:300]
-        ),
-        "datalist_etiquetas": list(
-            SalidaProgramada.objects.exclude(salida_label="")
-            .values_list("salida_label", flat=True)
-            .distinct()
-            .order_by("salida_label")[:300]
-        ),
-        "datalist_regresos": list(
-            SalidaProgramada.objects.exclude(regreso="")
-            .values_list("regreso", flat=True)
-            .distinct()
-            .order_by("regreso")[:300]
-        ),
-    }
+    return vocabulario.datalists()
 
 
 def _snapshot_salida(s: SalidaProgramada) -> dict:
@@ -203,10 +182,8 @@ def _snapshot_salida(s: SalidaProgramada) -> dict:
     }
 
 
-def _diff_salida(before: SalidaProgramada, after: SalidaProgramada) -> dict | None:
+def _diff_snapshots(b: dict, a: dict) -> dict | None:
     """Devuelve {campo: {before, after}} solo con los campos modificados."""
-    b = _snapshot_salida(before)
-    a = _snapshot_salida(after)
     changes = {}
     for k in a.keys():
         if b.get(k) != a.get(k):
@@ -214,22 +191,37 @@ def _diff_salida(before: SalidaProgramada, after: SalidaProgramada) -> dict | No
     return changes or None
 
 
-def _log_salida_change(request, salida: SalidaProgramada, changes: dict) -> None:
-    """Registra constancia de cambios usando django.contrib.admin.LogEntry."""
+def _log_salida_changes(request, cambios: list[tuple[SalidaProgramada, dict]]) -> None:
+    """Constancia de cambios en django.contrib.admin.LogEntry: un solo INSERT para todas las salidas."""
+    if not cambios:
+        return
     try:
         ct = ContentType.objects.get_for_model(SalidaProgramada)
-        LogEntry.objects.log_action(
-            user_id=getattr(request.user, "id", None) or 1,
-            content_type_id=ct.pk,
-            object_id=str(salida.pk),
-            object_repr=str(salida),
-            action_flag=CHANGE,
-            change_message={"fields": list(changes.keys()), "changes": changes},
-        )
+        user_id = getattr(request.user, "id", None) or 1
+        with transaction.atomic():
+            LogEntry.objects.bulk_create(
+                [
+                    LogEntry(
+                        user_id=user_id,
+                        content_type_id=ct.pk,
+                        object_id=str(salida.pk),
+                        object_repr=str(salida)[:200],
+                        action_flag=CHANGE,
+                        # Mismo formato que LogEntry.log_action con un dict (str del dict)
+                        change_message=str({"fields": list(changes.keys()), "changes": changes}),
+                    )
+                    for salida, changes in cambios
+                ]
+            )
     except Exception:
         return
 
 
+def _log_salida_change(request, salida: SalidaProgramada, changes: dict) -> None:
+    """Registra constancia de cambios usando django.contrib.admin.LogEntry."""
+    _log_salida_changes(request, [(salida, changes)])
+
+
 # ---------------------------------------------------------------------
 # CRUD / Listado
 # ---------------------------------------------------------------------
@@ -346,11 +338,16 @@ class SalidaProgramadaUpdateView(LoginRequiredMixin, PermissionRequiredMixin, Up
             ctx["salida_log"] = []
         return ctx
 
+    def get_object(self, queryset=None):
+        obj = super().get_object(queryset)
+        # Snapshot antes de que el form modifique la instancia (evita releer la fila al guardar)
+        self._before = _snapshot_salida(obj)
+        return obj
+
     def form_valid(self, form):
-        before = SalidaProgramada.objects.get(pk=self.object.pk)
         resp = super().form_valid(form)
         after = self.object
-        changes = _diff_salida(before, after)
+        changes = _diff_snapshots(self._before, _snapshot_salida(after))
         if changes:
             _log_salida_change(self.request, after, changes)
         messages.success(self.request, "Salida programada actualizada.")
@@ -389,59 +386,18 @@ def salidas_copiar_dia_anterior(request):
 
     from_day = to_day - timedelta(days=1)
 
-    from_start, from_end = _day_bounds(from_day)
-    to_start, to_end = _day_bounds(to_day)
+    reporte = expansion.expandir([(from_day, to_day)])
 
-    origen = (
-        SalidaProgramada.objects.select_related("colectivo")
-        .filter(salida_programada__gte=from_start, salida_programada__lt=from_end)
-        .order_by("salida_programada", "id")
-    )
-
-    if not origen.exists():
+    if not reporte.origenes:
         messages.warning(request, "No hay salidas el día anterior para copiar.")
-        return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={to_day}")
-
-    # Índice para evitar duplicados simples (colectivo + salida_programada exacta)
-    existentes = set(
-        SalidaProgramada.objects.filter(salida_programada__gte=to_start, salida_programada__lt=to_end)
-        .values_list("colectivo_id", "salida_programada")
-    )
-
-    created = 0
-    delta = timedelta(days=1)
-
-    for s in origen:
-        new_dt = s.salida_programada + delta
-        if (s.colectivo_id, new_dt) in existentes:
-            continue
-
-        obj = SalidaProgramada(
-            colectivo=s.colectivo,
-            salida_programada=new_dt,
-            llegada_programada=(s.llegada_programada + delta) if s.llegada_programada else None,
-            tipo=s.tipo,
-            estado=SalidaProgramada.Estado.PROGRAMADA,
-            seccion=s.seccion,
-            salida_label=s.salida_label,
-            regreso=s.regreso,
-            chofer=s.chofer,
-            recorrido=s.recorrido,
-            nota=s.nota,
-        )
-        obj.save()
-        created += 1
-
-    if created:
-        messages.success(request, f"Copiadas {created} salidas desde {from_day} a {to_day}.")
+    elif reporte.total_creadas:
+        messages.success(request, f"Copiadas {reporte.total_creadas} salidas desde {from_day} a {to_day}.")
     else:
         messages.info(request, "No se copiaron salidas (ya existían).")
 
     return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={to_day}")
 
 
-
-
 @require_POST
 @login_required
 @permission_required("flota.add_salidaprogramada", raise_exception=True)
@@ -462,73 +418,20 @@ def salidas_copiar_15_dias(request):
     except Exception:
         return HttpResponseBadRequest("Fecha inválida")
 
-    from_start, from_end = _day_bounds(base_day)
+    reporte = expansion.expandir((base_day, base_day + timedelta(days=k)) for k in range(1, 15))
 
-    origen = (
-        SalidaProgramada.objects.select_related("colectivo")
-        .filter(salida_programada__gte=from_start, salida_programada__lt=from_end)
-        .order_by("salida_programada", "id")
-    )
-
-    if not origen.exists():
+    if not reporte.origenes:
         messages.warning(request, "No hay salidas en ese día para copiar.")
-        return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={base_day}")
-
-    # Índice para evitar duplicados simples (colectivo + salida_programada exacta)
-    rango_start, _ = _day_bounds(base_day)
-    rango_end = rango_start + timedelta(days=15)
-    existentes = set(
-        SalidaProgramada.objects.filter(salida_programada__gte=rango_start, salida_programada__lt=rango_end)
-        .values_list("colectivo_id", "salida_programada")
-    )
-
-    created = 0
-    for day_offset in range(1, 15):
-        delta = timedelta(days=day_offset)
-
-        for s in origen:
-            new_dt = s.salida_programada + delta
-            key = (s.colectivo_id, new_dt)
-            if key in existentes:
-                continue
-
-            SalidaProgramada.objects.create(
-                colectivo=s.colectivo,
-                salida_programada=new_dt,
-                llegada_programada=(s.llegada_programada + delta) if s.llegada_programada else None,
-                tipo=s.tipo,
-                estado=SalidaProgramada.Estado.PROGRAMADA,
-                seccion=s.seccion,
-                salida_label=s.salida_label,
-                regreso=s.regreso,
-                chofer=s.chofer,
-                recorrido=s.recorrido,
-                nota=s.nota,
-            )
-            existentes.add(key)
-            created += 1
-
-    if created:
-        messages.success(request, f"Copiadas {created} salidas a 15 días desde {base_day}.")
+    elif reporte.total_creadas:
+        messages.success(request, f"Copiadas {reporte.total_creadas} salidas a 15 días desde {base_day}.")
     else:
         messages.info(request, "No se copiaron salidas (ya existían).")
 
     return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={base_day}")
 
 
-@login_required
-def plan_15_dias(request):
-    """
-    Planificación por quincena (15 días) en formato de agenda.
-
-    Operación real:
-    - El diagrama suele armarse el día anterior a la tarde/noche.
-    - Con turnos rotativos, planificar 15 días reduce reprocesos.
-    """
-    start_str = (request.GET.get("start") or "").strip()
-    start_day = _parse_day(start_str) if start_str else _default_day_for_diagramador()
-    q = (request.GET.get("q") or "").strip()
-
+def _plan_15_salidas(start_day, q: str = "") -> dict:
+    """Salidas de los 15 días por día local: concretas + las que arman los patrones."""
     start_dt, _ = _day_bounds(start_day)
     end_dt = start_dt + timedelta(days=15)
 
@@ -543,28 +446,43 @@ def plan_15_dias(request):
             | models.Q(salida_label__icontains=q)
         )
 
-    salidas = list(qs.order_by("salida_programada", "colectivo__interno", "id"))
+    return patrones.resolver(start_day, start_day + timedelta(days=14), qs.order_by("salida_programada", "id"), q)
 
-    salidas_by_day = {}
-    for s in salidas:
-        d = timezone.localtime(s.salida_programada).date()
-        salidas_by_day.setdefault(d, []).append(s)
-
-    # Partes abiertos/en proceso por unidad (alerta informativa)
-    partes = (
-        ParteDiario.objects.filter(estado__in=[ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO])
-        .values("colectivo_id")
-        .annotate(cant=models.Count("id"))
+
+@login_required
+def plan_15_dias(request):
+    """
+    Planificación por quincena (15 días) en formato de agenda.
+
+    Operación real:
+    - El diagrama suele armarse el día anterior a la tarde/noche.
+    - Con turnos rotativos, planificar 15 días reduce reprocesos.
+    """
+    start_str = (request.GET.get("start") or "").strip()
+    start_day = _parse_day(start_str) if start_str else _default_day_for_diagramador()
+    q = (request.GET.get("q") or "").strip()
+
+    salidas_by_day = _plan_15_salidas(start_day, q)
+    conflictos_list = conflictos.detectar(s for salidas in salidas_by_day.values() for s in salidas)
+    conflictos.marcar(conflictos_list)
+
+    # Unidades con partes abiertos/en proceso (alerta informativa), desde EstadoUnidad
+    colectivos_con_partes = list(
+        EstadoUnidad.objects.filter(partes_abiertos__gt=0).values_list("colectivo_id", flat=True)
     )
-    partes_map = {p["colectivo_id"]: p["cant"] for p in partes}
-    colectivos_con_partes = list(partes_map.keys())
 
     days = []
     for i in range(15):
         d = start_day + timedelta(days=i)
         days.append({"day": d, "salidas": salidas_by_day.get(d, [])})
 
-    ctx = {"start": start_day, "q": q, "days": days, "colectivos_con_partes": colectivos_con_partes}
+    ctx = {
+        "start": start_day,
+        "q": q,
+        "days": days,
+        "colectivos_con_partes": colectivos_con_partes,
+        "conflictos_total": len(conflictos_list),
+    }
     return render(request, "flota/plan_15.html", ctx)
 
 
@@ -575,25 +493,7 @@ def plan_15_print(request):
     start_day = _parse_day(start_str) if start_str else _default_day_for_diagramador()
     q = (request.GET.get("q") or "").strip()
 
-    start_dt, _ = _day_bounds(start_day)
-    end_dt = start_dt + timedelta(days=15)
-
-    qs = SalidaProgramada.objects.select_related("colectivo").filter(salida_programada__gte=start_dt, salida_programada__lt=end_dt)
-    if q:
-        qs = qs.filter(
-            models.Q(colectivo__interno__icontains=q)
-            | models.Q(colectivo__dominio__icontains=q)
-            | models.Q(chofer__icontains=q)
-            | models.Q(recorrido__icontains=q)
-            | models.Q(seccion__icontains=q)
-            | models.Q(salida_label__icontains=q)
-        )
-
-    salidas = list(qs.order_by("salida_programada", "colectivo__interno", "id"))
-    salidas_by_day = {}
-    for s in salidas:
-        d = timezone.localtime(s.salida_programada).date()
-        salidas_by_day.setdefault(d, []).append(s)
+    salidas_by_day = _plan_15_salidas(start_day, q)
 
     days = []
     for i in range(15):
@@ -613,19 +513,7 @@ def plan_15_export_csv(request):
     start_day = _parse_day(start_str) if start_str else _default_day_for_diagramador()
     q = (request.GET.get("q") or "").strip()
 
-    start_dt, _ = _day_bounds(start_day)
-    end_dt = start_dt + timedelta(days=15)
-
-    qs = SalidaProgramada.objects.select_related("colectivo").filter(salida_programada__gte=start_dt, salida_programada__lt=end_dt)
-    if q:
-        qs = qs.filter(
-            models.Q(colectivo__interno__icontains=q)
-            | models.Q(colectivo__dominio__icontains=q)
-            | models.Q(chofer__icontains=q)
-            | models.Q(recorrido__icontains=q)
-            | models.Q(seccion__icontains=q)
-            | models.Q(salida_label__icontains=q)
-        )
+    salidas_by_day = _plan_15_salidas(start_day, q)
 
     resp = HttpResponse(content_type="text/csv; charset=utf-8")
     resp["Content-Disposition"] = f'attachment; filename="plan_15_{start_day}.csv"'
@@ -633,23 +521,24 @@ def plan_15_export_csv(request):
     w = csv.writer(resp)
     w.writerow(["fecha", "hora", "interno", "dominio", "seccion", "salida_label", "regreso", "chofer", "recorrido", "tipo", "estado", "nota"])
 
-    for s in qs.order_by("salida_programada", "colectivo__interno", "id"):
-        w.writerow(
-            [
-                timezone.localtime(s.salida_programada).date().isoformat(),
-                timezone.localtime(s.salida_programada).strftime("%H:%M"),
-                s.colectivo.interno,
-                s.colectivo.dominio,
-                s.seccion,
-                s.salida_label,
-                s.regreso,
-                s.chofer,
-                s.recorrido,
-                s.tipo,
-                s.estado,
-                s.nota,
-            ]
-        )
+    for i in range(15):
+        for s in salidas_by_day.get(start_day + timedelta(days=i), []):
+            w.writerow(
+                [
+                    timezone.localtime(s.salida_programada).date().isoformat(),
+                    timezone.localtime(s.salida_programada).strftime("%H:%M"),
+                    s.colectivo.interno,
+                    s.colectivo.dominio,
+                    s.seccion,
+                    s.salida_label,
+                    s.regreso,
+                    s.chofer,
+                    s.recorrido,
+                    s.tipo,
+                    s.estado,
+                    s.nota,
+                ]
+            )
 
     return resp
 
@@ -675,59 +564,14 @@ def plan_15_copiar_quincena_anterior(request):
     except Exception:
         return HttpResponseBadRequest("Start inválido")
 
-    from_start = start_day - timedelta(days=15)
-    to_start = start_day
-    to_end = to_start + timedelta(days=15)
-
-    # Índice de existentes en destino (15 días)
-    existentes = set(
-        SalidaProgramada.objects.filter(salida_programada__gte=_day_bounds(to_start)[0], salida_programada__lt=to_end)
-        .values_list("colectivo_id", "salida_programada")
-    )
-
-    created = 0
-    skipped_days = 0
-
     # Por cada día de la quincena: copia desde (día-15) a (día)
-    for day_offset in range(15):
-        src_day = from_start + timedelta(days=day_offset)
-        dst_day = to_start + timedelta(days=day_offset)
-
-        src_start, src_end = _day_bounds(src_day)
-        origen = (
-            SalidaProgramada.objects.select_related("colectivo")
-            .filter(salida_programada__gte=src_start, salida_programada__lt=src_end)
-            .order_by("salida_programada", "id")
-        )
-        if not origen.exists():
-            skipped_days += 1
-            continue
-
-        delta = timedelta(days=15)
-        for s in origen:
-            new_dt = s.salida_programada + delta
-            key = (s.colectivo_id, new_dt)
-            if key in existentes:
-                continue
-
-            SalidaProgramada.objects.create(
-                colectivo=s.colectivo,
-                salida_programada=new_dt,
-                llegada_programada=(s.llegada_programada + delta) if s.llegada_programada else None,
-                tipo=s.tipo,
-                estado=SalidaProgramada.Estado.PROGRAMADA,
-                seccion=s.seccion,
-                salida_label=s.salida_label,
-                regreso=s.regreso,
-                chofer=s.chofer,
-                recorrido=s.recorrido,
-                nota=s.nota,
-            )
-            existentes.add(key)
-            created += 1
+    reporte = expansion.expandir(
+        (start_day + timedelta(days=k - 15), start_day + timedelta(days=k)) for k in range(15)
+    )
+    skipped_days = len(reporte.dias_sin_origen)
 
-    if created:
-        msg = f"Copiada quincena anterior: {created} salidas creadas."
+    if reporte.total_creadas:
+        msg = f"Copiada quincena anterior: {reporte.total_creadas} salidas creadas."
         if skipped_days:
             msg += f" (Días sin datos en origen: {skipped_days})"
         messages.success(request, msg)
@@ -740,6 +584,35 @@ def plan_15_copiar_quincena_anterior(request):
 # ---------------------------------------------------------------------
 # API mínima (offline) para UX del formulario
 # ---------------------------------------------------------------------
+@login_required
+@permission_required("flota.view_salidaprogramada", raise_exception=True)
+@require_GET
+def api_conflictos(request):
+    """
+    Unidades / choferes con salidas superpuestas entre ?desde= y ?hasta= (YYYY-MM-DD).
+
+    Sin parámetros: el día del diagramador. Máximo 62 días por consulta.
+    """
+    try:
+        desde = datetime.fromisoformat(request.GET["desde"]).date() if request.GET.get("desde") else _default_day_for_diagramador()
+        hasta = datetime.fromisoformat(request.GET["hasta"]).date() if request.GET.get("hasta") else desde
+    except ValueError:
+        return JsonResponse({"ok": False, "error": "Fecha inválida"}, status=400)
+    if hasta < desde or (hasta - desde).days > 61:
+        return JsonResponse({"ok": False, "error": "Rango inválido (máximo 62 días)"}, status=400)
+
+    encontrados = conflictos.en_rango(desde, hasta)
+    return JsonResponse(
+        {
+            "ok": True,
+            "desde": desde.isoformat(),
+            "hasta": hasta.isoformat(),
+            "total": len(encontrados),
+            "conflictos": [c.as_dict() for c in encontrados],
+        }
+    )
+
+
 @login_required
 @require_GET
 def api_colectivo_info(request):
@@ -812,11 +685,60 @@ def api_colectivo_info(request):
     )
 
 
+# Campo del form -> clave del snapshot de auditoría
+_CAMPOS_DIAGRAMA = {"colectivo": "colectivo_id", "chofer": "chofer"}
+
+
+@transaction.atomic
+def _guardar_diagrama(request, formset) -> int:
+    """
+    Guarda el editor rápido sólo con lo que cambió: diff por campo desde el form, un bulk_update
+    con esos campos y un bulk_create de LogEntry. Cantidad de queries fija aunque cambie todo el día.
+
+    bulk_update no dispara post_save: acá se marca updated_at (ETag), se registra el vocabulario
+    nuevo, se recalcula EstadoUnidad y se avisa a las pantallas (generación SALIDAS).
+    """
+    now = timezone.now()
+    cambios = []
+    campos = set()
+    vocab = []
+    for form in formset.forms:
+        changed = [f for f in form.changed_data if f in _CAMPOS_DIAGRAMA]
+        if not changed or not form.instance.pk:
+            continue
+        obj = form.instance  # ya tiene los valores nuevos (construct_instance en is_valid)
+        changes = {}
+        for f in changed:
+            before = form.initial.get(f)
+            after = getattr(obj, _CAMPOS_DIAGRAMA[f])
+            if (before or "") == (after or ""):
+                continue
+            changes[_CAMPOS_DIAGRAMA[f]] = {"before": before, "after": after}
+            campos.add(f)
+        if not changes:
+            continue
+        obj.updated_at = now
+        cambios.append((obj, changes))
+        vocab += vocabulario.terminos_de(obj, [c for c in changed if c in vocabulario.CAMPOS])
+
+    if not cambios:
+        return 0
+
+    SalidaProgramada.objects.bulk_update([obj for obj, _ in cambios], sorted(campos) + ["updated_at"], batch_size=500)
+    _log_salida_changes(request, cambios)
+    vocabulario.registrar(vocab)
+    # Unidad nueva y anterior de cada fila que cambió de colectivo
+    estado_unidad.actualizar(
+        {obj.colectivo_id for obj, _ in cambios} | {c["colectivo_id"]["before"] for _, c in cambios if "colectivo_id" in c}
+    )
+    generaciones.bump(generaciones.SALIDAS)
+    return len(cambios)
+
+
 # ---------------------------------------------------------------------
 # Impresión / Pantalla TV
 # ---------------------------------------------------------------------
 @login_required
-@login_required
 @permission_required("flota.change_salidaprogramada", raise_exception=True)
 def diagrama_edit(request):
     """Editor rápido del diagrama del día (bulk edit)."""
@@ -833,47 +755,28 @@ def diagrama_edit(request):
     FormSet = modelformset_factory(
         SalidaProgramada,
         form=SalidaProgramadaBulkForm,
+        formset=FormSetFilasCargadas,
         extra=0,
         can_delete=False,
     )
 
-    colectivos_ids = list(qs.values_list("colectivo_id", flat=True).distinct())
-    open_partes = (
-        ParteDiario.objects.filter(
-            colectivo_id__in=colectivos_ids,
-            estado__in=[ParteDiario.Estado.ABIERTO, ParteDiario.Estado.EN_PROCESO],
-        )
-        .order_by("-fecha_evento", "-id")
+    # Último parte abierto por unidad (EstadoUnidad: una query indexada)
+    parte_pk_by_colectivo = dict(
+        EstadoUnidad.objects.filter(ultimo_parte__isnull=False).values_list("colectivo_id", "ultimo_parte_id")
     )
 
-    parte_pk_by_colectivo = {}
-    for p in open_partes:
-        if p.colectivo_id not in parte_pk_by_colectivo:
-            parte_pk_by_colectivo[p.colectivo_id] = p.pk
-
-    before_map = {s.pk: _snapshot_salida(s) for s in qs}
+    # Una sola query / un solo HTML de opciones de unidad para todas las filas
+    form_kwargs = {"opciones_colectivo": OpcionesColectivo()}
 
     if request.method == "POST":
-        formset = FormSet(request.POST, queryset=qs)
+        formset = FormSet(request.POST, queryset=qs, form_kwargs=form_kwargs)
         if formset.is_valid():
-            saved = formset.save()
-            for obj in saved:
-                before = before_map.get(obj.pk)
-                if not before:
-                    continue
-                after = _snapshot_salida(obj)
-                changes = {}
-                for k in after.keys():
-                    if before.get(k) != after.get(k):
-                        changes[k] = {"before": before.get(k), "after": after.get(k)}
-                if changes:
-                    _log_salida_change(request, obj, changes)
-
+            _guardar_diagrama(request, formset)
             messages.success(request, "Diagrama actualizado.")
             return redirect(f"{reverse_lazy('flota:salida_diagrama_edit')}?fecha={day.isoformat()}")
         messages.error(request, "No se pudo guardar. Revisá los campos marcados.")
     else:
-        formset = FormSet(queryset=qs)
+        formset = FormSet(queryset=qs, form_kwargs=form_kwargs)
 
     ctx = {
         "day": day,
@@ -884,10 +787,10 @@ def diagrama_edit(request):
     return render(request, "flota/diagrama_edit.html", ctx)
 
 
+@etag_flota()
 def diagrama_print(request):
     """Vista imprimible del diagrama del día (similar a la planilla en papel)."""
     day, _explicit = _resolve_day_from_request(request)
-    day = day
 
     start, end = _day_bounds(day)
 
@@ -909,17 +812,15 @@ def diagrama_print(request):
 
 @login_required
 @permission_required("flota.view_salidaprogramada", raise_exception=True)
+@etag_flota(dias=2)
 def salidas_dual(request):
     """
     Vista operativa para diagramador: hoy y mañana en paralelo.
     - Si ?fecha=YYYY-MM-DD => la izquierda es esa fecha y la derecha es +1 día.
     - Si no hay datos, cae al último día con salidas para no quedar vacío.
     """
-    base_day, explicit = _resolve_day_from_request(request)
-    if (not explicit) and (not _day_has_salidas(base_day)):
-        last = _latest_day_with_salidas()
-        if last:
-            base_day = last
+    # Sin fecha la heurística ya cae al último día con salidas
+    base_day, _explicit = _resolve_day_from_request(request)
 
     day_a = base_day
     day_b = base_day + timedelta(days=1)
@@ -950,102 +851,67 @@ def salidas_dual(request):
     )
 
 
-@login_required
-def tv_horarios(request):
+def _tv_horarios_context(request) -> dict:
     """
-    Pantalla "TV Horarios" (diagrama por fecha):
+    Contexto de "TV Horarios" (diagrama por fecha):
     - Por defecto: heurística de diagramador (>=18: mañana).
-    - Si ese día no tiene salidas, cae al último día con salidas.
+    - Si ese día no tiene salidas (ni patrón que lo cubra), cae al último día con salidas.
     - Permite override: ?fecha=YYYY-MM-DD
+    - Suma las salidas virtuales de los patrones (flota.patrones).
     """
     now = timezone.localtime(timezone.now())
+    day, _explicit = _resolve_day_from_request(request, con_patrones=True)
 
-    day, explicit = _resolve_day_from_request(request)
-    if (not explicit) and (not _day_has_salidas(day)):
-        last = _latest_day_with_salidas()
-        if last:
-            day = last
-    salidas = _qs_for_day(day)
+    return {
+        "salidas": patrones.resolver(day, day, _qs_for_day(day))[day],
+        "now": now,
+        "day": day,
+        "refresh_sec": 20,
+    }
 
-    return render(
-        request,
-        "flota/tv_horarios.html",
-        {
-            "salidas": salidas,
-            "now": now,
-            "day": day,
-            "refresh_sec": 20,
-        },
-    )
+
+@login_required
+@etag_flota(patrones=True)
+def tv_horarios(request):
+    """Pantalla "TV Horarios". Ver `_tv_horarios_context`; las filas se actualizan por `tv_stream`."""
+    return render(request, "flota/tv_horarios.html", _tv_horarios_context(request))
 
 
 # ---------------------------------------------------------------------
 # Plantillas operativas (Normal / Domingo)
 # ---------------------------------------------------------------------
 def _find_source_day_for_plantilla(to_day, modo):
-    # Busca hacia atrÃ¡s (hasta 30 dÃ­as) un dÃ­a "modelo" con salidas.
+    # Busca hacia atrás (hasta 30 días) un día "modelo" con salidas: una sola query por el rango
     modo = (modo or "normal").strip().lower()
+    start, _ = _day_bounds(to_day - timedelta(days=30))
+    end, _ = _day_bounds(to_day)
+    con_salidas = {
+        timezone.localdate(dt)
+        for dt in SalidaProgramada.objects.filter(salida_programada__gte=start, salida_programada__lt=end).values_list(
+            "salida_programada", flat=True
+        )
+    }
     for i in range(1, 31):
         d = to_day - timedelta(days=i)
         if modo == "domingo" and d.weekday() != 6:
             continue
         if modo == "normal" and d.weekday() == 6:
             continue
-
-        s, e = _day_bounds(d)
-        if SalidaProgramada.objects.filter(salida_programada__gte=s, salida_programada__lt=e).exists():
+        if d in con_salidas:
             return d
 
     return to_day - timedelta(days=1)
 
 
 def _copy_salidas_between_days(request, from_day, to_day):
-    from_start, from_end = _day_bounds(from_day)
-    to_start, to_end = _day_bounds(to_day)
-
-    origen = (
-        SalidaProgramada.objects.select_related("colectivo")
-        .filter(salida_programada__gte=from_start, salida_programada__lt=from_end)
-        .order_by("salida_programada", "id")
-    )
-
-    if not origen.exists():
-        messages.warning(request, f"No hay salidas el dÃ­a modelo ({from_day}) para copiar.")
-        return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={to_day}")
-
-    existentes = set(
-        SalidaProgramada.objects.filter(salida_programada__gte=to_start, salida_programada__lt=to_end)
-        .values_list("colectivo_id", "salida_programada")
-    )
+    reporte = expansion.expandir([(from_day, to_day)])
 
-    created = 0
-    delta = (to_start - from_start)
-
-    for s in origen:
-        new_dt = s.salida_programada + delta
-        if (s.colectivo_id, new_dt) in existentes:
-            continue
-
-        obj = SalidaProgramada(
-            colectivo=s.colectivo,
-            salida_programada=new_dt,
-            llegada_programada=(s.llegada_programada + delta) if s.llegada_programada else None,
-            tipo=s.tipo,
-            estado=SalidaProgramada.Estado.PROGRAMADA,
-            seccion=s.seccion,
-            salida_label=s.salida_label,
-            regreso=s.regreso,
-            chofer=s.chofer,
-            recorrido=s.recorrido,
-            nota=s.nota,
-        )
-        obj.save()
-        created += 1
-
-    if created:
-        messages.success(request, f"Generadas {created} salidas desde plantilla ({from_day}) a {to_day}.")
+    if not reporte.origenes:
+        messages.warning(request, f"No hay salidas el día modelo ({from_day}) para copiar.")
+    elif reporte.total_creadas:
+        messages.success(request, f"Generadas {reporte.total_creadas} salidas desde plantilla ({from_day}) a {to_day}.")
     else:
-        messages.info(request, "No se generaron salidas (ya existÃ­an).")
+        messages.info(request, "No se generaron salidas (ya existían).")
 
     return redirect(f"{reverse_lazy('flota:salida_list')}?fecha={to_day}")
 
@@ -1067,3 +933,25 @@ def salidas_generar_desde_plantilla(request):
 
     from_day = _find_source_day_for_plantilla(to_day, modo)
     return _copy_salidas_between_days(request, from_day, to_day)
+
+
+# ---------------------------------------------------------------------
+# Diagramas por patrón: excepción puntual
+# ---------------------------------------------------------------------
+@login_required
+@permission_required("flota.add_salidaprogramada", raise_exception=True)
+@require_POST
+def salida_patron_editar(request):
+    """
+    Crea (si no existe) la fila concreta de una línea de patrón para un día y abre su edición.
+
+    Es la única forma en que un patrón escribe filas: sólo para los días que tienen cambios.
+    """
+    try:
+        linea = PatronDiagramaLinea.objects.select_related("colectivo").get(pk=int(request.POST.get("linea") or 0))
+        day = datetime.fromisoformat((request.POST.get("fecha") or "").strip()).date()
+    except (PatronDiagramaLinea.DoesNotExist, ValueError):
+        return HttpResponseBadRequest("Línea o fecha inválida")
+
+    salida = patrones.materializar(linea, day)
+    return redirect(f"{reverse_lazy('flota:salida_update', args=[salida.pk])}?fecha={day}")
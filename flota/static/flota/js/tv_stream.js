@@ -0,0 +1,55 @@
+// Pantallas TV: reemplaza las filas sólo cuando el servidor avisa un cambio
+// (flota.tv_views.tv_stream). SSE con EventSource; long-poll con fetch si no hay soporte.
+//
+// Uso: <tbody data-tv-stream="{% url 'flota:tv_stream' %}" data-tv-pantalla="taller"
+//             data-tv-day="YYYY-MM-DD" data-tv-refresh="20">
+(function () {
+  document.querySelectorAll('[data-tv-stream]').forEach(function (tbody) {
+    const refreshSec = Number(tbody.dataset.tvRefresh) || 20;
+    let ultimo = '';
+
+    const url = new URL(tbody.dataset.tvStream, window.location.origin);
+    new URLSearchParams(window.location.search).forEach(function (v, k) {
+      url.searchParams.set(k, v);
+    });
+    url.searchParams.set('pantalla', tbody.dataset.tvPantalla);
+
+    function aplicar(d) {
+      // Cambió el día mostrado (ej. pasadas las 18hs): recargar con encabezado incluido
+      if (d.day && tbody.dataset.tvDay && d.day !== tbody.dataset.tvDay) {
+        window.location.reload();
+        return;
+      }
+      ultimo = d.hash;
+      tbody.innerHTML = d.html;
+    }
+
+    if (window.EventSource) {
+      const es = new EventSource(url.toString());
+      es.addEventListener('fragmento', function (e) {
+        aplicar(JSON.parse(e.data));
+      });
+      return;
+    }
+
+    function esperar(ms) {
+      return new Promise(function (r) { setTimeout(r, ms); });
+    }
+
+    (async function poll() {
+      for (;;) {
+        try {
+          url.searchParams.set('ultimo', ultimo);
+          const res = await fetch(url.toString(), { credentials: 'same-origin' });
+          if (res.status === 200) {
+            aplicar(await res.json());
+          } else if (res.status !== 204) {
+            await esperar(refreshSec * 1000);
+          }
+        } catch (e) {
+          await esperar(refreshSec * 1000);
+        }
+      }
+    })();
+  });
+})();
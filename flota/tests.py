@@ -4,15 +4,33 @@ from datetime import timedelta
 
 import shutil
 import tempfile
+from io import StringIO
 
 from django.contrib.auth.models import Permission, User
 from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
 from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.db import connection
 from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
 from django.urls import reverse
 from django.utils import timezone
 
-from flota.models import Colectivo
+from flota import conflictos, estado_unidad, expansion, odometro, patrones, vencimientos, vocabulario
+from flota.models import (
+    Colectivo,
+    EstadoUnidad,
+    EstimacionOdometro,
+    Feriado,
+    OdometroLectura,
+    PatronDiagrama,
+    PatronDiagramaLinea,
+    SalidaProgramada,
+    TerminoVocabulario,
+    Vencimiento,
+)
 from flota.partes_models import ParteDiario, ParteDiarioAdjunto
 
 
@@ -145,3 +163,838 @@ class FlotaPlan15SmokeTests(TestCase):
         url = reverse("flota:informe_flota")
         resp = self.client.get(url)
         self.assertEqual(resp.status_code, 200)
+
+
+# Sin muestreo: cada request se audita (el conteo de consultas no depende del contador de la regla)
+@override_settings(TV_STREAM_ESPERA=0, TV_STREAM_INTERVALO=0, AUDITORIA_MUESTREO=[])
+class TvStreamTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.admin = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.login(username="admin", password="admin12345")
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CHASIS10",
+            is_active=True,
+        )
+        self.fecha = timezone.localdate().isoformat()
+        self.url = reverse("flota:tv_stream")
+
+    def _salida(self, label):
+        return SalidaProgramada.objects.create(
+            colectivo=self.c,
+            salida_programada=timezone.now() + timedelta(hours=1),
+            seccion="TERMAS",
+            salida_label=label,
+        )
+
+    def test_long_poll_envia_solo_si_cambia(self):
+        self._salida("S-001")
+
+        resp = self.client.get(self.url, {"pantalla": "horarios", "fecha": self.fecha})
+        self.assertEqual(resp.status_code, 200)
+        data = resp.json()
+        self.assertIn("S-001", data["html"])
+        self.assertEqual(data["day"], self.fecha)
+
+        # Misma versión: 204 sin tocar la DB (el fragmento sale del cache)
+        with self.assertNumQueries(3):  # sesión + usuario + AuditEvent
+            resp = self.client.get(self.url, {"pantalla": "horarios", "fecha": self.fecha, "ultimo": data["hash"]})
+        self.assertEqual(resp.status_code, 204)
+
+        # Una edición incrementa la generación: fragmento nuevo
+        self._salida("S-002")
+        resp = self.client.get(self.url, {"pantalla": "horarios", "fecha": self.fecha, "ultimo": data["hash"]})
+        self.assertEqual(resp.status_code, 200)
+        self.assertIn("S-002", resp.json()["html"])
+
+    def test_sse_usa_last_event_id(self):
+        ParteDiario.objects.create(
+            colectivo=self.c,
+            tipo=ParteDiario.Tipo.INCIDENCIA,
+            severidad=ParteDiario.Severidad.ALTA,
+            estado=ParteDiario.Estado.ABIERTO,
+            descripcion="Pierde aceite",
+        )
+
+        resp = self.client.get(self.url, {"pantalla": "taller"}, HTTP_ACCEPT="text/event-stream")
+        self.assertEqual(resp["Content-Type"], "text/event-stream")
+        body = b"".join(resp.streaming_content).decode()
+        self.assertIn("event: fragmento", body)
+        self.assertIn("Pierde aceite", body)
+        ultimo = body.split("id: ", 1)[1].split("\n", 1)[0]
+
+        resp = self.client.get(self.url, {"pantalla": "taller"}, HTTP_ACCEPT="text/event-stream", HTTP_LAST_EVENT_ID=ultimo)
+        body = b"".join(resp.streaming_content).decode()
+        self.assertNotIn("event: fragmento", body)
+        self.assertIn(": sin cambios", body)
+
+    def test_pantalla_invalida_y_permisos(self):
+        resp = self.client.get(self.url, {"pantalla": "otra"})
+        self.assertEqual(resp.status_code, 400)
+
+        User.objects.create_user(username="sin_perm", password="pass12345")
+        self.client.login(username="sin_perm", password="pass12345")
+        resp = self.client.get(self.url, {"pantalla": "taller"})
+        self.assertEqual(resp.status_code, 403)
+
+
+class EtagFlotaTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.login(username="admin", password="admin12345")
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CHASIS10",
+            is_active=True,
+        )
+        self.fecha = timezone.localdate().isoformat()
+        self.salida = SalidaProgramada.objects.create(
+            colectivo=self.c,
+            salida_programada=timezone.now() + timedelta(hours=1),
+            seccion="TERMAS",
+            salida_label="S-001",
+        )
+
+    def test_304_si_no_cambio(self):
+        # TV Horarios firma además patrones y feriados (flota.patrones)
+        for name, queries in (("flota:tv_horarios", 7), ("flota:salida_dual", 5), ("flota:salida_diagrama_print", 5)):
+            url = reverse(name)
+            resp = self.client.get(url, {"fecha": self.fecha})
+            self.assertEqual(resp.status_code, 200, name)
+            etag = resp["ETag"]
+            self.assertIn("no-cache", resp["Cache-Control"])
+
+            # Sólo sesión, usuario, agregados del ETag y AuditEvent: nada de la vista
+            with self.assertNumQueries(queries):
+                resp = self.client.get(url, {"fecha": self.fecha}, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(resp.status_code, 304, name)
+            self.assertEqual(resp.content, b"")
+
+    def test_etag_cambia_al_editar(self):
+        url = reverse("flota:tv_taller")
+        resp = self.client.get(url, {"partial": "1"})
+        etag = resp["ETag"]
+        self.assertEqual(self.client.get(url, {"partial": "1"}, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        ParteDiario.objects.create(
+            colectivo=self.c,
+            tipo=ParteDiario.Tipo.INCIDENCIA,
+            severidad=ParteDiario.Severidad.ALTA,
+            estado=ParteDiario.Estado.ABIERTO,
+            descripcion="Pierde aceite",
+        )
+        resp = self.client.get(url, {"partial": "1"}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "Pierde aceite")
+
+        # Borrar también cambia el ETag (cambia la cantidad)
+        url = reverse("flota:tv_horarios")
+        etag = self.client.get(url, {"fecha": self.fecha})["ETag"]
+        self.salida.delete()
+        resp = self.client.get(url, {"fecha": self.fecha}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertNotContains(resp, "S-001")
+
+
+    def test_sin_fecha_firma_solo_el_dia_de_la_heuristica(self):
+        # Una salida de otro día (lejano) no invalida la pantalla del día que se muestra
+        vieja = SalidaProgramada.objects.create(
+            colectivo=self.c,
+            salida_programada=timezone.now() - timedelta(days=40),
+            seccion="TERMAS",
+            salida_label="S-VIEJA",
+        )
+        url = reverse("flota:salida_diagrama_print")
+        etag = self.client.get(url)["ETag"]
+        vieja.salida_label = "S-EDITADA"
+        vieja.save()
+        self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH=etag).status_code, 304)
+
+        # Una del día mostrado sí
+        self.salida.salida_label = "S-002"
+        self.salida.save()
+        resp = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(resp.status_code, 200)
+        self.assertContains(resp, "S-002")
+
+
+class VocabularioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CHASIS10",
+            is_active=True,
+        )
+
+    def _salida(self, **kwargs):
+        return SalidaProgramada.objects.create(colectivo=self.c, salida_programada=timezone.now(), **kwargs)
+
+    def _termino(self, tipo, termino):
+        return TerminoVocabulario.objects.get(tipo=tipo, termino=termino)
+
+    def test_ranking_por_uso_reciente(self):
+        self._salida(chofer="ZAPATA")
+        self._salida(chofer="ZAPATA", seccion="TERMAS")
+        self._salida(chofer="ACOSTA")
+
+        listas = vocabulario.datalists()
+        self.assertEqual(listas["datalist_choferes"], ["ZAPATA", "ACOSTA"])
+        self.assertEqual(listas["datalist_secciones"], ["TERMAS"])
+        self.assertEqual(self._termino(TerminoVocabulario.Tipo.CHOFER, "ZAPATA").frecuencia, 2)
+
+        # Muchos usos viejos pesan menos que pocos recientes
+        hace_un_anio = timezone.now() - timedelta(days=365)
+        vocabulario.registrar([(TerminoVocabulario.Tipo.CHOFER, "BENITEZ")] * 20, cuando=hace_un_anio)
+        self.assertEqual(vocabulario.datalists()["datalist_choferes"][-1], "BENITEZ")
+
+    def test_solo_cuenta_cambios(self):
+        s = self._salida(chofer="ZAPATA")
+        s = SalidaProgramada.objects.get(pk=s.pk)
+        s.nota = "sin cambios de vocabulario"
+        s.save()
+        self.assertEqual(self._termino(TerminoVocabulario.Tipo.CHOFER, "ZAPATA").frecuencia, 1)
+
+        s.chofer = "ACOSTA"
+        s.save()
+        s.save()
+        self.assertEqual(self._termino(TerminoVocabulario.Tipo.CHOFER, "ACOSTA").frecuencia, 1)
+
+    def test_datalists_desde_cache(self):
+        self._salida(chofer="ZAPATA")
+        vocabulario.datalists()
+        with self.assertNumQueries(0):
+            self.assertEqual(vocabulario.datalists()["datalist_choferes"], ["ZAPATA"])
+
+    def test_reconstruir(self):
+        self._salida(chofer=" ZAPATA ", recorrido="RCIA")
+        self._salida(chofer="ZAPATA")
+        TerminoVocabulario.objects.all().delete()
+
+        self.assertEqual(vocabulario.reconstruir(), 2)
+        self.assertEqual(self._termino(TerminoVocabulario.Tipo.CHOFER, "ZAPATA").frecuencia, 2)
+        self.assertEqual(vocabulario.datalists()["datalist_recorridos"], ["RCIA"])
+
+    def test_formulario_chofer_no_lee_salidas(self):
+        for i in range(5):
+            self._salida(chofer=f"CHOFER {i}")
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+
+        with CaptureQueriesContext(connection) as q:
+            resp = self.client.get(reverse("flota:chofer_parte_create"))
+        self.assertEqual(resp.status_code, 200)
+        self.assertFalse([x for x in q.captured_queries if "flota_salidaprogramada" in x["sql"]])
+
+
+class ExpansionTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CHASIS10",
+            is_active=True,
+        )
+        self.base = timezone.localdate() - timedelta(days=30)
+
+    def _salida(self, day, hora, **kwargs):
+        dt = timezone.make_aware(timezone.datetime.combine(day, timezone.datetime.min.time()).replace(hour=hora))
+        return SalidaProgramada.objects.create(colectivo=self.c, salida_programada=dt, **kwargs)
+
+    def test_quincena_queries_constantes(self):
+        for k in range(15):
+            for hora in (6, 12, 18):
+                self._salida(self.base + timedelta(days=k), hora, chofer=f"CHOFER {hora}")
+        pares = [(self.base + timedelta(days=k), self.base + timedelta(days=k + 15)) for k in range(15)]
+
+        # origen + existentes + bulk_create + vocabulario (lectura, update, insert) + savepoint
+        with CaptureQueriesContext(connection) as q:
+            reporte = expansion.expandir(pares)
+        self.assertEqual(reporte.total_creadas, 45)
+        self.assertLessEqual(len(q), 10)
+        self.assertEqual(SalidaProgramada.objects.count(), 90)
+        self.assertEqual(TerminoVocabulario.objects.get(termino="CHOFER 6").frecuencia, 30)
+
+    def test_omitidas_y_dias_sin_origen(self):
+        destino = self.base + timedelta(days=1)
+        self._salida(self.base, 6, chofer="ZAPATA")
+        self._salida(self.base, 7)
+        self._salida(destino, 6)
+
+        reporte = expansion.expandir([(self.base, destino), (self.base - timedelta(days=1), self.base)])
+        self.assertEqual(reporte.origenes, 2)
+        self.assertEqual(reporte.total_creadas, 1)
+        self.assertEqual([o.motivo for o in reporte.omitidas], ["ya existe"])
+        self.assertEqual(reporte.dias_sin_origen, [self.base - timedelta(days=1)])
+
+        copia = SalidaProgramada.objects.get(salida_programada__date=destino, salida_programada__hour=7)
+        self.assertEqual(copia.estado, SalidaProgramada.Estado.PROGRAMADA)
+
+    @override_settings(TIME_ZONE="America/Sao_Paulo")
+    def test_desplazar_conserva_hora_local(self):
+        # Brasil tuvo horario de verano hasta 2019: 04/11/2018 adelantó una hora
+        antes = timezone.make_aware(timezone.datetime(2018, 11, 3, 6, 30))
+        despues = expansion.desplazar(antes, 1)
+        self.assertEqual(timezone.localtime(despues).strftime("%Y-%m-%d %H:%M"), "2018-11-04 06:30")
+        self.assertEqual(despues.timestamp() - antes.timestamp(), 23 * 3600)
+
+
+class PatronesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CHASIS10",
+            is_active=True,
+        )
+        # Lunes
+        self.lunes = timezone.localdate() - timedelta(days=timezone.localdate().weekday())
+        self.normal = PatronDiagrama.objects.create(nombre="Hábiles", vigente_desde=self.lunes - timedelta(days=60))
+        self.domingo = PatronDiagrama.objects.create(
+            nombre="Domingos", tipo_dia=PatronDiagrama.TipoDia.DOMINGO, vigente_desde=self.lunes - timedelta(days=60)
+        )
+        self.linea = PatronDiagramaLinea.objects.create(
+            patron=self.normal, colectivo=self.c, hora=timezone.datetime(2000, 1, 1, 6, 0).time(), seccion="TERMAS", chofer="ZAPATA"
+        )
+        PatronDiagramaLinea.objects.create(
+            patron=self.normal, colectivo=self.c, hora=timezone.datetime(2000, 1, 1, 14, 0).time(), seccion="TERMAS"
+        )
+        PatronDiagramaLinea.objects.create(
+            patron=self.domingo, colectivo=self.c, hora=timezone.datetime(2000, 1, 1, 8, 0).time(), seccion="DOMINGO"
+        )
+
+    def test_resolver_por_tipo_de_dia_y_feriado(self):
+        Feriado.objects.create(fecha=self.lunes + timedelta(days=2), descripcion="Feriado")
+        dias = patrones.resolver(self.lunes, self.lunes + timedelta(days=6), [])
+
+        self.assertEqual([s.seccion for s in dias[self.lunes]], ["TERMAS", "TERMAS"])
+        # Feriado sin patrón propio: usa el de domingo
+        self.assertEqual([s.seccion for s in dias[self.lunes + timedelta(days=2)]], ["DOMINGO"])
+        self.assertEqual([s.seccion for s in dias[self.lunes + timedelta(days=6)]], ["DOMINGO"])
+        self.assertTrue(all(s.virtual and s.pk is None for s in dias[self.lunes]))
+        self.assertEqual(SalidaProgramada.objects.count(), 0)
+
+    def test_queries_no_crecen_con_el_horizonte(self):
+        with CaptureQueriesContext(connection) as corto:
+            patrones.resolver(self.lunes, self.lunes + timedelta(days=6), [])
+        with CaptureQueriesContext(connection) as largo:
+            dias = patrones.resolver(self.lunes, self.lunes + timedelta(days=89), [])
+        self.assertEqual(len(corto), len(largo))
+        self.assertEqual(sum(len(v) for v in dias.values()), 78 * 2 + 12)
+
+    def test_excepcion_reemplaza_linea_del_dia(self):
+        salida = patrones.materializar(self.linea, self.lunes)
+        self.assertEqual(patrones.materializar(self.linea, self.lunes).pk, salida.pk)
+        salida.salida_programada += timedelta(minutes=30)
+        salida.chofer = "ACOSTA"
+        salida.save()
+
+        concretas = SalidaProgramada.objects.select_related("colectivo")
+        dias = patrones.resolver(self.lunes, self.lunes + timedelta(days=1), concretas)
+        self.assertEqual([s.chofer for s in dias[self.lunes]], ["ACOSTA", ""])
+        self.assertEqual([s.chofer for s in dias[self.lunes + timedelta(days=1)]], ["ZAPATA", ""])
+
+    def test_plan_15_y_editar_linea(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+
+        resp = self.client.get(reverse("flota:plan_15"), {"start": self.lunes.isoformat()})
+        self.assertContains(resp, "ZAPATA", count=13)
+
+        resp = self.client.post(reverse("flota:salida_patron_editar"), {"linea": self.linea.pk, "fecha": self.lunes.isoformat()})
+        salida = SalidaProgramada.objects.get()
+        self.assertRedirects(resp, f"{reverse('flota:salida_update', args=[salida.pk])}?fecha={self.lunes}", fetch_redirect_response=False)
+        self.assertEqual((salida.patron_linea_id, salida.patron_fecha), (self.linea.pk, self.lunes))
+
+        resp = self.client.get(reverse("flota:tv_horarios"), {"fecha": self.lunes.isoformat()})
+        self.assertContains(resp, "ZAPATA", count=1)
+
+
+class ConflictosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c1 = Colectivo.objects.create(
+            interno=10, dominio="AAA111", anio_modelo=2015, marca="Marca", modelo="Modelo", numero_chasis="CHASIS10"
+        )
+        self.c2 = Colectivo.objects.create(
+            interno=20, dominio="BBB222", anio_modelo=2016, marca="Marca", modelo="Modelo", numero_chasis="CHASIS20"
+        )
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def _salida(self, colectivo, hora, minutos=0, **kwargs):
+        dt = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time()).replace(hour=hora, minute=minutos))
+        return SalidaProgramada.objects.create(colectivo=colectivo, salida_programada=dt, **kwargs)
+
+    def test_unidad_y_chofer_superpuestos(self):
+        a = self._salida(self.c1, 6, chofer="Pérez, Juan")
+        b = self._salida(self.c1, 6, 30)
+        self._salida(self.c2, 6, 45, chofer="PEREZ JUAN")
+        # Sin superposición: arranca cuando termina la duración asumida
+        self._salida(self.c1, 8)
+        # Cancelada no ocupa
+        self._salida(self.c2, 7, estado=SalidaProgramada.Estado.CANCELADA, chofer="PEREZ JUAN")
+
+        encontrados = conflictos.en_rango(self.day, self.day)
+        self.assertEqual(
+            [(c.recurso, c.clave, c.a.pk, c.b.pk) for c in encontrados if c.recurso == "colectivo"],
+            [("colectivo", "Interno 10", a.pk, b.pk)],
+        )
+        self.assertEqual([(c.recurso, c.clave) for c in encontrados if c.recurso == "chofer"], [("chofer", "PEREZ JUAN")])
+
+    def test_especial_con_llegada_de_dia_anterior(self):
+        inicio = timezone.make_aware(timezone.datetime.combine(self.day - timedelta(days=1), timezone.datetime.min.time()).replace(hour=20))
+        SalidaProgramada.objects.create(
+            colectivo=self.c1,
+            salida_programada=inicio,
+            llegada_programada=inicio + timedelta(hours=14),
+            tipo=SalidaProgramada.Tipo.ESPECIAL,
+        )
+        self._salida(self.c1, 9)
+        self._salida(self.c1, 11)
+        self.assertEqual(len(conflictos.en_rango(self.day, self.day)), 1)
+
+    def test_api_y_plan(self):
+        self._salida(self.c1, 6)
+        self._salida(self.c1, 6, 30)
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+
+        resp = self.client.get(reverse("flota:api_conflictos"), {"desde": self.day.isoformat()})
+        self.assertEqual(resp.json()["total"], 1)
+        self.assertEqual(resp.json()["conflictos"][0]["b"]["interno"], 10)
+        self.assertEqual(self.client.get(reverse("flota:api_conflictos"), {"desde": "x"}).status_code, 400)
+
+        resp = self.client.get(reverse("flota:plan_15"), {"start": self.day.isoformat()})
+        self.assertEqual(resp.context["conflictos_total"], 1)
+        self.assertContains(resp, "Interno 10 también en la salida")
+
+
+    def test_comando_sale_con_codigo_1_si_hay_conflictos(self):
+        args = ["detectar_conflictos", f"--desde={self.day.isoformat()}", f"--hasta={self.day.isoformat()}"]
+        self._salida(self.c1, 6)
+        call_command(*args, stdout=StringIO(), stderr=StringIO())
+
+        self._salida(self.c1, 6, 30)
+        out = StringIO()
+        with self.assertRaises(CommandError) as ctx:
+            call_command(*args, stdout=out, stderr=StringIO())
+        self.assertEqual(ctx.exception.returncode, 1)
+        self.assertIn("1 conflictos", str(ctx.exception))
+        self.assertIn("Interno 10", out.getvalue())
+
+
+class DiagramaFormsetQueriesTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        self.colectivos = [
+            Colectivo.objects.create(
+                interno=i, dominio=f"AAA{i:03d}", anio_modelo=2015, marca="Marca", modelo="Modelo", numero_chasis=f"CH{i}"
+            )
+            for i in range(1, 21)
+        ]
+        self.day = timezone.localdate() + timedelta(days=1)
+
+    def _cargar(self, n):
+        base = timezone.make_aware(timezone.datetime.combine(self.day, timezone.datetime.min.time()).replace(hour=5))
+        for i in range(n):
+            SalidaProgramada.objects.create(
+                colectivo=self.colectivos[i % 20], salida_programada=base + timedelta(minutes=10 * i), chofer=f"CHOFER {i}"
+            )
+
+    def _queries(self, url):
+        cache.clear()
+        with CaptureQueriesContext(connection) as q:
+            resp = self.client.get(url, {"fecha": self.day.isoformat()})
+        self.assertEqual(resp.status_code, 200)
+        return len(q), resp
+
+    def test_queries_constantes_al_crecer_filas(self):
+        for name in ("flota:salida_diagrama_edit", "flota:salida_diagrama_reemplazos"):
+            SalidaProgramada.objects.all().delete()
+            self._cargar(3)
+            pocas, _ = self._queries(reverse(name))
+            self._cargar(30)
+            muchas, resp = self._queries(reverse(name))
+            self.assertEqual(pocas, muchas, name)
+            self.assertContains(resp, '<option value="%d" selected>' % self.colectivos[0].pk)
+
+    def test_post_valida_contra_opciones_compartidas(self):
+        self._cargar(2)
+        salidas = list(SalidaProgramada.objects.order_by("salida_programada"))
+        data = {
+            "form-TOTAL_FORMS": "2",
+            "form-INITIAL_FORMS": "2",
+            "form-MIN_NUM_FORMS": "0",
+            "form-MAX_NUM_FORMS": "1000",
+        }
+        for i, s in enumerate(salidas):
+            data[f"form-{i}-id"] = str(s.pk)
+            data[f"form-{i}-colectivo"] = str(self.colectivos[5].pk)
+            data[f"form-{i}-chofer"] = s.chofer
+        data["form-1-colectivo"] = "999999"
+
+        url = f"{reverse('flota:salida_diagrama_reemplazos')}?fecha={self.day.isoformat()}"
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 200)
+        self.assertTrue(resp.context["formset"].forms[1].errors)
+
+        data["form-1-colectivo"] = str(self.colectivos[6].pk)
+        resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(
+            list(SalidaProgramada.objects.order_by("salida_programada").values_list("colectivo__interno", flat=True)), [6, 7]
+        )
+
+    def _post_reshuffle(self, url):
+        salidas = list(SalidaProgramada.objects.order_by("salida_programada", "id"))
+        data = {
+            "form-TOTAL_FORMS": str(len(salidas)),
+            "form-INITIAL_FORMS": str(len(salidas)),
+            "form-MIN_NUM_FORMS": "0",
+            "form-MAX_NUM_FORMS": "1000",
+        }
+        for i, s in enumerate(salidas):
+            data[f"form-{i}-id"] = str(s.pk)
+            # Todas cambian de unidad; las pares también de chofer
+            data[f"form-{i}-colectivo"] = str(self.colectivos[(i + 1) % 20].pk)
+            data[f"form-{i}-chofer"] = f"REEMPLAZO {i}" if i % 2 == 0 else s.chofer
+        cache.clear()
+        with CaptureQueriesContext(connection) as q:
+            resp = self.client.post(url, data)
+        self.assertEqual(resp.status_code, 302)
+        return len(q)
+
+    def test_guardar_diagrama_queries_constantes(self):
+        from django.contrib.admin.models import LogEntry
+
+        url = f"{reverse('flota:salida_diagrama_edit')}?fecha={self.day.isoformat()}"
+        self._cargar(10)
+        pocas = self._post_reshuffle(url)
+        self.assertEqual(LogEntry.objects.count(), 10)
+
+        SalidaProgramada.objects.all().delete()
+        LogEntry.objects.all().delete()
+        self._cargar(100)
+        antes = timezone.now()
+        muchas = self._post_reshuffle(url)
+        self.assertEqual(pocas, muchas)
+
+        self.assertEqual(LogEntry.objects.count(), 100)
+        primera = SalidaProgramada.objects.order_by("salida_programada", "id").first()
+        self.assertEqual((primera.colectivo.interno, primera.chofer), (2, "REEMPLAZO 0"))
+        self.assertGreaterEqual(primera.updated_at, antes)
+        self.assertIn("colectivo_id", LogEntry.objects.get(object_id=str(primera.pk)).change_message)
+        self.assertTrue(TerminoVocabulario.objects.filter(termino="REEMPLAZO 98").exists())
+
+    def test_update_view_registra_cambio(self):
+        from django.contrib.admin.models import LogEntry
+
+        self._cargar(1)
+        s = SalidaProgramada.objects.get()
+        form = {
+            "colectivo": s.colectivo_id,
+            "salida_programada": timezone.localtime(s.salida_programada).strftime("%Y-%m-%dT%H:%M"),
+            "tipo": s.tipo,
+            "estado": s.estado,
+            "chofer": "OTRO",
+        }
+        resp = self.client.post(reverse("flota:salida_update", args=[s.pk]), form)
+        self.assertEqual(resp.status_code, 302, getattr(resp, "context", None) and resp.context["form"].errors)
+        log = LogEntry.objects.get()
+        self.assertIn("'chofer'", log.change_message)
+        self.assertNotIn("colectivo_id", log.change_message)
+
+
+class EstadoUnidadTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.c1 = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CH10",
+            revision_tecnica_vto=timezone.localdate() + timedelta(days=10),
+            matafuego_1_vto=timezone.localdate() + timedelta(days=40),
+            matafuego_2_vto=timezone.localdate() + timedelta(days=5),
+        )
+        self.c2 = Colectivo.objects.create(
+            interno=20, dominio="BBB222", anio_modelo=2016, marca="Marca", modelo="Modelo", numero_chasis="CH20"
+        )
+
+    def _estado(self, c):
+        return EstadoUnidad.objects.get(colectivo=c)
+
+    def test_se_mantiene_por_senales(self):
+        e = self._estado(self.c1)
+        self.assertEqual((e.vtv_dias, e.matafuego_dias, e.proxima_salida), (10, 5, None))
+
+        pronto = timezone.now() + timedelta(hours=2)
+        s = SalidaProgramada.objects.create(colectivo=self.c1, salida_programada=pronto + timedelta(hours=1), salida_label="B")
+        SalidaProgramada.objects.create(colectivo=self.c1, salida_programada=pronto, salida_label="A")
+        self.assertEqual(self._estado(self.c1).proxima_label, "A")
+
+        # Cambiar de unidad recalcula las dos
+        s = SalidaProgramada.objects.get(pk=s.pk)
+        s.colectivo = self.c2
+        s.save()
+        self.assertEqual(self._estado(self.c2).proxima_label, "B")
+
+        p1 = ParteDiario.objects.create(
+            colectivo=self.c1, tipo=ParteDiario.Tipo.INCIDENCIA, severidad=ParteDiario.Severidad.MEDIA, descripcion="x"
+        )
+        p2 = ParteDiario.objects.create(
+            colectivo=self.c1, tipo=ParteDiario.Tipo.INCIDENCIA, severidad=ParteDiario.Severidad.CRITICA, descripcion="y"
+        )
+        e = self._estado(self.c1)
+        self.assertEqual((e.partes_abiertos, e.severidad_max, e.ultimo_parte_id), (2, "CRITICA", p2.pk))
+
+        p2.estado = ParteDiario.Estado.RESUELTO
+        p2.save()
+        e = self._estado(self.c1)
+        self.assertEqual((e.partes_abiertos, e.severidad_max, e.ultimo_parte_id), (1, "MEDIA", p1.pk))
+
+    def test_parte_movido_a_otra_unidad_recalcula_las_dos(self):
+        p = ParteDiario.objects.create(
+            colectivo=self.c1, tipo=ParteDiario.Tipo.INCIDENCIA, severidad=ParteDiario.Severidad.ALTA, descripcion="x"
+        )
+        self.assertEqual(self._estado(self.c1).partes_abiertos, 1)
+
+        # Como la edición del parte: instancia leída de la DB, se cambia la unidad
+        p = ParteDiario.objects.get(pk=p.pk)
+        p.colectivo = self.c2
+        p.save()
+        e1, e2 = self._estado(self.c1), self._estado(self.c2)
+        self.assertEqual((e1.partes_abiertos, e1.severidad_max, e1.ultimo_parte_id), (0, "", None))
+        self.assertEqual((e2.partes_abiertos, e2.severidad_max, e2.ultimo_parte_id), (1, "ALTA", p.pk))
+
+        # Misma instancia, de vuelta a la primera unidad
+        p.colectivo = self.c1
+        p.save()
+        self.assertEqual(self._estado(self.c1).partes_abiertos, 1)
+        self.assertEqual(self._estado(self.c2).partes_abiertos, 0)
+
+    def test_vigentes_corre_salidas_pasadas_y_reconstruir(self):
+        ahora = timezone.now()
+        SalidaProgramada.objects.create(colectivo=self.c1, salida_programada=ahora + timedelta(minutes=5), salida_label="A")
+        SalidaProgramada.objects.create(colectivo=self.c1, salida_programada=ahora + timedelta(hours=3), salida_label="B")
+
+        self.assertEqual(estado_unidad.vigentes(ahora), 0)
+        self.assertEqual(estado_unidad.vigentes(ahora + timedelta(minutes=10)), 1)
+        self.assertEqual(self._estado(self.c1).proxima_label, "B")
+
+        # Rearmado desde cero (con la hora real: A todavía no salió)
+        EstadoUnidad.objects.all().delete()
+        self.assertEqual(estado_unidad.reconstruir(), 2)
+        self.assertEqual(self._estado(self.c1).proxima_label, "A")
+
+    def test_actualizar_queries_fijas(self):
+        for c in (self.c1, self.c2):
+            SalidaProgramada.objects.create(colectivo=c, salida_programada=timezone.now() + timedelta(hours=1))
+        with self.assertNumQueries(4):
+            estado_unidad.actualizar([self.c1.pk, self.c2.pk])
+
+    def test_informe_lee_estado(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        ParteDiario.objects.create(
+            colectivo=self.c1, tipo=ParteDiario.Tipo.INCIDENCIA, severidad=ParteDiario.Severidad.ALTA, descripcion="x"
+        )
+        resp = self.client.get(reverse("flota:informe_flota"))
+        self.assertEqual(resp.status_code, 200)
+        fila = next(r for r in resp.context["rows"] if r["unidad"].pk == self.c1.pk)
+        self.assertEqual((fila["partes_cant"], fila["partes_sev"], fila["vtv_dias"], fila["matafuego_dias"]), (1, "ALTA", 10, 5))
+
+
+class VencimientosTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoy = timezone.localdate()
+        self.c1 = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CH10",
+            revision_tecnica_vto=self.hoy + timedelta(days=3),
+            matafuego_vto=self.hoy + timedelta(days=30),
+            odometro_km=109_800,
+            aceite_ultimo_cambio_km=100_000,
+            aceite_intervalo_km=10_000,
+        )
+        self.c2 = Colectivo.objects.create(
+            interno=20,
+            dominio="BBB222",
+            anio_modelo=2016,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CH20",
+            revision_tecnica_vto=self.hoy - timedelta(days=1),
+        )
+
+    def _vtos(self, c):
+        return {v.tipo: v for v in Vencimiento.objects.filter(colectivo=c)}
+
+    def test_se_mantiene_al_guardar(self):
+        v = self._vtos(self.c1)
+        self.assertEqual(set(v), {Vencimiento.Tipo.VTV, Vencimiento.Tipo.MATAFUEGO_1, Vencimiento.Tipo.ACEITE})
+        # Matafuego sin campo nuevo: sale del legacy
+        self.assertEqual(v[Vencimiento.Tipo.MATAFUEGO_1].campo, "matafuego_vto")
+        self.assertEqual((v[Vencimiento.Tipo.ACEITE].km, v[Vencimiento.Tipo.ACEITE].km_restantes), (110_000, 200))
+
+        self.c1.revision_tecnica_vto = None
+        self.c1.odometro_km = 110_300
+        self.c1.save()
+        v = self._vtos(self.c1)
+        self.assertNotIn(Vencimiento.Tipo.VTV, v)
+        self.assertEqual(v[Vencimiento.Tipo.ACEITE].km_restantes, -300)
+
+    def test_proximos_por_fecha_y_km(self):
+        Colectivo.objects.create(
+            interno=30,
+            dominio="CCC333",
+            anio_modelo=2016,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CH30",
+            revision_tecnica_vto=self.hoy,
+            is_active=False,
+        )
+        filas = [(v.colectivo.interno, v.tipo) for v in vencimientos.proximos(dias=7)]
+        # Vencido primero, luego por fecha; el aceite entra por km; la unidad inactiva no
+        self.assertEqual(filas[:2], [(20, "VTV"), (10, "VTV")])
+        self.assertIn((10, "ACEITE"), filas)
+        self.assertNotIn((10, "MATAFUEGO_1"), filas)
+        self.assertNotIn(30, [i for i, _ in filas])
+
+        d = vencimientos.describir(vencimientos.proximos(dias=7, tipos=["ACEITE"]).get())
+        self.assertEqual((d["estado"], d["badge"], d["km_restantes"]), ("Por vencer", "high", 200))
+
+    def test_sincronizar_queries_fijas(self):
+        colectivos = list(Colectivo.objects.all())
+        with self.assertNumQueries(3):
+            vencimientos.sincronizar(colectivos)
+        Vencimiento.objects.all().delete()
+        self.assertEqual(vencimientos.reconstruir(), 4)
+
+    def test_reporte_usa_el_indice(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        self.c1.matafuego_2_vto = self.hoy + timedelta(days=2)
+        self.c1.save()
+        resp = self.client.get(reverse("flota:colectivo_report", args=[self.c1.pk]))
+        self.assertEqual(resp.status_code, 200)
+        self.assertEqual((resp.context["mf_dias"], resp.context["mf_estado"]), (2, "Por vencer"))
+        self.assertEqual((resp.context["vtv_dias"], resp.context["aceite"]["faltan_km"]), (3, 200))
+
+
+class OdometroTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.hoy = timezone.localdate()
+        self.c = Colectivo.objects.create(
+            interno=10,
+            dominio="AAA111",
+            anio_modelo=2015,
+            marca="Marca",
+            modelo="Modelo",
+            numero_chasis="CH10",
+            aceite_ultimo_cambio_km=100_000,
+            aceite_intervalo_km=10_000,
+        )
+
+    def _parte(self, dias_atras, km, **kw):
+        return ParteDiario.objects.create(
+            colectivo=self.c,
+            fecha_evento=timezone.now() - timedelta(days=dias_atras),
+            tipo=ParteDiario.Tipo.CHECKLIST,
+            odometro_km=km,
+            descripcion="x",
+            **kw,
+        )
+
+    def test_lecturas_desde_partes_y_carga_manual(self):
+        p = self._parte(1, 150_000)
+        self.assertEqual(p.lectura_odometro.km, 150_000)
+        p.odometro_km = 150_100
+        p.save()
+        self.assertEqual(OdometroLectura.objects.get(parte=p).km, 150_100)
+        p.odometro_km = None
+        p.save()
+        self.assertFalse(OdometroLectura.objects.filter(parte=p).exists())
+
+        # Mantenimiento sin odómetro: el km del cambio también es una lectura
+        m = self._parte(
+            0, None, accion_mantenimiento=ParteDiario.AccionMantenimiento.ACEITE, km_mantenimiento=150_300
+        )
+        self.assertEqual(m.lectura_odometro.km, 150_300)
+
+        # Import: la lectura queda marcada
+        imp = ParteDiario(colectivo=self.c, odometro_km=150_400, descripcion="import")
+        imp._origen_odometro = OdometroLectura.Origen.IMPORTACION
+        imp.save()
+        self.assertEqual(imp.lectura_odometro.origen, OdometroLectura.Origen.IMPORTACION)
+
+        # Edición manual del colectivo: una lectura por km nuevo
+        self.c.odometro_km = 150_500
+        self.c.save()
+        self.c.save()
+        manual = OdometroLectura.objects.filter(colectivo=self.c, origen=OdometroLectura.Origen.MANUAL)
+        self.assertEqual([l.km for l in manual], [150_500])
+
+    def test_ajuste_robusto(self):
+        base = timezone.now()
+        puntos = [(base - timedelta(days=10 - i), 100_000 + 300 * i) for i in range(10)]
+        # Una lectura mal tipeada (un cero de más) no mueve la estimación
+        puntos[4] = (puntos[4][0], 1_001_200)
+        ajuste = odometro.ajustar(puntos, base)
+        self.assertAlmostEqual(ajuste.km_dia, 300, delta=1)
+        self.assertAlmostEqual(ajuste.km_base, 103_000, delta=5)
+        self.assertIsNone(odometro.ajustar(puntos[:2], base))
+
+    def test_estimar_proyecta_aceite(self):
+        for i in range(6):
+            self._parte(30 - 5 * i, 105_000 + 1_000 * i)
+        with self.assertNumQueries(3):
+            self.assertEqual(odometro.estimar(hoy=self.hoy), 1)
+        e = EstimacionOdometro.objects.get(colectivo=self.c)
+        self.assertAlmostEqual(e.km_dia, 200, delta=1)
+
+        vencimientos.reconstruir()
+        aceite = Vencimiento.objects.get(colectivo=self.c, tipo=Vencimiento.Tipo.ACEITE)
+        # Hoy ~111.000 km: el cambio (110.000) ya pasó hace ~5 días
+        self.assertLess(aceite.km_restantes, 0)
+        self.assertEqual(aceite.fecha, e.fecha_para(110_000))
+        self.assertLess(aceite.fecha, self.hoy)
+        self.assertIn(aceite, list(vencimientos.proximos(dias=7)))
+
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        resp = self.client.get(reverse("flota:colectivo_report", args=[self.c.pk]))
+        self.assertEqual(resp.context["aceite"]["fecha_estimada"], aceite.fecha)
+        self.assertEqual(resp.context["km_estimado"], e.km_en(self.hoy))
@@ -0,0 +1,158 @@
+from __future__ import annotations
+
+"""
+flota.tv_views
+
+Actualización por "push" de las pantallas TV (Taller / Horarios).
+
+Cómo funciona
+- La TV abre un EventSource (SSE) contra `tv_stream`; si el navegador no lo soporta,
+  hace long-poll con fetch al mismo endpoint.
+- Cada conexión espera hasta TV_STREAM_ESPERA segundos mirando sólo los contadores de
+  generación en cache (core.generaciones): mientras no se edite una SalidaProgramada /
+  ParteDiario no se toca la DB.
+- Cuando cambia la generación (o pasa el minuto, porque "próxima salida" depende de la hora)
+  el fragmento se rearma UNA vez y queda en cache para todas las pantallas con los mismos
+  parámetros. Se envía sólo si su hash difiere del que ya tiene la pantalla.
+- Después de enviar (o de vencer la espera) la conexión se cierra: waitress tiene pocos hilos
+  y no conviene retenerlos. EventSource reconecta solo (campo `retry`) mandando Last-Event-ID.
+"""
+
+import hashlib
+import json
+import time
+from dataclasses import dataclass
+from typing import Callable
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.http import HttpResponse, HttpResponseBadRequest, JsonResponse, StreamingHttpResponse
+from django.template.loader import render_to_string
+from django.views.decorators.http import require_GET
+
+from core import generaciones
+
+from .partes_views import _tv_taller_context
+from .salidas_views import _tv_horarios_context
+
+
+@dataclass(frozen=True)
+class Pantalla:
+    contexto: Callable
+    template: str
+    areas: tuple[str, ...]
+    permiso: str | None = None
+
+
+PANTALLAS = {
+    "taller": Pantalla(
+        _tv_taller_context,
+        "flota/_tv_taller_rows.html",
+        (generaciones.SALIDAS, generaciones.PARTES),
+        "flota.view_partediario",
+    ),
+    "horarios": Pantalla(
+        _tv_horarios_context,
+        "flota/_tv_horarios_rows.html",
+        (generaciones.SALIDAS,),
+    ),
+}
+
+# Parámetros del stream que no cambian el contenido del fragmento
+_PARAMS_CONTROL = {"pantalla", "ultimo", "formato", "partial", "refresh"}
+
+
+@dataclass(frozen=True)
+class Fragmento:
+    hash: str
+    html: str
+    day: str
+
+    def as_dict(self) -> dict:
+        return {"hash": self.hash, "html": self.html, "day": self.day}
+
+
+def _clave_fragmento(request, nombre: str, pantalla: Pantalla) -> str:
+    params = sorted((k, v) for k, v in request.GET.items() if k not in _PARAMS_CONTROL)
+    firma = hashlib.md5(repr(params).encode("utf-8")).hexdigest()[:12]
+    minuto = int(time.time() // 60)
+    return generaciones.clave(f"tv:{nombre}:{firma}:{minuto}", *pantalla.areas)
+
+
+def fragmento(request, nombre: str) -> Fragmento:
+    """Fragmento actual de la pantalla, compartido entre TVs con los mismos parámetros."""
+
+    pantalla = PANTALLAS[nombre]
+    key = _clave_fragmento(request, nombre, pantalla)
+    frag = cache.get(key)
+    if frag is None:
+        ctx = pantalla.contexto(request)
+        html = render_to_string(pantalla.template, ctx)
+        day = ctx.get("day")
+        frag = Fragmento(
+            hash=hashlib.md5(html.encode("utf-8")).hexdigest()[:16],
+            html=html,
+            day=day.isoformat() if day else "",
+        )
+        cache.set(key, frag, 120)
+    return frag
+
+
+def _esperar_cambio(request, nombre: str, ultimo: str) -> Fragmento | None:
+    """Devuelve el fragmento apenas difiera de `ultimo`, o None si vence la espera."""
+
+    espera = float(getattr(settings, "TV_STREAM_ESPERA", 15))
+    intervalo = float(getattr(settings, "TV_STREAM_INTERVALO", 1.0))
+    limite = time.monotonic() + espera
+    while True:
+        frag = fragmento(request, nombre)
+        if frag.hash != ultimo:
+            return frag
+        if time.monotonic() >= limite:
+            return None
+        time.sleep(intervalo)
+
+
+def _sse(request, nombre: str, ultimo: str):
+    retry_ms = int(float(getattr(settings, "TV_STREAM_RETRY", 1.0)) * 1000)
+    yield f"retry: {retry_ms}\n\n"
+    frag = _esperar_cambio(request, nombre, ultimo)
+    if frag is None:
+        yield ": sin cambios\n\n"
+        return
+    yield f"id: {frag.hash}\nevent: fragmento\ndata: {json.dumps(frag.as_dict())}\n\n"
+
+
+@login_required
+@require_GET
+def tv_stream(request):
+    """Fragmento nuevo de una pantalla TV sólo cuando cambió.
+
+    - `pantalla`: taller | horarios (el resto de la querystring es la de la pantalla).
+    - `ultimo`: hash que ya tiene la TV (en SSE también vale el header Last-Event-ID).
+    - SSE si el cliente acepta text/event-stream (o `formato=sse`); si no, long-poll:
+      200 JSON {hash, html, day} o 204 si no hubo cambios dentro de la espera.
+    """
+
+    nombre = (request.GET.get("pantalla") or "").strip()
+    pantalla = PANTALLAS.get(nombre)
+    if pantalla is None:
+        return HttpResponseBadRequest("Pantalla inválida.")
+    if pantalla.permiso and not request.user.has_perm(pantalla.permiso):
+        raise PermissionDenied
+
+    ultimo = (request.headers.get("Last-Event-ID") or request.GET.get("ultimo") or "").strip()
+
+    sse = request.GET.get("formato") == "sse" or "text/event-stream" in request.headers.get("Accept", "")
+    if sse:
+        resp = StreamingHttpResponse(_sse(request, nombre, ultimo), content_type="text/event-stream")
+        resp["Cache-Control"] = "no-cache"
+        resp["X-Accel-Buffering"] = "no"
+        return resp
+
+    frag = _esperar_cambio(request, nombre, ultimo)
+    if frag is None:
+        return HttpResponse(status=204)
+    return JsonResponse(frag.as_dict())
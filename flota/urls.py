@@ -5,6 +5,7 @@ from . import salidas_views
 from . import diagrama_reemplazos_views
 from . import choferes_views
 from . import informe_views
+from . import tv_views
 from . import views
 
 app_name = "flota"
@@ -42,6 +43,7 @@ urlpatterns = [
     path("salidas/copiar-dia-anterior/", salidas_views.salidas_copiar_dia_anterior, name="salida_copy_prev_day"),
     path("salidas/generar-plantilla/", salidas_views.salidas_generar_desde_plantilla, name="salida_generar_plantilla"),
     path("salidas/copiar-15-dias/", salidas_views.salidas_copiar_15_dias, name="salida_copy_15"),
+    path("salidas/patron/editar/", salidas_views.salida_patron_editar, name="salida_patron_editar"),
     path("plan/", salidas_views.plan_15_dias, name="plan_15"),
     path("plan/print/", salidas_views.plan_15_print, name="plan_15_print"),
     path("plan/export.csv", salidas_views.plan_15_export_csv, name="plan_15_export_csv"),
@@ -50,10 +52,12 @@ urlpatterns = [
 
     # API
     path("api/colectivo-info/", salidas_views.api_colectivo_info, name="api_colectivo_info"),
+    path("api/conflictos/", salidas_views.api_conflictos, name="api_conflictos"),
 
     # Pantallas TV
     path("tv/horarios/", salidas_views.tv_horarios, name="tv_horarios"),
     path("tv/taller/", partes_views.tv_taller, name="tv_taller"),
+    path("tv/stream/", tv_views.tv_stream, name="tv_stream"),
 
     # Choferes
     path("choferes/", choferes_views.chofer_list, name="chofer_list"),
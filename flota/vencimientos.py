@@ -0,0 +1,223 @@
+from __future__ import annotations
+
+"""
+flota.vencimientos
+
+Mantiene el índice Vencimiento (una fila por colectivo y tipo) a partir de los campos de
+Colectivo, y es el único lugar que sabe leerlo:
+
+- `sincronizar(colectivos)` recalcula esas unidades (dos lecturas + un upsert, y un delete si
+  algo dejó de tener dato), sin importar cuántas sean. Lo llama el post_save de Colectivo
+  y los caminos bulk (backfill_matafuegos).
+- `proximos(dias, km)` es "todo lo que vence en los próximos N días / M km" de toda la
+  flota: un rango sobre índices, sin recorrer colectivos.
+- `estado_dias` / `estado_km` dan el badge y el texto que usan dashboard, informe y reportes.
+
+Matafuegos: si el campo nuevo está vacío se usa el legacy (matafuego_vto /
+matafuego_vencimiento_2), igual que Colectivo.matafuego_proximo_vencimiento; `campo` dice cuál.
+
+Aceite / filtros: `km_restantes` se cuenta contra el km estimado hoy (EstimacionOdometro, ver
+flota.odometro) o el odómetro cargado si es mayor; con estimación, `fecha` es el día proyectado
+en que se llega al km del cambio.
+"""
+
+from datetime import timedelta
+from typing import Iterable
+
+from django.db.models import F, Q
+from django.utils import timezone
+
+from core import generaciones
+
+from .models import Colectivo
+from .odometro_models import EstimacionOdometro
+from .vencimientos_models import Vencimiento
+
+Tipo = Vencimiento.Tipo
+
+# Umbrales de mantenimiento por km (km restantes)
+KM_POR_VENCER = 500
+KM_PROXIMO = 1500
+
+CAMPOS_COLECTIVO = (
+    "id",
+    "revision_tecnica_vto",
+    "matafuego_1_vto",
+    "matafuego_2_vto",
+    "matafuego_vto",
+    "matafuego_vencimiento_2",
+    "odometro_km",
+    "aceite_intervalo_km",
+    "aceite_ultimo_cambio_km",
+    "filtros_intervalo_km",
+    "filtros_ultimo_cambio_km",
+)
+
+_ACTUALIZABLES = ["fecha", "km", "km_restantes", "campo", "actualizado"]
+
+
+def _primero(c: Colectivo, *campos: str):
+    for campo in campos:
+        valor = getattr(c, campo, None)
+        if valor:
+            return campo, valor
+    return None, None
+
+
+def filas(c: Colectivo, estimacion: EstimacionOdometro | None = None, hoy=None) -> list[Vencimiento]:
+    """Filas Vencimiento (sin guardar) que corresponden a la unidad según sus campos actuales."""
+
+    hoy = hoy or timezone.localdate()
+    km_actual = max(
+        (k for k in (c.odometro_km, estimacion.km_en(hoy) if estimacion else None) if k),
+        default=None,
+    )
+    out = []
+    for tipo, campos in (
+        (Tipo.VTV, ("revision_tecnica_vto",)),
+        (Tipo.MATAFUEGO_1, ("matafuego_1_vto", "matafuego_vto")),
+        (Tipo.MATAFUEGO_2, ("matafuego_2_vto", "matafuego_vencimiento_2")),
+    ):
+        campo, fecha = _primero(c, *campos)
+        if fecha:
+            out.append(Vencimiento(colectivo_id=c.pk, tipo=tipo, fecha=fecha, campo=campo))
+
+    for tipo, prefijo in ((Tipo.ACEITE, "aceite"), (Tipo.FILTROS, "filtros")):
+        ultimo = getattr(c, f"{prefijo}_ultimo_cambio_km")
+        intervalo = getattr(c, f"{prefijo}_intervalo_km")
+        if not ultimo or not intervalo:
+            continue
+        km = int(ultimo) + int(intervalo)
+        out.append(
+            Vencimiento(
+                colectivo_id=c.pk,
+                tipo=tipo,
+                fecha=estimacion.fecha_para(km) if estimacion else None,
+                km=km,
+                km_restantes=(km - int(km_actual)) if km_actual else None,
+                campo=f"{prefijo}_ultimo_cambio_km",
+            )
+        )
+    return out
+
+
+def sincronizar(colectivos: Iterable[Colectivo]) -> int:
+    colectivos = list(colectivos)
+    if not colectivos:
+        return 0
+
+    ids = [c.pk for c in colectivos]
+    estimaciones = EstimacionOdometro.objects.in_bulk(ids)
+    hoy = timezone.localdate()
+    nuevas = [v for c in colectivos for v in filas(c, estimaciones.get(c.pk), hoy)]
+    vigentes = {(v.colectivo_id, v.tipo) for v in nuevas}
+
+    # Lo que dejó de tener dato (ej: se borró la fecha) se va; el resto se pisa
+    sobrantes = [
+        pk
+        for pk, colectivo_id, tipo in Vencimiento.objects.filter(colectivo_id__in=ids)
+        .order_by()
+        .values_list("pk", "colectivo_id", "tipo")
+        if (colectivo_id, tipo) not in vigentes
+    ]
+    if sobrantes:
+        Vencimiento.objects.filter(pk__in=sobrantes).delete()
+    if nuevas:
+        Vencimiento.objects.bulk_create(
+            nuevas,
+            update_conflicts=True,
+            unique_fields=["colectivo", "tipo"],
+            update_fields=_ACTUALIZABLES,
+            batch_size=500,
+        )
+    if sobrantes or nuevas:
+        # bulk_create / delete no disparan señales: el dashboard cachea por generación de flota
+        generaciones.bump(generaciones.FLOTA)
+    return len(nuevas)
+
+
+def reconstruir(chunk: int = 500) -> int:
+    total = 0
+    lote = []
+    for c in Colectivo.objects.only(*CAMPOS_COLECTIVO).order_by("pk").iterator(chunk_size=chunk):
+        lote.append(c)
+        if len(lote) >= chunk:
+            total += sincronizar(lote)
+            lote = []
+    return total + sincronizar(lote)
+
+
+def proximos(dias: int = 7, km: int | None = KM_POR_VENCER, hoy=None, tipos: Iterable[str] | None = None):
+    """Vencidos y por vencer de las unidades activas: fecha <= hoy + dias, o km_restantes <= km."""
+
+    hoy = hoy or timezone.localdate()
+    cond = Q(fecha__lte=hoy + timedelta(days=dias))
+    if km is not None:
+        cond |= Q(km_restantes__lte=km)
+    qs = Vencimiento.objects.filter(cond, colectivo__is_active=True)
+    if tipos:
+        qs = qs.filter(tipo__in=list(tipos))
+    return qs.select_related("colectivo").order_by(
+        F("fecha").asc(nulls_last=True), "km_restantes", "colectivo__interno", "tipo"
+    )
+
+
+def por_colectivo(colectivo_id: int) -> dict[str, Vencimiento]:
+    return {v.tipo: v for v in Vencimiento.objects.filter(colectivo_id=colectivo_id)}
+
+
+def estado_dias(dias: int | None, sin_fecha=("info", "Sin fecha")) -> tuple[str, str]:
+    """(badge, estado) para un vencimiento por fecha."""
+
+    if dias is None:
+        return sin_fecha
+    if dias < 0:
+        return ("critical", "Vencido")
+    if dias == 0:
+        return ("critical", "Hoy")
+    if dias <= 7:
+        return ("high", "Por vencer")
+    return ("ok", "OK")
+
+
+def estado_km(faltan: int | None) -> tuple[str, str]:
+    """(badge, estado) para un mantenimiento por km."""
+
+    if faltan is None:
+        return ("info", "Sin datos")
+    if faltan <= 0:
+        return ("critical", "Vencido")
+    if faltan <= KM_POR_VENCER:
+        return ("high", "Por vencer")
+    if faltan <= KM_PROXIMO:
+        return ("info", "Próximo")
+    return ("ok", "OK")
+
+
+def describir(v: Vencimiento, hoy=None) -> dict:
+    """Fila plana (para tablas, CSV y correo)."""
+
+    hoy = hoy or timezone.localdate()
+    dias = (v.fecha - hoy).days if v.fecha else None
+    # Los de km se juzgan por km (la fecha es sólo una proyección)
+    badge, estado = estado_km(v.km_restantes) if v.km is not None else estado_dias(dias)
+    return {
+        "interno": v.colectivo.interno,
+        "dominio": v.colectivo.dominio,
+        "tipo": v.get_tipo_display(),
+        "fecha": v.fecha,
+        "dias": dias,
+        "km": v.km,
+        "km_restantes": v.km_restantes,
+        "estado": estado,
+        "badge": badge,
+    }
+
+
+# ---------------------------------------------------------------------
+# Señales (conectadas en FlotaConfig.ready)
+# ---------------------------------------------------------------------
+def colectivo_guardado(sender, instance: Colectivo, raw: bool = False, **kwargs) -> None:
+    if raw:
+        return
+    sincronizar([instance])
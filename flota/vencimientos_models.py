@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.db import models
+
+
+class Vencimiento(models.Model):
+    """Índice normalizado de vencimientos por unidad (VTV, matafuegos, aceite, filtros).
+
+    Se deriva de los campos de Colectivo (ver flota.vencimientos): no se edita a mano. Una fila
+    por (colectivo, tipo), sólo si hay dato. Los de fecha se consultan por `fecha`; los de
+    mantenimiento por `km` (km del próximo cambio) y `km_restantes` (contra el odómetro).
+    """
+
+    class Tipo(models.TextChoices):
+        VTV = "VTV", "VTV"
+        MATAFUEGO_1 = "MATAFUEGO_1", "Matafuego 1"
+        MATAFUEGO_2 = "MATAFUEGO_2", "Matafuego 2"
+        ACEITE = "ACEITE", "Aceite"
+        FILTROS = "FILTROS", "Filtros"
+
+    colectivo = models.ForeignKey("flota.Colectivo", on_delete=models.CASCADE, related_name="vencimientos")
+    tipo = models.CharField("tipo", max_length=12, choices=Tipo.choices)
+
+    fecha = models.DateField("vence", null=True, blank=True)
+    km = models.PositiveIntegerField("vence (km)", null=True, blank=True)
+    km_restantes = models.IntegerField("km restantes", null=True, blank=True)
+
+    # Campo de Colectivo del que sale el dato (incluye los legacy de matafuego)
+    campo = models.CharField("campo origen", max_length=40)
+    actualizado = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = "vencimiento"
+        verbose_name_plural = "vencimientos"
+        ordering = ["fecha", "km_restantes"]
+        constraints = [
+            models.UniqueConstraint(fields=["colectivo", "tipo"], name="uniq_vencimiento_colectivo_tipo"),
+        ]
+        indexes = [
+            models.Index(fields=["fecha"], name="idx_vencimiento_fecha"),
+            models.Index(fields=["tipo", "fecha"], name="idx_vencimiento_tipo_fecha"),
+            models.Index(fields=["km_restantes"], name="idx_vencimiento_km_rest"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_tipo_display()} {self.colectivo_id}: {self.fecha or self.km}"
@@ -1,6 +1,6 @@
 from __future__ import annotations
 
-from datetime import timedelta
+from datetime import datetime, time, timedelta
 from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import PermissionRequiredMixin, LoginRequiredMixin
@@ -14,71 +14,37 @@ from django.views.generic import ListView, CreateView, UpdateView, DeleteView, D
 
 from tablib import Dataset
 
-from .models import Colectivo
+from . import vencimientos
+from .models import Colectivo, EstimacionOdometro
 from .forms import ColectivoForm
 from .filters import ColectivoFilter
 from .resources import ColectivoResource
 
-from inventario.models import MovimientoStock
+from inventario.models import ConsumoDiario, MovimientoStock
+from inventario.services import consumo, referencias
 
 
 QTY_FIELD = DecimalField(max_digits=12, decimal_places=3)
 ZERO_QTY = Value(0, output_field=QTY_FIELD)
 
 
-def _badge_por_dias(dias: int | None, sin_fecha_text: str = "Sin fecha"):
-    if dias is None:
-        return ("info", sin_fecha_text)
-
-    if dias < 0:
-        return ("critical", "Vencido")
-    if dias == 0:
-        return ("critical", "Hoy")
-    if 1 <= dias <= 7:
-        return ("high", "Por vencer")
-    return ("ok", "OK")
-
-
-def _km_mantenimiento(odometro_km, ultimo_km, intervalo_km):
+def _km_mantenimiento(c: Colectivo, v, prefijo: str):
     """
-    Devuelve dict con estado por KM.
+    Devuelve dict con estado por KM a partir de la fila Vencimiento (o None).
     Si falta algún dato -> estado info.
     """
-    if not odometro_km or not ultimo_km or not intervalo_km:
-        return {
-            "badge": "info",
-            "estado": "Sin datos",
-            "odometro_km": odometro_km,
-            "ultimo_km": ultimo_km,
-            "intervalo_km": intervalo_km,
-            "proximo_km": None,
-            "faltan_km": None,
-        }
-
-    proximo = int(ultimo_km) + int(intervalo_km)
-    faltan = int(proximo) - int(odometro_km)
-
-    if faltan <= 0:
-        badge = "critical"
-        estado = "Vencido"
-    elif faltan <= 500:
-        badge = "high"
-        estado = "Por vencer"
-    elif faltan <= 1500:
-        badge = "info"
-        estado = "Próximo"
-    else:
-        badge = "ok"
-        estado = "OK"
-
+    faltan = v.km_restantes if v else None
+    badge, estado = vencimientos.estado_km(faltan)
     return {
         "badge": badge,
         "estado": estado,
-        "odometro_km": int(odometro_km),
-        "ultimo_km": int(ultimo_km),
-        "intervalo_km": int(intervalo_km),
-        "proximo_km": int(proximo),
-        "faltan_km": int(faltan),
+        "odometro_km": c.odometro_km,
+        "ultimo_km": getattr(c, f"{prefijo}_ultimo_cambio_km"),
+        "intervalo_km": getattr(c, f"{prefijo}_intervalo_km"),
+        "proximo_km": v.km if v else None,
+        "faltan_km": faltan,
+        # Día proyectado con el km/día estimado (flota.odometro); None sin estimación
+        "fecha_estimada": v.fecha if v else None,
     }
 
 
@@ -147,77 +113,77 @@ class ColectivoReportView(LoginRequiredMixin, PermissionRequiredMixin, DetailVie
         c: Colectivo = self.object
 
         days = self._clamp_days(self.request.GET.get("days", "30"))
-        dt_from = timezone.now() - timedelta(days=days)
         today = timezone.localdate()
+        desde_dia = today - timedelta(days=days)
+        dt_from = timezone.make_aware(datetime.combine(desde_dia, time.min))
 
         can_view_inv = self.request.user.has_perm("inventario.view_movimientostock")
 
-        mov_qs = MovimientoStock.objects.none()
+        mov_list = []
         stats_by_tipo = []
         top_consumos = []
         dias_con_actividad = 0
         total_mov = 0
 
         if can_view_inv:
-            interno = str(c.interno)
-            dominio = (c.dominio or "").strip().upper()
-
-            tokens = [
-                f"INT-{interno}",
-                f"INT {interno}",
-                f"INTERNO {interno}",
-                f"COLECTIVO {interno}",
-                f"COLECTIVO-{interno}",
-                f"#{interno}",
-            ]
-            if dominio:
-                tokens.append(dominio)
-                tokens.append(f"DOM-{dominio}")
-
-            text_q = Q()
-            for t in tokens:
-                text_q |= Q(referencia__icontains=t) | Q(observaciones__icontains=t)
-
-            link_q = Q(colectivo_id=c.id) | text_q
-
-            mov_qs = (
-                MovimientoStock.objects
-                .filter(fecha__gte=dt_from)
-                .filter(link_q)
-                .select_related("producto", "ubicacion", "ubicacion_destino", "usuario", "proveedor", "colectivo")
-                .order_by("-fecha", "-id")
-            )
-
-            total_mov = mov_qs.count()
-            dias_con_actividad = mov_qs.datetimes("fecha", "day").count()
+            # Agregados desde el rollup diario (inventario.services.consumo): lecturas por índice
+            rollup = ConsumoDiario.objects.filter(colectivo=c, dia__gte=desde_dia)
+            tot = rollup.aggregate(n=Sum("movimientos"), dias=Count("dia", distinct=True))
+            total_mov = tot["n"] or 0
+            dias_con_actividad = tot["dias"]
 
             stats_by_tipo = list(
-                mov_qs.values("tipo").annotate(
-                    cnt=Count("id"),
+                rollup.values("tipo").annotate(
+                    cnt=Sum("movimientos"),
                     qty=Coalesce(Sum("cantidad"), ZERO_QTY, output_field=QTY_FIELD),
                 ).order_by("tipo")
             )
 
             top_consumos = list(
-                mov_qs.filter(tipo=MovimientoStock.Tipo.EGRESO)
+                rollup.filter(tipo=MovimientoStock.Tipo.EGRESO)
                 .values("producto__codigo", "producto__nombre")
                 .annotate(qty=Coalesce(Sum("cantidad"), ZERO_QTY, output_field=QTY_FIELD))
                 .order_by("-qty", "producto__codigo")[:10]
             )
 
+            # Detalle: sólo productos que la unidad movió en el período (índice producto+fecha);
+            # la unidad de los movimientos sin colectivo se detecta igual que en el rollup
+            if total_mov:
+                detector = referencias.detector()
+                candidatos = (
+                    MovimientoStock.objects
+                    .filter(fecha__gte=dt_from, producto_id__in=rollup.values("producto_id"))
+                    .filter(Q(colectivo_id=c.id) | Q(colectivo__isnull=True))
+                    .select_related("producto", "ubicacion", "ubicacion_destino", "usuario", "proveedor", "colectivo")
+                    .order_by("-fecha", "-id")
+                )
+                for m in candidatos.iterator(chunk_size=500):
+                    if consumo.colectivo_de(m, detector) == c.id:
+                        mov_list.append(m)
+                        if len(mov_list) >= 200:
+                            break
+
+        # Vencimientos: una query sobre el índice (flota.vencimientos)
+        vtos = vencimientos.por_colectivo(c.pk)
+        Tipo = vencimientos.Tipo
+
         # VTV
-        vto_vtv = c.revision_tecnica_vto
+        vto_vtv = vtos[Tipo.VTV].fecha if Tipo.VTV in vtos else None
         vtv_dias = (vto_vtv - today).days if vto_vtv else None
-        vtv_badge, vtv_estado = _badge_por_dias(vtv_dias, sin_fecha_text="Sin fecha")
+        vtv_badge, vtv_estado = vencimientos.estado_dias(vtv_dias)
 
-        # Matafuego
-        vto_mf = c.matafuego_vto
+        # Matafuego (el más próximo de los dos)
+        vto_mf = min(
+            (vtos[t].fecha for t in (Tipo.MATAFUEGO_1, Tipo.MATAFUEGO_2) if t in vtos),
+            default=None,
+        )
         mf_dias = (vto_mf - today).days if vto_mf else None
-        mf_badge, mf_estado = _badge_por_dias(mf_dias, sin_fecha_text="Sin fecha")
+        mf_badge, mf_estado = vencimientos.estado_dias(mf_dias)
 
-        # Mantenimiento por KM
-        aceite = _km_mantenimiento(c.odometro_km, c.aceite_ultimo_cambio_km, c.aceite_intervalo_km)
-        filtros = _km_mantenimiento(c.odometro_km, c.filtros_ultimo_cambio_km, c.filtros_intervalo_km)
+        # Mantenimiento por KM (km/día estimado en la pasada nocturna)
+        estimacion = EstimacionOdometro.objects.filter(pk=c.pk).first()
+        aceite = _km_mantenimiento(c, vtos.get(Tipo.ACEITE), "aceite")
+        filtros = _km_mantenimiento(c, vtos.get(Tipo.FILTROS), "filtros")
 
         # Limpieza (simple)
         if c.limpieza_ultima_fecha:
@@ -244,6 +210,7 @@ class ColectivoReportView(LoginRequiredMixin, PermissionRequiredMixin, DetailVie
             "mf_badge": mf_badge,
             "mf_estado": mf_estado,
             "mf_dias": mf_dias,
+            "mf_vto": vto_mf,
 
             "aceite": aceite,
             "aceite_fecha": c.aceite_ultimo_cambio_fecha,
@@ -255,6 +222,8 @@ class ColectivoReportView(LoginRequiredMixin, PermissionRequiredMixin, DetailVie
 
             "odometro_km": c.odometro_km,
             "odometro_fecha": c.odometro_fecha,
+            "km_dia": estimacion.km_dia if estimacion else None,
+            "km_estimado": estimacion.km_en(today) if estimacion else None,
 
             "limp_badge": limp_badge,
             "limp_estado": limp_estado,
@@ -263,7 +232,7 @@ class ColectivoReportView(LoginRequiredMixin, PermissionRequiredMixin, DetailVie
             "limp_por": c.limpieza_realizada_por,
             "limp_obs": c.limpieza_obs,
 
-            "mov_qs": mov_qs[:200],
+            "mov_qs": mov_list,
             "total_mov": total_mov,
             "dias_con_actividad": dias_con_actividad,
             "stats_by_tipo": stats_by_tipo,
@@ -0,0 +1,174 @@
+from __future__ import annotations
+
+"""
+flota.vocabulario
+
+Autocompletado del diagrama (datalists) servido desde TerminoVocabulario en lugar de
+SELECT DISTINCT sobre todo el historial de SalidaProgramada.
+
+- `registrar`: suma usos (lo llama el post_save de SalidaProgramada y los procesos masivos).
+- `datalists`: listas por tipo, las más usadas recientemente primero; sale del cache hasta
+  que cambia la generación del vocabulario.
+- `reconstruir`: rearma la tabla desde SalidaProgramada (comando reconstruir_vocabulario).
+"""
+
+from collections import Counter
+from datetime import datetime, timezone as dt_timezone
+from typing import Iterable
+
+from django.core.cache import cache
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core import generaciones
+
+from .models import SalidaProgramada, TerminoVocabulario
+
+Tipo = TerminoVocabulario.Tipo
+
+# Campo de SalidaProgramada -> tipo de término
+CAMPOS = {
+    "chofer": Tipo.CHOFER,
+    "seccion": Tipo.SECCION,
+    "recorrido": Tipo.RECORRIDO,
+    "salida_label": Tipo.ETIQUETA,
+    "regreso": Tipo.REGRESO,
+}
+
+# Tipo -> nombre en el contexto de los templates
+DATALISTS = {
+    Tipo.CHOFER: "datalist_choferes",
+    Tipo.SECCION: "datalist_secciones",
+    Tipo.RECORRIDO: "datalist_recorridos",
+    Tipo.ETIQUETA: "datalist_etiquetas",
+    Tipo.REGRESO: "datalist_regresos",
+}
+
+LIMITE = 300
+VIDA_MEDIA_DIAS = 30
+EPOCA = datetime(2024, 1, 1, tzinfo=dt_timezone.utc)
+_MAX_LEN = TerminoVocabulario._meta.get_field("termino").max_length
+
+
+def peso(cuando: datetime) -> float:
+    """Peso de un uso en `cuando`: se duplica cada VIDA_MEDIA_DIAS (ver TerminoVocabulario)."""
+
+    return 2.0 ** ((cuando - EPOCA).total_seconds() / (VIDA_MEDIA_DIAS * 86400))
+
+
+def _limpio(valor) -> str:
+    return (valor or "").strip()[:_MAX_LEN]
+
+
+def terminos_de(salida: SalidaProgramada, campos: Iterable[str] | None = None) -> list[tuple[str, str]]:
+    """Pares (tipo, término) no vacíos de una salida."""
+
+    out = []
+    for campo in campos if campos is not None else CAMPOS:
+        termino = _limpio(getattr(salida, campo, ""))
+        if termino:
+            out.append((CAMPOS[campo], termino))
+    return out
+
+
+def registrar(pares: Iterable[tuple[str, str]], cuando: datetime | None = None) -> int:
+    """Suma un uso por cada par (tipo, término). Devuelve términos distintos tocados.
+
+    Una query para leer, un bulk_update (F + delta) y un bulk_create, sin importar cuántos pares.
+    """
+
+    cuenta = Counter((tipo, _limpio(termino)) for tipo, termino in pares if _limpio(termino))
+    if not cuenta:
+        return 0
+
+    cuando = cuando or timezone.now()
+    w = peso(cuando)
+
+    existentes = {
+        (tipo, termino): pk
+        for pk, tipo, termino in TerminoVocabulario.objects.filter(
+            tipo__in={k[0] for k in cuenta},
+            termino__in={k[1] for k in cuenta},
+        ).values_list("pk", "tipo", "termino")
+    }
+    actualizar = []
+    nuevos = []
+    for (tipo, termino), n in cuenta.items():
+        pk = existentes.get((tipo, termino))
+        if pk is not None:
+            actualizar.append(
+                TerminoVocabulario(
+                    pk=pk,
+                    frecuencia=F("frecuencia") + n,
+                    puntaje=F("puntaje") + n * w,
+                    ultimo_uso=cuando,
+                )
+            )
+        else:
+            nuevos.append(TerminoVocabulario(tipo=tipo, termino=termino, frecuencia=n, ultimo_uso=cuando, puntaje=n * w))
+    if actualizar:
+        TerminoVocabulario.objects.bulk_update(actualizar, ["frecuencia", "puntaje", "ultimo_uso"], batch_size=500)
+    if nuevos:
+        # Si otro request creó el mismo término en el medio se pierde este uso: es sólo ranking
+        TerminoVocabulario.objects.bulk_create(nuevos, ignore_conflicts=True)
+
+    generaciones.bump(generaciones.VOCABULARIO)
+    return len(cuenta)
+
+
+def salida_guardada(sender, instance: SalidaProgramada, created: bool, raw: bool = False, **kwargs) -> None:
+    """post_save de SalidaProgramada: cuenta como uso sólo lo nuevo o lo que cambió."""
+
+    if raw:
+        return
+    inicial = {} if created else getattr(instance, "_vocabulario_inicial", {})
+    campos = [c for c in CAMPOS if c not in inicial or inicial[c] != getattr(instance, c)]
+    registrar(terminos_de(instance, campos))
+    instance._vocabulario_inicial = {c: getattr(instance, c) for c in CAMPOS}
+
+
+def datalists() -> dict[str, list[str]]:
+    """Listas para <datalist>, hasta LIMITE por tipo, por uso reciente (no alfabético)."""
+
+    key = generaciones.clave("vocabulario:datalists", generaciones.VOCABULARIO)
+    out = cache.get(key)
+    if out is None:
+        out = {nombre: [] for nombre in DATALISTS.values()}
+        for tipo, termino in TerminoVocabulario.objects.order_by("tipo", "-puntaje", "termino").values_list(
+            "tipo", "termino"
+        ):
+            lista = out.get(DATALISTS.get(tipo))
+            if lista is not None and len(lista) < LIMITE:
+                lista.append(termino)
+        cache.set(key, out, 3600)
+    return {k: list(v) for k, v in out.items()}
+
+
+@transaction.atomic
+def reconstruir(chunk_size: int = 5000) -> int:
+    """Rearma el vocabulario desde todas las salidas (uso = created_at). Devuelve términos."""
+
+    acumulado: dict[tuple[str, str], list] = {}
+    rows = SalidaProgramada.objects.order_by("id").values_list("created_at", *CAMPOS).iterator(chunk_size=chunk_size)
+    for created_at, *valores in rows:
+        w = peso(created_at)
+        for campo, valor in zip(CAMPOS, valores):
+            termino = _limpio(valor)
+            if not termino:
+                continue
+            acc = acumulado.setdefault((CAMPOS[campo], termino), [0, created_at, 0.0])
+            acc[0] += 1
+            acc[1] = max(acc[1], created_at)
+            acc[2] += w
+
+    TerminoVocabulario.objects.all().delete()
+    TerminoVocabulario.objects.bulk_create(
+        (
+            TerminoVocabulario(tipo=tipo, termino=termino, frecuencia=f, ultimo_uso=u, puntaje=p)
+            for (tipo, termino), (f, u, p) in acumulado.items()
+        ),
+        batch_size=500,
+    )
+    generaciones.bump(generaciones.VOCABULARIO)
+    return len(acumulado)
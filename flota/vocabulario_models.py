@@ -0,0 +1,39 @@
+from __future__ import annotations
+
+from django.db import models
+
+
+class TerminoVocabulario(models.Model):
+    """Vocabulario de autocompletado del diagrama (datalists).
+
+    Reemplaza los SELECT DISTINCT sobre todo el historial de SalidaProgramada. Lo mantiene
+    flota.vocabulario al guardar salidas; `reconstruir_vocabulario` lo rearma desde cero.
+
+    `puntaje` = suma de 2^((uso - época) / vida media) de cada uso: ordenar por puntaje equivale
+    a ordenar por frecuencia con decaimiento (lo reciente pesa más) sin reescribir filas viejas.
+    """
+
+    class Tipo(models.TextChoices):
+        CHOFER = "CHOFER", "Chofer"
+        SECCION = "SECCION", "Sección"
+        RECORRIDO = "RECORRIDO", "Recorrido"
+        ETIQUETA = "ETIQUETA", "Etiqueta de salida"
+        REGRESO = "REGRESO", "Regreso"
+
+    tipo = models.CharField(max_length=10, choices=Tipo.choices)
+    termino = models.CharField(max_length=120)
+    frecuencia = models.PositiveIntegerField(default=0)
+    ultimo_uso = models.DateTimeField()
+    puntaje = models.FloatField(default=0)
+
+    class Meta:
+        ordering = ["tipo", "-puntaje", "termino"]
+        constraints = [
+            models.UniqueConstraint(fields=["tipo", "termino"], name="uq_vocabulario_tipo_termino"),
+        ]
+        indexes = [
+            models.Index(fields=["tipo", "-puntaje"], name="idx_vocabulario_tipo_puntaje"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.get_tipo_display()}: {self.termino}"
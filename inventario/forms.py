@@ -160,7 +160,8 @@ class MovimientoStockForm(forms.ModelForm):
         if "colectivo" in self.fields:
             self.fields["colectivo"].queryset = Colectivo.objects.filter(is_active=True).order_by("interno")
             self.fields["colectivo"].required = False
-            self.fields["colectivo"].empty_label = "Sin unidad (no vincular)"
+            # Vacío no es "ninguna": el alta y el rollup de consumo toman la unidad que nombre el texto
+            self.fields["colectivo"].empty_label = "Según referencia / observaciones / lote"
             self.fields["colectivo"].widget.attrs.setdefault("class", "ti-input")
 
         # Solo mostrar ubicaciones habilitadas para transferencias
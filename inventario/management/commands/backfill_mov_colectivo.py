@@ -1,100 +1,101 @@
 from __future__ import annotations
 
-import re
+import json
+from pathlib import Path
+
 from django.core.management.base import BaseCommand
 from django.db import transaction
 
-from flota.models import Colectivo
+from core import generaciones
 from inventario.models import MovimientoStock
-
-
-# Captura interno cuando viene con palabra clave cerca
-RX_KEYED_INT = re.compile(
-    r"\b(?:INT(?:ERNO)?|UNIDAD|COLECTIVO|BUS|C)\s*[:#\-]?\s*(\d{1,4})\b",
-    re.IGNORECASE
-)
-
-# También soporta "INT-14" o "INT 14"
-RX_INT_SIMPLE = re.compile(r"\bINT\s*[- ]\s*(\d{1,4})\b", re.IGNORECASE)
-
-
-def _normalize(s: str) -> str:
-    # Normaliza para comparar dominios aunque haya espacios o guiones
-    s = (s or "").upper()
-    return re.sub(r"[\s\-\._]", "", s)
+from inventario.services import consumo, referencias
 
 
 class Command(BaseCommand):
     help = (
         "Completa MovimientoStock.colectivo en movimientos con colectivo=NULL "
         "a partir de referencia/observaciones/lote.\n"
-        "Detecta internos por patrones (INT-14, interno 14, unidad:14, #14) y dominio."
+        "Detecta internos por patrones (INT-14, interno 14, unidad:14, C-14) y dominio.\n"
+        "Procesa por lotes de id ascendente; con --checkpoint se puede cortar y retomar."
     )
 
     def add_arguments(self, parser):
         parser.add_argument("--dry-run", action="store_true", help="Simula sin guardar cambios.")
         parser.add_argument("--limit", type=int, default=0, help="Limita cantidad a procesar (0 = sin límite).")
         parser.add_argument("--show-unmatched", type=int, default=10, help="Muestra N ejemplos que no matchearon (0 = no mostrar).")
+        parser.add_argument("--chunk", type=int, default=2000, help="Movimientos por lote / transacción (default: 2000).")
+        parser.add_argument("--desde-id", type=int, default=0, help="Arranca después de este id de movimiento.")
+        parser.add_argument(
+            "--checkpoint",
+            default="",
+            help="Archivo JSON con el último id procesado: se lee al arrancar y se escribe tras cada lote.",
+        )
+
+    def _leer_checkpoint(self, path: Path | None) -> int:
+        if not path or not path.exists():
+            return 0
+        try:
+            return int(json.loads(path.read_text(encoding="utf-8")).get("ultimo_id") or 0)
+        except (ValueError, OSError):
+            return 0
 
     def handle(self, *args, **opts):
         dry = bool(opts["dry_run"])
         limit = int(opts["limit"] or 0)
         show_unmatched = int(opts["show_unmatched"] or 0)
+        chunk = max(1, int(opts["chunk"]))
+        checkpoint = Path(opts["checkpoint"]) if opts["checkpoint"] else None
 
-        colectivos = list(Colectivo.objects.filter(is_active=True).only("id", "interno", "dominio"))
-        by_interno = {c.interno: c for c in colectivos}
-        by_dom_norm = {}
-        for c in colectivos:
-            dom = (c.dominio or "").strip().upper()
-            if dom:
-                by_dom_norm[_normalize(dom)] = c
+        ultimo_id = max(int(opts["desde_id"] or 0), self._leer_checkpoint(checkpoint))
+        if ultimo_id:
+            self.stdout.write(f"Retomando después del id {ultimo_id}")
 
-        qs = MovimientoStock.objects.filter(colectivo__isnull=True).only(
-            "id", "referencia", "observaciones", "lote"
-        ).order_by("-id")
+        detector = referencias.detector()
+        base = MovimientoStock.objects.filter(colectivo__isnull=True).only(
+            "id", "referencia", "observaciones", "lote", "producto_id", "fecha", "tipo", "cantidad", "colectivo_id"
+        ).order_by("id")
 
+        total = base.filter(id__gt=ultimo_id).count()
         if limit > 0:
-            qs = qs[:limit]
-
-        total = qs.count()
+            total = min(total, limit)
         self.stdout.write(f"Movimientos a evaluar (colectivo=NULL): {total}")
 
         found = 0
         updated = 0
         blank = 0
         not_found = 0
+        evaluados = 0
         examples_unmatched = []
 
-        updates = []
-
-        for m in qs.iterator(chunk_size=500):
-            text = f"{m.referencia or ''} {m.observaciones or ''} {m.lote or ''}".strip()
-            if not text:
-                blank += 1
-                continue
-
-            target = None
-
-            mm = RX_KEYED_INT.search(text) or RX_INT_SIMPLE.search(text)
-            if mm:
-                interno = int(mm.group(1))
-                target = by_interno.get(interno)
-
-            if target is None and by_dom_norm:
-                ntext = _normalize(text)
-                for dom_norm, c in by_dom_norm.items():
-                    if dom_norm and dom_norm in ntext:
-                        target = c
-                        break
-
-            if target is None:
-                not_found += 1
-                if show_unmatched > 0 and len(examples_unmatched) < show_unmatched:
-                    examples_unmatched.append((m.id, text[:120]))
-                continue
-
-            found += 1
-            updates.append((m.id, target.id))
+        while not limit or evaluados < limit:
+            n = chunk if not limit else min(chunk, limit - evaluados)
+            lote = list(base.filter(id__gt=ultimo_id)[:n])
+            if not lote:
+                break
+            evaluados += len(lote)
+            ultimo_id = lote[-1].id
+
+            a_vincular = []
+            for m in lote:
+                text = referencias.texto_movimiento(m)
+                if not text:
+                    blank += 1
+                    continue
+
+                target = detector.detectar(text)
+                if target is None:
+                    not_found += 1
+                    if show_unmatched > 0 and len(examples_unmatched) < show_unmatched:
+                        examples_unmatched.append((m.id, text[:120]))
+                    continue
+
+                found += 1
+                a_vincular.append((m, target))
+
+            if not dry and a_vincular:
+                updated += self._guardar(a_vincular, detector)
+            if not dry and checkpoint:
+                checkpoint.write_text(json.dumps({"ultimo_id": ultimo_id}), encoding="utf-8")
 
         self.stdout.write(f"Detectados para completar: {found}")
         self.stdout.write(f"Sin texto (imposible auto): {blank}")
@@ -109,8 +110,28 @@ class Command(BaseCommand):
             self.stdout.write("DRY-RUN: no se guardó nada.")
             return
 
-        with transaction.atomic():
-            for mov_id, col_id in updates:
-                updated += MovimientoStock.objects.filter(id=mov_id, colectivo__isnull=True).update(colectivo_id=col_id)
+        self.stdout.write(f"Actualizados: {updated} (último id: {ultimo_id})")
 
-        self.stdout.write(f"Actualizados: {updated}")
\ No newline at end of file
+    def _guardar(self, a_vincular, detector) -> int:
+        """Un lote: bulk_update de colectivo y el rollup de consumo movido a la unidad nueva."""
+
+        with transaction.atomic():
+            # Sólo los que siguen sin colectivo (alguien pudo editarlos mientras tanto)
+            libres = set(
+                MovimientoStock.objects.filter(
+                    pk__in=[m.pk for m, _ in a_vincular], colectivo__isnull=True
+                ).values_list("pk", flat=True)
+            )
+            movs = [m for m, _ in a_vincular if m.pk in libres]
+            if not movs:
+                return 0
+
+            # El rollup los tenía por texto (quizás con otra flota): restar ahí, sumar en la unidad vinculada
+            consumo.registrar(movs, -1, detector)
+            for m, target in a_vincular:
+                if m.pk in libres:
+                    m.colectivo_id = target
+            MovimientoStock.objects.bulk_update(movs, ["colectivo"], batch_size=500)
+            consumo.registrar(movs, 1, detector)
+            generaciones.bump(generaciones.INVENTARIO)
+        return len(movs)
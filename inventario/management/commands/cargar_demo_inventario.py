@@ -3,7 +3,7 @@ from __future__ import annotations
 from decimal import Decimal
 from django.core.management.base import BaseCommand
 from django.contrib.auth import get_user_model
-from django.db import IntegrityError, transaction
+from django.db import transaction
 from django.contrib.auth.models import Permission
 from django.utils import timezone
 
@@ -17,40 +17,49 @@ from inventario.models import (
     StockActual,
     MovimientoStock,
 )
+from inventario.services.stock import recalcular_totales
 
 
 DEMO_PREFIX = "DEMO-"  # evita colisiones con tus códigos reales
 
 
-def upsert_stock(producto: Producto, ubicacion: Ubicacion, cantidad: Decimal) -> StockActual:
+def upsert_stock_lote(cantidades: dict[tuple[int, int], Decimal]) -> int:
     """
-    Upsert robusto (evita el bug que viste con update_or_create + UNIQUE):
-    1) intenta UPDATE
-    2) si no actualizó, intenta INSERT
-    3) si choca por UNIQUE, hace UPDATE y listo
+    Fija StockActual (producto_id, ubicacion_id) -> cantidad en una pasada:
+    1) un SELECT de las filas existentes
+    2) bulk_update de las que ya estaban
+    3) bulk_create (ignorando choques UNIQUE) de las nuevas
     """
     mgr = StockActual._base_manager
-    updated = mgr.filter(producto=producto, ubicacion=ubicacion).update(
-        cantidad=cantidad,
-        last_movement_at=timezone.now(),
-    )
-    if updated:
-        return mgr.get(producto=producto, ubicacion=ubicacion)
-
-    try:
-        return mgr.create(
-            producto=producto,
-            ubicacion=ubicacion,
-            cantidad=cantidad,
-            last_movement_at=timezone.now(),
-        )
-    except IntegrityError:
-        # ya existía (pero por algún motivo no matcheó en el primer get)
-        mgr.filter(producto=producto, ubicacion=ubicacion).update(
-            cantidad=cantidad,
-            last_movement_at=timezone.now(),
-        )
-        return mgr.get(producto=producto, ubicacion=ubicacion)
+    now = timezone.now()
+    productos = {pid for pid, _ in cantidades}
+    ubicaciones = {uid for _, uid in cantidades}
+
+    existentes = {
+        (st.producto_id, st.ubicacion_id): st
+        for st in mgr.filter(producto_id__in=productos, ubicacion_id__in=ubicaciones)
+    }
+
+    to_update = []
+    to_create = []
+    for key, cantidad in cantidades.items():
+        st = existentes.get(key)
+        if st is not None:
+            st.cantidad = cantidad
+            st.last_movement_at = now
+            st.updated_at = now
+            to_update.append(st)
+        else:
+            to_create.append(
+                StockActual(producto_id=key[0], ubicacion_id=key[1], cantidad=cantidad, last_movement_at=now)
+            )
+
+    if to_update:
+        mgr.bulk_update(to_update, ["cantidad", "last_movement_at", "updated_at"])
+    if to_create:
+        mgr.bulk_create(to_create, ignore_conflicts=True)
+    recalcular_totales(productos)
+    return len(cantidades)
 
 
 class Command(BaseCommand):
@@ -120,6 +129,8 @@ class Command(BaseCommand):
         ]
 
         created = 0
+        stock_objetivo: dict[tuple[int, int], Decimal] = {}
+        movs: list[MovimientoStock] = []
         for code, nombre, desc, cat, sub, um, prov, stock_min, venc in demo_rows:
             codigo = f"{DEMO_PREFIX}{code}"
             p, is_new = Producto.objects.get_or_create(
@@ -151,13 +162,13 @@ class Command(BaseCommand):
                 )
             created += 1
 
-            # Stock por ubicación (upsert robusto)
-            upsert_stock(p, ub_dep, Decimal("25"))
-            upsert_stock(p, ub_tal, Decimal("7"))
-            upsert_stock(p, ub_mos, Decimal("2"))
+            # Stock por ubicación (se escribe todo junto al final)
+            stock_objetivo[(p.pk, ub_dep.pk)] = Decimal("25")
+            stock_objetivo[(p.pk, ub_tal.pk)] = Decimal("7")
+            stock_objetivo[(p.pk, ub_mos.pk)] = Decimal("2")
 
             # Movimientos DEMO simples
-            MovimientoStock.objects.create(
+            movs.append(MovimientoStock(
                 producto=p,
                 ubicacion=ub_dep,
                 tipo=MovimientoStock.Tipo.INGRESO,
@@ -166,7 +177,10 @@ class Command(BaseCommand):
                 referencia="Carga DEMO",
                 observaciones="Movimiento demo (ingreso)",
                 usuario=demo_user,
-            )
+            ))
+
+        upsert_stock_lote(stock_objetivo)
+        MovimientoStock.objects.bulk_create(movs)
 
         self.stdout.write(self.style.SUCCESS(f"✅ Demo cargado: {created} productos. Usuario demo: demo / demo1234"))
         self.stdout.write(self.style.SUCCESS("👉 Probá: Inventario > Productos / Stock / Movimientos / Configuración"))
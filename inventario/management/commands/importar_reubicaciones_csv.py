@@ -68,58 +68,80 @@ class Command(BaseCommand):
         skipped_zero = 0
         errors = []
 
-        with transaction.atomic():
-            for i, row in enumerate(r, start=2):
-                total_rows += 1
-                try:
-                    p_code = (row.get("producto_codigo") or "").strip().upper()
-                    o_code = (row.get("origen") or "").strip().upper()
-                    d_code = (row.get("destino") or "").strip().upper()
-                    qty_raw = (row.get("cantidad") or "0").strip().replace(",", ".")
-
-                    if not p_code or not o_code or not d_code:
-                        raise ValueError("producto_codigo, origen y destino son obligatorios.")
-
-                    qty = Decimal(qty_raw)
-                    if qty == 0:
-                        skipped_zero += 1
-                        continue
-                    if qty < 0:
-                        raise ValueError("cantidad no puede ser negativa (para transferencia).")
-
-                    producto = Producto.objects.get(codigo=p_code)
-                    origen = Ubicacion.objects.get(codigo=o_code)
-                    destino = Ubicacion.objects.get(codigo=d_code)
-
-                    ref = (row.get("referencia") or "").strip() or default_ref
-                    obs = (row.get("observaciones") or "").strip()
-
-                    mov = MovimientoStock(
-                        producto=producto,
-                        ubicacion=origen,
-                        ubicacion_destino=destino,
-                        tipo=MovimientoStock.Tipo.TRANSFERENCIA,
-                        cantidad=qty,
-                        referencia=ref,
-                        observaciones=obs,
-                        usuario=user,
-                    )
-
-                    mov.full_clean()
-                    ok_rows += 1
-
-                    if not dry:
-                        mov.save()
-                        stock_service.aplicar_movimiento_creado(mov)
-                        created += 1
+        # Catálogos en memoria: evita 3 consultas por fila en cargas grandes
+        productos = {p.codigo: p for p in Producto.objects.all().only("id", "codigo")}
+        ubicaciones = {u.codigo: u for u in Ubicacion.objects.all().only("id", "codigo", "permite_transferencias")}
 
-                except Exception as e:
-                    errors.append(f"Fila {i}: {e}")
+        movs: list[MovimientoStock] = []
+        filas: list[int] = []
 
-            if dry:
-                transaction.set_rollback(True)
+        for i, row in enumerate(r, start=2):
+            total_rows += 1
+            try:
+                p_code = (row.get("producto_codigo") or "").strip().upper()
+                o_code = (row.get("origen") or "").strip().upper()
+                d_code = (row.get("destino") or "").strip().upper()
+                qty_raw = (row.get("cantidad") or "0").strip().replace(",", ".")
+
+                if not p_code or not o_code or not d_code:
+                    raise ValueError("producto_codigo, origen y destino son obligatorios.")
+
+                qty = Decimal(qty_raw)
+                if qty == 0:
+                    skipped_zero += 1
+                    continue
+                if qty < 0:
+                    raise ValueError("cantidad no puede ser negativa (para transferencia).")
+
+                producto = productos.get(p_code)
+                if producto is None:
+                    raise Producto.DoesNotExist("Producto matching query does not exist.")
+                origen = ubicaciones.get(o_code)
+                destino = ubicaciones.get(d_code)
+                if origen is None or destino is None:
+                    raise Ubicacion.DoesNotExist("Ubicacion matching query does not exist.")
+
+                ref = (row.get("referencia") or "").strip() or default_ref
+                obs = (row.get("observaciones") or "").strip()
+
+                mov = MovimientoStock(
+                    producto=producto,
+                    ubicacion=origen,
+                    ubicacion_destino=destino,
+                    tipo=MovimientoStock.Tipo.TRANSFERENCIA,
+                    cantidad=qty,
+                    referencia=ref,
+                    observaciones=obs,
+                    usuario=user,
+                )
+
+                # Las FK ya se resolvieron arriba: no re-validarlas fila por fila
+                mov.full_clean(exclude=["producto", "ubicacion", "ubicacion_destino", "usuario"])
+                ok_rows += 1
+                movs.append(mov)
+                filas.append(i)
+
+            except Exception as e:
+                errors.append((i, f"Fila {i}: {e}"))
+
+        if movs:
+            # Stock insuficiente se valida en memoria, en el orden del archivo
+            with transaction.atomic():
+                res = stock_service.aplicar_movimientos_lote(movs, omitir_errores=True)
+                fallidos = {idx for idx, _ in res.errores}
+                for idx, msg in res.errores:
+                    errors.append((filas[idx], f"Fila {filas[idx]}: {msg}"))
+                if dry:
+                    transaction.set_rollback(True)
+                else:
+                    MovimientoStock.objects.bulk_create(
+                        [m for idx, m in enumerate(movs) if idx not in fallidos],
+                        batch_size=stock_service.LOTE_CHUNK,
+                    )
+                    created = res.aplicados
 
         if errors:
+            errors = [txt for _, txt in sorted(errors, key=lambda e: e[0])]
             msg = "Errores:\n" + "\n".join(errors[:30])
             if len(errors) > 30:
                 msg += f"\n... ({len(errors) - 30} más)"
@@ -83,62 +83,83 @@ class Command(BaseCommand):
 
         errors = []
 
-        with transaction.atomic():
-            for i, row in enumerate(r, start=2):  # 1 = header
-                total_rows += 1
-                try:
-                    p_code = (row.get("producto_codigo") or row.get("codigo") or "").strip().upper()
-                    u_code = (row.get("ubicacion_codigo") or row.get("ubicacion") or "").strip().upper()
-                    qty_raw = (row.get("cantidad") or "0").strip().replace(",", ".")
-
-                    if not p_code or not u_code:
-                        raise ValueError("producto_codigo y ubicacion_codigo son obligatorios.")
-
-                    qty = Decimal(qty_raw)
-                    if qty == 0:
-                        skipped_zero += 1
-                        continue
-                    if qty < 0:
-                        raise ValueError("cantidad no puede ser negativa (para stock inicial).")
-
-                    producto = Producto.objects.get(codigo=p_code)
-                    ubic = Ubicacion.objects.get(codigo=u_code)
-
-                    ref = (row.get("referencia") or "").strip() or default_ref
-                    obs = (row.get("observaciones") or row.get("obs") or "").strip()
-
-                    proveedor = None
-                    prov_raw = (row.get("proveedor") or "").strip()
-                    if prov_raw:
-                        # Intento: CUIT exacto -> nombre exacto
-                        proveedor = Proveedor.objects.filter(cuit=prov_raw).first() or Proveedor.objects.filter(nombre__iexact=prov_raw).first()
-
-                    mov = MovimientoStock(
-                        producto=producto,
-                        ubicacion=ubic,
-                        tipo=MovimientoStock.Tipo.INGRESO,
-                        cantidad=qty,
-                        proveedor=proveedor,
-                        referencia=ref,
-                        observaciones=obs,
-                        usuario=user,
-                    )
-
-                    mov.full_clean()
-                    ok_rows += 1
+        # Catálogos en memoria: evita 2-3 consultas por fila en cargas grandes
+        productos = {p.codigo: p for p in Producto.objects.all().only("id", "codigo")}
+        ubicaciones = {u.codigo: u for u in Ubicacion.objects.all().only("id", "codigo", "permite_transferencias")}
+        proveedores: dict[str, Proveedor | None] = {}
 
-                    if not dry:
-                        mov.save()
-                        stock_service.aplicar_movimiento_creado(mov)
-                        created += 1
+        movs: list[MovimientoStock] = []
+        filas: list[int] = []
 
-                except Exception as e:
-                    errors.append(f"Fila {i}: {e}")
-
-            if dry:
-                transaction.set_rollback(True)
+        for i, row in enumerate(r, start=2):  # 1 = header
+            total_rows += 1
+            try:
+                p_code = (row.get("producto_codigo") or row.get("codigo") or "").strip().upper()
+                u_code = (row.get("ubicacion_codigo") or row.get("ubicacion") or "").strip().upper()
+                qty_raw = (row.get("cantidad") or "0").strip().replace(",", ".")
+
+                if not p_code or not u_code:
+                    raise ValueError("producto_codigo y ubicacion_codigo son obligatorios.")
+
+                qty = Decimal(qty_raw)
+                if qty == 0:
+                    skipped_zero += 1
+                    continue
+                if qty < 0:
+                    raise ValueError("cantidad no puede ser negativa (para stock inicial).")
+
+                producto = productos.get(p_code)
+                if producto is None:
+                    raise Producto.DoesNotExist("Producto matching query does not exist.")
+                ubic = ubicaciones.get(u_code)
+                if ubic is None:
+                    raise Ubicacion.DoesNotExist("Ubicacion matching query does not exist.")
+
+                ref = (row.get("referencia") or "").strip() or default_ref
+                obs = (row.get("observaciones") or row.get("obs") or "").strip()
+
+                proveedor = None
+                prov_raw = (row.get("proveedor") or "").strip()
+                if prov_raw:
+                    if prov_raw not in proveedores:
+                        # Intento: CUIT exacto -> nombre exacto
+                        proveedores[prov_raw] = Proveedor.objects.filter(cuit=prov_raw).first() or Proveedor.objects.filter(nombre__iexact=prov_raw).first()
+                    proveedor = proveedores[prov_raw]
+
+                mov = MovimientoStock(
+                    producto=producto,
+                    ubicacion=ubic,
+                    tipo=MovimientoStock.Tipo.INGRESO,
+                    cantidad=qty,
+                    proveedor=proveedor,
+                    referencia=ref,
+                    observaciones=obs,
+                    usuario=user,
+                )
+
+                # Las FK ya se resolvieron arriba: no re-validarlas fila por fila
+                mov.full_clean(exclude=["producto", "ubicacion", "proveedor", "usuario"])
+                ok_rows += 1
+                movs.append(mov)
+                filas.append(i)
+
+            except Exception as e:
+                errors.append((i, f"Fila {i}: {e}"))
+
+        if not dry and movs:
+            with transaction.atomic():
+                res = stock_service.aplicar_movimientos_lote(movs, omitir_errores=True)
+                fallidos = {idx for idx, _ in res.errores}
+                for idx, msg in res.errores:
+                    errors.append((filas[idx], f"Fila {filas[idx]}: {msg}"))
+                MovimientoStock.objects.bulk_create(
+                    [m for idx, m in enumerate(movs) if idx not in fallidos],
+                    batch_size=stock_service.LOTE_CHUNK,
+                )
+                created = res.aplicados
 
         if errors:
+            errors = [txt for _, txt in sorted(errors, key=lambda e: e[0])]
             msg = "Errores:\n" + "\n".join(errors[:30])
             if len(errors) > 30:
                 msg += f"\n... ({len(errors) - 30} más)"
@@ -0,0 +1,67 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand, CommandError
+
+from inventario.models import Producto, Ubicacion
+from inventario.services.reconciliacion import CHUNK, reconciliar_stock
+
+
+class Command(BaseCommand):
+    help = (
+        "Recalcula StockActual desde el ledger de MovimientoStock y reporta (o repara) diferencias. "
+        "Con --incremental sólo lee los movimientos posteriores al último checkpoint (ideal para la tarea nocturna)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reparar", action="store_true", help="Corrige StockActual con el valor del ledger.")
+        parser.add_argument(
+            "--incremental",
+            action="store_true",
+            help="Parte del último checkpoint. Si no hay (o se editaron/borraron movimientos ya conciliados), corre completa.",
+        )
+        parser.add_argument("--chunk-size", type=int, default=CHUNK, help=f"Filas por tanda al leer el ledger. Default={CHUNK}.")
+        parser.add_argument("--max-detalle", type=int, default=30, help="Máximo de diferencias a listar. Default=30.")
+
+    def handle(self, *args, **opts):
+        chunk_size = int(opts["chunk_size"])
+        if chunk_size <= 0:
+            raise CommandError("--chunk-size debe ser mayor a 0.")
+
+        res = reconciliar_stock(
+            reparar=bool(opts["reparar"]),
+            incremental=bool(opts["incremental"]),
+            chunk_size=chunk_size,
+        )
+
+        if res.motivo_completa:
+            self.stdout.write(self.style.WARNING(f"Se corrió completa: {res.motivo_completa}."))
+
+        desde = f"#{res.desde_movimiento_id}" if res.desde_movimiento_id is not None else "inicio"
+        self.stdout.write(
+            f"Modo {res.modo}: movimientos {desde} -> #{res.hasta_movimiento_id} "
+            f"(leídos {res.movimientos_leidos}, pares {res.pares})."
+        )
+        if res.inconsistentes:
+            self.stdout.write(self.style.WARNING(f"Movimientos inconsistentes ignorados: {res.inconsistentes}."))
+
+        if not res.diferencias:
+            self.stdout.write(self.style.SUCCESS("OK: StockActual coincide con el ledger."))
+            return
+
+        max_detalle = max(0, int(opts["max_detalle"]))
+        detalle = res.diferencias[:max_detalle]
+        productos = dict(Producto.objects.filter(id__in={d.producto_id for d in detalle}).values_list("id", "codigo"))
+        ubicaciones = dict(Ubicacion.objects.filter(id__in={d.ubicacion_id for d in detalle}).values_list("id", "codigo"))
+        for d in detalle:
+            actual = "sin fila" if d.actual is None else d.actual
+            self.stdout.write(
+                f"  {productos.get(d.producto_id, d.producto_id)} @ {ubicaciones.get(d.ubicacion_id, d.ubicacion_id)}: "
+                f"StockActual={actual} ledger={d.esperado}"
+            )
+        if len(res.diferencias) > max_detalle:
+            self.stdout.write(f"  ... ({len(res.diferencias) - max_detalle} más)")
+
+        if res.reparadas:
+            self.stdout.write(self.style.SUCCESS(f"OK: reparadas {res.reparadas} filas de StockActual."))
+        else:
+            self.stdout.write(self.style.WARNING(f"Diferencias: {len(res.diferencias)}. Usá --reparar para corregir."))
@@ -0,0 +1,20 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+
+from inventario.services import consumo
+
+
+class Command(BaseCommand):
+    help = (
+        "Rearma el rollup ConsumoDiario (movimientos por unidad, producto, día y tipo) desde MovimientoStock. "
+        "Normalmente se mantiene solo en el servicio de stock; correr tras cargas masivas por SQL "
+        "o después de corregir internos/dominios de colectivos."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--chunk", type=int, default=2000, help="Movimientos por lote (default: 2000).")
+
+    def handle(self, *args, **opts):
+        n = consumo.reconstruir(chunk=max(1, opts["chunk"]))
+        self.stdout.write(self.style.SUCCESS(f"OK: rollup reconstruido ({n} filas)."))
@@ -0,0 +1,36 @@
+from __future__ import annotations
+
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+
+from inventario.services.historico import generar_snapshot
+
+
+class Command(BaseCommand):
+    help = (
+        "Genera un StockSnapshot (foto del stock al inicio del día indicado) para consultas históricas rápidas. "
+        "Programarlo diario o mensual (--mensual)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--fecha", default="", help="Día de corte YYYY-MM-DD (00:00). Default: hoy.")
+        parser.add_argument("--mensual", action="store_true", help="Usa el día 1 del mes de --fecha.")
+
+    def handle(self, *args, **opts):
+        raw = (opts.get("fecha") or "").strip()
+        try:
+            dia = date.fromisoformat(raw) if raw else timezone.localdate()
+        except ValueError:
+            raise CommandError(f"Fecha inválida: {raw} (usar YYYY-MM-DD)")
+
+        if opts.get("mensual"):
+            dia = dia.replace(day=1)
+
+        try:
+            filas = generar_snapshot(dia)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        self.stdout.write(self.style.SUCCESS(f"OK: snapshot {dia:%Y-%m-%d} con {filas} filas."))
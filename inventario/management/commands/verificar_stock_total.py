@@ -0,0 +1,46 @@
+from __future__ import annotations
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from inventario.services.stock import productos_desincronizados, recalcular_totales
+
+
+class Command(BaseCommand):
+    help = "Verifica Producto.stock_total / bajo_minimo contra StockActual y, con --reparar, los recalcula."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--reparar", action="store_true", help="Recalcula los productos desincronizados.")
+        parser.add_argument("--todos", action="store_true", help="Con --reparar: recalcula todos los productos.")
+        parser.add_argument("--max-detalle", type=int, default=30, help="Máximo de productos a listar. Default=30.")
+
+    @transaction.atomic
+    def handle(self, *args, **opts):
+        if opts["reparar"] and opts["todos"]:
+            n = recalcular_totales()
+            self.stdout.write(self.style.SUCCESS(f"OK: recalculados {n} productos."))
+            return
+
+        malos = list(
+            productos_desincronizados()
+            .only("id", "codigo", "stock_total", "bajo_minimo", "stock_minimo")
+            .order_by("codigo")
+        )
+        if not malos:
+            self.stdout.write(self.style.SUCCESS("OK: stock_total y bajo_minimo coinciden con StockActual."))
+            return
+
+        max_detalle = max(0, int(opts["max_detalle"]))
+        for p in malos[:max_detalle]:
+            self.stdout.write(
+                f"  {p.codigo}: stock_total={p.stock_total} real={p.total_real} "
+                f"bajo_minimo={p.bajo_minimo} real={p.bajo_minimo_real}"
+            )
+        if len(malos) > max_detalle:
+            self.stdout.write(f"  ... ({len(malos) - max_detalle} más)")
+
+        if opts["reparar"]:
+            n = recalcular_totales(p.pk for p in malos)
+            self.stdout.write(self.style.SUCCESS(f"OK: reparados {n} productos."))
+        else:
+            self.stdout.write(self.style.WARNING(f"Desincronizados: {len(malos)}. Usá --reparar para corregir."))
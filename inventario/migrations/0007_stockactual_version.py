@@ -0,0 +1,18 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0006_alter_producto_options_alter_stockactual_options_and_more'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='stockactual',
+            name='version',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+    ]
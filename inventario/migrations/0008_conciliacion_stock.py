@@ -0,0 +1,50 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:12
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0007_stockactual_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConciliacionStock',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='creado')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='actualizado')),
+                ('modo', models.CharField(choices=[('COMPLETA', 'Completa'), ('INCREMENTAL', 'Incremental')], max_length=12)),
+                ('desde_movimiento_id', models.BigIntegerField(blank=True, null=True)),
+                ('hasta_movimiento_id', models.BigIntegerField(default=0)),
+                ('movimientos_total', models.BigIntegerField(default=0)),
+                ('movimientos_leidos', models.BigIntegerField(default=0)),
+                ('pares', models.IntegerField(default=0)),
+                ('diferencias', models.IntegerField(default=0)),
+                ('reparadas', models.IntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'conciliación de stock',
+                'verbose_name_plural': 'conciliaciones de stock',
+                'ordering': ['-id'],
+            },
+        ),
+        migrations.CreateModel(
+            name='SaldoConciliado',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('cantidad', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.ubicacion')),
+            ],
+            options={
+                'verbose_name': 'saldo conciliado',
+                'verbose_name_plural': 'saldos conciliados',
+                'constraints': [models.UniqueConstraint(fields=('producto', 'ubicacion'), name='uq_saldoconc_prod_ubic')],
+            },
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:14
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0008_conciliacion_stock'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockSnapshot',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('corte', models.DateTimeField()),
+                ('cantidad', models.DecimalField(decimal_places=3, max_digits=12)),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+                ('ubicacion', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.ubicacion')),
+            ],
+            options={
+                'verbose_name': 'snapshot de stock',
+                'verbose_name_plural': 'snapshots de stock',
+                'indexes': [models.Index(fields=['producto', 'corte'], name='idx_snapshot_producto_corte'), models.Index(fields=['ubicacion', 'corte'], name='idx_snapshot_ubicacion_corte')],
+                'constraints': [models.UniqueConstraint(fields=('corte', 'producto', 'ubicacion'), name='uq_snapshot_corte_prod_ubic')],
+            },
+        ),
+    ]
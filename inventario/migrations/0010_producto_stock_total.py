@@ -0,0 +1,58 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:16
+
+from decimal import Decimal
+from django.db import migrations, models
+from django.db.models import BooleanField, Case, DecimalField, OuterRef, Q, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+
+
+def backfill_stock_total(apps, schema_editor):
+    Producto = apps.get_model("inventario", "Producto")
+    StockActual = apps.get_model("inventario", "StockActual")
+
+    qty = DecimalField(max_digits=12, decimal_places=3)
+    suma = Subquery(
+        StockActual.objects.filter(producto_id=OuterRef("pk"))
+        .values("producto_id")
+        .annotate(s=Sum("cantidad"))
+        .values("s"),
+        output_field=qty,
+    )
+    total = Coalesce(suma, Value(Decimal("0"), output_field=qty), output_field=qty)
+    Producto.objects.update(
+        stock_total=total,
+        bajo_minimo=Case(
+            When(Q(stock_minimo__gt=0) & Q(stock_minimo__gt=total), then=Value(True)),
+            default=Value(False),
+            output_field=BooleanField(),
+        ),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('inventario', '0009_stock_snapshot'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='producto',
+            name='bajo_minimo',
+            field=models.BooleanField(default=False, editable=False),
+        ),
+        migrations.AddField(
+            model_name='producto',
+            name='stock_total',
+            field=models.DecimalField(decimal_places=3, default=Decimal('0.000'), editable=False, max_digits=12),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['is_active', 'stock_total'], name='idx_producto_activo_stock'),
+        ),
+        migrations.AddIndex(
+            model_name='producto',
+            index=models.Index(fields=['is_active', 'bajo_minimo'], name='idx_producto_activo_bajomin'),
+        ),
+        migrations.RunPython(backfill_stock_total, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,80 @@
+# Generated by Django 5.1.15 on 2026-10-17 21:56
+
+import django.db.models.deletion
+from decimal import Decimal
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def _tokens(interno, dominio):
+    # Copia congelada de inventario.services.consumo.tokens_colectivo
+    interno = str(interno)
+    dominio = (dominio or "").strip().upper()
+    out = [f"INT-{interno}", f"INT {interno}", f"INTERNO {interno}", f"COLECTIVO {interno}", f"COLECTIVO-{interno}", f"#{interno}"]
+    if dominio:
+        out += [dominio, f"DOM-{dominio}"]
+    return out
+
+
+def backfill_consumo(apps, schema_editor):
+    # Rollup de la historia: colectivo del movimiento o, si falta, el token más largo en el texto
+    Colectivo = apps.get_model("flota", "Colectivo")
+    MovimientoStock = apps.get_model("inventario", "MovimientoStock")
+    ConsumoDiario = apps.get_model("inventario", "ConsumoDiario")
+
+    tokens = {}
+    for pk, interno, dominio in Colectivo.objects.order_by("interno").values_list("pk", "interno", "dominio"):
+        for t in _tokens(interno, dominio):
+            tokens.setdefault(t, pk)
+    por_largo = sorted(tokens.items(), key=lambda kv: -len(kv[0]))
+
+    acum = {}
+    campos = ("colectivo_id", "producto_id", "fecha", "tipo", "cantidad", "referencia", "observaciones")
+    for m in MovimientoStock.objects.only(*campos).iterator(chunk_size=2000):
+        colectivo_id = m.colectivo_id
+        if not colectivo_id:
+            texto = f"{m.referencia or ''} {m.observaciones or ''}".upper()
+            colectivo_id = next((pk for t, pk in por_largo if t in texto), None)
+        if not colectivo_id:
+            continue
+        clave = (colectivo_id, m.producto_id, timezone.localdate(m.fecha), m.tipo)
+        qty, n = acum.get(clave, (Decimal("0"), 0))
+        acum[clave] = (qty + m.cantidad, n + 1)
+
+    ConsumoDiario.objects.bulk_create(
+        [
+            ConsumoDiario(colectivo_id=c, producto_id=p, dia=d, tipo=t, cantidad=qty, movimientos=n)
+            for (c, p, d, t), (qty, n) in acum.items()
+        ],
+        batch_size=500,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0022_odometro'),
+        ('inventario', '0010_producto_stock_total'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ConsumoDiario',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('dia', models.DateField()),
+                ('tipo', models.CharField(choices=[('INGRESO', 'Ingreso'), ('EGRESO', 'Egreso'), ('AJUSTE', 'Ajuste'), ('TRANSFERENCIA', 'Transferencia')], max_length=14)),
+                ('cantidad', models.DecimalField(decimal_places=3, default=Decimal('0.000'), max_digits=14)),
+                ('movimientos', models.IntegerField(default=0)),
+                ('colectivo', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='consumos_diarios', to='flota.colectivo')),
+                ('producto', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='inventario.producto')),
+            ],
+            options={
+                'verbose_name': 'consumo diario',
+                'verbose_name_plural': 'consumos diarios',
+                'indexes': [models.Index(fields=['colectivo', 'dia'], name='idx_consumo_colectivo_dia')],
+                'constraints': [models.UniqueConstraint(fields=('colectivo', 'producto', 'dia', 'tipo'), name='uq_consumo_col_prod_dia_tipo')],
+            },
+        ),
+        migrations.RunPython(backfill_consumo, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,20 @@
+# Generated by Django 5.1.15 on 2026-10-17 22:04
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('flota', '0023_indices_cursor'),
+        ('inventario', '0011_consumo_diario'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='movimientostock',
+            index=models.Index(fields=['fecha', 'id'], name='idx_mov_fecha_id'),
+        ),
+    ]
@@ -6,6 +6,7 @@ from django.conf import settings
 from django.core.validators import MinValueValidator
 from django.core.exceptions import ValidationError
 from django.db import models
+from django.db.models import BooleanField, Case, F, Q, Value, When
 
 
 class TimeStampedModel(models.Model):
@@ -169,7 +170,25 @@ class Ubicacion(TimeStampedModel):
             self.referencia = self.referencia.strip()
 
 
+def bajo_minimo_expr(stock_total=None):
+    """Expresión SQL de `Producto.bajo_minimo` (mínimo > 0 y total por debajo).
+
+    `stock_total` permite pasar el valor nuevo dentro de un UPDATE (ej. F("stock_total") + delta),
+    ya que en SQL el lado derecho ve los valores previos de la fila.
+    """
+
+    total = F("stock_total") if stock_total is None else stock_total
+    return Case(
+        When(Q(stock_minimo__gt=0) & Q(stock_minimo__gt=total), then=Value(True)),
+        default=Value(False),
+        output_field=BooleanField(),
+    )
+
+
 class Producto(TimeStampedModel):
+    # Los mantiene inventario.services.stock en la misma transacción que StockActual
+    DENORMALIZADOS = ("stock_total", "bajo_minimo")
+
     codigo = models.CharField(max_length=60, unique=True)
     nombre = models.CharField(max_length=220)
     descripcion = models.TextField(blank=True)
@@ -183,6 +202,10 @@ class Producto(TimeStampedModel):
     maneja_vencimiento = models.BooleanField(default=False)
     is_active = models.BooleanField(default=True)
 
+    # Desnormalizados: suma de StockActual.cantidad y flag de bajo mínimo
+    stock_total = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.000"), editable=False)
+    bajo_minimo = models.BooleanField(default=False, editable=False)
+
     class Meta:
         verbose_name = "producto"
         verbose_name_plural = "productos"
@@ -190,11 +213,25 @@ class Producto(TimeStampedModel):
         indexes = [
             models.Index(fields=["codigo"], name="idx_producto_codigo"),
             models.Index(fields=["nombre"], name="idx_producto_nombre"),
+            models.Index(fields=["is_active", "stock_total"], name="idx_producto_activo_stock"),
+            models.Index(fields=["is_active", "bajo_minimo"], name="idx_producto_activo_bajomin"),
         ]
 
     def __str__(self) -> str:
         return f"{self.codigo} - {self.nombre}"
 
+    def save(self, *args, **kwargs):
+        # En una edición (form/import) no pisar el total con el valor leído al abrir el objeto
+        if not self._state.adding and kwargs.get("update_fields") is None and not kwargs.get("force_insert"):
+            kwargs["update_fields"] = [
+                f.name for f in self._meta.concrete_fields if not f.primary_key and f.name not in self.DENORMALIZADOS
+            ]
+        super().save(*args, **kwargs)
+
+        # stock_minimo pudo cambiar: recalcular el flag con el total real de la fila
+        if "stock_minimo" in (kwargs.get("update_fields") or ["stock_minimo"]):
+            Producto.objects.filter(pk=self.pk).update(bajo_minimo=bajo_minimo_expr())
+
     def clean(self):
         super().clean()
         if self.codigo:
@@ -208,6 +245,8 @@ class StockActual(TimeStampedModel):
     ubicacion = models.ForeignKey(Ubicacion, on_delete=models.PROTECT, related_name="stocks")
     cantidad = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.000"))
     last_movement_at = models.DateTimeField(blank=True, null=True)
+    # Control optimista: cada escritura del servicio de stock incrementa la versión
+    version = models.PositiveIntegerField(default=0, editable=False)
 
     class Meta:
         verbose_name = "stock actual"
@@ -278,6 +317,8 @@ class MovimientoStock(TimeStampedModel):
             models.Index(fields=["producto", "fecha"], name="idx_mov_producto_fecha"),
             models.Index(fields=["ubicacion", "fecha"], name="idx_mov_ubicacion_fecha"),
             models.Index(fields=["tipo", "fecha"], name="idx_mov_tipo_fecha"),
+            # Listado paginado por cursor (core.paginacion)
+            models.Index(fields=["fecha", "id"], name="idx_mov_fecha_id"),
         ]
 
     def __str__(self) -> str:
@@ -314,4 +355,109 @@ class MovimientoStock(TimeStampedModel):
             if getattr(self.ubicacion_destino, "permite_transferencias", True) is False:
                 raise ValidationError({"ubicacion_destino": "La ubicación destino no permite transferencias."})
         else:
-            self.ubicacion_destino = None
\ No newline at end of file
+            self.ubicacion_destino = None
+
+
+class SaldoConciliado(models.Model):
+    """Saldo por (producto, ubicación) según el ledger de movimientos, al último checkpoint.
+
+    Lo mantiene `inventario.services.reconciliacion`: permite reconciliar en modo
+    incremental sin volver a leer todo el historial.
+    """
+
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+")
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.CASCADE, related_name="+")
+    cantidad = models.DecimalField(max_digits=12, decimal_places=3, default=Decimal("0.000"))
+
+    class Meta:
+        verbose_name = "saldo conciliado"
+        verbose_name_plural = "saldos conciliados"
+        constraints = [
+            models.UniqueConstraint(fields=["producto", "ubicacion"], name="uq_saldoconc_prod_ubic"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.producto_id} @ {self.ubicacion_id}: {self.cantidad}"
+
+
+class ConciliacionStock(TimeStampedModel):
+    """Registro de cada corrida de `reconciliar_stock` (la última es el checkpoint)."""
+
+    class Modo(models.TextChoices):
+        COMPLETA = "COMPLETA", "Completa"
+        INCREMENTAL = "INCREMENTAL", "Incremental"
+
+    modo = models.CharField(max_length=12, choices=Modo.choices)
+    desde_movimiento_id = models.BigIntegerField(blank=True, null=True)
+    hasta_movimiento_id = models.BigIntegerField(default=0)
+    # Cantidad de movimientos con id <= hasta_movimiento_id (detecta borrados en el tramo ya conciliado)
+    movimientos_total = models.BigIntegerField(default=0)
+    movimientos_leidos = models.BigIntegerField(default=0)
+    pares = models.IntegerField(default=0)
+    diferencias = models.IntegerField(default=0)
+    reparadas = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "conciliación de stock"
+        verbose_name_plural = "conciliaciones de stock"
+        ordering = ["-id"]
+
+    def __str__(self) -> str:
+        return f"{self.modo} hasta #{self.hasta_movimiento_id} ({self.diferencias} diferencias)"
+
+
+class StockSnapshot(models.Model):
+    """Foto del stock por (producto, ubicación) en un instante de corte.
+
+    Incluye todos los movimientos con `fecha < corte`. Se generan con `snapshot_stock`
+    (diario o mensual) y los usa `inventario.services.historico.stock_at` como punto
+    de partida. Los pares con cantidad 0 no se guardan.
+    """
+
+    corte = models.DateTimeField()
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+")
+    ubicacion = models.ForeignKey(Ubicacion, on_delete=models.CASCADE, related_name="+")
+    cantidad = models.DecimalField(max_digits=12, decimal_places=3)
+
+    class Meta:
+        verbose_name = "snapshot de stock"
+        verbose_name_plural = "snapshots de stock"
+        constraints = [
+            models.UniqueConstraint(fields=["corte", "producto", "ubicacion"], name="uq_snapshot_corte_prod_ubic"),
+        ]
+        indexes = [
+            models.Index(fields=["producto", "corte"], name="idx_snapshot_producto_corte"),
+            models.Index(fields=["ubicacion", "corte"], name="idx_snapshot_ubicacion_corte"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.corte:%Y-%m-%d %H:%M} {self.producto_id} @ {self.ubicacion_id}: {self.cantidad}"
+
+
+class ConsumoDiario(models.Model):
+    """Rollup diario de movimientos por unidad: (colectivo, producto, día, tipo) -> cantidad y cantidad de movimientos.
+
+    Lo mantiene `inventario.services.consumo` desde el servicio de stock (alta, edición, baja y
+    lote). La unidad es `MovimientoStock.colectivo` o, si está vacío, la que se detecta en
+    referencia / observaciones. Lo lee el informe por unidad (flota.ColectivoReportView).
+    """
+
+    colectivo = models.ForeignKey("flota.Colectivo", on_delete=models.CASCADE, related_name="consumos_diarios")
+    producto = models.ForeignKey(Producto, on_delete=models.CASCADE, related_name="+")
+    dia = models.DateField()
+    tipo = models.CharField(max_length=14, choices=MovimientoStock.Tipo.choices)
+    cantidad = models.DecimalField(max_digits=14, decimal_places=3, default=Decimal("0.000"))
+    movimientos = models.IntegerField(default=0)
+
+    class Meta:
+        verbose_name = "consumo diario"
+        verbose_name_plural = "consumos diarios"
+        constraints = [
+            models.UniqueConstraint(fields=["colectivo", "producto", "dia", "tipo"], name="uq_consumo_col_prod_dia_tipo"),
+        ]
+        indexes = [
+            models.Index(fields=["colectivo", "dia"], name="idx_consumo_colectivo_dia"),
+        ]
+
+    def __str__(self) -> str:
+        return f"{self.dia} {self.colectivo_id} {self.producto_id} {self.tipo}: {self.cantidad} ({self.movimientos})"
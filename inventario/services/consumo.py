@@ -0,0 +1,124 @@
+from __future__ import annotations
+
+"""
+inventario.services.consumo
+
+Rollup diario de movimientos por unidad (ConsumoDiario) para el informe de cada colectivo.
+
+- `registrar(movs, signo)` suma (+1) o resta (-1) movimientos al rollup. Lo llama el servicio
+  de stock dentro de su transacción: alta, edición (resta el viejo, suma el nuevo), baja y lote.
+- La unidad es `MovimientoStock.colectivo`; si está vacío se detecta en referencia /
+  observaciones / lote con el mismo detector que el alta de movimientos
+  (inventario.services.referencias: INT-14, #14, dominio, ...).
+- `reconstruir()` rearma todo desde los movimientos (comando `reconstruir_consumo`).
+"""
+
+from collections import defaultdict
+from dataclasses import dataclass
+from datetime import datetime
+from decimal import Decimal
+from typing import Iterable
+
+from django.db.models import F
+from django.utils import timezone
+
+from inventario.models import ConsumoDiario, MovimientoStock
+from inventario.services import referencias
+from inventario.services.referencias import DetectorColectivos, texto_movimiento
+
+LOTE_CHUNK = 500
+
+
+def colectivo_de(mov, detector: DetectorColectivos | None) -> int | None:
+    if mov.colectivo_id:
+        return mov.colectivo_id
+    if detector is None:
+        return None
+    return detector.detectar(texto_movimiento(mov))
+
+
+@dataclass(frozen=True)
+class _Clave:
+    colectivo_id: int
+    producto_id: int
+    dia: object
+    tipo: str
+
+
+def _dia(fecha: datetime | None):
+    return timezone.localdate(fecha or timezone.now())
+
+
+def registrar(movs: Iterable, signo: int = 1, detector: DetectorColectivos | None = None) -> int:
+    """Suma (signo=1) o resta (signo=-1) los movimientos al rollup. Devuelve las claves tocadas.
+
+    `movs` pueden ser MovimientoStock (guardados o no) o snapshots con los mismos campos.
+    Consultas fijas: una lectura de las claves existentes, un bulk_update y un bulk_create.
+    """
+
+    movs = list(movs)
+    if not movs:
+        return 0
+    if detector is None and any(not m.colectivo_id for m in movs):
+        detector = referencias.detector()
+
+    deltas: dict[_Clave, list] = defaultdict(lambda: [Decimal("0"), 0])
+    for m in movs:
+        colectivo_id = colectivo_de(m, detector)
+        if not colectivo_id:
+            continue
+        d = deltas[_Clave(colectivo_id, m.producto_id, _dia(m.fecha), m.tipo)]
+        d[0] += Decimal(m.cantidad) * signo
+        d[1] += signo
+    if not deltas:
+        return 0
+
+    existentes = {}
+    claves = list(deltas)
+    for i in range(0, len(claves), LOTE_CHUNK):
+        chunk = claves[i : i + LOTE_CHUNK]
+        for row in ConsumoDiario.objects.filter(
+            colectivo_id__in={k.colectivo_id for k in chunk},
+            producto_id__in={k.producto_id for k in chunk},
+            dia__in={k.dia for k in chunk},
+        ).only("id", "colectivo_id", "producto_id", "dia", "tipo"):
+            existentes[_Clave(row.colectivo_id, row.producto_id, row.dia, row.tipo)] = row
+
+    to_update, to_create = [], []
+    for k, (qty, n) in deltas.items():
+        row = existentes.get(k)
+        if row is not None:
+            row.cantidad = F("cantidad") + qty
+            row.movimientos = F("movimientos") + n
+            to_update.append(row)
+        elif n > 0:
+            to_create.append(
+                ConsumoDiario(
+                    colectivo_id=k.colectivo_id, producto_id=k.producto_id, dia=k.dia, tipo=k.tipo, cantidad=qty, movimientos=n
+                )
+            )
+
+    if to_update:
+        ConsumoDiario.objects.bulk_update(to_update, ["cantidad", "movimientos"], batch_size=LOTE_CHUNK)
+        if signo < 0:
+            ConsumoDiario.objects.filter(pk__in=[r.pk for r in to_update], movimientos__lte=0).delete()
+    if to_create:
+        # IntegrityError si otro proceso creó la misma clave: el servicio de stock reintenta
+        ConsumoDiario.objects.bulk_create(to_create, batch_size=LOTE_CHUNK)
+    return len(deltas)
+
+
+def reconstruir(chunk: int = 2000) -> int:
+    """Rearma ConsumoDiario desde todos los movimientos."""
+
+    ConsumoDiario.objects.all().delete()
+    detector = referencias.detector()
+    total = 0
+    lote = []
+    campos = ("id", "colectivo_id", "producto_id", "fecha", "tipo", "cantidad", "referencia", "observaciones", "lote")
+    for m in MovimientoStock.objects.only(*campos).order_by("pk").iterator(chunk_size=chunk):
+        lote.append(m)
+        if len(lote) >= chunk:
+            total += registrar(lote, 1, detector)
+            lote = []
+    return total + registrar(lote, 1, detector)
@@ -0,0 +1,82 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from datetime import date, datetime, time
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Max, Q
+from django.utils import timezone
+
+from inventario.models import MovimientoStock, StockSnapshot
+from inventario.services.reconciliacion import CHUNK, Clave, plegar_movimientos
+from inventario.services.stock import LOTE_CHUNK
+
+
+def instante_de(fecha: date | datetime) -> datetime:
+    """Datetime aware para consultar stock. Una fecha sola = inicio de ese día (00:00 local)."""
+
+    if isinstance(fecha, datetime):
+        return fecha if timezone.is_aware(fecha) else timezone.make_aware(fecha)
+    return timezone.make_aware(datetime.combine(fecha, time.min))
+
+
+def _pk(obj) -> int | None:
+    return getattr(obj, "pk", obj)
+
+
+def stock_at(fecha: date | datetime, producto=None, ubicacion=None) -> dict[Clave, Decimal]:
+    """Stock por (producto_id, ubicacion_id) en un instante del pasado.
+
+    Parte del StockSnapshot más cercano anterior (o igual) y aplica sólo los movimientos
+    posteriores a ese corte (índices idx_mov_producto_fecha / idx_mov_ubicacion_fecha).
+    `producto` / `ubicacion` aceptan instancia o id. Devuelve sólo cantidades distintas de 0.
+    """
+
+    instante = instante_de(fecha)
+    producto_id = _pk(producto)
+    ubicacion_id = _pk(ubicacion)
+
+    corte = StockSnapshot.objects.filter(corte__lte=instante).aggregate(m=Max("corte"))["m"]
+
+    saldos: dict[Clave, Decimal] = defaultdict(Decimal)
+    if corte is not None:
+        snap = StockSnapshot.objects.filter(corte=corte)
+        if producto_id:
+            snap = snap.filter(producto_id=producto_id)
+        if ubicacion_id:
+            snap = snap.filter(ubicacion_id=ubicacion_id)
+        for p_id, u_id, cantidad in snap.values_list("producto_id", "ubicacion_id", "cantidad"):
+            saldos[(p_id, u_id)] = cantidad
+
+    movs = MovimientoStock.objects.filter(fecha__lt=instante)
+    if corte is not None:
+        movs = movs.filter(fecha__gte=corte)
+    if producto_id:
+        movs = movs.filter(producto_id=producto_id)
+    if ubicacion_id:
+        movs = movs.filter(Q(ubicacion_id=ubicacion_id) | Q(ubicacion_destino_id=ubicacion_id))
+    plegar_movimientos(movs, saldos, CHUNK)
+
+    return {
+        k: v
+        for k, v in saldos.items()
+        if v != 0 and (not producto_id or k[0] == producto_id) and (not ubicacion_id or k[1] == ubicacion_id)
+    }
+
+
+@transaction.atomic
+def generar_snapshot(fecha: date | datetime) -> int:
+    """Escribe (o reescribe) el StockSnapshot del corte pedido. Devuelve filas guardadas."""
+
+    corte = instante_de(fecha)
+    if corte > timezone.now():
+        raise ValueError("No se puede generar un snapshot con corte en el futuro.")
+
+    StockSnapshot.objects.filter(corte=corte).delete()
+    saldos = stock_at(corte)
+    StockSnapshot.objects.bulk_create(
+        (StockSnapshot(corte=corte, producto_id=k[0], ubicacion_id=k[1], cantidad=v) for k, v in saldos.items()),
+        batch_size=LOTE_CHUNK,
+    )
+    return len(saldos)
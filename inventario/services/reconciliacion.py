@@ -0,0 +1,306 @@
+from __future__ import annotations
+
+from collections import defaultdict
+from dataclasses import dataclass, field
+from decimal import Decimal
+from typing import Callable
+
+from django.db import transaction
+from django.db.models import F, Max
+from django.utils import timezone
+
+from inventario.models import ConciliacionStock, MovimientoStock, SaldoConciliado, StockActual
+from inventario.services.stock import LOTE_CHUNK, recalcular_totales
+
+# Filas por tanda al recorrer el ledger con iterator()
+CHUNK = 5000
+
+Clave = tuple[int, int]
+
+
+@dataclass
+class Diferencia:
+    """Par (producto, ubicación) donde StockActual no coincide con el ledger.
+
+    `actual` None = no existe fila en StockActual.
+    """
+
+    producto_id: int
+    ubicacion_id: int
+    esperado: Decimal
+    actual: Decimal | None
+    stock_id: int | None = None
+
+
+@dataclass
+class ResultadoReconciliacion:
+    modo: str
+    desde_movimiento_id: int | None
+    hasta_movimiento_id: int
+    movimientos_leidos: int = 0
+    pares: int = 0
+    # Transferencias sin destino / tipos desconocidos (no se pueden plegar)
+    inconsistentes: int = 0
+    diferencias: list[Diferencia] = field(default_factory=list)
+    reparadas: int = 0
+    # Si se pidió incremental y se corrió completa, por qué
+    motivo_completa: str = ""
+
+
+def plegar_movimientos(qs, saldos: dict[Clave, Decimal], chunk_size: int) -> tuple[int, int]:
+    """Suma al dict los deltas de cada movimiento del queryset (origen y destino).
+
+    Recorre el ledger en tandas: la memoria depende de la cantidad de pares
+    (producto, ubicación), no de la cantidad de movimientos.
+    """
+
+    T = MovimientoStock.Tipo
+    leidos = 0
+    inconsistentes = 0
+    rows = (
+        qs.order_by("id")
+        .values_list("tipo", "producto_id", "ubicacion_id", "ubicacion_destino_id", "cantidad")
+        .iterator(chunk_size=chunk_size)
+    )
+    for tipo, producto_id, ubicacion_id, destino_id, cantidad in rows:
+        leidos += 1
+        qty = cantidad or Decimal("0")
+        origen = (producto_id, ubicacion_id)
+
+        if tipo == T.INGRESO or tipo == T.AJUSTE:
+            saldos[origen] += qty
+        elif tipo == T.EGRESO:
+            saldos[origen] -= qty
+        elif tipo == T.TRANSFERENCIA and destino_id:
+            saldos[origen] -= qty
+            saldos[(producto_id, destino_id)] += qty
+        else:
+            inconsistentes += 1
+
+    return leidos, inconsistentes
+
+
+def _filas_por_claves(qs, claves: set[Clave], campos: tuple[str, ...]) -> dict[Clave, tuple]:
+    """Trae filas (producto_id, ubicacion_id, *campos) de `qs` sólo para las claves pedidas."""
+
+    productos = sorted({k[0] for k in claves})
+    ubicaciones = sorted({k[1] for k in claves})
+    out: dict[Clave, tuple] = {}
+
+    for i in range(0, len(productos), LOTE_CHUNK):
+        sub = qs.filter(producto_id__in=productos[i : i + LOTE_CHUNK])
+        if len(ubicaciones) <= LOTE_CHUNK:
+            sub = sub.filter(ubicacion_id__in=ubicaciones)
+        for row in sub.values_list("producto_id", "ubicacion_id", *campos):
+            key = (row[0], row[1])
+            if key in claves:
+                out[key] = row[2:]
+    return out
+
+
+def _reparar(diferencias: list[Diferencia]) -> int:
+    """Lleva StockActual al valor del ledger (bulk_update + bulk_create)."""
+
+    now = timezone.now()
+    to_update: list[StockActual] = []
+    to_create: list[StockActual] = []
+    for d in diferencias:
+        if d.stock_id is not None:
+            to_update.append(
+                StockActual(pk=d.stock_id, cantidad=d.esperado, version=F("version") + 1, updated_at=now)
+            )
+        else:
+            to_create.append(StockActual(producto_id=d.producto_id, ubicacion_id=d.ubicacion_id, cantidad=d.esperado))
+
+    if to_update:
+        StockActual.objects.bulk_update(to_update, ["cantidad", "version", "updated_at"], batch_size=LOTE_CHUNK)
+    if to_create:
+        StockActual.objects.bulk_create(to_create, batch_size=LOTE_CHUNK)
+    if diferencias:
+        recalcular_totales({d.producto_id for d in diferencias})
+    return len(to_update) + len(to_create)
+
+
+def _motivo_completa(cp: ConciliacionStock | None) -> str:
+    """Devuelve por qué no se puede correr incremental ('' = se puede)."""
+
+    if cp is None:
+        return "no hay checkpoint previo"
+
+    ya_conciliados = MovimientoStock.objects.filter(id__lte=cp.hasta_movimiento_id)
+    if ya_conciliados.count() != cp.movimientos_total:
+        return "se borraron movimientos ya conciliados"
+    if ya_conciliados.filter(updated_at__gt=cp.created_at).exists():
+        return "se editaron movimientos ya conciliados"
+    return ""
+
+
+def _completa(hasta: int, chunk_size: int) -> tuple[ResultadoReconciliacion, Callable[[], None]]:
+    """Pliega todo el ledger hasta `hasta` y lo compara con StockActual (sólo lectura).
+
+    Devuelve el resultado y la escritura del checkpoint, que corre después con el lock tomado.
+    """
+
+    res = ResultadoReconciliacion(
+        modo=ConciliacionStock.Modo.COMPLETA,
+        desde_movimiento_id=None,
+        hasta_movimiento_id=hasta,
+    )
+
+    saldos: dict[Clave, Decimal] = defaultdict(Decimal)
+    res.movimientos_leidos, res.inconsistentes = plegar_movimientos(
+        MovimientoStock.objects.filter(id__lte=hasta), saldos, chunk_size
+    )
+
+    pendientes = {k for k, v in saldos.items() if v != 0}
+    stock_rows = StockActual.objects.values_list("id", "producto_id", "ubicacion_id", "cantidad").iterator(
+        chunk_size=chunk_size
+    )
+    for stock_id, producto_id, ubicacion_id, cantidad in stock_rows:
+        key = (producto_id, ubicacion_id)
+        pendientes.discard(key)
+        esperado = saldos.get(key, Decimal("0"))
+        if cantidad != esperado:
+            res.diferencias.append(Diferencia(producto_id, ubicacion_id, esperado, cantidad, stock_id))
+    for key in sorted(pendientes):
+        res.diferencias.append(Diferencia(key[0], key[1], saldos[key], None))
+
+    res.pares = len(saldos)
+
+    def guardar() -> None:
+        # Nuevo checkpoint: saldos del ledger (los 0 no se guardan)
+        SaldoConciliado.objects.all().delete()
+        SaldoConciliado.objects.bulk_create(
+            (SaldoConciliado(producto_id=k[0], ubicacion_id=k[1], cantidad=v) for k, v in saldos.items() if v != 0),
+            batch_size=LOTE_CHUNK,
+        )
+
+    return res, guardar
+
+
+def _incremental(
+    cp: ConciliacionStock, hasta: int, chunk_size: int
+) -> tuple[ResultadoReconciliacion, Callable[[], None]]:
+    """Pliega los movimientos posteriores al checkpoint sobre sus saldos (sólo lectura)."""
+
+    desde = cp.hasta_movimiento_id
+    res = ResultadoReconciliacion(
+        modo=ConciliacionStock.Modo.INCREMENTAL,
+        desde_movimiento_id=desde,
+        hasta_movimiento_id=hasta,
+    )
+
+    deltas: dict[Clave, Decimal] = defaultdict(Decimal)
+    res.movimientos_leidos, res.inconsistentes = plegar_movimientos(
+        MovimientoStock.objects.filter(id__gt=desde, id__lte=hasta), deltas, chunk_size
+    )
+    claves = set(deltas)
+    res.pares = len(claves)
+
+    base = _filas_por_claves(SaldoConciliado.objects.all(), claves, ("id", "cantidad")) if claves else {}
+    actual = _filas_por_claves(StockActual.objects.all(), claves, ("id", "cantidad")) if claves else {}
+
+    saldos_update: list[SaldoConciliado] = []
+    saldos_create: list[SaldoConciliado] = []
+    for key in sorted(claves):
+        saldo_id, saldo = base.get(key, (None, Decimal("0")))
+        esperado = saldo + deltas[key]
+
+        if saldo_id is not None:
+            saldos_update.append(SaldoConciliado(pk=saldo_id, cantidad=esperado))
+        else:
+            saldos_create.append(SaldoConciliado(producto_id=key[0], ubicacion_id=key[1], cantidad=esperado))
+
+        stock_id, cantidad = actual.get(key, (None, None))
+        if stock_id is None:
+            if esperado != 0:
+                res.diferencias.append(Diferencia(key[0], key[1], esperado, None))
+        elif cantidad != esperado:
+            res.diferencias.append(Diferencia(key[0], key[1], esperado, cantidad, stock_id))
+
+    def guardar() -> None:
+        SaldoConciliado.objects.bulk_update(saldos_update, ["cantidad"], batch_size=LOTE_CHUNK)
+        SaldoConciliado.objects.bulk_create(saldos_create, batch_size=LOTE_CHUNK)
+
+    return res, guardar
+
+
+def _confirmar(diferencias: list[Diferencia], hasta: int) -> list[Diferencia]:
+    """Vuelve a comparar los pares con diferencia contra StockActual de ahora (con el lock tomado).
+
+    StockActual se leyó sin bloquear: mientras tanto pudieron aplicarse movimientos posteriores a
+    `hasta`. Se suman al saldo del ledger y sólo quedan las diferencias que siguen en pie.
+    """
+
+    if not diferencias:
+        return []
+    claves = {(d.producto_id, d.ubicacion_id) for d in diferencias}
+    productos = sorted({k[0] for k in claves})
+    posteriores: dict[Clave, Decimal] = defaultdict(Decimal)
+    for i in range(0, len(productos), LOTE_CHUNK):
+        plegar_movimientos(
+            MovimientoStock.objects.filter(id__gt=hasta, producto_id__in=productos[i : i + LOTE_CHUNK]),
+            posteriores,
+            CHUNK,
+        )
+    actual = _filas_por_claves(StockActual.objects.all(), claves, ("id", "cantidad"))
+
+    out: list[Diferencia] = []
+    for d in diferencias:
+        key = (d.producto_id, d.ubicacion_id)
+        esperado = d.esperado + posteriores.get(key, Decimal("0"))
+        stock_id, cantidad = actual.get(key, (None, None))
+        if stock_id is None:
+            if esperado != 0:
+                out.append(Diferencia(key[0], key[1], esperado, None))
+        elif cantidad != esperado:
+            out.append(Diferencia(key[0], key[1], esperado, cantidad, stock_id))
+    return out
+
+
+def reconciliar_stock(*, reparar: bool = False, incremental: bool = False, chunk_size: int = CHUNK) -> ResultadoReconciliacion:
+    """Recalcula StockActual desde el ledger de MovimientoStock y reporta (o repara) el desvío.
+
+    - Completa: recorre todo el ledger en tandas y compara contra todo StockActual.
+    - Incremental: parte del último checkpoint (SaldoConciliado + ConciliacionStock) y sólo
+      lee los movimientos con id mayor. Si se borraron/editaron movimientos ya conciliados,
+      corre completa (ver `ResultadoReconciliacion.motivo_completa`).
+
+    El ledger se lee sin transacción de escritura, acotado por `id <= hasta` (con
+    transaction_mode IMMEDIATE, un atomic() tomaría el lock de SQLite durante todo el recorrido y
+    frenaría las altas de stock). Sólo la escritura del checkpoint y las reparaciones corren en
+    la transacción, que antes vuelve a leer los pares con diferencia (`_confirmar`).
+    """
+
+    hasta = MovimientoStock.objects.aggregate(m=Max("id"))["m"] or 0
+
+    motivo = ""
+    cp = None
+    if incremental:
+        cp = ConciliacionStock.objects.order_by("-id").first()
+        motivo = _motivo_completa(cp)
+
+    if incremental and not motivo:
+        res, guardar = _incremental(cp, hasta, chunk_size)
+        total = cp.movimientos_total + res.movimientos_leidos
+    else:
+        res, guardar = _completa(hasta, chunk_size)
+        res.motivo_completa = motivo
+        total = res.movimientos_leidos
+
+    with transaction.atomic():
+        guardar()
+        res.diferencias = _confirmar(res.diferencias, hasta)
+        if reparar:
+            res.reparadas = _reparar(res.diferencias)
+        ConciliacionStock.objects.create(
+            modo=res.modo,
+            desde_movimiento_id=res.desde_movimiento_id,
+            hasta_movimiento_id=hasta,
+            movimientos_total=total,
+            movimientos_leidos=res.movimientos_leidos,
+            pares=res.pares,
+            diferencias=len(res.diferencias),
+            reparadas=res.reparadas,
+        )
+    return res
@@ -0,0 +1,156 @@
+from __future__ import annotations
+
+"""
+inventario.services.referencias
+
+Detección de la unidad (colectivo) en el texto libre de los movimientos: referencia,
+observaciones, lote.
+
+- `AhoCorasick`: autómata multi-patrón. Se arma una vez y encuentra todas las apariciones de
+  todos los patrones en una sola pasada sobre el texto, sin importar cuántos patrones haya
+  (antes: un `in` por dominio de la flota para cada movimiento).
+- `DetectorColectivos`: interno por palabra clave (INT-14, interno 14, unidad:14, C-14, #14) y,
+  si no, dominio normalizado (sin espacios/guiones/puntos) con el autómata. Es el único criterio
+  para atribuir un movimiento sin colectivo a una unidad: lo usan el alta de movimientos
+  (MovimientoStockCreateView), `backfill_mov_colectivo`, el rollup de consumo
+  (inventario.services.consumo) y el reporte por unidad.
+- `detector()` arma uno por generación de flota (todas las unidades, también las dadas de baja:
+  la historia las nombra) y lo reutiliza hasta que la flota cambie.
+"""
+
+import re
+from collections import deque
+from typing import Iterable, Iterator
+
+from core import generaciones
+
+# Captura interno cuando viene con palabra clave cerca
+RX_KEYED_INT = re.compile(
+    r"\b(?:INT(?:ERNO)?|UNIDAD|COLECTIVO|BUS|C)\s*[:#\-]?\s*(\d{1,4})\b",
+    re.IGNORECASE
+)
+
+# También soporta "INT-14" o "INT 14"
+RX_INT_SIMPLE = re.compile(r"\bINT\s*[- ]\s*(\d{1,4})\b", re.IGNORECASE)
+
+# "#14" suelto (sin palabra clave)
+RX_NUMERAL = re.compile(r"(?<![\w#])#\s*(\d{1,4})\b")
+
+_RX_SEPARADORES = re.compile(r"[\s\-\._]")
+
+
+def normalizar(s: str) -> str:
+    # Normaliza para comparar dominios aunque haya espacios o guiones
+    return _RX_SEPARADORES.sub("", (s or "").upper())
+
+
+class AhoCorasick:
+    """Autómata de Aho-Corasick sobre patrones (str -> valor). Ante patrones repetidos vale el primero."""
+
+    def __init__(self, patrones: Iterable[tuple[str, object]]):
+        self._goto: list[dict[str, int]] = [{}]
+        self._fail: list[int] = [0]
+        # Por nodo: (largo, valor) de cada patrón que termina ahí (propio + por enlaces de falla)
+        self._out: list[list[tuple[int, object]]] = [[]]
+        for patron, valor in patrones:
+            if patron:
+                self._agregar(patron, valor)
+        self._construir()
+
+    def __bool__(self) -> bool:
+        return len(self._goto) > 1
+
+    def _agregar(self, patron: str, valor) -> None:
+        nodo = 0
+        for ch in patron:
+            sig = self._goto[nodo].get(ch)
+            if sig is None:
+                sig = len(self._goto)
+                self._goto[nodo][ch] = sig
+                self._goto.append({})
+                self._fail.append(0)
+                self._out.append([])
+            nodo = sig
+        if not self._out[nodo]:
+            self._out[nodo].append((len(patron), valor))
+
+    def _construir(self) -> None:
+        cola = deque(self._goto[0].values())
+        while cola:
+            nodo = cola.popleft()
+            for ch, sig in self._goto[nodo].items():
+                cola.append(sig)
+                f = self._fail[nodo]
+                while f and ch not in self._goto[f]:
+                    f = self._fail[f]
+                destino = self._goto[f].get(ch, 0)
+                self._fail[sig] = destino if destino != sig else 0
+                self._out[sig] = self._out[sig] + self._out[self._fail[sig]]
+
+    def buscar(self, texto: str) -> Iterator[tuple[int, int, object]]:
+        """(inicio, fin, valor) de cada aparición, en orden de fin."""
+
+        goto, fail, out = self._goto, self._fail, self._out
+        nodo = 0
+        for i, ch in enumerate(texto):
+            while nodo and ch not in goto[nodo]:
+                nodo = fail[nodo]
+            nodo = goto[nodo].get(ch, 0)
+            for largo, valor in out[nodo]:
+                yield i + 1 - largo, i + 1, valor
+
+    def mas_largo(self, texto: str):
+        """Valor del patrón más largo que aparece (a igual largo, el primero en el texto); None si ninguno."""
+
+        mejor = None
+        for inicio, fin, valor in self.buscar(texto):
+            largo = fin - inicio
+            if mejor is None or largo > mejor[0]:
+                mejor = (largo, valor)
+        return mejor[1] if mejor else None
+
+
+class DetectorColectivos:
+    """Interno por palabra clave y, si no, dominio. Se arma con filas (pk, interno, dominio)."""
+
+    def __init__(self, filas: Iterable[tuple[int, int, str]]):
+        filas = list(filas)
+        self.por_interno = {interno: pk for pk, interno, _ in filas}
+        self.dominios = AhoCorasick((normalizar(dominio), pk) for pk, _, dominio in filas if (dominio or "").strip())
+
+    def detectar(self, texto: str) -> int | None:
+        if not texto:
+            return None
+        mm = RX_KEYED_INT.search(texto) or RX_INT_SIMPLE.search(texto) or RX_NUMERAL.search(texto)
+        if mm:
+            pk = self.por_interno.get(int(mm.group(1)))
+            if pk:
+                return pk
+        if self.dominios:
+            return self.dominios.mas_largo(normalizar(texto))
+        return None
+
+
+def texto_movimiento(mov) -> str:
+    return f"{mov.referencia or ''} {mov.observaciones or ''} {mov.lote or ''}".strip()
+
+
+# Un detector armado por proceso, para la generación de flota vigente
+_detector: tuple[str, DetectorColectivos] | None = None
+
+
+def detector() -> DetectorColectivos:
+    """Detector de todas las unidades; se rearma sólo cuando cambia la generación de flota."""
+
+    global _detector
+    from flota.models import Colectivo
+
+    key = generaciones.clave("referencias:detector", generaciones.FLOTA)
+    actual = _detector
+    if actual is not None and actual[0] == key:
+        return actual[1]
+    # Activas primero: ante el mismo dominio en dos unidades gana la activa
+    filas = Colectivo.objects.order_by("-is_active", "interno").values_list("pk", "interno", "dominio")
+    det = DetectorColectivos(filas)
+    _detector = (key, det)
+    return det
@@ -1,13 +1,24 @@
 from __future__ import annotations
 
-from dataclasses import dataclass
+import dataclasses
+import functools
+import random
+import time
+from collections import defaultdict
+from dataclasses import dataclass, field
+from datetime import datetime
 from decimal import Decimal
+from typing import Iterable
 
-from django.db import transaction
-from django.db.models import F
+from django.conf import settings
+from django.db import IntegrityError, OperationalError, transaction
+from django.db.models import DecimalField, F, OuterRef, Q, Subquery, Sum, Value
+from django.db.models.functions import Coalesce
 from django.utils import timezone
 
-from inventario.models import MovimientoStock, StockActual
+from inventario.models import MovimientoStock, Producto, StockActual, StockSnapshot, bajo_minimo_expr
+from inventario.services import consumo
+from inventario.signals import stock_cambiado
 
 
 @dataclass(frozen=True)
@@ -15,6 +26,7 @@ class MovimientoSnapshot:
     """Snapshot mínimo de un MovimientoStock antes de editarlo.
 
     Se usa para recalcular stock con lógica de 'revertir viejo' + 'aplicar nuevo'.
+    Unidad, fecha y textos sirven para descontar el movimiento viejo del rollup de consumo.
     """
 
     producto_id: int
@@ -22,6 +34,49 @@ class MovimientoSnapshot:
     tipo: str
     cantidad: Decimal
     ubicacion_destino_id: int | None = None
+    colectivo_id: int | None = None
+    fecha: datetime | None = None
+    referencia: str = ""
+    observaciones: str = ""
+    lote: str = ""
+
+    @classmethod
+    def de(cls, mov: MovimientoStock) -> "MovimientoSnapshot":
+        return cls(
+            producto_id=mov.producto_id,
+            ubicacion_id=mov.ubicacion_id,
+            tipo=mov.tipo,
+            cantidad=mov.cantidad,
+            ubicacion_destino_id=mov.ubicacion_destino_id,
+            colectivo_id=mov.colectivo_id,
+            fecha=mov.fecha,
+            referencia=mov.referencia,
+            observaciones=mov.observaciones,
+            lote=mov.lote,
+        )
+
+
+@dataclass
+class LoteResultado:
+    """Resultado de `aplicar_movimientos_lote`.
+
+    `errores` guarda (índice en la lista recibida, mensaje) de los movimientos omitidos.
+    """
+
+    aplicados: int = 0
+    errores: list[tuple[int, str]] = field(default_factory=list)
+
+
+class StockConflicto(ValueError):
+    """Otro proceso modificó StockActual entre la lectura y la escritura."""
+
+
+MSG_EGRESO_INSUFICIENTE = "Stock insuficiente para registrar el egreso."
+MSG_AJUSTE_NEGATIVO = "El ajuste dejaría el stock en negativo."
+MSG_CONFLICTO = "El stock cambió mientras se registraba el movimiento. Reintentá."
+
+# Tamaño de tanda para IN (...) y bulk_* (SQLite limita la cantidad de parámetros)
+LOTE_CHUNK = 500
 
 
 def _get_qty(val) -> Decimal:
@@ -31,51 +86,103 @@ def _get_qty(val) -> Decimal:
         return Decimal("0")
 
 
-def _stock_row(producto_id: int, ubicacion_id: int) -> StockActual:
-    """Obtiene (o crea) el StockActual para producto+ubicación, bloqueando la fila."""
+def _es_db_ocupada(exc: Exception) -> bool:
+    msg = str(exc).lower()
+    return "locked" in msg or "busy" in msg
 
-    obj, _ = StockActual.objects.select_for_update().get_or_create(
-        producto_id=producto_id,
-        ubicacion_id=ubicacion_id,
-        defaults={"cantidad": Decimal("0")},
-    )
-    return obj
 
+def con_reintentos(fn):
+    """Corre `fn` en su propia transacción y la reintenta (acotado) ante DB ocupada o conflicto.
 
-def _touch_stock(pk: int, delta_qty: Decimal) -> None:
-    """Aplica delta a cantidad y actualiza last_movement_at (timezone aware)."""
+    SQLite ignora select_for_update: la consistencia la dan los UPDATE condicionales y
+    la columna `version`. Si ya hay un atomic externo (ej. una vista), no se reintenta acá:
+    se usa un savepoint y el error sube para que lo maneje quien abrió la transacción.
+    """
+
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        if transaction.get_connection().in_atomic_block:
+            with transaction.atomic():
+                return fn(*args, **kwargs)
+
+        intentos = max(1, int(getattr(settings, "INVENTARIO_STOCK_REINTENTOS", 5)))
+        espera = float(getattr(settings, "INVENTARIO_STOCK_REINTENTO_ESPERA", 0.05))
+        for n in range(intentos):
+            try:
+                with transaction.atomic():
+                    return fn(*args, **kwargs)
+            except (OperationalError, StockConflicto) as e:
+                if isinstance(e, OperationalError) and not _es_db_ocupada(e):
+                    raise
+                if n == intentos - 1:
+                    raise
+                time.sleep(espera * (2 ** n) * (1 + random.random()))
+
+    return wrapper
+
+
+def _apply_delta(producto_id: int, ubicacion_id: int, delta: Decimal, msg_negativo: str = "") -> None:
+    """Aplica delta con un único UPDATE condicional (no depende de bloqueos de fila).
+
+    Con `msg_negativo`, el UPDATE sólo afecta la fila si `cantidad + delta >= 0`;
+    si no afecta ninguna fila, el stock no alcanza. Actualiza last_movement_at (aware).
+    """
+
+    qs = StockActual.objects.filter(producto_id=producto_id, ubicacion_id=ubicacion_id)
+    cambios = {
+        "cantidad": F("cantidad") + delta,
+        "version": F("version") + 1,
+        "last_movement_at": timezone.now(),
+    }
+
+    if msg_negativo and delta < 0:
+        if not qs.filter(cantidad__gte=-delta).update(**cambios):
+            # sin fila = stock 0
+            raise ValueError(msg_negativo)
+    elif not qs.update(**cambios):
+        StockActual.objects.get_or_create(
+            producto_id=producto_id,
+            ubicacion_id=ubicacion_id,
+            defaults={"cantidad": Decimal("0")},
+        )
+        qs.update(**cambios)
+
+    _touch_producto(producto_id, delta)
 
-    StockActual.objects.filter(pk=pk).update(
-        cantidad=F("cantidad") + delta_qty,
-        last_movement_at=timezone.now(),
-    )
+
+def _touch_producto(producto_id: int, delta: Decimal) -> None:
+    """Mantiene Producto.stock_total / bajo_minimo en la misma transacción que StockActual."""
+
+    if not delta:
+        return
+    nuevo_total = F("stock_total") + delta
+    Producto.objects.filter(pk=producto_id).update(stock_total=nuevo_total, bajo_minimo=bajo_minimo_expr(nuevo_total))
+    stock_cambiado.send(sender=Producto)
+
+
+def _registrar_consumo(movs, signo: int) -> None:
+    """Rollup por unidad (inventario.services.consumo) en la misma transacción que el stock."""
+
+    try:
+        consumo.registrar(movs, signo)
+    except IntegrityError:
+        # Otro proceso creó la misma clave (unidad, producto, día, tipo) en el medio
+        raise StockConflicto(MSG_CONFLICTO)
 
 
 def _apply_ingreso(producto_id: int, ubicacion_id: int, qty: Decimal) -> None:
-    st = _stock_row(producto_id, ubicacion_id)
-    _touch_stock(st.pk, qty)
+    _apply_delta(producto_id, ubicacion_id, qty)
 
 
 def _apply_egreso(producto_id: int, ubicacion_id: int, qty: Decimal) -> None:
-    st = _stock_row(producto_id, ubicacion_id)
-
     # Validación: no dejar stock negativo
-    st.refresh_from_db(fields=["cantidad"])
-    if st.cantidad - qty < 0:
-        raise ValueError("Stock insuficiente para registrar el egreso.")
-
-    _touch_stock(st.pk, -qty)
+    _apply_delta(producto_id, ubicacion_id, -qty, MSG_EGRESO_INSUFICIENTE)
 
 
 def _apply_ajuste(producto_id: int, ubicacion_id: int, qty: Decimal) -> None:
     """Ajuste suma (puede ser negativo)."""
 
-    st = _stock_row(producto_id, ubicacion_id)
-    st.refresh_from_db(fields=["cantidad"])
-    if st.cantidad + qty < 0:
-        raise ValueError("El ajuste dejaría el stock en negativo.")
-
-    _touch_stock(st.pk, qty)
+    _apply_delta(producto_id, ubicacion_id, qty, MSG_AJUSTE_NEGATIVO)
 
 
 def _apply_transferencia(producto_id: int, ub_origen_id: int, ub_destino_id: int, qty: Decimal) -> None:
@@ -85,9 +192,15 @@ def _apply_transferencia(producto_id: int, ub_origen_id: int, ub_destino_id: int
     _apply_ingreso(producto_id, ub_destino_id, qty)
 
 
+@con_reintentos
 def aplicar_movimiento_creado(mov: MovimientoStock) -> None:
     """Aplica el impacto de un movimiento recién creado."""
 
+    _aplicar_stock(mov)
+    _registrar_consumo([mov], 1)
+
+
+def _aplicar_stock(mov: MovimientoStock) -> None:
     qty = _get_qty(mov.cantidad)
 
     if mov.tipo == MovimientoStock.Tipo.INGRESO:
@@ -111,7 +224,14 @@ def aplicar_movimiento_creado(mov: MovimientoStock) -> None:
     raise ValueError("Tipo de movimiento inválido.")
 
 
-@transaction.atomic
+def _invalidar_snapshots(mov: MovimientoStock) -> None:
+    """Los StockSnapshot posteriores a un movimiento editado/borrado ya no reflejan el ledger."""
+
+    if mov.fecha:
+        StockSnapshot.objects.filter(corte__gt=mov.fecha).delete()
+
+
+@con_reintentos
 def aplicar_movimiento_actualizado(old: MovimientoSnapshot, mov: MovimientoStock) -> None:
     """Reversa el efecto del movimiento viejo y aplica el nuevo."""
 
@@ -132,13 +252,20 @@ def aplicar_movimiento_actualizado(old: MovimientoSnapshot, mov: MovimientoStock
         _apply_egreso(old.producto_id, old.ubicacion_destino_id, qty_old)
 
     # 2) aplicar nuevo
-    aplicar_movimiento_creado(mov)
+    _aplicar_stock(mov)
+    _invalidar_snapshots(mov)
 
+    # 3) rollup de consumo: sale el viejo, entra el nuevo (la fecha no se edita)
+    _registrar_consumo([dataclasses.replace(old, fecha=old.fecha or mov.fecha)], -1)
+    _registrar_consumo([mov], 1)
 
-@transaction.atomic
+
+@con_reintentos
 def aplicar_movimiento_eliminado(mov: MovimientoStock) -> None:
     """Reversa el efecto del movimiento eliminado."""
 
+    _invalidar_snapshots(mov)
+    _registrar_consumo([mov], -1)
     qty = _get_qty(mov.cantidad)
 
     if mov.tipo == MovimientoStock.Tipo.INGRESO:
@@ -162,3 +289,231 @@ def aplicar_movimiento_eliminado(mov: MovimientoStock) -> None:
         return
 
     raise ValueError("Tipo de movimiento inválido.")
+
+
+# -----------------------------
+# Lote: muchos movimientos en una pasada
+# -----------------------------
+def _deltas_movimiento(mov: MovimientoStock) -> list[tuple[tuple[int, int], Decimal, str]]:
+    """Traduce un movimiento a deltas (clave, delta, mensaje si queda negativo).
+
+    Mensaje vacío = sin validación (igual que `_apply_ingreso`).
+    """
+
+    qty = _get_qty(mov.cantidad)
+    origen = (mov.producto_id, mov.ubicacion_id)
+
+    if mov.tipo == MovimientoStock.Tipo.INGRESO:
+        return [(origen, qty, "")]
+
+    if mov.tipo == MovimientoStock.Tipo.EGRESO:
+        return [(origen, -qty, MSG_EGRESO_INSUFICIENTE)]
+
+    if mov.tipo == MovimientoStock.Tipo.AJUSTE:
+        return [(origen, qty, MSG_AJUSTE_NEGATIVO)]
+
+    if mov.tipo == MovimientoStock.Tipo.TRANSFERENCIA:
+        if not mov.ubicacion_destino_id:
+            raise ValueError("La transferencia requiere una ubicación destino.")
+        destino = (mov.producto_id, mov.ubicacion_destino_id)
+        return [(origen, -qty, MSG_EGRESO_INSUFICIENTE), (destino, qty, "")]
+
+    raise ValueError("Tipo de movimiento inválido.")
+
+
+def _prefetch_stock(keys: set[tuple[int, int]]) -> dict[tuple[int, int], StockActual]:
+    """Trae (bloqueando) los StockActual existentes para las claves pedidas."""
+
+    productos = sorted({k[0] for k in keys})
+    ubicaciones = sorted({k[1] for k in keys})
+    out: dict[tuple[int, int], StockActual] = {}
+
+    for i in range(0, len(productos), LOTE_CHUNK):
+        chunk = productos[i : i + LOTE_CHUNK]
+        qs = (
+            StockActual.objects.select_for_update()
+            .filter(producto_id__in=chunk)
+            .only("id", "producto_id", "ubicacion_id", "cantidad", "version")
+        )
+        if len(ubicaciones) <= LOTE_CHUNK:
+            qs = qs.filter(ubicacion_id__in=ubicaciones)
+        for st in qs:
+            key = (st.producto_id, st.ubicacion_id)
+            if key in keys:
+                out[key] = st
+    return out
+
+
+@con_reintentos
+def aplicar_movimientos_lote(movs: Iterable[MovimientoStock], *, omitir_errores: bool = False) -> LoteResultado:
+    """Aplica el impacto de muchos movimientos nuevos con pocas consultas.
+
+    Equivale a llamar `aplicar_movimiento_creado` para cada movimiento, en orden:
+    las validaciones de stock negativo se hacen en memoria sobre un único prefetch
+    de StockActual y la escritura final es un bulk_update + bulk_create.
+
+    Concurrencia: el bulk_update aplica deltas (`cantidad + d`, `version + 1`) y luego
+    se verifica que cada versión avanzó exactamente 1 respecto del prefetch. Si otro
+    proceso escribió en el medio, se levanta StockConflicto y `con_reintentos` repite
+    el lote completo.
+
+    - omitir_errores=False: ante el primer error levanta ValueError (mismo mensaje que
+      el camino unitario) y no escribe nada.
+    - omitir_errores=True: el movimiento con error se saltea (no impacta stock) y se
+      informa en `LoteResultado.errores`.
+
+    Los movimientos no necesitan estar guardados: sólo se leen sus campos.
+    """
+
+    movs = list(movs)
+    res = LoteResultado()
+    if not movs:
+        return res
+
+    # 1) deltas por movimiento (los inválidos quedan registrados con su error)
+    planes: list[list[tuple[tuple[int, int], Decimal, str]] | ValueError] = []
+    keys: set[tuple[int, int]] = set()
+    for mov in movs:
+        try:
+            deltas = _deltas_movimiento(mov)
+        except ValueError as e:
+            planes.append(e)
+            continue
+        planes.append(deltas)
+        keys.update(k for k, _, _ in deltas)
+
+    # 2) saldos actuales en una pasada
+    existentes = _prefetch_stock(keys)
+    existentes_version = {st.pk: st.version for st in existentes.values()}
+    iniciales = {key: _get_qty(st.cantidad) for key, st in existentes.items()}
+    saldos: dict[tuple[int, int], Decimal] = defaultdict(lambda: Decimal("0"))
+    for key, st in existentes.items():
+        saldos[key] = _get_qty(st.cantidad)
+
+    # 3) aplicar en memoria, en orden (mismas reglas que el camino unitario)
+    tocados: set[tuple[int, int]] = set()
+    aplicados: list[MovimientoStock] = []
+    for idx, plan in enumerate(planes):
+        try:
+            if isinstance(plan, ValueError):
+                raise plan
+
+            nuevos: dict[tuple[int, int], Decimal] = {}
+            for key, delta, msg in plan:
+                nuevo = nuevos.get(key, saldos[key]) + delta
+                if msg and nuevo < 0:
+                    raise ValueError(msg)
+                nuevos[key] = nuevo
+        except ValueError as e:
+            if not omitir_errores:
+                raise
+            res.errores.append((idx, str(e)))
+            continue
+
+        saldos.update(nuevos)
+        tocados.update(nuevos)
+        aplicados.append(movs[idx])
+        res.aplicados += 1
+
+    # 4) escritura
+    now = timezone.now()
+    to_update: list[StockActual] = []
+    to_create: list[StockActual] = []
+    for key in tocados:
+        st = existentes.get(key)
+        if st is not None:
+            delta = saldos[key] - iniciales[key]
+            st.cantidad = F("cantidad") + delta
+            st.version = F("version") + 1
+            st.last_movement_at = now
+            st.updated_at = now
+            to_update.append(st)
+        else:
+            to_create.append(
+                StockActual(
+                    producto_id=key[0],
+                    ubicacion_id=key[1],
+                    cantidad=saldos[key],
+                    last_movement_at=now,
+                    version=1,
+                )
+            )
+
+    if to_update:
+        esperadas = {st.pk: existentes_version[st.pk] + 1 for st in to_update}
+        StockActual.objects.bulk_update(
+            to_update, ["cantidad", "version", "last_movement_at", "updated_at"], batch_size=LOTE_CHUNK
+        )
+        pks = list(esperadas)
+        for i in range(0, len(pks), LOTE_CHUNK):
+            for pk, version in StockActual.objects.filter(pk__in=pks[i : i + LOTE_CHUNK]).values_list("pk", "version"):
+                if version != esperadas[pk]:
+                    raise StockConflicto(MSG_CONFLICTO)
+
+    if to_create:
+        try:
+            StockActual.objects.bulk_create(to_create, batch_size=LOTE_CHUNK)
+        except IntegrityError:
+            # Otro proceso creó la misma fila (producto, ubicación) en el medio
+            raise StockConflicto(MSG_CONFLICTO)
+
+    # Totales por producto (un solo bulk_update con deltas)
+    por_producto: dict[int, Decimal] = defaultdict(Decimal)
+    for st in to_update:
+        por_producto[st.producto_id] += saldos[(st.producto_id, st.ubicacion_id)] - iniciales[(st.producto_id, st.ubicacion_id)]
+    for st in to_create:
+        por_producto[st.producto_id] += st.cantidad
+    productos = []
+    for producto_id, delta in por_producto.items():
+        if delta:
+            nuevo_total = F("stock_total") + delta
+            productos.append(Producto(pk=producto_id, stock_total=nuevo_total, bajo_minimo=bajo_minimo_expr(nuevo_total)))
+    if productos:
+        Producto.objects.bulk_update(productos, ["stock_total", "bajo_minimo"], batch_size=LOTE_CHUNK)
+        stock_cambiado.send(sender=Producto)
+
+    # Rollup por unidad (los movimientos sin fecha todavía cuentan en el día de hoy)
+    _registrar_consumo(aplicados, 1)
+
+    return res
+
+
+# -----------------------------
+# Totales desnormalizados por producto
+# -----------------------------
+_QTY = DecimalField(max_digits=12, decimal_places=3)
+
+
+def _total_real():
+    """Subquery: suma de StockActual.cantidad del producto (0 si no tiene filas)."""
+
+    suma = Subquery(
+        StockActual.objects.filter(producto_id=OuterRef("pk"))
+        .values("producto_id")
+        .annotate(s=Sum("cantidad"))
+        .values("s"),
+        output_field=_QTY,
+    )
+    return Coalesce(suma, Value(Decimal("0"), output_field=_QTY), output_field=_QTY)
+
+
+def productos_desincronizados(producto_ids: Iterable[int] | None = None):
+    """Productos cuyo stock_total / bajo_minimo no coincide con StockActual."""
+
+    qs = Producto.objects.all()
+    if producto_ids is not None:
+        qs = qs.filter(pk__in=list(producto_ids))
+    qs = qs.annotate(total_real=_total_real()).annotate(bajo_minimo_real=bajo_minimo_expr(F("total_real")))
+    return qs.filter(~Q(stock_total=F("total_real")) | ~Q(bajo_minimo=F("bajo_minimo_real")))
+
+
+def recalcular_totales(producto_ids: Iterable[int] | None = None) -> int:
+    """Recalcula stock_total / bajo_minimo desde StockActual con un solo UPDATE."""
+
+    qs = Producto.objects.all()
+    if producto_ids is not None:
+        qs = qs.filter(pk__in=list(producto_ids))
+    total = _total_real()
+    n = qs.update(stock_total=total, bajo_minimo=bajo_minimo_expr(total))
+    stock_cambiado.send(sender=Producto)
+    return n
@@ -0,0 +1,5 @@
+from django.dispatch import Signal
+
+# Lo envía inventario.services.stock después de escribir StockActual / Producto.stock_total
+# con update() o bulk_* (que no disparan post_save). Sin argumentos extra.
+stock_cambiado = Signal()
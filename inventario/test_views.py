@@ -1,8 +1,10 @@
+import shutil
+import tempfile
 from decimal import Decimal
 
 from django.contrib.auth import get_user_model
 from django.core.files.uploadedfile import SimpleUploadedFile
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import reverse
 
 from adjuntos.forms import ProductoImagenInlineFormSet
@@ -44,11 +46,21 @@ class InventarioViewsSmokeTests(TestCase):
 
     def setUp(self):
         self.client.login(username="admin", password="pass1234")
+        # Las imágenes subidas van a una carpeta temporal, no al MEDIA_ROOT real
+        tmpdir = tempfile.mkdtemp(prefix="panol_media_")
+        self.addCleanup(shutil.rmtree, tmpdir, ignore_errors=True)
+        media = override_settings(MEDIA_ROOT=tmpdir)
+        media.enable()
+        self.addCleanup(media.disable)
 
     def test_movimiento_list_loads(self):
         resp = self.client.get(reverse("inventario:movimiento_list"))
         self.assertEqual(resp.status_code, 200)
 
+    def test_stock_historico_loads(self):
+        resp = self.client.get(reverse("inventario:stock_historico"), {"producto": self.prod.codigo, "ubicacion": self.ubi.pk})
+        self.assertEqual(resp.status_code, 200)
+
     def test_movimiento_create_loads(self):
         resp = self.client.get(reverse("inventario:movimiento_create"))
         self.assertEqual(resp.status_code, 200)
@@ -1,12 +1,37 @@
 from __future__ import annotations
 
+import json
+import tempfile
+import threading
+from pathlib import Path
+from datetime import timedelta
 from decimal import Decimal
+from io import StringIO
 
-from django.test import TestCase
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
 from django.utils import timezone
 
-from inventario.models import Producto, Ubicacion, MovimientoStock, StockActual
+from flota.models import Colectivo
+
+from inventario.models import (
+    ConciliacionStock,
+    ConsumoDiario,
+    MovimientoStock,
+    Producto,
+    SaldoConciliado,
+    StockActual,
+    StockSnapshot,
+    Ubicacion,
+)
+from inventario.services import consumo, historico, reconciliacion, referencias
 from inventario.services import stock as stock_service
+from inventario.services.reconciliacion import reconciliar_stock
 
 
 class StockServiceTests(TestCase):
@@ -129,3 +154,589 @@ class StockServiceTests(TestCase):
 
         stock_service.aplicar_movimiento_eliminado(mov)
         self.assertEqual(self._stock(self.u1).cantidad, Decimal("0"))
+
+
+class StockLoteTests(TestCase):
+    def setUp(self):
+        self.prod = Producto.objects.create(codigo="P-001", nombre="Producto X")
+        self.prod2 = Producto.objects.create(codigo="P-002", nombre="Producto Y")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        self.u2 = Ubicacion.objects.create(codigo="U-02", nombre="Ubicación 2")
+
+    def _mov(self, tipo, cantidad, prod=None, ubic=None, destino=None) -> MovimientoStock:
+        return MovimientoStock(
+            producto=prod or self.prod,
+            ubicacion=ubic or self.u1,
+            ubicacion_destino=destino,
+            tipo=tipo,
+            cantidad=Decimal(cantidad),
+        )
+
+    def _cantidad(self, prod, ubic) -> Decimal:
+        st = StockActual.objects.filter(producto=prod, ubicacion=ubic).first()
+        return st.cantidad if st else Decimal("0")
+
+    def test_lote_equivale_a_aplicar_en_orden(self):
+        T = MovimientoStock.Tipo
+        movs = [
+            self._mov(T.INGRESO, "10"),
+            self._mov(T.EGRESO, "3"),
+            self._mov(T.TRANSFERENCIA, "4", destino=self.u2),
+            self._mov(T.AJUSTE, "-1", ubic=self.u2),
+            self._mov(T.INGRESO, "7", prod=self.prod2, ubic=self.u2),
+        ]
+        res = stock_service.aplicar_movimientos_lote(movs)
+
+        self.assertEqual(res.aplicados, 5)
+        self.assertEqual(res.errores, [])
+        self.assertEqual(self._cantidad(self.prod, self.u1), Decimal("3"))
+        self.assertEqual(self._cantidad(self.prod, self.u2), Decimal("3"))
+        self.assertEqual(self._cantidad(self.prod2, self.u2), Decimal("7"))
+        st = StockActual.objects.get(producto=self.prod, ubicacion=self.u1)
+        self.assertTrue(timezone.is_aware(st.last_movement_at))
+
+    def test_lote_respeta_el_orden_para_validar_negativos(self):
+        T = MovimientoStock.Tipo
+        movs = [self._mov(T.EGRESO, "3"), self._mov(T.INGRESO, "5")]
+
+        with self.assertRaisesMessage(ValueError, "Stock insuficiente para registrar el egreso."):
+            stock_service.aplicar_movimientos_lote(movs)
+
+        # Nada escrito
+        self.assertFalse(StockActual.objects.exists())
+
+    def test_lote_mismos_mensajes_que_camino_unitario(self):
+        T = MovimientoStock.Tipo
+        casos = [
+            self._mov(T.AJUSTE, "-1"),
+            self._mov(T.TRANSFERENCIA, "1"),
+            self._mov("OTRO", "1"),
+        ]
+        for mov in casos:
+            with self.assertRaises(ValueError) as unitario:
+                stock_service.aplicar_movimiento_creado(mov)
+            with self.assertRaises(ValueError) as lote:
+                stock_service.aplicar_movimientos_lote([mov])
+            self.assertEqual(str(unitario.exception), str(lote.exception))
+
+    def test_lote_omitir_errores_saltea_y_reporta(self):
+        T = MovimientoStock.Tipo
+        movs = [
+            self._mov(T.INGRESO, "2"),
+            self._mov(T.EGRESO, "5"),
+            self._mov(T.EGRESO, "1"),
+        ]
+        res = stock_service.aplicar_movimientos_lote(movs, omitir_errores=True)
+
+        self.assertEqual(res.aplicados, 2)
+        self.assertEqual(res.errores, [(1, "Stock insuficiente para registrar el egreso.")])
+        self.assertEqual(self._cantidad(self.prod, self.u1), Decimal("1"))
+
+    def test_lote_cantidad_de_consultas_no_depende_del_largo(self):
+        T = MovimientoStock.Tipo
+        StockActual.objects.create(producto=self.prod, ubicacion=self.u1, cantidad=Decimal("1"))
+        movs = [self._mov(T.INGRESO, "1", ubic=u) for u in (self.u1, self.u2) for _ in range(50)]
+
+        # SAVEPOINT + SELECT + UPDATE + SELECT (versiones) + INSERT + UPDATE (totales producto) + RELEASE
+        with self.assertNumQueries(7):
+            stock_service.aplicar_movimientos_lote(movs)
+
+        self.assertEqual(self._cantidad(self.prod, self.u1), Decimal("51"))
+        self.assertEqual(self._cantidad(self.prod, self.u2), Decimal("50"))
+
+
+@override_settings(INVENTARIO_STOCK_REINTENTOS=200, INVENTARIO_STOCK_REINTENTO_ESPERA=0.001)
+class StockConcurrenciaTests(TransactionTestCase):
+    """Estrés multi-hilo: sin select_for_update real (SQLite), el stock no pierde updates ni queda negativo."""
+
+    HILOS = 8
+    OPS_POR_HILO = 25
+
+    def setUp(self):
+        self.prod = Producto.objects.create(codigo="P-001", nombre="Producto X")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+
+    def _correr(self, tipo: str, cantidad: Decimal) -> tuple[int, int, list[Exception]]:
+        ok = []
+        rechazados = []
+        fallas: list[Exception] = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def worker():
+            try:
+                barrera.wait()
+                for _ in range(self.OPS_POR_HILO):
+                    mov = MovimientoStock(producto=self.prod, ubicacion=self.u1, tipo=tipo, cantidad=cantidad)
+                    try:
+                        stock_service.aplicar_movimiento_creado(mov)
+                        ok.append(1)
+                    except stock_service.StockConflicto as e:
+                        fallas.append(e)
+                    except ValueError:
+                        rechazados.append(1)
+                    except Exception as e:  # DB ocupada más allá de los reintentos
+                        fallas.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=worker) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+        return len(ok), len(rechazados), fallas
+
+    def _stock(self) -> StockActual:
+        return StockActual.objects.get(producto=self.prod, ubicacion=self.u1)
+
+    def test_ingresos_concurrentes_no_pierden_updates(self):
+        ok, rechazados, fallas = self._correr(MovimientoStock.Tipo.INGRESO, Decimal("1"))
+
+        self.assertEqual(fallas, [])
+        self.assertEqual(rechazados, 0)
+        self.assertEqual(ok, self.HILOS * self.OPS_POR_HILO)
+        st = self._stock()
+        self.assertEqual(st.cantidad, Decimal(ok))
+        self.assertEqual(st.version, ok)
+
+    def test_egresos_concurrentes_no_dejan_stock_negativo(self):
+        inicial = 50
+        stock_service.aplicar_movimiento_creado(
+            MovimientoStock(producto=self.prod, ubicacion=self.u1, tipo=MovimientoStock.Tipo.INGRESO, cantidad=Decimal(inicial))
+        )
+
+        ok, rechazados, fallas = self._correr(MovimientoStock.Tipo.EGRESO, Decimal("1"))
+
+        self.assertEqual(fallas, [])
+        self.assertEqual(ok, inicial)
+        self.assertEqual(ok + rechazados, self.HILOS * self.OPS_POR_HILO)
+        self.assertEqual(self._stock().cantidad, Decimal("0"))
+
+    def test_lotes_concurrentes_detectan_conflicto_y_reintentan(self):
+        StockActual.objects.create(producto=self.prod, ubicacion=self.u1, cantidad=Decimal("0"))
+        ok = []
+        fallas: list[Exception] = []
+        barrera = threading.Barrier(self.HILOS)
+
+        def worker():
+            try:
+                barrera.wait()
+                for _ in range(5):
+                    movs = [
+                        MovimientoStock(producto=self.prod, ubicacion=self.u1, tipo=MovimientoStock.Tipo.INGRESO, cantidad=Decimal("1"))
+                        for _ in range(4)
+                    ]
+                    try:
+                        ok.append(stock_service.aplicar_movimientos_lote(movs).aplicados)
+                    except Exception as e:
+                        fallas.append(e)
+            finally:
+                connection.close()
+
+        hilos = [threading.Thread(target=worker) for _ in range(self.HILOS)]
+        for h in hilos:
+            h.start()
+        for h in hilos:
+            h.join()
+
+        self.assertEqual(fallas, [])
+        self.assertEqual(self._stock().cantidad, Decimal(sum(ok)))
+        self.assertEqual(sum(ok), self.HILOS * 5 * 4)
+
+
+class ReconciliacionStockTests(TestCase):
+    def setUp(self):
+        self.prod = Producto.objects.create(codigo="P-001", nombre="Producto X")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        self.u2 = Ubicacion.objects.create(codigo="U-02", nombre="Ubicación 2")
+
+    def _crear(self, tipo, cantidad, ubic=None, destino=None) -> MovimientoStock:
+        mov = MovimientoStock.objects.create(
+            producto=self.prod,
+            ubicacion=ubic or self.u1,
+            ubicacion_destino=destino,
+            tipo=tipo,
+            cantidad=Decimal(cantidad),
+        )
+        stock_service.aplicar_movimiento_creado(mov)
+        return mov
+
+    def test_completa_sin_diferencias_incluye_destino_de_transferencias(self):
+        T = MovimientoStock.Tipo
+        self._crear(T.INGRESO, "10")
+        self._crear(T.TRANSFERENCIA, "4", destino=self.u2)
+        self._crear(T.EGRESO, "1", ubic=self.u2)
+
+        res = reconciliar_stock(chunk_size=2)
+
+        self.assertEqual(res.movimientos_leidos, 3)
+        self.assertEqual(res.pares, 2)
+        self.assertEqual(res.diferencias, [])
+        self.assertEqual(SaldoConciliado.objects.get(ubicacion=self.u2).cantidad, Decimal("3"))
+
+    def test_reporta_y_repara_drift(self):
+        T = MovimientoStock.Tipo
+        self._crear(T.INGRESO, "10")
+        StockActual.objects.filter(ubicacion=self.u1).update(cantidad=Decimal("7"))
+        StockActual.objects.create(producto=self.prod, ubicacion=self.u2, cantidad=Decimal("2"))
+
+        res = reconciliar_stock()
+        self.assertEqual(len(res.diferencias), 2)
+        self.assertEqual(res.reparadas, 0)
+        self.assertEqual(StockActual.objects.get(ubicacion=self.u1).cantidad, Decimal("7"))
+
+        res = reconciliar_stock(reparar=True)
+        self.assertEqual(res.reparadas, 2)
+        self.assertEqual(StockActual.objects.get(ubicacion=self.u1).cantidad, Decimal("10"))
+        self.assertEqual(StockActual.objects.get(ubicacion=self.u2).cantidad, Decimal("0"))
+
+    def test_incremental_lee_solo_movimientos_nuevos(self):
+        T = MovimientoStock.Tipo
+        self._crear(T.INGRESO, "10")
+        self._crear(T.EGRESO, "2")
+        reconciliar_stock()
+
+        self._crear(T.TRANSFERENCIA, "3", destino=self.u2)
+        StockActual.objects.filter(ubicacion=self.u2).update(cantidad=Decimal("99"))
+
+        res = reconciliar_stock(incremental=True, reparar=True)
+
+        self.assertEqual(res.modo, ConciliacionStock.Modo.INCREMENTAL)
+        self.assertEqual(res.movimientos_leidos, 1)
+        self.assertEqual(len(res.diferencias), 1)
+        self.assertEqual(StockActual.objects.get(ubicacion=self.u2).cantidad, Decimal("3"))
+        self.assertEqual(SaldoConciliado.objects.get(ubicacion=self.u1).cantidad, Decimal("5"))
+
+    def test_incremental_corre_completa_si_se_borraron_movimientos(self):
+        T = MovimientoStock.Tipo
+        self._crear(T.INGRESO, "10")
+        mov = self._crear(T.INGRESO, "1")
+        reconciliar_stock()
+
+        stock_service.aplicar_movimiento_eliminado(mov)
+        mov.delete()
+
+        res = reconciliar_stock(incremental=True)
+        self.assertEqual(res.modo, ConciliacionStock.Modo.COMPLETA)
+        self.assertEqual(res.motivo_completa, "se borraron movimientos ya conciliados")
+        self.assertEqual(res.diferencias, [])
+
+
+    def test_confirma_diferencias_contra_movimientos_posteriores(self):
+        T = MovimientoStock.Tipo
+        hasta = self._crear(T.INGRESO, "10").id
+        # Leído sin lock (StockActual=10 < ledger hasta `hasta`)... y mientras tanto entra otro ingreso
+        leida = reconciliacion.Diferencia(self.prod.pk, self.u1.pk, Decimal("10"), Decimal("7"), None)
+        self._crear(T.INGRESO, "5")
+        self.assertEqual(reconciliacion._confirmar([leida], hasta), [])
+
+        # Un desvío real sigue en pie, con el esperado de ahora
+        StockActual.objects.filter(ubicacion=self.u1).update(cantidad=Decimal("12"))
+        (d,) = reconciliacion._confirmar([leida], hasta)
+        self.assertEqual((d.esperado, d.actual), (Decimal("15"), Decimal("12")))
+
+class StockHistoricoTests(TestCase):
+    def setUp(self):
+        self.prod = Producto.objects.create(codigo="P-001", nombre="Producto X")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        self.u2 = Ubicacion.objects.create(codigo="U-02", nombre="Ubicación 2")
+        self.hoy = timezone.localdate()
+
+    def _crear(self, dias_atras: int, tipo, cantidad, ubic=None, destino=None) -> MovimientoStock:
+        mov = MovimientoStock.objects.create(
+            producto=self.prod,
+            ubicacion=ubic or self.u1,
+            ubicacion_destino=destino,
+            tipo=tipo,
+            cantidad=Decimal(cantidad),
+        )
+        stock_service.aplicar_movimiento_creado(mov)
+        fecha = historico.instante_de(self.hoy - timedelta(days=dias_atras)) + timedelta(hours=12)
+        MovimientoStock.objects.filter(pk=mov.pk).update(fecha=fecha)
+        mov.refresh_from_db()
+        return mov
+
+    def _cargar_historia(self):
+        T = MovimientoStock.Tipo
+        self._crear(10, T.INGRESO, "10")
+        self._crear(8, T.TRANSFERENCIA, "4", destino=self.u2)
+        self._crear(5, T.EGRESO, "3")
+        self._crear(2, T.INGRESO, "1", ubic=self.u2)
+
+    def test_stock_at_sin_snapshot_reproduce_el_ledger(self):
+        self._cargar_historia()
+        k1 = (self.prod.pk, self.u1.pk)
+        k2 = (self.prod.pk, self.u2.pk)
+
+        self.assertEqual(historico.stock_at(self.hoy - timedelta(days=9)), {k1: Decimal("10")})
+        self.assertEqual(historico.stock_at(self.hoy - timedelta(days=4)), {k1: Decimal("3"), k2: Decimal("4")})
+        self.assertEqual(historico.stock_at(self.hoy, ubicacion=self.u2), {k2: Decimal("5")})
+
+    def test_snapshot_mismo_resultado_y_menos_movimientos(self):
+        self._cargar_historia()
+        fecha = self.hoy - timedelta(days=4)
+        esperado = historico.stock_at(fecha, producto=self.prod)
+
+        filas = historico.generar_snapshot(self.hoy - timedelta(days=6))
+        self.assertEqual(filas, 2)
+        self.assertEqual(historico.stock_at(fecha, producto=self.prod), esperado)
+        self.assertEqual(historico.stock_at(self.hoy - timedelta(days=6), ubicacion=self.u2), {(self.prod.pk, self.u2.pk): Decimal("4")})
+
+    def test_editar_movimiento_viejo_invalida_snapshots_posteriores(self):
+        self._cargar_historia()
+        historico.generar_snapshot(self.hoy - timedelta(days=6))
+        historico.generar_snapshot(self.hoy - timedelta(days=1))
+
+        mov = MovimientoStock.objects.get(tipo=MovimientoStock.Tipo.EGRESO)
+        stock_service.aplicar_movimiento_eliminado(mov)
+        mov.delete()
+
+        self.assertEqual(StockSnapshot.objects.values("corte").distinct().count(), 1)
+        self.assertEqual(historico.stock_at(self.hoy, ubicacion=self.u1), {(self.prod.pk, self.u1.pk): Decimal("6")})
+
+    def test_no_permite_snapshot_futuro(self):
+        with self.assertRaises(ValueError):
+            historico.generar_snapshot(self.hoy + timedelta(days=1))
+
+
+class ProductoStockTotalTests(TestCase):
+    def setUp(self):
+        self.prod = Producto.objects.create(codigo="P-001", nombre="Producto X", stock_minimo=Decimal("5"))
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        self.u2 = Ubicacion.objects.create(codigo="U-02", nombre="Ubicación 2")
+
+    def _mov(self, tipo, cantidad, ubic=None, destino=None) -> MovimientoStock:
+        return MovimientoStock(
+            producto=self.prod,
+            ubicacion=ubic or self.u1,
+            ubicacion_destino=destino,
+            tipo=tipo,
+            cantidad=Decimal(cantidad),
+        )
+
+    def test_servicio_mantiene_total_y_flag(self):
+        T = MovimientoStock.Tipo
+        stock_service.aplicar_movimiento_creado(self._mov(T.INGRESO, "3"))
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock_total, Decimal("3"))
+        self.assertTrue(self.prod.bajo_minimo)
+
+        stock_service.aplicar_movimientos_lote(
+            [self._mov(T.INGRESO, "4", ubic=self.u2), self._mov(T.TRANSFERENCIA, "2", destino=self.u2)]
+        )
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock_total, Decimal("7"))
+        self.assertFalse(self.prod.bajo_minimo)
+
+        with self.assertRaises(ValueError):
+            stock_service.aplicar_movimiento_creado(self._mov(T.EGRESO, "100"))
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock_total, Decimal("7"))
+
+    def test_editar_producto_no_pisa_total_y_recalcula_flag(self):
+        stock_service.aplicar_movimiento_creado(self._mov(MovimientoStock.Tipo.INGRESO, "6"))
+
+        viejo = Producto.objects.get(pk=self.prod.pk)
+        stock_service.aplicar_movimiento_creado(self._mov(MovimientoStock.Tipo.EGRESO, "2"))
+        viejo.stock_minimo = Decimal("4.5")
+        viejo.save()
+
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock_total, Decimal("4"))
+        self.assertTrue(self.prod.bajo_minimo)
+
+    def test_verificar_y_reparar(self):
+        StockActual.objects.create(producto=self.prod, ubicacion=self.u1, cantidad=Decimal("9"))
+        self.assertEqual(list(stock_service.productos_desincronizados()), [self.prod])
+
+        stock_service.recalcular_totales()
+        self.assertFalse(stock_service.productos_desincronizados().exists())
+        self.prod.refresh_from_db()
+        self.assertEqual(self.prod.stock_total, Decimal("9"))
+        self.assertFalse(self.prod.bajo_minimo)
+
+
+class ConsumoDiarioTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.prod = Producto.objects.create(codigo="ACE-01", nombre="Aceite")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        datos = dict(anio_modelo=2015, marca="Marca", modelo="Modelo", is_active=True)
+        self.c1 = Colectivo.objects.create(interno=1, dominio="AAA111", numero_chasis="CH1", **datos)
+        self.c14 = Colectivo.objects.create(interno=14, dominio="BBB222", numero_chasis="CH14", **datos)
+        stock_service.aplicar_movimiento_creado(
+            MovimientoStock.objects.create(
+                producto=self.prod, ubicacion=self.u1, tipo=MovimientoStock.Tipo.INGRESO, cantidad=Decimal("100")
+            )
+        )
+
+    def _egreso(self, cantidad, colectivo=None, referencia="", dias=0) -> MovimientoStock:
+        mov = MovimientoStock.objects.create(
+            producto=self.prod,
+            ubicacion=self.u1,
+            tipo=MovimientoStock.Tipo.EGRESO,
+            cantidad=Decimal(cantidad),
+            colectivo=colectivo,
+            referencia=referencia,
+        )
+        if dias:
+            # fecha es auto_now_add
+            mov.fecha = timezone.now() - timedelta(days=dias)
+            MovimientoStock.objects.filter(pk=mov.pk).update(fecha=mov.fecha)
+        stock_service.aplicar_movimiento_creado(mov)
+        return mov
+
+    def _rollup(self, colectivo):
+        return {
+            (r.dia, r.tipo): (r.cantidad, r.movimientos)
+            for r in ConsumoDiario.objects.filter(colectivo=colectivo)
+        }
+
+    def test_detecta_la_unidad_como_el_alta(self):
+        detector = referencias.detector()
+        self.assertEqual(detector.detectar("Cambio aceite INT-14"), self.c14.pk)
+        self.assertEqual(detector.detectar("cambio int-1 urgente"), self.c1.pk)
+        self.assertEqual(detector.detectar("COLECTIVO-14"), self.c14.pk)
+        self.assertEqual(detector.detectar("pedido #14"), self.c14.pk)
+        self.assertEqual(detector.detectar("dom-bbb222"), self.c14.pk)
+        self.assertIsNone(detector.detectar("sin unidad"))
+        # Mismo autómata mientras la flota no cambie
+        self.assertIs(referencias.detector(), detector)
+
+    def test_servicio_mantiene_el_rollup(self):
+        hoy = timezone.localdate()
+        T = MovimientoStock.Tipo
+        mov = self._egreso("4", referencia="INT-14")
+        self._egreso("2", colectivo=self.c14)
+        self.assertEqual(self._rollup(self.c14), {(hoy, T.EGRESO): (Decimal("6"), 2)})
+        self.assertEqual(self._rollup(self.c1), {})
+
+        # Edición: pasa a la otra unidad y cambia la cantidad
+        old = stock_service.MovimientoSnapshot.de(mov)
+        mov.referencia = "INT-1"
+        mov.cantidad = Decimal("3")
+        mov.save()
+        stock_service.aplicar_movimiento_actualizado(old, mov)
+        self.assertEqual(self._rollup(self.c14), {(hoy, T.EGRESO): (Decimal("2"), 1)})
+        self.assertEqual(self._rollup(self.c1), {(hoy, T.EGRESO): (Decimal("3"), 1)})
+
+        stock_service.aplicar_movimiento_eliminado(mov)
+        mov.delete()
+        self.assertEqual(self._rollup(self.c1), {})
+
+        # Lote (como los importadores: se aplica y después se guarda)
+        lote = [
+            MovimientoStock(producto=self.prod, ubicacion=self.u1, tipo=T.EGRESO, cantidad=Decimal("1"), colectivo=self.c1),
+            MovimientoStock(producto=self.prod, ubicacion=self.u1, tipo=T.EGRESO, cantidad=Decimal("1"), referencia="#1"),
+        ]
+        stock_service.aplicar_movimientos_lote(lote)
+        MovimientoStock.objects.bulk_create(lote)
+        self.assertEqual(self._rollup(self.c1), {(hoy, T.EGRESO): (Decimal("2"), 2)})
+
+        antes = self._rollup(self.c14), self._rollup(self.c1)
+        consumo.reconstruir()
+        self.assertEqual((self._rollup(self.c14), self._rollup(self.c1)), antes)
+
+    def test_reporte_lee_el_rollup(self):
+        self._egreso("4", referencia="INT-14", dias=3)
+        self._egreso("2", colectivo=self.c14, dias=40)
+        self._egreso("5", referencia="INT-1")
+
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        url = reverse("flota:colectivo_report", args=[self.c14.pk])
+
+        resp = self.client.get(url, {"days": "30"})
+        self.assertEqual(resp.context["total_mov"], 1)
+        self.assertEqual([m.cantidad for m in resp.context["mov_qs"]], [Decimal("4")])
+        self.assertEqual(resp.context["top_consumos"][0]["qty"], Decimal("4"))
+
+        # La cantidad de consultas no depende de la ventana
+        consultas = []
+        for days in ("30", "365"):
+            with CaptureQueriesContext(connection) as q:
+                resp = self.client.get(url, {"days": days})
+            consultas.append(len(q))
+        self.assertEqual(consultas[0], consultas[1])
+        self.assertEqual(resp.context["total_mov"], 2)
+        self.assertEqual(resp.context["dias_con_actividad"], 2)
+
+
+class ReferenciasTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.prod = Producto.objects.create(codigo="FIL-01", nombre="Filtro")
+        self.u1 = Ubicacion.objects.create(codigo="U-01", nombre="Ubicación 1")
+        datos = dict(anio_modelo=2015, marca="Marca", modelo="Modelo", is_active=True)
+        self.c7 = Colectivo.objects.create(interno=7, dominio="AB 123 CD", numero_chasis="CH7", **datos)
+        self.c8 = Colectivo.objects.create(interno=8, dominio="AB123", numero_chasis="CH8", **datos)
+
+    def test_automata_encuentra_todas_las_apariciones(self):
+        ac = referencias.AhoCorasick([("HE", 1), ("SHE", 2), ("HERS", 3), ("HIS", 4), ("HE", 99)])
+        self.assertEqual(
+            sorted(ac.buscar("USHERS")),
+            [(1, 4, 2), (2, 4, 1), (2, 6, 3)],
+        )
+        self.assertEqual(ac.mas_largo("USHERS"), 3)
+        self.assertIsNone(ac.mas_largo("XYZ"))
+        self.assertFalse(referencias.AhoCorasick([]))
+
+    def test_detector_interno_y_dominio(self):
+        det = referencias.detector()
+        self.assertEqual(det.detectar("Cambio filtro unidad: 8"), self.c8.pk)
+        # Dominio con separadores; el más largo gana sobre el que lo contiene
+        self.assertEqual(det.detectar("dom ab-123-cd"), self.c7.pk)
+        self.assertEqual(det.detectar("patente AB.123"), self.c8.pk)
+        # Interno inexistente: cae al dominio
+        self.assertEqual(det.detectar("INT-99 AB123"), self.c8.pk)
+        self.assertIsNone(det.detectar("sin unidad"))
+
+    def _mov(self, referencia: str) -> MovimientoStock:
+        return MovimientoStock.objects.create(
+            producto=self.prod,
+            ubicacion=self.u1,
+            tipo=MovimientoStock.Tipo.AJUSTE,
+            cantidad=Decimal("1"),
+            referencia=referencia,
+        )
+
+    def test_backfill_por_lotes_retoma_y_mantiene_rollup(self):
+        movs = [self._mov(r) for r in ("INT-7", "nada", "AB123", "COLECTIVO 8", "INT 7")]
+        # "COLECTIVO 8" ya estaba en el rollup por texto (mismo detector)
+        consumo.reconstruir()
+
+        with tempfile.TemporaryDirectory() as tmp:
+            ck = Path(tmp) / "ck.json"
+            call_command("backfill_mov_colectivo", chunk=2, limit=2, checkpoint=str(ck), stdout=StringIO())
+            self.assertEqual(json.loads(ck.read_text())["ultimo_id"], movs[1].pk)
+            self.assertFalse(MovimientoStock.objects.filter(pk=movs[2].pk, colectivo__isnull=False).exists())
+
+            call_command("backfill_mov_colectivo", chunk=2, checkpoint=str(ck), stdout=StringIO())
+
+        vinculados = dict(MovimientoStock.objects.values_list("pk", "colectivo_id"))
+        self.assertEqual(
+            [vinculados[m.pk] for m in movs],
+            [self.c7.pk, None, self.c8.pk, self.c8.pk, self.c7.pk],
+        )
+        antes = sorted(ConsumoDiario.objects.values_list("colectivo_id", "movimientos"))
+        consumo.reconstruir()
+        self.assertEqual(sorted(ConsumoDiario.objects.values_list("colectivo_id", "movimientos")), antes)
+        self.assertEqual(antes, [(self.c7.pk, 2), (self.c8.pk, 2)])
+
+    def test_alta_vincula_la_unidad_de_la_referencia(self):
+        user = User.objects.create_superuser(username="admin", password="admin12345", email="admin@example.com")
+        self.client.force_login(user)
+        # La opción vacía dice lo que hace: no es "no vincular"
+        self.assertContains(self.client.get(reverse("inventario:movimiento_create")), "Según referencia / observaciones / lote")
+        resp = self.client.post(
+            reverse("inventario:movimiento_create"),
+            {
+                "producto": self.prod.pk,
+                "ubicacion": self.u1.pk,
+                "tipo": MovimientoStock.Tipo.INGRESO,
+                "cantidad": "2",
+                "referencia": "Remito 55 interno 7",
+            },
+        )
+        self.assertEqual(resp.status_code, 302)
+        self.assertEqual(MovimientoStock.objects.get().colectivo_id, self.c7.pk)
@@ -18,6 +18,7 @@ urlpatterns = [
 
     # Stock
     path("stock/", views.StockActualListView.as_view(), name="stock_list"),
+    path("stock/historico/", views.stock_historico, name="stock_historico"),
 
     # API (offline)
     path("api/stock-por-ubicacion/", views.stock_por_ubicacion_json, name="api_stock_por_ubicacion"),
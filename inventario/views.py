@@ -1,5 +1,6 @@
 from __future__ import annotations
 
+from datetime import date
 from io import BytesIO
 
 from tablib import Dataset
@@ -8,10 +9,11 @@ from django.contrib import messages
 from django.contrib.auth.decorators import login_required, permission_required
 from django.contrib.auth.mixins import LoginRequiredMixin, PermissionRequiredMixin
 from django.db import transaction
-from django.db.models import F, Sum
+from django.db.models import F
 from django.http import HttpResponse, JsonResponse
 from django.shortcuts import redirect, render
 from django.urls import reverse, reverse_lazy
+from django.utils import timezone
 from django.utils.http import url_has_allowed_host_and_scheme
 from django.views.decorators.http import require_GET
 from django.views.generic import ListView, CreateView, UpdateView, DeleteView, DetailView
@@ -30,6 +32,7 @@ except Exception:
     canvas = None
     REPORTLAB_OK = False
 
+from core.paginacion import KeysetPaginationMixin
 from flota.models import Colectivo
 
 from adjuntos.forms import ProductoImagenInlineFormSet
@@ -55,6 +58,7 @@ from inventario.models import (
     MovimientoStock,
 )
 from inventario.resources import ProductoResource
+from inventario.services import historico, referencias
 from inventario.services import stock as stock_service
 
 # -----------------------------
@@ -344,7 +348,6 @@ class ProductoListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
             .select_related("categoria", "subcategoria", "unidad_medida", "proveedor")
             .prefetch_related("imagenes")  # para miniatura sin N+1
         )
-        qs = qs.annotate(stock_total=Sum("stocks__cantidad"))
         self.filterset = ProductoFilter(self.request.GET, queryset=qs)
         return self.filterset.qs.order_by("codigo")
 
@@ -539,12 +542,13 @@ class StockActualListView(LoginRequiredMixin, PermissionRequiredMixin, ListView)
 # -----------------------------
 # Movimientos
 # -----------------------------
-class MovimientoStockListView(LoginRequiredMixin, PermissionRequiredMixin, ListView):
+class MovimientoStockListView(LoginRequiredMixin, PermissionRequiredMixin, KeysetPaginationMixin, ListView):
     permission_required = "inventario.view_movimientostock"
     model = MovimientoStock
     template_name = "inventario/movimiento_list.html"
     context_object_name = "movimientos"
     paginate_by = 25
+    keyset_orden = ("-fecha", "-id")
 
     def get_queryset(self):
         qs = super().get_queryset().select_related("producto", "ubicacion", "ubicacion_destino", "proveedor", "colectivo", "usuario").order_by("-fecha")
@@ -641,6 +645,12 @@ class MovimientoStockCreateView(LoginRequiredMixin, PermissionRequiredMixin, Cre
                 if force and col_id and not getattr(form.instance, "colectivo_id", None):
                     form.instance.colectivo_id = col_id
 
+                # Sin unidad elegida: vincular la que se nombre en referencia/observaciones/lote
+                if not form.instance.colectivo_id:
+                    form.instance.colectivo_id = referencias.detector().detectar(
+                        referencias.texto_movimiento(form.instance)
+                    )
+
                 response = super().form_valid(form)
 
                 # Aplica stock
@@ -688,15 +698,7 @@ class MovimientoStockUpdateView(LoginRequiredMixin, PermissionRequiredMixin, Upd
             with transaction.atomic():
                 old_obj = MovimientoStock.objects.select_for_update().get(pk=self.object.pk)
 
-                old = stock_service.MovimientoSnapshot(
-                    producto_id=old_obj.producto_id,
-                    ubicacion_id=old_obj.ubicacion_id,
-                    tipo=old_obj.tipo,
-                    cantidad=old_obj.cantidad,
-                    # Si tu snapshot soporta destino (transferencias), lo pasamos.
-                    # Si no existe ese parámetro en tu clase, borrá estas 2 líneas.
-                    ubicacion_destino_id=getattr(old_obj, "ubicacion_destino_id", None),
-                )
+                old = stock_service.MovimientoSnapshot.de(old_obj)
 
                 response = super().form_valid(form)
 
@@ -857,4 +859,53 @@ def productos_etiquetas_pdf(request):
 
     resp = HttpResponse(pdf, content_type="application/pdf")
     resp["Content-Disposition"] = 'inline; filename="etiquetas_productos.pdf"'
-    return resp
\ No newline at end of file
+    return resp
+
+# -----------------------------
+# Stock histórico (snapshot + delta)
+# -----------------------------
+@login_required
+@permission_required("inventario.view_stockactual", raise_exception=True)
+@require_GET
+def stock_historico(request):
+    """Stock al inicio de un día pasado, por producto y/o ubicación."""
+
+    hoy = timezone.localdate()
+    raw_fecha = (request.GET.get("fecha") or "").strip()
+    try:
+        fecha = date.fromisoformat(raw_fecha) if raw_fecha else hoy
+    except ValueError:
+        messages.error(request, "Fecha inválida.")
+        fecha = hoy
+
+    codigo = (request.GET.get("producto") or "").strip().upper()
+    producto = Producto.objects.filter(codigo=codigo).first() if codigo else None
+    if codigo and producto is None:
+        messages.error(request, f"No existe el producto {codigo}.")
+
+    ubicacion = None
+    raw_ubic = (request.GET.get("ubicacion") or "").strip()
+    if raw_ubic.isdigit():
+        ubicacion = Ubicacion.objects.filter(pk=int(raw_ubic)).first()
+
+    rows = []
+    if not codigo or producto is not None:
+        saldos = historico.stock_at(fecha, producto=producto, ubicacion=ubicacion)
+        productos = Producto.objects.select_related("unidad_medida").in_bulk({k[0] for k in saldos})
+        ubicaciones = Ubicacion.objects.in_bulk({k[1] for k in saldos})
+        rows = [
+            {"producto": productos[p_id], "ubicacion": ubicaciones[u_id], "cantidad": cantidad}
+            for (p_id, u_id), cantidad in saldos.items()
+            if p_id in productos and u_id in ubicaciones
+        ]
+        rows.sort(key=lambda r: (r["producto"].codigo, r["ubicacion"].codigo))
+
+    ctx = {
+        "active_tab": "stock",
+        "fecha": fecha,
+        "producto_codigo": codigo,
+        "ubicacion_sel": ubicacion,
+        "ubicaciones": Ubicacion.objects.filter(is_active=True).order_by("codigo"),
+        "rows": rows,
+    }
+    return render(request, "inventario/stock_historico.html", ctx)
@@ -60,6 +60,11 @@ $logFile = Join-Path $LogDir ("server_" + $stamp + ".log")
 if (-not $env:DJANGO_DEBUG) { $env:DJANGO_DEBUG = "0" }
 
 $listen = "$BindHost`:$Port"
+
+# Las pantallas TV mantienen una conexion abierta (hasta TV_STREAM_ESPERA seg) cada una:
+# mas hilos que el default (4) para que no le quiten lugar al resto de los usuarios.
+if (-not $env:WAITRESS_THREADS) { $env:WAITRESS_THREADS = "12" }
+
 Write-Host ("Iniciando Waitress en " + $listen)
 Write-Host ("Log: " + $logFile)
 
@@ -67,7 +72,7 @@ Write-Host ("Log: " + $logFile)
 # En Windows PowerShell 5.1, stdout/stderr de ejecutables nativos puede generar "NativeCommandError"
 # aunque el proceso este bien (waitress loggea por stderr).
 # Para evitarlo, redirigimos en CMD (no en PowerShell) y asi no se crean error records.
-$cmd = '"' + $pythonExe + '" -m waitress --listen=' + $listen + ' config.wsgi:application >> "' + $logFile + '" 2>>&1'
+$cmd = '"' + $pythonExe + '" -m waitress --listen=' + $listen + ' --threads=' + $env:WAITRESS_THREADS + ' config.wsgi:application >> "' + $logFile + '" 2>>&1'
 & cmd.exe /c $cmd
 
 # Si waitress se corta, propagar exitcode